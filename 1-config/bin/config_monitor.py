@@ -22,6 +22,11 @@ CDB Subscription APIを使用して実装されています。
     --stop       : デーモンを停止
     --status     : デーモンの状態を確認
     --foreground : フォアグラウンドで実行（テスト用）
+    --log-json   : ログをJSON Lines形式で書く
+
+【ログ】
+ログは daemon_log モジュールで log/config_monitor.log に書きます
+（バッファに入れるだけで、書き込みはバックグラウンドのスレッドがまとめて行う）。
 
 【設定の拡張方法】
 新しい設定項目を監視する場合は、WATCHED_PATHSリストに追加するだけです。
@@ -33,6 +38,7 @@ CDB Subscription APIを使用して実装されています。
 
 import argparse
 import atexit
+import logging
 import os
 import signal
 import socket
@@ -53,6 +59,12 @@ except ImportError:
 # ネームスペースモジュールのインポート
 import example_ns
 
+# リポジトリ共通のモジュール (daemon_log など) は lib/ に置いている
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'lib'))
+
+import daemon_log
+from daemon_log import log
+
 # =============================================================================
 # 定数定義
 # =============================================================================
@@ -122,7 +134,7 @@ class Subscriber:
         # サブスクリプションの登録完了を通知
         cdb.subscribe_done(self.sock)
 
-        print("Subscribed to {path}".format(path=self.path))
+        log("Subscribed to {path}".format(path=self.path))
 
     def loop(self):
         """サブスクリプションループ：変更を待機→読み取り→ACK
@@ -197,16 +209,16 @@ class Subscriber:
                     # ファイルに書き込み
                     fp.write(f"{config_name} = {value}\n")
 
-                    # コンソールにも出力（デバッグ用）
-                    print(f"  {path} = {value}")
+                    # ログにも出力（デバッグ用）
+                    log(f"  {path} = {value}")
                 except Exception as e:
                     # エラーが発生しても他のパスの処理は継続
-                    print(f"Error reading {path}: {e}")
+                    log(f"Error reading {path}: {e}", logging.ERROR)
 
         cdb.end_session(rsock)
         rsock.close()
 
-        print("Configuration read from ConfD")
+        log("Configuration read from ConfD")
 
 
 # =============================================================================
@@ -218,7 +230,8 @@ def daemonize() -> None:
     プロセスをデーモン化する
 
     二重forkを使用してデーモンプロセスを作成し、
-    標準入出力をログファイルにリダイレクトします。
+    標準入出力を /dev/null にリダイレクトします
+    （ログは daemon_log でログファイルに書く）。
     """
     # ディレクトリを作成（存在しない場合）
     TMP_DIR.mkdir(exist_ok=True)
@@ -247,13 +260,14 @@ def daemonize() -> None:
         sys.stderr.write(f"fork #2 failed: {e}\n")
         sys.exit(1)
 
-    # 標準入出力をログファイルにリダイレクト
+    # 標準入出力を /dev/null にリダイレクト
     sys.stdout.flush()
     sys.stderr.flush()
 
-    with open(str(LOG_FILE), 'a') as log:
-        os.dup2(log.fileno(), sys.stdout.fileno())
-        os.dup2(log.fileno(), sys.stderr.fileno())
+    with open(os.devnull, 'a+') as devnull:
+        os.dup2(devnull.fileno(), sys.stdin.fileno())
+        os.dup2(devnull.fileno(), sys.stdout.fileno())
+        os.dup2(devnull.fileno(), sys.stderr.fileno())
 
     # PIDファイルを作成
     with open(str(PID_FILE), 'w') as f:
@@ -302,7 +316,7 @@ def is_running(pid: Optional[int]) -> bool:
         return False
 
 
-def start_daemon() -> None:
+def start_daemon(log_json: bool = False) -> None:
     """デーモンを起動する"""
     pid = get_pid()
     if is_running(pid):
@@ -316,6 +330,8 @@ def start_daemon() -> None:
     print(f"Log file: {LOG_FILE}")
 
     daemonize()
+    # ログのスレッドは fork で引き継がれないので、デーモン化の後で開始する
+    daemon_log.setup(LOG_FILE, json_lines=log_json)
     run_subscription_loop()
 
 
@@ -390,7 +406,7 @@ def run_subscription_loop() -> None:
     tmp_file = str(CONFIG_FILE) + ".tmp"
     if os.path.exists(tmp_file):
         os.rename(tmp_file, str(CONFIG_FILE))
-        print(f"Initial configuration written to {CONFIG_FILE}")
+        log(f"Initial configuration written to {CONFIG_FILE}")
 
     # ==========================================
     # 終了処理の準備
@@ -401,7 +417,7 @@ def run_subscription_loop() -> None:
 
     def signal_handler(signum, frame):
         """シグナルハンドラー：Ctrl-CやSIGTERMで終了イベントをセット"""
-        print("\nShutdown signal received...")
+        log("Shutdown signal received...")
         stop_event.set()
 
     # シグナルハンドラーを設定（Ctrl-C と kill コマンドの両方に対応）
@@ -429,15 +445,15 @@ def run_subscription_loop() -> None:
                 tmp_file = str(CONFIG_FILE) + ".tmp"
                 if os.path.exists(tmp_file):
                     os.rename(tmp_file, str(CONFIG_FILE))
-                    print(f"Configuration updated in {CONFIG_FILE}")
+                    log(f"Configuration updated in {CONFIG_FILE}")
 
                 # 次の変更を待機（sub.loop()内でwait→read→ackを実行）
                 sub.loop()
-                print("Configuration changed")
+                log("Configuration changed")
             except Exception as e:
                 # 終了シグナルでない場合のみエラー表示
                 if not stop_event.is_set():
-                    print(f"Error in subscription loop: {e}")
+                    log(f"Error in subscription loop: {e}", logging.ERROR)
                 break
 
     # バックグラウンドスレッドとしてサブスクリプション処理を開始
@@ -445,8 +461,7 @@ def run_subscription_loop() -> None:
     thread = threading.Thread(target=subscription_worker, daemon=True)
     thread.start()
 
-    print("Waiting for configuration changes...")
-    print("Press Ctrl-C to stop")
+    log("Waiting for configuration changes...")
 
     # ==========================================
     # メインスレッド: 終了シグナルを待機
@@ -479,18 +494,20 @@ Examples:
     parser.add_argument('--stop', action='store_true', help='Stop the daemon')
     parser.add_argument('--status', action='store_true', help='Check daemon status')
     parser.add_argument('--foreground', action='store_true', help='Run in foreground (for testing)')
+    parser.add_argument('--log-json', action='store_true', help='Write the log as JSON lines')
 
     args = parser.parse_args()
 
     # コマンドを実行
     if args.start:
-        start_daemon()
+        start_daemon(args.log_json)
     elif args.stop:
         stop_daemon()
     elif args.status:
         status_daemon()
     elif args.foreground:
         print("Running in foreground mode (Ctrl-C to stop)")
+        daemon_log.setup(LOG_FILE, json_lines=args.log_json, console=True)
         try:
             run_subscription_loop()
         except KeyboardInterrupt:
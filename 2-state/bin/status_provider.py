@@ -19,10 +19,18 @@ YANGモデル:
     --stop       : デーモンを停止
     --status     : デーモンの状態を確認
     --foreground : フォアグラウンドで実行（テスト用）
+    --log-json   : ログをJSON Lines形式で書く
+    --debug      : データ要求ごとのDEBUGログも書く
+
+【ログ】
+ログは daemon_log モジュールで log/status_provider.log に書きます
+（バッファに入れるだけで、書き込みはバックグラウンドのスレッドがまとめて行う）。
+データ要求ごとのログはDEBUGレベルなので、--debug を付けたときだけ書きます。
 """
 
 import argparse
 import atexit
+import logging
 import os
 import select
 import signal
@@ -49,6 +57,12 @@ except ImportError as e:
     print("Make sure example_ns.py is generated by confdc from the YANG model.")
     sys.exit(1)
 
+# リポジトリ共通のモジュール (daemon_log など) は lib/ に置いている
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'lib'))
+
+import daemon_log
+from daemon_log import log
+
 # =============================================================================
 # 定数定義
 # =============================================================================
@@ -165,10 +179,10 @@ class TransCallbacks:
             # Workerソケットをトランザクションに紐付ける
             # これにより、ConfDはこのソケットを通じてデータ要求を送信できる
             dp.trans_set_fd(tctx, wrksock_global)
-            print("DEBUG: Transaction initialized successfully")
+            log("Transaction initialized successfully", logging.DEBUG)
             return _confd.OK
         except Exception as e:
-            print(f"ERROR: Transaction initialization failed: {e}")
+            log(f"Transaction initialization failed: {e}", logging.ERROR)
             return _confd.ERR
 
     def cb_finish(self, tctx) -> int:
@@ -261,7 +275,7 @@ class DataCallbacks:
         """
         try:
             path = str(kp)
-            print(f"DEBUG: Data request for path: {path}")
+            log(f"Data request for path: {path}", logging.DEBUG)
 
             # ハッシュ値を使ってどのノードが要求されたか判定
             # UPTIME_HASH や LAST_CHECKED_HASH は、ファイル先頭で定義されています
@@ -272,7 +286,7 @@ class DataCallbacks:
                 uptime_msg = self._get_uptime_message()
                 val = _confd.Value(uptime_msg, _confd.C_STR)
                 dp.data_reply_value(tctx, val)
-                print(f"DEBUG: Returned uptime: {uptime_msg}")
+                log(f"Returned uptime: {uptime_msg}", logging.DEBUG)
 
             elif LAST_CHECKED_HASH in path:
                 # last-checked-at ノード: 現在時刻を返す
@@ -280,11 +294,11 @@ class DataCallbacks:
                 current_time = self._get_current_time()
                 val = _confd.Value(current_time, _confd.C_STR)
                 dp.data_reply_value(tctx, val)
-                print(f"DEBUG: Returned last-checked-at: {current_time}")
+                log(f"Returned last-checked-at: {current_time}", logging.DEBUG)
 
             else:
                 # 未知のパス（YANGモデルに存在しないノード）
-                print(f"WARN: Unknown path requested: {path}")
+                log(f"Unknown path requested: {path}", logging.WARNING)
                 # NOT_FOUND (2) を返す
                 # 定数インポートのトラブルを避けるため数値を直接使用
                 return 2
@@ -292,7 +306,7 @@ class DataCallbacks:
             return _confd.OK
 
         except Exception as e:
-            print(f"ERROR: Failed to get element: {e}")
+            log(f"Failed to get element: {e}", logging.ERROR)
             return _confd.ERR
 
     @staticmethod
@@ -379,7 +393,7 @@ def run() -> None:
     global wrksock_global
 
     # ConfDデーモンコンテキストを初期化
-    print(f"INFO: Initializing daemon: {DAEMON_NAME}")
+    log(f"Initializing daemon: {DAEMON_NAME}")
     dctx = dp.init_daemon(DAEMON_NAME)
 
     # ソケットを作成
@@ -398,7 +412,7 @@ def run() -> None:
 
     def signal_handler(signum, frame):
         """シグナルハンドラー：Ctrl-CやSIGTERMで終了フラグをセット"""
-        print("\nINFO: Shutdown signal received...")
+        log("Shutdown signal received...")
         stop_flag['stop'] = True
 
     signal.signal(signal.SIGINT, signal_handler)   # Ctrl-C
@@ -406,7 +420,7 @@ def run() -> None:
 
     try:
         # ConfDに接続
-        print(f"INFO: Connecting to ConfD at {CONFD_HOST}:{CONFD_PORT}")
+        log(f"Connecting to ConfD at {CONFD_HOST}:{CONFD_PORT}")
         dp.connect(dctx, ctlsock, dp.CONTROL_SOCKET, CONFD_HOST, CONFD_PORT, None)
         dp.connect(dctx, wrksock_global, dp.WORKER_SOCKET, CONFD_HOST, CONFD_PORT, None)
 
@@ -415,7 +429,7 @@ def run() -> None:
         # 1. まずトランザクションコールバック（TransCallbacks）を登録
         # 2. 次にデータコールバック（DataCallbacks）を登録
         # 3. 最後にregister_done()で登録完了を通知
-        print("INFO: Registering callbacks")
+        log("Registering callbacks")
         dp.register_trans_cb(dctx, TransCallbacks())
         dp.register_data_cb(dctx, CALLPOINT_NAME, DataCallbacks())
         dp.register_done(dctx)
@@ -432,10 +446,8 @@ def run() -> None:
         #    → ConfDが適切なコールバック（TransCallbacksやDataCallbacks）を呼び出す
         # 3. stop_flagがTrueになるまで繰り返す
         sockets = [ctlsock, wrksock_global]
-        print("=" * 60)
-        print("Status Provider is ready!")
-        print(f"Try running: 'show server-status' in ConfD CLI")
-        print("=" * 60)
+        log("Status Provider is ready!")
+        log("Try running: 'show server-status' in ConfD CLI")
 
         while not stop_flag['stop']:
             # select()でソケットの読み取り可能状態を監視（タイムアウト1秒）
@@ -449,11 +461,11 @@ def run() -> None:
 
     except Exception as e:
         if not stop_flag['stop']:
-            print(f"ERROR: Unexpected error: {e}")
+            log(f"Unexpected error: {e}", logging.ERROR)
             raise
     finally:
         # クリーンアップ
-        print("INFO: Closing sockets")
+        log("Closing sockets")
         ctlsock.close()
         if wrksock_global:
             wrksock_global.close()
@@ -468,7 +480,8 @@ def daemonize() -> None:
     プロセスをデーモン化する
 
     二重forkを使用してデーモンプロセスを作成し、
-    標準入出力をログファイルにリダイレクトします。
+    標準入出力を /dev/null にリダイレクトします
+    （ログは daemon_log でログファイルに書く）。
     """
     # ディレクトリを作成（存在しない場合）
     TMP_DIR.mkdir(exist_ok=True)
@@ -497,13 +510,14 @@ def daemonize() -> None:
         sys.stderr.write(f"fork #2 failed: {e}\n")
         sys.exit(1)
 
-    # 標準入出力をログファイルにリダイレクト
+    # 標準入出力を /dev/null にリダイレクト
     sys.stdout.flush()
     sys.stderr.flush()
 
-    with open(str(LOG_FILE), 'a') as log:
-        os.dup2(log.fileno(), sys.stdout.fileno())
-        os.dup2(log.fileno(), sys.stderr.fileno())
+    with open(os.devnull, 'a+') as devnull:
+        os.dup2(devnull.fileno(), sys.stdin.fileno())
+        os.dup2(devnull.fileno(), sys.stdout.fileno())
+        os.dup2(devnull.fileno(), sys.stderr.fileno())
 
     # PIDファイルを作成
     with open(str(PID_FILE), 'w') as f:
@@ -552,7 +566,7 @@ def is_running(pid: Optional[int]) -> bool:
         return False
 
 
-def start_daemon() -> None:
+def start_daemon(log_json: bool = False, debug: bool = False) -> None:
     """デーモンを起動する"""
     pid = get_pid()
     if is_running(pid):
@@ -566,6 +580,8 @@ def start_daemon() -> None:
     print(f"Log file: {LOG_FILE}")
 
     daemonize()
+    # ログのスレッドは fork で引き継がれないので、デーモン化の後で開始する
+    daemon_log.setup(LOG_FILE, json_lines=log_json, level=logging.DEBUG if debug else logging.INFO)
     run()
 
 
@@ -633,18 +649,22 @@ Examples:
     parser.add_argument('--stop', action='store_true', help='Stop the daemon')
     parser.add_argument('--status', action='store_true', help='Check daemon status')
     parser.add_argument('--foreground', action='store_true', help='Run in foreground (for testing)')
+    parser.add_argument('--log-json', action='store_true', help='Write the log as JSON lines')
+    parser.add_argument('--debug', action='store_true', help='Log every data request')
 
     args = parser.parse_args()
 
     # コマンドを実行
     if args.start:
-        start_daemon()
+        start_daemon(args.log_json, args.debug)
     elif args.stop:
         stop_daemon()
     elif args.status:
         status_daemon()
     elif args.foreground:
         print("Running in foreground mode (Ctrl-C to stop)")
+        daemon_log.setup(LOG_FILE, json_lines=args.log_json, console=True,
+                         level=logging.DEBUG if args.debug else logging.INFO)
         try:
             run()
         except KeyboardInterrupt:
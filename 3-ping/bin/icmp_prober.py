@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+ICMP エコーによる ping (プロセス内で実行)
+
+システムの ping コマンドを起動する代わりに、特権の要らない ICMP データグラム
+ソケット (SOCK_DGRAM / IPPROTO_ICMP, IPPROTO_ICMPV6) で echo request を送り、
+echo reply を受け取るまでの時間を直接測ります。
+
+【なぜプロセス内なのか】
+ping アクションのたびに fork/exec で ping を起動し、その出力の文字列を
+解析するのは、1 回の ping (数十バイトのパケット 1 つ) に比べて重い処理です。
+IcmpProber はアドレスファミリーごとに 1 本のソケットを asyncio の
+イベントループに登録し、多数の ping を同時にそのソケットで多重化します。
+応答はシーケンス番号で送信元の ping に振り分けます。
+応答の TTL (IPv6 はホップリミット) は補助データ (recvmsg) で受け取ります。
+
+【使うための条件 (Linux)】
+一般ユーザーが ICMP データグラムソケットを作るには、そのユーザーのグループが
+sysctl net.ipv4.ping_group_range の範囲に含まれている必要があります。
+
+    sudo sysctl -w net.ipv4.ping_group_range="0 2147483647"
+
+ソケットを作れない場合、IcmpProber.supported() は False を返します
+(ping_action.py はその場合、従来どおりシステムの ping を使います)。
+
+【ループバック限定モード】
+loopback_only=True にすると、ループバックアドレス (127.0.0.0/8, ::1) 以外の
+宛先を ValueError で拒否します。外部にパケットを出さずに動作確認するためのモードです。
+
+【使用方法】
+    python icmp_prober.py --loopback-only 127.0.0.1 ::1 --count 3
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import socket
+import struct
+import time
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+from ping_stats import PingStats, Probe
+from ping_sweep import PingResult, format_table
+
+# ICMP / ICMPv6 の echo request / echo reply のタイプ
+_ECHO = {
+    socket.AF_INET: (8, 0),
+    socket.AF_INET6: (128, 129),
+}
+
+_PROTO = {
+    socket.AF_INET: socket.IPPROTO_ICMP,
+    socket.AF_INET6: socket.IPPROTO_ICMPV6,
+}
+
+# 応答の TTL / ホップリミットを補助データで受け取るためのソケットオプション
+# (IP_RECVTTL は Python の socket モジュールに定義が無いので Linux の値を使う)
+_RECV_TTL = {
+    socket.AF_INET: (socket.IPPROTO_IP, getattr(socket, 'IP_RECVTTL', 12), socket.IP_TTL),
+    socket.AF_INET6: (socket.IPPROTO_IPV6, socket.IPV6_RECVHOPLIMIT, socket.IPV6_HOPLIMIT),
+}
+
+# echo request のデータ部 (システムの ping と同じ 56 バイト)
+_PAYLOAD = bytes(range(56))
+
+
+class IcmpProber:
+    """ICMP データグラムソケットを使った ping
+
+    ソケットはアドレスファミリーごとに 1 本だけ作り、最初の ping のときに
+    実行中のイベントループの読み込み待ちに登録します。
+    ping() はそのイベントループの中から呼び出してください。
+    """
+
+    def __init__(self, loopback_only: bool = False) -> None:
+        self.loopback_only = loopback_only
+        self._sockets: Dict[int, socket.socket] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._next_seq: Dict[int, int] = {socket.AF_INET: 0, socket.AF_INET6: 0}
+        # (ファミリー, シーケンス番号) → (宛先アドレス, 応答の (受信時刻, TTL) を受け取る Future)
+        self._waiters: Dict[Tuple[int, int], Tuple[str, asyncio.Future]] = {}
+
+    @staticmethod
+    def supported(family: int = socket.AF_INET) -> bool:
+        """このプロセスで ICMP データグラムソケットを作れるか"""
+        try:
+            socket.socket(family, socket.SOCK_DGRAM, _PROTO[family]).close()
+        except OSError:
+            return False
+        return True
+
+    def close(self) -> None:
+        """ソケットを閉じ、応答待ちの ping をすべて終わらせる"""
+        for sock in self._sockets.values():
+            if self._loop is not None and not self._loop.is_closed():
+                self._loop.remove_reader(sock.fileno())
+            sock.close()
+        self._sockets.clear()
+        for _, future in self._waiters.values():
+            future.cancel()
+        self._waiters.clear()
+
+    def _socket(self, family: int) -> socket.socket:
+        sock = self._sockets.get(family)
+        if sock is None:
+            sock = socket.socket(family, socket.SOCK_DGRAM, _PROTO[family])
+            sock.setblocking(False)
+            level, option, _ = _RECV_TTL[family]
+            try:
+                sock.setsockopt(level, option, 1)
+            except OSError:
+                pass  # TTL が取れないだけで ping はできる
+            self._loop = asyncio.get_running_loop()
+            self._loop.add_reader(sock.fileno(), self._on_readable, family, sock)
+            self._sockets[family] = sock
+        return sock
+
+    def _on_readable(self, family: int, sock: socket.socket) -> None:
+        """届いている応答をすべて読み、待っている ping に受信時刻と TTL を渡す"""
+        level, _, ttl_type = _RECV_TTL[family]
+        while True:
+            try:
+                data, ancdata, _, address = sock.recvmsg(2048, socket.CMSG_SPACE(4))
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # ICMP エラー (到達不能など) は応答なしとして扱う
+                continue
+            received = time.perf_counter()
+            ttl = None
+            for cmsg_level, cmsg_type, cmsg_data in ancdata:
+                if cmsg_level == level and cmsg_type == ttl_type and len(cmsg_data) >= 4:
+                    ttl = struct.unpack('=i', cmsg_data[:4])[0]
+
+            # データグラムソケットでは IP ヘッダーは除かれ、ICMP ヘッダーから始まる
+            # (識別子はカーネルがソケットごとに書き換えるので、照合には使わない)
+            if len(data) < 8 or data[0] != _ECHO[family][1]:
+                continue
+            seq = struct.unpack_from('!H', data, 6)[0]
+            waiter = self._waiters.get((family, seq))
+            if waiter is None or waiter[0] != address[0].split('%')[0]:
+                continue
+            if not waiter[1].done():
+                waiter[1].set_result((received, ttl))
+
+    def _allocate_seq(self, family: int) -> int:
+        # 応答待ちのシーケンス番号とは重ならないように割り当てる
+        for _ in range(0x10000):
+            seq = self._next_seq[family] = (self._next_seq[family] + 1) & 0xFFFF
+            if (family, seq) not in self._waiters:
+                return seq
+        raise RuntimeError("too many outstanding echo requests")
+
+    async def _resolve(self, destination: str) -> Tuple[int, tuple]:
+        loop = asyncio.get_running_loop()
+        infos = await loop.getaddrinfo(destination, None, type=socket.SOCK_DGRAM)
+        infos = [info for info in infos if info[0] in _ECHO]
+        if not infos:
+            raise OSError(f"no address for {destination}")
+        family, _, _, _, sockaddr = infos[0]
+        if self.loopback_only and not ipaddress.ip_address(sockaddr[0].split('%')[0]).is_loopback:
+            raise ValueError(f"{destination} is not a loopback address (loopback-only mode)")
+        return family, sockaddr
+
+    async def _echo(self, family: int, sockaddr: tuple, timeout: float) -> Tuple[Optional[float], Optional[int]]:
+        """echo request を 1 つ送り、(RTT (ミリ秒), TTL) を返す。時間内に応答が無ければ (None, None)"""
+        sock = self._socket(family)
+        seq = self._allocate_seq(family)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[(family, seq)] = (sockaddr[0].split('%')[0], future)
+        try:
+            # チェックサムはカーネルが計算する
+            packet = struct.pack('!BBHHH', _ECHO[family][0], 0, 0, 0, seq) + _PAYLOAD
+            sent = time.perf_counter()
+            sock.sendto(packet, sockaddr)
+            try:
+                received, ttl = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                return None, None
+            return (received - sent) * 1000.0, ttl
+        finally:
+            self._waiters.pop((family, seq), None)
+
+    async def probe(
+        self,
+        destination: str,
+        count: int = 1,
+        timeout: float = 1.0,
+        interval: float = 0.2,
+        on_probe: Optional[Callable[[Probe], None]] = None,
+    ) -> PingStats:
+        """*destination* に echo request を *count* 個 (*interval* 秒間隔で) 送り、プローブごとの結果を返す
+
+        応答を待つ時間は 1 パケットあたり *timeout* 秒。
+        on_probe を指定すると、応答を受け取るか時間切れになるたびに (終わった順に) 呼び出す。
+        宛先の名前解決や送信に失敗した場合は error を設定した結果を返す。
+        ループバック限定モードでループバック以外の宛先を指定すると ValueError。
+        """
+        stats = PingStats(destination)
+        try:
+            family, sockaddr = await self._resolve(destination)
+        except OSError as e:
+            stats.error = str(e)
+            return stats
+
+        async def echo(seq: int) -> None:
+            rtt, ttl = await self._echo(family, sockaddr, timeout)
+            stats.add_probe(seq, rtt, ttl)
+            if on_probe is not None:
+                on_probe(Probe(seq, rtt, ttl))
+
+        echoes: List[asyncio.Future] = []
+        try:
+            for seq in range(1, count + 1):
+                if seq > 1:
+                    await asyncio.sleep(interval)
+                echoes.append(asyncio.ensure_future(echo(seq)))
+            await asyncio.gather(*echoes)
+        except OSError as e:
+            stats.error = str(e)
+        finally:
+            for echo in echoes:
+                echo.cancel()
+        return stats
+
+    async def ping(
+        self,
+        destination: str,
+        count: int = 1,
+        timeout: float = 1.0,
+        interval: float = 0.2,
+    ) -> PingResult:
+        """probe() の結果を、スイープで使う PingResult にまとめて返す"""
+        stats = await self.probe(destination, count, timeout, interval)
+        return PingResult(
+            destination,
+            count,
+            stats.received,
+            rtt_min=stats.rtt_min,
+            rtt_avg=stats.rtt_avg,
+            rtt_max=stats.rtt_max,
+            error=stats.error,
+        )
+
+
+# =============================================================================
+# メイン
+# =============================================================================
+
+
+def main() -> None:
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description='in-process ICMP echo prober')
+    parser.add_argument('targets', nargs='+', help='addresses or host names')
+    parser.add_argument('--count', type=int, default=1, help='packets per target (default: 1)')
+    parser.add_argument('--timeout', type=float, default=1.0,
+                        help='seconds to wait for each reply (default: 1)')
+    parser.add_argument('--loopback-only', action='store_true',
+                        help='refuse targets other than loopback addresses')
+    args = parser.parse_args()
+
+    if not IcmpProber.supported():
+        parser.error("cannot open an ICMP datagram socket (check net.ipv4.ping_group_range)")
+
+    async def run() -> List[PingResult]:
+        prober = IcmpProber(loopback_only=args.loopback_only)
+        try:
+            return await asyncio.gather(*(prober.ping(t, args.count, args.timeout) for t in args.targets))
+        finally:
+            prober.close()
+
+    try:
+        results = asyncio.run(run())
+    except ValueError as e:
+        parser.error(str(e))
+
+    for line in format_table(results):
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
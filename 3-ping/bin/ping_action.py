@@ -9,6 +9,15 @@ CLI上で 'ping <destination>' コマンドを実行可能にします。
 - ping実行: 指定されたホストまたはIPアドレスへpingを送信
 - 結果表示: パケット送信/受信/損失、平均応答時間を表示
 - 中断機能: Ctrl-Cで実行中のpingを中断可能
+- 並列スイープ: 複数の宛先（リストやプレフィックス）へ同時にpingを実行
+- ICMPソケット: 特権不要のICMPソケットでプロセス内からpingを送信
+  （ソケットを作れない環境ではシステムのpingコマンドを使用）
+- 受付制御: 同時実行数・待ち行列・ユーザーごとの上限を超えた要求はすぐに拒否
+- 途中経過の表示: 応答や結果を得られた時点で、実行したユーザーのCLIに1行ずつ表示
+- 同じ要求の合流: 同じ宛先・回数の ping が実行中ならその結果を共有し、結果は短い時間保存する
+
+ConfDとの接続やコールバックの登録は lib/action_server.py の ActionServer が行い、
+このスクリプトでは各アクションの本体を関数として登録します。
 
 YANGモデル:
 - ファイル: yang/example.yang
@@ -20,44 +29,69 @@ YANGモデル:
     --stop       : デーモンを停止
     --status     : デーモンの状態を確認
     --foreground : フォアグラウンドで実行（テスト用）
+    --loopback-only : ループバックアドレス以外への ping を拒否（テスト用）
+    --workers N     : 同時に実行するアクションの数（デフォルト: 16）
+    --queue-size N  : 実行を待つアクションの数の上限（デフォルト: 64）
+    --per-user N    : 1ユーザーが同時に投入できるアクションの数（デフォルト: 8）
+    --cache-ttl SEC : ping の結果を保存する秒数（デフォルト: 2、0 で保存しない）
+    --log-json      : ログをJSON Lines形式で書く（log/ping_action.log）
 
 【CLI使用例】
     admin@confd> ping execute 8.8.8.8
     admin@confd> ping execute 8.8.8.8 count 5
     admin@confd> ping execute google.com
 
+    admin@confd> ping sweep target [ 192.0.2.0/24 ] count 2
+    admin@confd> ping statistics
+
     実行中にCtrl-Cで中断可能
 
-【制限事項】
-    - ConfDのアクションフレームワークの制約により、pingの実行中は
-      出力が表示されません。完了後に全結果が表示されます。
-    - 進捗を確認したい場合は、別ターミナルで以下を実行してください:
-      tail -f log/ping_action.log
+【途中経過の表示】
+    アクションの出力パラメータは完了時に一度だけ返すものなので、
+    実行中の様子は MAAPI の cli_write() で、アクションを実行した
+    ユーザーのCLIセッションに直接書き込みます。
+    - システムのpingを使う場合: 標準出力を読んだ行をそのまま表示
+    - ICMPソケットを使う場合: 応答（またはタイムアウト）ごとに1行表示
+    - sweep: 応答のあった宛先を見つけた順に表示
+    この場合、完了時の result には集計だけを入れます。
+    CLI以外（NETCONFなど）から実行された場合は、完了時に全結果を返します。
 """
 
 import argparse
+import asyncio
 import atexit
+import logging
 import os
 import platform
-import select
 import signal
-import socket
-import subprocess
 import sys
-import threading
 import time
 
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Callable, List, NamedTuple, Optional
 
 try:
     import _confd  # type: ignore
-    import _confd.dp as dp  # type: ignore
 except ImportError as e:
     print(f"Error: Could not import required ConfD modules: {e}")
     print("Make sure ConfD is installed and PYTHONPATH is set correctly.")
     sys.exit(1)
 
+# リポジトリ共通のモジュール (daemon_log など) は lib/ に置いている
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'lib'))
+
+# ログはバッファに入れるだけで、ファイルへの書き込みはバックグラウンドのスレッドがまとめて行う
+# （main() で daemon_log.setup() を呼んでから使う）
+import daemon_log
+from daemon_log import log
+
+from action_pool import DEFAULT_PER_USER, DEFAULT_QUEUE_SIZE, DEFAULT_WORKERS
+from action_server import ActionContext, ActionError, ActionServer, Uint8, Uint16, Uint32, Uint64
+from icmp_prober import IcmpProber
+from ping_stats import PingStats, Probe, format_probe
+from ping_sweep import DEFAULT_CONCURRENCY, PingResult, expand_targets, summarize, sweep
+from result_cache import DEFAULT_TTL, ResultCache
+
 try:
     import example_ns as ns
 except ImportError as e:
@@ -98,33 +132,17 @@ ACTION_POINT_NAME = "ping_action"
 # デーモン名
 DAEMON_NAME = "ping_action_daemon"
 
-# ConfDワーカーソケットのグローバル参照
-#
-# ConfDのデータプロバイダ/アクションは、
-#   - 制御用ソケット(ctrl_sock: デーモン登録や制御イベント用)
-#   - ワーカーソケット(work_sock: 実際のリクエスト/レスポンス用)
-# の2本を使います。
-#
-# この変数は後段の run_daemon() で生成したワーカーソケットを保持し、
-# cb_init() 内の dp.action_set_fd(uinfo, work_sock_global) で
-# 「このユーザのアクション応答は work_sock_global から返す」ことを
-# ConfD に伝えるために使われます。
-work_sock_global: Optional[socket.socket] = None
+# プロセス内のICMP ping（ICMPソケットを作れない環境では None になり、システムのpingを使う）
+prober: Optional[IcmpProber] = None
 
-# 実行中のpingプロセスを管理する辞書（Ctrl-C中断用）
-# キー: uinfo_key（UserInfoを文字列化したもの）
-# 値: {'process': subprocess.Popen, 'aborted': bool}
-active_pings: Dict = {}
+# 同じ宛先・回数の ping をまとめ、結果を短い時間保存する
+cache: Optional[ResultCache] = None
 
-# =============================================================================
-# ログ関数
-# =============================================================================
-
-def log(message: str) -> None:
-    """ログメッセージをファイルに書き込む"""
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-    with open(LOG_FILE, 'a') as f:
-        f.write(f"[{timestamp}] {message}\n")
+# アクションサーバー
+# ConfDへの接続、アクションポイントの登録、入力/出力の変換、受付制御、
+# 遅延応答、Ctrl-Cでの中断、途中経過の表示を引き受ける。
+# 下の @server.action で登録した関数が、YANGの同じ名前のアクションになる
+server = ActionServer(DAEMON_NAME, ns.ns, ACTION_POINT_NAME, CONFD_HOST, CONFD_PORT)
 
 
 def build_ping_command(destination: str, count: int) -> List[str]:
@@ -139,380 +157,383 @@ def build_ping_command(destination: str, count: int) -> List[str]:
     return ["ping", "-c", str(count), destination]
 
 
-def build_result_values(result_message: str, success: bool) -> List[Any]:
-    """YANGの出力パラメータ(result, success)に対応するTagValueリストを生成"""
-    return [
-        _confd.TagValue(
-            _confd.XmlTag(ns.ns.hash, ns.ns.ex_result),
-            _confd.Value(result_message, _confd.C_BUF),
-        ),
-        _confd.TagValue(
-            _confd.XmlTag(ns.ns.hash, ns.ns.ex_success),
-            _confd.Value(success, _confd.C_BOOL),
-        ),
-    ]
+def _usec(ms: Optional[float]) -> int:
+    return int(round(ms * 1000)) if ms is not None else 0
+
+
+# =============================================================================
+# アクションの出力
+# =============================================================================
+#
+# フィールド名がYANGの出力のleafに、型ヒントがConfDの値の型に対応する。
+# ActionServer はクラスごとに XmlTag などの型紙を一度だけ作り、
+# 応答のたびには値を詰めるだけにする（値が None のフィールドは出力しない）。
+
+class ProbeEntry(NamedTuple):
+    """destination アクションの probe リストの1エントリ"""
+
+    seq: Uint16
+    replied: bool
+    ttl: Optional[Uint8] = None
+    rtt: Optional[Uint32] = None     # マイクロ秒
+
+
+class PingOutput(NamedTuple):
+    """destination アクションの出力"""
+
+    result: str
+    success: bool
+    transmitted: Optional[Uint32] = None
+    received: Optional[Uint32] = None
+    loss_percent: Optional[Uint8] = None
+    rtt_min: Optional[Uint32] = None   # マイクロ秒
+    rtt_avg: Optional[Uint32] = None
+    rtt_max: Optional[Uint32] = None
+    rtt_mdev: Optional[Uint32] = None
+    probe: Optional[List[ProbeEntry]] = None
 
 
-def send_action_reply(uinfo: Any, result_message: str, success: bool) -> None:
-    """アクションの遅延応答/即時応答を送信するヘルパー"""
-    result_values = build_result_values(result_message, success)
-    dp.action_reply_values(uinfo, result_values)
+class HostEntry(NamedTuple):
+    """sweep アクションの host リストの1エントリ"""
+
+    destination: str
+    sent: Uint8
+    received: Uint8
+    loss: Uint8
+    rtt_min: Uint32
+    rtt_avg: Uint32
+    rtt_max: Uint32
+
+
+class SweepOutput(NamedTuple):
+    """sweep アクションの出力"""
+
+    host: List[HostEntry]
+    reachable: Uint32
+    unreachable: Uint32
+    elapsed: Uint32                     # ミリ秒
+    summary: str
+
+
+def build_ping_output(result_message: str, success: bool,
+                      stats: Optional[PingStats] = None) -> PingOutput:
+    """destination アクションの出力 (result, success) を生成
+
+    stats を渡すと、送受信数・損失率・RTT とプローブごとの結果 (probe リスト) も設定する。
+    """
+    if stats is None:
+        return PingOutput(result_message, success)
+
+    probes = [ProbeEntry(p.seq, p.replied, p.ttl, _usec(p.rtt) if p.rtt is not None else None)
+              for p in stats.probes]
+    if not stats.received:
+        return PingOutput(result_message, success, stats.transmitted, 0, int(round(stats.loss)),
+                          probe=probes)
+    # RTT は応答があった場合だけ設定する（マイクロ秒）
+    return PingOutput(
+        result_message, success,
+        transmitted=stats.transmitted,
+        received=stats.received,
+        loss_percent=int(round(stats.loss)),
+        rtt_min=_usec(stats.rtt_min),
+        rtt_avg=_usec(stats.rtt_avg),
+        rtt_max=_usec(stats.rtt_max),
+        rtt_mdev=_usec(stats.rtt_mdev),
+        probe=probes,
+    )
+
+
+class PingOutcome(NamedTuple):
+    """1回のpingの結果（同じ要求を待っているすべてのユーザーで共有する）
+
+    output はCLI以外に返す出力全体、summary は途中経過を表示済みのユーザーに返す集計。
+    """
+
+    success: bool
+    output: str
+    summary: str
+    stats: Optional[PingStats] = None
+
+
+def build_outcome_output(outcome: PingOutcome, streamed: bool) -> PingOutput:
+    """pingの結果から、1人のユーザーに返す出力を生成
+
+    途中経過をCLIに表示済み (streamed) なら、result には集計だけを入れる。
+    """
+    message = outcome.summary if streamed else outcome.output
+    return build_ping_output(message, outcome.success, outcome.stats)
+
 
 # =============================================================================
 # Ping実行関数
 # =============================================================================
 
-def execute_ping(uinfo, destination: str, count: int = 4) -> None:
+async def execute_ping(destination: str, count: int, progress: Callable[[str], None]) -> PingOutcome:
     """
-    pingコマンドを実行し、完了時に結果を返す
+    pingコマンドを実行し、出力を1行ずつ progress() に渡しながら、完了時の結果を返す
 
     【実行モデル】
-    この関数はcb_actionから別スレッドで呼び出されます。
-    - cb_actionは_confd.DELAYED_RESPONSEを返してすぐに制御を戻す
-    - この関数がバックグラウンドでpingを実行
-    - 完了後、dp.action_reply_values()で結果を返す
+    この関数は ping_destination() から ResultCache を通して、デーモンのイベントループの
+    タスクとして実行されます（同じ宛先・回数の要求が同時に来た場合も実行は1回だけ）。
+    - pingコマンドを asyncio の子プロセスとして起動する
+    - 標準出力はイベントループで1行ずつ読む（読めるまで待つ間も、
+      他のアクションやConfDからの要求を処理できる。スレッドは使わない）
+    - 読んだ行はその場で解析し、progress() で待っているすべてのユーザーに渡す
+    - 完了後、結果を PingOutcome にまとめて返す（応答は ActionServer が送る）
 
     【Ctrl-C中断の仕組み】
-    1. active_pings辞書にプロセスを登録
-    2. Ctrl-Cが押されるとcb_abort()が呼ばれる
-    3. cb_abort()がactive_pingsからプロセスを取得して終了
-    4. process.terminate()によりpingプロセスが終了
-    5. process.wait()が戻り、returncode < 0（シグナルで終了）を検知
-    6. ConfDがクライアント接続を切断するため、応答は送信できない
+    1. Ctrl-Cが押されるとcb_abort()が呼ばれる
+    2. cb_abort()がアクションのタスクを取り消す
+    3. 結果を待っているユーザーがいなくなると、このタスクも取り消され、
+       行の読み込みを待っているところで CancelledError になる
+    4. pingプロセスを終了させてから、CancelledError をそのまま送出する
 
     Args:
-        uinfo: ConfDユーザー情報オブジェクト（応答送信時に使用）
         destination: pingの宛先（IPアドレスまたはホスト名）
-        count: 送信するパケット数（デフォルト: 4）
+        count: 送信するパケット数
+        progress: 途中経過を1行受け取る関数
+
+    Returns:
+        成否、出力全体、集計と解析した統計
     """
-    global active_pings
+    # OSに応じてpingコマンドのオプションを設定
+    cmd = build_ping_command(destination, count)
+    log(f"Executing ping command: {' '.join(cmd)}")
 
-    # UserInfoを文字列化してキーに利用（1アクション＝1キー）
-    uinfo_key = str(uinfo)
+    try:
+        # 【プロセス起動】
+        # 標準エラーも標準出力にまとめるので、読むパイプは1本だけ
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+    except OSError as e:
+        error_msg = f"Error executing ping: {e}"
+        log(error_msg, logging.ERROR)
+        return PingOutcome(False, error_msg, error_msg)
 
     # pingコマンドの出力を保存するリスト
     output_lines = []
+    # 読んだ行はその場で解析して、送受信数やRTTの集計に反映する
+    stats = PingStats(destination)
 
     try:
-        # OSに応じてpingコマンドのオプションを設定
-        cmd = build_ping_command(destination, count)
+        # 【出力読み取り】
+        # 1行届くたびに解析し、途中経過として渡す
+        async for line in process.stdout:
+            line_text = line.decode(errors='replace').rstrip()
+            if line_text:                # 空行はスキップ
+                output_lines.append(line_text)
+                stats.feed(line_text)
+                progress(line_text)
+        await process.wait()
+
+    except asyncio.CancelledError:
+        # 【中断ケース】
+        # cb_abortが既に応答を返しているので、プロセスを止めるだけ
+        log(f"Ping was interrupted; terminating ping process (PID: {process.pid})")
+        process.kill()
+        await process.wait()
+        raise
 
-        log(f"Executing ping command: {' '.join(cmd)}")
+    # 【結果判定】
+    # returncode:
+    #   0       : 正常終了
+    #   正の値 : エラー終了（例: ホスト不明、ネットワークエラー）
+    success = process.returncode == 0
+    output = '\n'.join(output_lines)
+    summary = stats.summary()
+    if not success:
+        output = f"Ping to {destination} failed.\n{output}"
+        summary = f"Ping to {destination} failed.\n{summary}"
 
-        # 【プロセス起動】
-        # subprocess.Popenでpingコマンドを子プロセスとして起動
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,      # 標準出力をパイプでキャプチャ
-            stderr=subprocess.STDOUT,     # 標準エラーも標準出力にリダイレクト
-            text=True                     # バイトではなくテキストで受け取る
-        )
+    log(f"Ping completed - success: {success}")
+    return PingOutcome(success, output, summary, stats)
 
-        # 【重要】プロセスをグローバル辞書に登録
-        # cb_abort()がCtrl-C時にこのプロセスを取得して終了させるため
-        active_pings[uinfo_key] = {
-            'process': process,
-            'aborted': False
-        }
+# =============================================================================
+# 並列スイープ
+# =============================================================================
 
-        # 【出力読み取り】
-        # pingコマンドの出力を一行ずつ読み取り、リストに保存
-        try:
-            # 【重要】stdoutを読み切ってからwaitを呼ぶ
-            # process.communicate()を使うと、デッドロックを防げる
-            stdout_data, _ = process.communicate()
-
-            # 出力を行ごとに分割してリストに追加
-            for line in stdout_data.split('\n'):
-                line_text = line.rstrip()   # 末尾の空白を削除
-                if line_text:                # 空行はスキップ
-                    output_lines.append(line_text)
-
-        except Exception as e:
-            log(f"Error during ping execution: {e}")
-            output_lines.append(f"Error: {e}")
-            # エラー時もプロセスが残っている可能性があるので終了させる
-            try:
-                process.kill()
-                process.wait()
-            except:
-                pass
-
-        # 【クリーンアップ】
-        # pingが終了したので、グローバル辞書から削除
-        # （cb_abortがもう呼ばれることはない）
-        entry = active_pings.pop(uinfo_key, None)
-        aborted = entry.get('aborted', False) if entry else False
-
-        # 【結果判定】
-        # returncode:
-        #   0       : 正常終了
-        #   正の値 : エラー終了（例: ホスト不明、ネットワークエラー）
-        #   負の値 : シグナルで終了（例: -15 = SIGTERM, -9 = SIGKILL）
-        success = process.returncode == 0
-        output = '\n'.join(output_lines)
-
-        if not success and process.returncode < 0:
-            # 【中断ケース】
-            # Ctrl-Cで中断された場合、returncodeは負の値になる
-            # （process.terminate()がSIGTERM=15を送るので-15になる）
-            log(f"Ping was interrupted (signal: {-process.returncode})")
-            if aborted:
-                # cb_abortが既に応答を返している
-                log("Abort handled by cb_abort; skipping reply")
-                return
-            # 応答を返す前にエラーメッセージを設定
-            result_message = "Ping interrupted by Ctrl-C"
-            success = False
-        elif success:
-            result_message = output
-        else:
-            result_message = f"Ping to {destination} failed.\n{output}"
-
-        log(f"Ping completed - success: {success}")
-
-        # 【遅延応答の送信】
-        # cb_action()で_confd.DELAYED_RESPONSEを返した場合、
-        # ここでdp.action_reply_values()を呼んで結果を返す必要がある。
-        if aborted:
-            log("Skipping reply because cb_abort already responded")
-            return
-
-        try:
-            # YANGモデルの出力パラメータに対応する値を設定
-            # output { leaf result { ... } leaf success { ... } }
-            result_values = [
-                # resultパラメータ: pingの出力テキスト
-                _confd.TagValue(
-                    _confd.XmlTag(ns.ns.hash, ns.ns.ex_result),  # YANGのleaf名
-                    _confd.Value(result_message, _confd.C_BUF)   # string型の値
-                ),
-                # successパラメータ: pingが成功したかどうか
-                _confd.TagValue(
-                    _confd.XmlTag(ns.ns.hash, ns.ns.ex_success), # YANGのleaf名
-                    _confd.Value(success, _confd.C_BOOL)         # boolean型の値
-                )
-            ]
-            # ConfDに応答を送信（これがCLIに表示される）
-            dp.action_reply_values(uinfo, result_values)
-            log("Reply sent successfully")
-        except Exception as e:
-            # クライアントが切断されている場合はエラーになるが、
-            # それは正常な動作なので静かに終了
-            log(f"Could not send reply (connection may be closed): {e}")
+def build_sweep_output(results: List[PingResult], elapsed: float) -> SweepOutput:
+    """sweep アクションの出力 (host リストと集計) を生成"""
+    reachable = [
+        HostEntry(r.destination, r.sent, r.received, int(round(r.loss)),
+                  _usec(r.rtt_min), _usec(r.rtt_avg), _usec(r.rtt_max))
+        for r in results if r.reachable
+    ]
+    return SweepOutput(
+        host=reachable,
+        reachable=len(reachable),
+        unreachable=len(results) - len(reachable),
+        elapsed=int(elapsed * 1000),
+        summary=summarize(results, elapsed),
+    )
 
-    except Exception as e:
-        error_msg = f"Error executing ping: {str(e)}"
-        log(f"ERROR: {error_msg}")
+async def timed_sweep(ctx: ActionContext, targets: List[str], count: int, concurrency: int, timeout: int):
+    """スイープを実行し、(結果, 経過秒数) を返す
+
+    応答のあった宛先は、見つけた順に途中経過としてCLIに表示する。
+    """
+    def on_result(r: PingResult) -> None:
+        if r.reachable:
+            ctx.write(f"{r.destination}: {r.received}/{r.sent} received, "
+                            f"rtt avg {r.rtt_avg:.3f} ms")
+
+    start = time.perf_counter()
+    results = await sweep(
+        targets, count, concurrency, timeout,
+        on_result=on_result,
+        pinger=prober.ping if prober is not None else None,
+    )
+    return results, time.perf_counter() - start
 
-        # グローバル辞書から削除
-        active_pings.pop(uinfo_key, None)
 
-        # エラーを返す（遅延応答）
-        try:
-            send_action_reply(uinfo, error_msg, False)
-        except Exception as e2:
-            # 接続が閉じられている場合は静かに終了
-            log(f"Could not send error reply (connection may be closed): {e2}")
+async def probe_ping(destination: str, count: int, progress: Callable[[str], None]) -> PingOutcome:
+    """
+    ICMPソケットでpingを実行し、完了時の結果を返す
+
+    応答（またはタイムアウト）ごとに、システムのpingに近い形の1行を progress() に渡す。
+    """
+    stats = await prober.probe(destination, count,
+                               on_probe=lambda probe: progress(format_probe(destination, probe)))
+    log(f"Ping completed - received: {stats.received}/{stats.transmitted}")
+    summary = stats.summary()
+    return PingOutcome(stats.received > 0, summary, summary, stats)
+
+
+async def ping_destination(ctx: ActionContext, destination: str, count: int) -> PingOutput:
+    """
+    destination アクションの本体: pingを実行し、完了時の出力を返す
+
+    【同じ要求の合流】
+    同じ宛先・回数の ping が実行中なら、新しく送らずにその結果を待ちます。
+    完了した結果は --cache-ttl 秒のあいだ保存して、同じ要求にはそれを返します。
+    途中経過は、結果を待っているすべてのユーザーのCLIに表示します
+    （後から合流したユーザーには、それまでの行をまとめて表示してから続きを表示する）。
+
+    ICMPソケットが使える場合はプロセス内で、使えない場合はシステムのpingで実行する。
+    """
+    # 途中経過をCLIに表示できたか
+    streamed = False
+
+    def on_progress(text: str) -> None:
+        nonlocal streamed
+        streamed = ctx.write(text) or streamed
+
+    run = probe_ping if prober is not None else execute_ping
+    outcome = await cache.run(
+        (destination, count),
+        lambda progress: run(destination, count, progress),
+        on_progress,
+    )
+    return build_outcome_output(outcome, streamed)
 
 # =============================================================================
-# アクションコールバッククラス
+# アクション
 # =============================================================================
+#
+# 【実行モデル】
+# 関数は ActionServer がデーモンのイベントループで実行します。
+# - ConfD CLIでユーザーが 'ping destination ...' などを実行すると、
+#   ActionServer が入力パラメータを関数の引数にして呼び出す
+# - 時間のかかる処理（コルーチン）は ActionPool を通してタスクとして実行し、
+#   ConfD には _confd.DELAYED_RESPONSE（後で応答する）を返す
+#   （待ち行列がいっぱいの場合やユーザーごとの上限に達した場合は、その場でエラーになる）
+# - タスクが終わると、戻り値を dp.action_reply_values() で応答する
+#
+# 【Ctrl-C中断の仕組み】
+# Ctrl-Cが押されるとConfDが cb_abort() を呼び、ActionServer がタスクを取り消して
+# "Action aborted by user" を応答します（pingプロセスの終了やICMPの応答待ちの中止は、
+# 取り消されたタスクの中で行う）。
+# Ctrl-Cの後はConfDがクライアント接続を切断するので、CLIには "Aborted: by user" とだけ表示されます。
+
 
-class PingActionHandler:
+@server.action('destination', inline=True)
+def destination_action(ctx: ActionContext, destination: Optional[str] = None, count: int = 4):
     """
-    pingアクションのハンドラークラス
-
-    【役割】
-    ConfD CLIで 'ping execute <destination>' コマンドが実行されたときに
-    呼び出され、実際のping実行とレスポンスの返却を行います。
-
-    【処理フロー】
-    1. ConfD CLIでユーザーがpingコマンドを実行
-    2. ConfDがこのハンドラーのcb_action()メソッドを呼び出し
-    3. 入力パラメータ（destination, count）を取得
-    4. システムpingコマンドを実行
-    5. 結果を解析して出力パラメータ（result, success）を設定
-    6. ConfDにレスポンスを返却
-    7. CLIに結果が表示される
+    destination アクション（ping destination <宛先> [count <回数>]）
+
+    少し前に同じ宛先・回数で実行した結果があれば、pingを送らずにその場で返す。
+    無ければ ping_destination() のコルーチンを返し、ActionServer がそれを
+    イベントループのタスクとして実行して遅延応答を返す
+    （CLIはブロックし、結果が返るまで待つ。途中経過はCLIに表示される）。
+    """
+    log(f"Input parameters - destination: {destination}, count: {count}")
+
+    # destinationは必須パラメータ
+    if destination is None:
+        error_msg = "Error: destination parameter is required"
+        log(error_msg)
+        return build_ping_output(error_msg, False)
+
+    # 【保存した結果】
+    outcome = cache.get((destination, count))
+    if outcome is not None:
+        log(f"Reply from cache: destination={destination}, count={count}")
+        return build_outcome_output(outcome, False)
+
+    # pingはデーモンのイベントループのタスクとして実行する
+    # （ICMPソケットが使える場合は子プロセスを作らずにプロセス内で、
+    # 使えない場合はシステムのpingの出力をイベントループで読む。スレッドは使わない）
+    log(f"Starting ping task: destination={destination}, count={count}")
+    return ping_destination(ctx, destination, count)
+
+
+@server.action('sweep', inline=True)
+def sweep_action(ctx: ActionContext, target: List[str], count: int = 1,
+                 concurrency: int = DEFAULT_CONCURRENCY, timeout: int = 1):
     """
+    sweep アクション
 
-    def cb_init(self, uinfo) -> int:
-        """
-        アクション初期化コールバック
-
-        ConfDデーモンは "制御ソケット"(ctrl_sock) と
-        "ワーカーソケット"(work_sock_global) の2本を使います。
-
-        ここでは uinfo にワーカーソケットを関連付けることで、
-        後続の cb_action / execute_ping からの応答
-        (dp.action_reply_values など) が work_sock_global 経由で
-        ConfD に返されるように設定します。
-
-        Args:
-            uinfo: ユーザー情報
-
-        Returns:
-            _confd.CONFD_OK
-        """
-        global work_sock_global
-        log("Action initialized")
-        # ユーザー情報にワーカーソケットを設定
-        dp.action_set_fd(uinfo, work_sock_global)
-        return _confd.CONFD_OK
-
-    def cb_abort(self, uinfo) -> int:
-        """
-        アクション中止コールバック
-
-        【呼び出されるタイミング】
-        CLIでping実行中にユーザーがCtrl-Cを押したとき、
-        ConfDがこのコールバックを呼び出します。
-
-        【主な処理】
-        1. active_pings辞書から実行中のプロセスを取得
-        2. process.terminate()でSIGTERMシグナルを送信
-        3. 0.1秒待ってまだ生きていたらprocess.kill()でSIGKILL
-        4. execute_ping()スレッドのprocess.wait()が戻り、終了処理が走る
-
-        【重要なConfDの仕様】
-        Ctrl-Cが押されると、ConfDはクライアント接続を切断します。
-        そのため、この後でdp.action_reply_values()を呼んでも
-        結果をCLIに表示することはできません。
-        CLIには "Aborted: by user" とだけ表示されます。
-
-        Args:
-            uinfo: ConfDユーザー情報オブジェクト
-
-        Returns:
-            _confd.CONFD_OK: 常に成功を返す
-        """
-        global active_pings
-
-        log("Action aborted (Ctrl-C pressed)")
-
-        uinfo_key = str(uinfo)
-
-        if uinfo_key in active_pings:
-            info = active_pings[uinfo_key]
-            process = info['process']
-            info['aborted'] = True  # execute_ping側に通知
-
-            log(f"Terminating ping process (PID: {process.pid})")
-
-            try:
-                # 【ステップ 1】穏やかな終了を試みる（SIGTERM = 15）
-                process.terminate()
-
-                # 【ステップ 2】少し待って、まだ生きていたら強制終了
-                time.sleep(0.1)
-                if process.poll() is None:
-                    process.kill()
-                    process.wait()
-
-                log("Ping process terminated")
-
-            except Exception as e:
-                log(f"Error terminating ping process: {e}")
-
-            # 応答はここで返す（execute_ping側ではスキップされる）
-            try:
-                dp.action_delayed_reply_error(uinfo, "Action aborted by user")
-                log("Abort reply sent from cb_abort")
-            except Exception as e:
-                log(f"Error sending abort reply: {e}")
-        else:
-            # プロセスが見つからない場合（既に終了しているなど）
-            log("No active ping process found")
-
-        return _confd.CONFD_OK
-
-    def cb_finish(self, uinfo) -> int:
-        """
-        アクション終了コールバック（使用されない）
-
-        Args:
-            uinfo: ユーザー情報
-
-        Returns:
-            _confd.CONFD_OK
-        """
-        log("Action finished")
-        return _confd.CONFD_OK
-
-    def cb_action(self, uinfo, name, kp, params) -> int:
-        """
-        アクションコールバック
-
-        Args:
-            uinfo: ユーザー情報
-            name: アクション名
-            kp: キーパス
-            params: 入力パラメータ
-
-        Returns:
-            _confd.DELAYED_RESPONSE: 遅延応答（別スレッドで結果を返す）
-            _confd.CONFD_OK: 即座に成功
-        """
-        global work_sock_global
-
-        try:
-            log(f"Action callback invoked: {name}")
-
-            # 【入力パラメータの解析】
-            # YANGモデルの input { leaf destination ... leaf count ... }
-            # から値を取得する
-            destination = None
-            count = 4  # YANGで定義したdefault値
-
-            # paramsは_confd.TagValueオブジェクトのリスト
-            # 各TagValueは YANGのleafに対応する
-            for param in params:
-                # destinationパラメータのチェック
-                # ns.ns.ex_destinationはYANGから生成された定数
-                if param.tag == ns.ns.ex_destination:
-                    destination = str(param.v)  # _confd.Valueから文字列に変換
-                    log(f"Input parameter - destination: {destination}")
-
-                # countパラメータのチェック
-                elif param.tag == ns.ns.ex_count:
-                    count = int(param.v)  # _confd.Valueから整数に変換
-                    log(f"Input parameter - count: {count}")
-
-            # destinationは必須パラメータ
-            if destination is None:
-                error_msg = "Error: destination parameter is required"
-                log(error_msg)
-                # アクションの出力を設定
-                send_action_reply(uinfo, error_msg, False)
-                return _confd.CONFD_OK
-
-            # 【別スレッドでping実行】
-            # pingは数秒かかる処理なので、メインスレッドをブロックしないよう
-            # 別スレッドで実行する
-            log(f"Starting ping thread: destination={destination}, count={count}")
-            ping_thread = threading.Thread(
-                target=execute_ping,          # 実行する関数
-                args=(uinfo, destination, count),  # 関数に渡す引数
-                daemon=True                   # デーモンスレッド（メイン終了時に自動終了）
-            )
-            ping_thread.start()  # スレッド開始
-
-            # 【遅延応答の宣言】
-            # _confd.DELAYED_RESPONSEを返すことで、ConfDに以下を伝える:
-            # - 「今すぐ結果を返さないが、後で返す」
-            # - 別スレッドがdp.action_reply_values()を呼ぶまで待つ
-            # - CLIはブロックし、結果が返るまで待つ
-            log("Returning DELAYED_RESPONSE")
-            return _confd.DELAYED_RESPONSE
-
-        except Exception as e:
-            error_msg = f"Error in action callback: {str(e)}"
-            log(f"ERROR: {error_msg}")
-
-            # エラーを即座に返す
-            send_action_reply(uinfo, error_msg, False)
-            return _confd.CONFD_OK
+    宛先を展開し、スイープのコルーチンを返す（タスクとして実行され、遅延応答になる）。
+    宛先の指定に誤りがある場合は、その場でエラーを返す。
+    """
+    try:
+        targets = expand_targets(target)
+    except ValueError as e:
+        log(f"Invalid sweep targets: {e}")
+        raise ActionError(str(e))
+
+    log(f"Starting sweep task: {len(targets)} targets, count={count}, concurrency={concurrency}")
+
+    async def run() -> SweepOutput:
+        return build_sweep_output(*await timed_sweep(ctx, targets, count, concurrency, timeout))
+
+    return run()
+
+
+class Statistics(NamedTuple):
+    """statistics アクションの出力（フィールド名がYANGの出力のleafに対応する）"""
+
+    workers: Uint32
+    running: Uint32
+    queued: Uint32
+    queue_size: Uint32
+    max_queued: Uint32
+    accepted: Uint64
+    rejected: Uint64
+    completed: Uint64
+    cache_hits: Uint64
+    coalesced: Uint64
+
+
+@server.action('statistics', inline=True)
+def statistics_action() -> Statistics:
+    """statistics アクション（受付制御と結果の共有の統計）。待ち行列を通さずにその場で返す"""
+    stats = server.pool.snapshot()
+    return Statistics(
+        workers=stats['workers'],
+        running=stats['running'],
+        queued=stats['queued'],
+        queue_size=stats['queue-size'],
+        max_queued=stats['max-queued'],
+        accepted=stats['accepted'],
+        rejected=stats['rejected'],
+        completed=stats['completed'],
+        cache_hits=cache.hits,
+        coalesced=cache.coalesced,
+    )
 
 # =============================================================================
 # デーモン管理関数
@@ -526,7 +547,7 @@ def daemonize() -> None:
         if pid > 0:
             sys.exit(0)
     except OSError as e:
-        log(f"First fork failed: {e}")
+        log(f"First fork failed: {e}", logging.ERROR)
         sys.exit(1)
 
     # 環境をデタッチ
@@ -540,7 +561,7 @@ def daemonize() -> None:
         if pid > 0:
             sys.exit(0)
     except OSError as e:
-        log(f"Second fork failed: {e}")
+        log(f"Second fork failed: {e}", logging.ERROR)
         sys.exit(1)
 
     # 標準入出力をリダイレクト
@@ -640,96 +661,55 @@ def check_status() -> None:
 # メイン処理
 # =============================================================================
 
-def run_daemon() -> None:
+def run_daemon(loopback_only: bool = False,
+               workers: int = DEFAULT_WORKERS,
+               queue_size: int = DEFAULT_QUEUE_SIZE,
+               per_user: int = DEFAULT_PER_USER,
+               cache_ttl: float = DEFAULT_TTL) -> None:
     """
     デーモンのメイン処理
-    ConfDに接続してアクションハンドラーを登録し、イベントループを実行
+    ICMP ping と結果の共有を準備してから、アクションサーバーを実行
+
+    Args:
+        loopback_only: ループバックアドレス以外への ping を拒否する（テスト用）
+        workers: 同時に実行するアクションの数
+        queue_size: 実行を待つアクションの数の上限
+        per_user: 1ユーザーが同時に投入できるアクションの数
+        cache_ttl: ping の結果を保存する秒数（0 の場合は実行中の要求の合流だけを行う）
     """
-    global work_sock_global
+    global prober, cache
 
     log(f"Starting {DAEMON_NAME}...")
 
-    # デーモンコンテキストを初期化（最初に実行）
-    log("Initializing daemon context...")
-    daemon_ctx = dp.init_daemon(DAEMON_NAME)
-    log("Daemon context initialized")
-
-    # ConfDへのソケット接続
-    # ctrl_sock: ConfDとの制御チャネル用ソケット
-    #            (デーモン登録、再登録、制御イベントなど)
-    ctrl_sock = socket.socket()
+    if IcmpProber.supported():
+        prober = IcmpProber(loopback_only=loopback_only)
+        log("Using in-process ICMP datagram sockets"
+            + (" (loopback only)" if loopback_only else ""))
+    elif loopback_only:
+        raise RuntimeError("--loopback-only requires ICMP datagram sockets "
+                           "(check net.ipv4.ping_group_range)")
+    else:
+        log("ICMP datagram sockets are not available; using the system ping command")
 
-    # work_sock_global: アクション/DP呼び出し処理用のワーカーソケット
-    #                   実際のアクションリクエストと応答のやり取りに使用
-    work_sock_global = socket.socket()
+    cache = ResultCache(cache_ttl)
+    log(f"Ping results are shared for {cache.ttl:g} seconds")
 
     try:
-        # ConfDに接続（daemon_ctxを第1引数に渡す）
-        log(f"Connecting to ConfD at {CONFD_HOST}:{CONFD_PORT}...")
-        dp.connect(daemon_ctx, ctrl_sock, dp.CONTROL_SOCKET, CONFD_HOST, CONFD_PORT, None)
-        dp.connect(daemon_ctx, work_sock_global, dp.WORKER_SOCKET, CONFD_HOST, CONFD_PORT, None)
-        log("Connected to ConfD")
-
-        # アクションハンドラーを登録
-        log(f"Registering action point: {ACTION_POINT_NAME}")
-        action_handler = PingActionHandler()
-        dp.register_action_cbs(daemon_ctx, ACTION_POINT_NAME, action_handler)
-
-        # 登録完了を通知
-        dp.register_done(daemon_ctx)
-        log(f"{DAEMON_NAME} registration complete")
-
-        # シグナルハンドラー設定
-        stop_flag = {'stop': False}
-
-        def signal_handler(signum, frame):
-            log(f"Received signal {signum}, shutting down...")
-            stop_flag['stop'] = True
-
-        signal.signal(signal.SIGTERM, signal_handler)
-        signal.signal(signal.SIGINT, signal_handler)
-
-        # イベントループ
-        log("Entering event loop...")
-        sockets = [ctrl_sock, work_sock_global]
-
-        while not stop_flag['stop']:
-            # ソケットからの読み取りを待機
-            readable, _, _ = select.select(sockets, [], [], 1.0)
-
-            for sock in readable:
-                try:
-                    # データを読み取って処理（daemon_ctxを第1引数に渡す）
-                    dp.fd_ready(daemon_ctx, sock)
-                except _confd.error.Error as e:
-                    # ConfDが接続を閉じた場合
-                    if e.confd_errno == _confd.ERR_EOF:
-                        log("ConfD closed connection, shutting down...")
-                        stop_flag['stop'] = True
-                        break
-                    else:
-                        log(f"Error processing socket data: {e}")
-                        # その他のエラーの場合も停止
-                        stop_flag['stop'] = True
-                        break
-                except Exception as e:
-                    log(f"Error processing socket data: {e}")
-                    # 予期しないエラーの場合も停止
-                    stop_flag['stop'] = True
-                    break
+        # ConfDに接続してアクションポイントを登録し、シグナルを受けるまでイベントループを実行する
+        # （ConfDのソケットとICMPソケットを同じループでまとめて待つ）
+        server.run(workers, queue_size, per_user)
 
     except KeyboardInterrupt:
         log("Keyboard interrupt received")
 
     except Exception as e:
-        log(f"Error in main loop: {e}")
+        log(f"Error in main loop: {e}", logging.ERROR)
         raise
 
     finally:
-        log(f"Shutting down {DAEMON_NAME}")
-        ctrl_sock.close()
-        if work_sock_global:
-            work_sock_global.close()
+        log(f"{DAEMON_NAME} stopped")
+        if prober is not None:
+            prober.close()
 
 def main():
     """メイン関数"""
@@ -746,6 +726,19 @@ def main():
                       help='Check daemon status')
     group.add_argument('--foreground', action='store_true',
                       help='Run in foreground (for testing)')
+    parser.add_argument('--loopback-only', action='store_true',
+                        help='Refuse to ping anything but loopback addresses (for testing)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Number of actions running at once (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help=f'Number of actions waiting to run (default: {DEFAULT_QUEUE_SIZE})')
+    parser.add_argument('--per-user', type=int, default=DEFAULT_PER_USER,
+                        help=f'Number of actions in progress per user (default: {DEFAULT_PER_USER})')
+    parser.add_argument('--cache-ttl', type=float, default=DEFAULT_TTL,
+                        help=f'Seconds to reuse a ping result for the same destination and count '
+                             f'(default: {DEFAULT_TTL:g}, 0 disables)')
+    parser.add_argument('--log-json', action='store_true',
+                        help='Write the log as JSON lines')
 
     args = parser.parse_args()
 
@@ -758,7 +751,9 @@ def main():
 
         print(f"Starting {DAEMON_NAME}...")
         daemonize()
-        run_daemon()
+        # ログのスレッドは fork で引き継がれないので、デーモン化の後で開始する
+        daemon_log.setup(LOG_FILE, json_lines=args.log_json)
+        run_daemon(args.loopback_only, args.workers, args.queue_size, args.per_user, args.cache_ttl)
 
     elif args.stop:
         stop_daemon()
@@ -768,7 +763,8 @@ def main():
 
     elif args.foreground:
         print(f"Running {DAEMON_NAME} in foreground...")
-        run_daemon()
+        daemon_log.setup(LOG_FILE, json_lines=args.log_json, console=True)
+        run_daemon(args.loopback_only, args.workers, args.queue_size, args.per_user, args.cache_ttl)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,159 @@
+"""
+ping の結果の集計 (構造化された出力用)
+
+ping アクションの出力を、文字列 1 つ (result) だけでなく型の付いた値
+(送信数、受信数、損失率、RTT の最小/平均/最大/標準偏差、プローブごとの結果)
+として返すための集計クラスです。
+
+- システムの ping を使う場合は、出力を 1 行ずつ feed() に渡します
+  (出力全体を溜めてから正規表現で探すのではなく、行を読んだ時点で解析する)
+- プロセス内の ICMP ping (icmp_prober.py) は add_probe() で直接記録します
+  (途中経過の表示には、プローブ 1 つを format_probe() で ping と同じ形の行にします)
+
+RTT の標準偏差 (mdev) は iputils の ping と同じ式
+sqrt(mean(rtt^2) - mean(rtt)^2) で計算します。
+"""
+
+import math
+import re
+
+from typing import Dict, List, NamedTuple, Optional
+
+# 応答の行
+#   64 bytes from 192.0.2.1: icmp_seq=1 ttl=64 time=0.045 ms
+_REPLY_RE = re.compile(r"icmp_seq=(\d+)(?:.*?\bttl=(\d+))?.*?\btime[=<]\s*([\d.]+)\s*ms", re.IGNORECASE)
+
+# 集計の行
+#   3 packets transmitted, 3 received, 0% packet loss, time 2003ms
+#   3 packets transmitted, 3 packets received, 0.0% packet loss   (macOS)
+_SUMMARY_RE = re.compile(r"(\d+) packets transmitted, (\d+) (?:packets )?received")
+
+
+class Probe(NamedTuple):
+    """1 つの echo request の結果 (rtt はミリ秒、応答が無ければ None)"""
+
+    seq: int
+    rtt: Optional[float] = None
+    ttl: Optional[int] = None
+
+    @property
+    def replied(self) -> bool:
+        return self.rtt is not None
+
+
+def format_probe(destination: str, probe: Probe) -> str:
+    """プローブ 1 つの結果を、システムの ping の出力に近い形の 1 行にする"""
+    if not probe.replied:
+        return f"Request timeout for {destination}: icmp_seq={probe.seq}"
+    ttl = f" ttl={probe.ttl}" if probe.ttl is not None else ""
+    return f"Reply from {destination}: icmp_seq={probe.seq}{ttl} time={probe.rtt:.3f} ms"
+
+
+class PingStats:
+    """1 宛先分の ping の集計"""
+
+    def __init__(self, destination: str) -> None:
+        self.destination = destination
+        self._probes: Dict[int, Probe] = {}
+        # 集計の行で報告された送信数/受信数 (無ければプローブから数える)
+        self._transmitted: Optional[int] = None
+        self._received: Optional[int] = None
+        self.error: Optional[str] = None
+
+    # -------------------------------------------------------------------------
+    # 記録
+    # -------------------------------------------------------------------------
+
+    def feed(self, line: str) -> None:
+        """システムの ping の出力を 1 行解析する"""
+        m = _REPLY_RE.search(line)
+        if m:
+            ttl = int(m.group(2)) if m.group(2) else None
+            self.add_probe(int(m.group(1)), float(m.group(3)), ttl)
+            return
+        m = _SUMMARY_RE.search(line)
+        if m:
+            self._transmitted, self._received = int(m.group(1)), int(m.group(2))
+
+    def add_probe(self, seq: int, rtt: Optional[float], ttl: Optional[int] = None) -> None:
+        """プローブ 1 つの結果を記録する (応答が無ければ rtt は None)"""
+        # 重複した応答 (DUP!) は最初のものだけを使う
+        if seq not in self._probes or not self._probes[seq].replied:
+            self._probes[seq] = Probe(seq, rtt, ttl)
+
+    # -------------------------------------------------------------------------
+    # 集計値
+    # -------------------------------------------------------------------------
+
+    @property
+    def transmitted(self) -> int:
+        if self._transmitted is not None:
+            return self._transmitted
+        return len(self._probes)
+
+    @property
+    def received(self) -> int:
+        if self._received is not None:
+            return self._received
+        return sum(1 for p in self._probes.values() if p.replied)
+
+    @property
+    def loss(self) -> float:
+        """パケット損失率 (%)"""
+        if self.transmitted == 0:
+            return 100.0
+        return (self.transmitted - self.received) * 100.0 / self.transmitted
+
+    @property
+    def probes(self) -> List[Probe]:
+        """プローブごとの結果 (シーケンス番号順)
+
+        システムの ping は応答の無かったプローブを表示しないので、
+        送信数までの抜けているシーケンス番号は応答なしとして補う
+        (シーケンス番号は 1 から、macOS の ping は 0 から始まる)。
+        """
+        probes = dict(self._probes)
+        first = 0 if 0 in probes else 1
+        for seq in range(first, first + self.transmitted):
+            probes.setdefault(seq, Probe(seq))
+        return [probes[seq] for seq in sorted(probes)]
+
+    def _rtts(self) -> List[float]:
+        return [p.rtt for p in self._probes.values() if p.rtt is not None]
+
+    @property
+    def rtt_min(self) -> Optional[float]:
+        rtts = self._rtts()
+        return min(rtts) if rtts else None
+
+    @property
+    def rtt_max(self) -> Optional[float]:
+        rtts = self._rtts()
+        return max(rtts) if rtts else None
+
+    @property
+    def rtt_avg(self) -> Optional[float]:
+        rtts = self._rtts()
+        return sum(rtts) / len(rtts) if rtts else None
+
+    @property
+    def rtt_mdev(self) -> Optional[float]:
+        rtts = self._rtts()
+        if not rtts:
+            return None
+        avg = sum(rtts) / len(rtts)
+        return math.sqrt(max(sum(r * r for r in rtts) / len(rtts) - avg * avg, 0.0))
+
+    def summary(self) -> str:
+        """システムの ping の統計表示に近い形の文字列"""
+        lines = [
+            f"--- {self.destination} ping statistics ---",
+            f"{self.transmitted} packets transmitted, {self.received} received, "
+            f"{self.loss:.0f}% packet loss",
+        ]
+        if self.received:
+            lines.append(f"rtt min/avg/max/mdev = {self.rtt_min:.3f}/{self.rtt_avg:.3f}/"
+                         f"{self.rtt_max:.3f}/{self.rtt_mdev:.3f} ms")
+        if self.error:
+            lines.append(f"Error: {self.error}")
+        return '\n'.join(lines)
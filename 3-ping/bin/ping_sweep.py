@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+並列 ping スイープ
+
+複数の宛先 (アドレスの列挙やプレフィックス) に対して ping を並行に実行し、
+宛先ごとの損失率と RTT (最小/平均/最大)、全体の集計を返します。
+
+【なぜ並列なのか】
+ping は応答を待つ時間がほとんどなので、1 宛先ずつ順番に実行すると
+/22 (1022 ホスト) の到達性確認だけで数十分〜1 時間かかります。
+asyncio で子プロセス (システムの ping) を同時に動かし、同時実行数を
+セマフォで制限することで、CPU をほとんど使わずに数秒で終わります。
+
+このモジュールは ConfD に依存しません。
+ConfD のアクションとしての実行は ping_action.py が担当します。
+
+【使用方法】
+    python ping_sweep.py 192.0.2.0/24
+    python ping_sweep.py 192.0.2.1,192.0.2.2 198.51.100.0/28 --count 3 --concurrency 128
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import platform
+import re
+import time
+
+from typing import Awaitable, Callable, Iterable, List, NamedTuple, Optional
+
+# 1 回のスイープで扱う宛先数の上限 (/8 などを誤って指定したときの保護)
+MAX_TARGETS = 4096
+
+# 同時に実行する ping の数の既定値
+DEFAULT_CONCURRENCY = 64
+
+# =============================================================================
+# データ型
+# =============================================================================
+
+
+class PingResult(NamedTuple):
+    """1 宛先分の ping の結果 (RTT はミリ秒)"""
+
+    destination: str
+    sent: int
+    received: int
+    rtt_min: Optional[float] = None
+    rtt_avg: Optional[float] = None
+    rtt_max: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def loss(self) -> float:
+        """パケット損失率 (%)"""
+        if self.sent == 0:
+            return 100.0
+        return (self.sent - self.received) * 100.0 / self.sent
+
+    @property
+    def reachable(self) -> bool:
+        return self.received > 0
+
+
+# =============================================================================
+# 宛先の展開
+# =============================================================================
+
+
+def expand_targets(specs: Iterable[str], max_targets: int = MAX_TARGETS) -> List[str]:
+    """宛先の指定を個々の宛先に展開する
+
+    各要素はカンマ/空白区切りで複数書けます。
+    - プレフィックス (192.0.2.0/24) : ホストアドレスに展開 (ネットワーク/ブロードキャストを除く)
+    - アドレスやホスト名            : そのまま
+
+    重複は取り除き、指定順を保ちます。上限を超えた場合は ValueError。
+    """
+    targets: List[str] = []
+    seen = set()
+
+    def add(target: str) -> None:
+        if target not in seen:
+            seen.add(target)
+            targets.append(target)
+            if len(targets) > max_targets:
+                raise ValueError(f"too many targets (max {max_targets})")
+
+    for spec in specs:
+        for item in re.split(r"[,\s]+", spec.strip()):
+            if not item:
+                continue
+            if "/" in item:
+                try:
+                    network = ipaddress.ip_network(item, strict=False)
+                except ValueError as e:
+                    raise ValueError(f"invalid prefix: {item}") from e
+                if network.num_addresses - 2 > max_targets:
+                    raise ValueError(f"too many targets in {item} (max {max_targets})")
+                hosts = list(network.hosts()) or [network.network_address]
+                for host in hosts:
+                    add(str(host))
+            else:
+                add(item)
+    return targets
+
+
+# =============================================================================
+# ping の実行と結果の解析
+# =============================================================================
+
+# Linux (iputils) / macOS の出力形式
+#   64 bytes from 192.0.2.1: icmp_seq=1 ttl=64 time=0.045 ms
+#   3 packets transmitted, 3 received, 0% packet loss, time 2003ms
+_RTT_RE = re.compile(r"time[=<]\s*([\d.]+)\s*ms")
+_SUMMARY_RE = re.compile(r"(\d+) packets transmitted, (\d+) (?:packets )?received")
+
+
+def build_ping_command(destination: str, count: int, timeout: float) -> List[str]:
+    """OSごとに適切なpingコマンドを構築する (timeout は 1 パケットの応答待ち秒数)"""
+    system = platform.system()
+
+    if system == "Windows":
+        return ["ping", "-n", str(count), "-w", str(int(timeout * 1000)), destination]
+
+    if system == "Darwin":
+        # macOS の -W はミリ秒
+        return ["ping", "-n", "-c", str(count), "-W", str(int(timeout * 1000)), destination]
+
+    # Linux: -W は秒 (整数)、連続送信の間隔は一般ユーザーの下限 0.2 秒にする
+    cmd = ["ping", "-n", "-c", str(count), "-W", str(max(int(timeout), 1))]
+    if count > 1:
+        cmd += ["-i", "0.2"]
+    return cmd + [destination]
+
+
+def parse_ping_output(destination: str, count: int, text: str) -> PingResult:
+    """ping の出力から送受信数と RTT を取り出す"""
+    rtts = [float(m.group(1)) for m in _RTT_RE.finditer(text)]
+    m = _SUMMARY_RE.search(text)
+    if m:
+        sent, received = int(m.group(1)), int(m.group(2))
+    else:
+        sent, received = count, len(rtts)
+
+    if not rtts:
+        return PingResult(destination, sent, received)
+    return PingResult(
+        destination,
+        sent,
+        received,
+        rtt_min=min(rtts),
+        rtt_avg=sum(rtts) / len(rtts),
+        rtt_max=max(rtts),
+    )
+
+
+async def ping_one(destination: str, count: int = 1, timeout: float = 1.0) -> PingResult:
+    """1 宛先に ping を実行する (タスクを取り消すと ping プロセスも止める)"""
+    cmd = build_ping_command(destination, count, timeout)
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+        )
+    except OSError as e:
+        return PingResult(destination, count, 0, error=str(e))
+
+    try:
+        # 名前解決に時間がかかる場合などに備えて、全体にも上限を設ける
+        stdout, _ = await asyncio.wait_for(proc.communicate(), timeout * count + 5)
+    except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+        proc.kill()
+        await proc.wait()
+        if isinstance(e, asyncio.CancelledError):
+            raise
+        return PingResult(destination, count, 0, error="timed out")
+
+    result = parse_ping_output(destination, count, stdout.decode(errors="replace"))
+    if proc.returncode not in (0, 1) and not result.reachable:
+        # 0: 応答あり、1: 応答なし、それ以外: 名前解決の失敗などのエラー
+        lines = stdout.decode(errors="replace").strip().splitlines()
+        result = result._replace(error=lines[-1] if lines else f"exit status {proc.returncode}")
+    return result
+
+
+# 1 宛先に ping を実行する関数 (宛先, パケット数, 応答待ち秒数)
+Pinger = Callable[[str, int, float], Awaitable[PingResult]]
+
+
+async def sweep(
+    destinations: Iterable[str],
+    count: int = 1,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    timeout: float = 1.0,
+    on_result: Optional[Callable[[PingResult], None]] = None,
+    pinger: Optional[Pinger] = None,
+) -> List[PingResult]:
+    """複数の宛先に並行して ping を実行し、宛先の指定順に結果を返す
+
+    同時に動かす ping は concurrency 個まで。
+    on_result を指定すると、1 宛先の結果が出るたびに (終わった順に) 呼び出す。
+    pinger を省略するとシステムの ping を使う (ping_one)。
+    """
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    pinger = pinger or ping_one
+
+    async def probe(destination: str) -> PingResult:
+        async with semaphore:
+            result = await pinger(destination, count, timeout)
+        if on_result is not None:
+            on_result(result)
+        return result
+
+    return list(await asyncio.gather(*(probe(d) for d in destinations)))
+
+
+# =============================================================================
+# 表示
+# =============================================================================
+
+
+def _ms(value: Optional[float]) -> str:
+    return f"{value:.3f}" if value is not None else "-"
+
+
+def format_table(results: Iterable[PingResult]) -> List[str]:
+    """宛先ごとの結果の表 (1 要素 1 行)"""
+    lines = [f"{'destination':40s} {'sent':>4s} {'recv':>4s} {'loss%':>6s} "
+             f"{'min(ms)':>9s} {'avg(ms)':>9s} {'max(ms)':>9s}"]
+    for r in results:
+        line = (f"{r.destination:40s} {r.sent:4d} {r.received:4d} {r.loss:6.1f} "
+                f"{_ms(r.rtt_min):>9s} {_ms(r.rtt_avg):>9s} {_ms(r.rtt_max):>9s}")
+        if r.error:
+            line += f"  ({r.error})"
+        lines.append(line)
+    return lines
+
+
+def summarize(results: List[PingResult], elapsed: float) -> str:
+    """全体の集計 (到達可能な宛先数、全体の損失率と RTT)"""
+    reachable = [r for r in results if r.reachable]
+    sent = sum(r.sent for r in results)
+    received = sum(r.received for r in results)
+    loss = (sent - received) * 100.0 / sent if sent else 0.0
+    summary = (f"{len(results)} targets, {len(reachable)} reachable, "
+               f"{len(results) - len(reachable)} unreachable, "
+               f"{sent} sent, {received} received, {loss:.1f}% loss")
+    if reachable:
+        rtt_min = min(r.rtt_min for r in reachable if r.rtt_min is not None)
+        rtt_max = max(r.rtt_max for r in reachable if r.rtt_max is not None)
+        rtt_avg = sum(r.rtt_avg * r.received for r in reachable if r.rtt_avg is not None) / received
+        summary += f", rtt min/avg/max {rtt_min:.3f}/{rtt_avg:.3f}/{rtt_max:.3f} ms"
+    return summary + f", {elapsed:.2f} s"
+
+
+# =============================================================================
+# メイン
+# =============================================================================
+
+
+def main() -> None:
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description='parallel ping sweep')
+    parser.add_argument('targets', nargs='+',
+                        help='addresses, host names or prefixes (comma separated lists allowed)')
+    parser.add_argument('--count', type=int, default=1, help='packets per target (default: 1)')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'number of pings running at once (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--timeout', type=float, default=1.0,
+                        help='seconds to wait for each reply (default: 1)')
+    parser.add_argument('--all', action='store_true', help='show unreachable targets too')
+    args = parser.parse_args()
+
+    try:
+        targets = expand_targets(args.targets)
+    except ValueError as e:
+        parser.error(str(e))
+
+    start = time.perf_counter()
+    results = asyncio.run(sweep(targets, args.count, args.concurrency, args.timeout))
+    elapsed = time.perf_counter() - start
+
+    shown = results if args.all else [r for r in results if r.reachable]
+    for line in format_table(shown):
+        print(line)
+    print(summarize(results, elapsed))
+
+
+if __name__ == '__main__':
+    main()
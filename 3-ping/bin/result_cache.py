@@ -0,0 +1,135 @@
+"""
+同じ要求の実行をまとめる (結果のキャッシュと実行中の要求の合流)
+
+監視のスクリプトが複数のセッションから同じ宛先へ同時に ping を実行すると、
+これまでは要求ごとに ping を送っていました。ResultCache は、キーの同じ要求を
+1 回の実行にまとめます。
+
+- 同じキーの実行が進行中なら、新しく実行せずにその結果を待つ (合流)
+- 終わった結果は ttl 秒のあいだ保存し、同じキーの要求にはそれを返す
+  (ttl=0 の場合は保存せず、合流だけを行う)
+- 実行中の途中経過 (progress) は、待っているすべての要求に渡す。
+  後から合流した要求には、それまでの途中経過をまとめて渡してから続きを渡す
+- 待っている要求が取り消されても実行は続け、全員が取り消した場合にだけ止める
+- 失敗 (例外) や取り消しで終わった結果は保存しない
+
+run() はイベントループのスレッドから呼び出してください。
+ヒット/合流の件数は snapshot() で取得できます。
+"""
+
+import asyncio
+import time
+
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+DEFAULT_TTL = 2.0
+
+# 途中経過を受け取る関数
+Progress = Callable[[str], None]
+
+
+class _Flight:
+    """実行中の 1 つの要求 (結果を待っている要求と、それまでの途中経過)"""
+
+    def __init__(self) -> None:
+        self.task: Optional[asyncio.Task] = None
+        self.watchers: List[Optional[Progress]] = []
+        self.lines: List[str] = []
+
+    def progress(self, text: str) -> None:
+        self.lines.append(text)
+        for watcher in list(self.watchers):
+            if watcher is not None:
+                watcher(text)
+
+
+class ResultCache:
+    """キーごとに実行を 1 回にまとめ、結果を ttl 秒のあいだ保存する"""
+
+    def __init__(self, ttl: float = DEFAULT_TTL) -> None:
+        self.ttl = max(ttl, 0.0)
+        # キー → (期限 (time.monotonic()), 結果)
+        self._results: Dict[Hashable, Tuple[float, Any]] = {}
+        self._flights: Dict[Hashable, _Flight] = {}
+
+        # 統計
+        self.hits = 0           # 保存した結果を返した要求
+        self.coalesced = 0      # 実行中の要求に合流した要求
+        self.misses = 0         # 新しく実行した要求
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """保存している *key* の結果 (無いか、期限が切れていれば None)
+
+        見つかった場合はヒットとして数える。
+        """
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if time.monotonic() >= expires:
+            del self._results[key]
+            return None
+        self.hits += 1
+        return result
+
+    async def run(
+        self,
+        key: Hashable,
+        factory: Callable[[Progress], Awaitable[Any]],
+        on_progress: Optional[Progress] = None,
+    ) -> Any:
+        """*key* の結果を返す
+
+        保存している結果があればそれを、同じキーの実行が進行中ならその結果を返す。
+        どちらも無ければ factory(progress) で実行を始める。
+        factory に渡す progress() で書いた途中経過は、待っているすべての要求の
+        on_progress に渡される。
+        """
+        result = self.get(key)
+        if result is not None:
+            return result
+
+        flight = self._flights.get(key)
+        if flight is None:
+            self.misses += 1
+            flight = self._flights[key] = _Flight()
+            flight.task = asyncio.get_running_loop().create_task(factory(flight.progress))
+            flight.task.add_done_callback(lambda task: self._landed(key, flight, task))
+        else:
+            self.coalesced += 1
+            if on_progress is not None:
+                for text in flight.lines:
+                    on_progress(text)
+
+        flight.watchers.append(on_progress)
+        try:
+            # 待っている要求が取り消されても、実行そのものは取り消さない
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.watchers.remove(on_progress)
+            if not flight.watchers and not flight.task.done():
+                # 待っている要求が無くなった
+                flight.task.cancel()
+
+    def _landed(self, key: Hashable, flight: _Flight, task: asyncio.Task) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if self.ttl > 0 and not task.cancelled() and task.exception() is None:
+            self._results[key] = (time.monotonic() + self.ttl, task.result())
+            self._expire()
+
+    def _expire(self) -> None:
+        """期限の切れた結果を捨てる"""
+        now = time.monotonic()
+        for key in [k for k, (expires, _) in self._results.items() if now >= expires]:
+            del self._results[key]
+
+    def snapshot(self) -> Dict[str, int]:
+        """統計 (ヒット/合流/実行の件数、実行中と保存している結果の数)"""
+        return {
+            'hits': self.hits,
+            'coalesced': self.coalesced,
+            'misses': self.misses,
+            'in-flight': len(self._flights),
+            'cached': len(self._results),
+        }
@@ -0,0 +1,631 @@
+#!/usr/bin/env python3
+"""
+ConfD ACL検証アクションハンドラー
+
+このスクリプトはConfDのアクションハンドラーとして動作し、
+CLI上で 'request access-lists test ...' コマンドを実行可能にします。
+
+提供する機能:
+- ACLのコンパイル: コミット済みの access-lists を acl_compiler で検索構造に変換
+- 自動再コンパイル: CDBサブスクリプションで /access-lists の変更を検知
+- パケット判定: 指定したパケットが最初にマッチするエントリを返す
+
+YANGモデル:
+- ファイル: yang/network-device.yang
+- 名前空間: bin/network_device_ns.py
+- アクションポイント名: acl_test_action
+
+【使用方法】
+    --start      : デーモンとして起動
+    --stop       : デーモンを停止
+    --status     : デーモンの状態を確認
+    --foreground : フォアグラウンドで実行（テスト用）
+    --log-json   : ログをJSON Lines形式で書く
+
+【CLI使用例】
+    admin@confd> request access-lists test number 10 source 192.168.1.100
+    admin@confd> request access-lists test number 100 protocol tcp source 10.0.0.1 destination 192.0.2.10 destination-port 443
+
+【設計】
+判定処理はマイクロ秒単位で終わるため、ping_action.py のようなタスクと
+遅延応答 (DELAYED_RESPONSE) は使わず、cb_action() の中で即座に応答します。
+コンパイルはコミット時にのみ行い、判定時には検索構造を参照するだけです。
+"""
+
+import argparse
+import atexit
+import logging
+import os
+import select
+import signal
+import socket
+import sys
+import time
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import _confd  # type: ignore
+    import _confd.cdb as cdb  # type: ignore
+    import _confd.dp as dp  # type: ignore
+except ImportError as e:
+    print(f"Error: Could not import required ConfD modules: {e}")
+    print("Make sure ConfD is installed and PYTHONPATH is set correctly.")
+    sys.exit(1)
+
+try:
+    import network_device_ns as ns
+except ImportError as e:
+    print(f"Error: Could not import network_device_ns module: {e}")
+    print("Make sure network_device_ns.py is generated by confdc from the YANG model.")
+    sys.exit(1)
+
+# リポジトリ共通のモジュール (daemon_log など) は lib/ に置いている
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'lib'))
+
+# ログはバッファに入れるだけで、ファイルへの書き込みはバックグラウンドのスレッドがまとめて行う
+# （main() で daemon_log.setup() を呼んでから使う）
+import daemon_log
+from daemon_log import log
+
+from acl_compiler import (
+    ANY_ADDRESS,
+    AclEntry,
+    AclMatcher,
+    PacketTuple,
+    address_spec,
+    compile_access_lists,
+    host_spec,
+    parse_protocol,
+)
+
+# =============================================================================
+# 定数定義
+# =============================================================================
+
+# スクリプトのファイル名の拡張子を取り除いた名前
+SCRIPT_BASE = Path(__file__).stem
+
+# スクリプトのディレクトリを基準にパスを設定
+SCRIPT_DIR = Path(__file__).resolve().parent.parent
+
+TMP_DIR = SCRIPT_DIR / 'tmp'
+LOG_DIR = SCRIPT_DIR / 'log'
+
+# ディレクトリが存在しない場合は作成
+TMP_DIR.mkdir(parents=True, exist_ok=True)
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+# PIDファイル
+PID_FILE = TMP_DIR / f'{SCRIPT_BASE}.pid'
+
+# ログファイル
+LOG_FILE = LOG_DIR / f'{SCRIPT_BASE}.log'
+
+# ConfD接続設定
+CONFD_HOST = "127.0.0.1"
+CONFD_PORT = 4565
+
+# アクションポイント名（YANGファイルで定義したもの）
+ACTION_POINT_NAME = "acl_test_action"
+
+# デーモン名
+DAEMON_NAME = "acl_test_action_daemon"
+
+# 監視・読み込み対象のパス
+ACL_PATH = "/access-lists"
+
+# YANG の acl-protocol (union) の enumeration 部分の定義順
+# union の値が enumeration 側だった場合、CDB からは定義順の番号で返ってくる
+PROTOCOL_ENUM = ["ip", "tcp", "udp", "icmp", "esp", "ah", "gre"]
+
+# 出力 leaf action (enumeration) の値: 定義順に 0 から割り当てられる
+ACTION_ENUM = {"permit": 0, "deny": 1}
+
+# ConfDワーカーソケットのグローバル参照
+# cb_init() 内の dp.action_set_fd(uinfo, work_sock_global) で使用
+work_sock_global: Optional[socket.socket] = None
+
+# コンパイル済みACL（コミットのたびに丸ごと差し替える）
+acl_matcher: AclMatcher = AclMatcher()
+
+# =============================================================================
+# CDBからのACL読み込み
+# =============================================================================
+
+def value_to_protocol(value) -> Optional[int]:
+    """acl-protocol 型の _confd.Value をプロトコル番号に変換する"""
+    if value.confd_type() == _confd.C_ENUM_VALUE:
+        return parse_protocol(PROTOCOL_ENUM[value.as_pyval()])
+    return parse_protocol(str(value))
+
+
+def _read_address(rsock, base: str, any_leaf: str, host_leaf: str, network: str):
+    """choice (any / host / network) で指定されたアドレスを読み取る"""
+    if cdb.exists(rsock, f"{base}/{any_leaf}"):
+        return ANY_ADDRESS
+    if cdb.exists(rsock, f"{base}/{host_leaf}"):
+        return host_spec(str(cdb.get(rsock, f"{base}/{host_leaf}")))
+    if cdb.exists(rsock, f"{base}/{network}/address"):
+        address = str(cdb.get(rsock, f"{base}/{network}/address"))
+        # wildcard は省略できる。省略時は 0.0.0.0 (host 指定と同じ完全一致)
+        if not cdb.exists(rsock, f"{base}/{network}/wildcard"):
+            return host_spec(address)
+        return address_spec(address, str(cdb.get(rsock, f"{base}/{network}/wildcard")))
+    return ANY_ADDRESS
+
+
+def _read_port(rsock, path: str):
+    """source-port / destination-port (eq または range) を (start, end) で返す"""
+    if cdb.exists(rsock, f"{path}/eq"):
+        port = int(cdb.get(rsock, f"{path}/eq"))
+        return port, port
+    # start / end はどちらも省略できる。start の省略時は 0、end の省略時は start だけの範囲
+    has_start = cdb.exists(rsock, f"{path}/range/start")
+    has_end = cdb.exists(rsock, f"{path}/range/end")
+    if has_start or has_end:
+        start = int(cdb.get(rsock, f"{path}/range/start")) if has_start else 0
+        end = int(cdb.get(rsock, f"{path}/range/end")) if has_end else start
+        return start, end
+    return None
+
+
+def _read_common(rsock, base: str) -> Dict:
+    """standard / extended で共通の leaf を読み取る"""
+    action = cdb.get(rsock, f"{base}/action")
+    return {
+        'sequence': int(cdb.get(rsock, f"{base}/sequence")),
+        'action': "permit" if action.as_pyval() == ACTION_ENUM["permit"] else "deny",
+        'log': bool(cdb.get(rsock, f"{base}/log").as_pyval()),
+    }
+
+
+def read_access_lists(rsock) -> Dict[int, List[AclEntry]]:
+    """CDBから access-lists を読み取り、ACL番号 → エントリ一覧 の辞書を返す"""
+    acls: Dict[int, List[AclEntry]] = {}
+
+    # 標準ACL: 送信元アドレスのみ
+    for i in range(cdb.num_instances(rsock, f"{ACL_PATH}/standard")):
+        acl_path = f"{ACL_PATH}/standard[{i}]"
+        number = int(cdb.get(rsock, f"{acl_path}/number"))
+        entries = []
+        for j in range(cdb.num_instances(rsock, f"{acl_path}/entry")):
+            base = f"{acl_path}/entry[{j}]"
+            entries.append(AclEntry(
+                source=_read_address(rsock, base, "any", "host", "network"),
+                **_read_common(rsock, base),
+            ))
+        acls[number] = entries
+
+    # 拡張ACL: プロトコル、送信元/宛先アドレス、ポート
+    for i in range(cdb.num_instances(rsock, f"{ACL_PATH}/extended")):
+        acl_path = f"{ACL_PATH}/extended[{i}]"
+        number = int(cdb.get(rsock, f"{acl_path}/number"))
+        entries = []
+        for j in range(cdb.num_instances(rsock, f"{acl_path}/entry")):
+            base = f"{acl_path}/entry[{j}]"
+            protocol = value_to_protocol(cdb.get(rsock, f"{base}/protocol"))
+            established = False
+            if cdb.exists(rsock, f"{base}/established"):
+                established = bool(cdb.get(rsock, f"{base}/established").as_pyval())
+            entries.append(AclEntry(
+                protocol=protocol,
+                source=_read_address(rsock, base, "source-any", "source-host", "source-network"),
+                destination=_read_address(
+                    rsock, base, "destination-any", "destination-host", "destination-network"),
+                source_port=_read_port(rsock, f"{base}/source-port"),
+                destination_port=_read_port(rsock, f"{base}/destination-port"),
+                established=established,
+                **_read_common(rsock, base),
+            ))
+        acls[number] = entries
+
+    return acls
+
+
+def reload_access_lists() -> None:
+    """running の access-lists を読み込み、コンパイルし直して差し替える"""
+    global acl_matcher
+
+    rsock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
+    try:
+        cdb.connect(rsock, cdb.READ_SOCKET, CONFD_HOST, CONFD_PORT, '/')
+        cdb.start_session(rsock, cdb.RUNNING)
+        cdb.set_namespace(rsock, ns.ns.hash)
+        try:
+            acls = read_access_lists(rsock)
+        finally:
+            cdb.end_session(rsock)
+    finally:
+        rsock.close()
+
+    start = time.perf_counter()
+    matcher = compile_access_lists(acls)
+    elapsed = time.perf_counter() - start
+
+    # 参照の差し替えだけなので、判定中のリクエストに影響しない
+    acl_matcher = matcher
+    total = sum(len(entries) for entries in acls.values())
+    log(f"Compiled {len(acls)} ACLs ({total} entries) in {elapsed:.3f}s")
+
+# =============================================================================
+# アクション応答
+# =============================================================================
+
+def build_result_values(action: str, sequence: Optional[int], result: str,
+                        lookup_usec: int) -> List:
+    """YANGの出力パラメータに対応するTagValueリストを生成"""
+    values = [
+        _confd.TagValue(
+            _confd.XmlTag(ns.ns.hash, ns.ns.nd_action),
+            _confd.Value(ACTION_ENUM[action], _confd.C_ENUM_VALUE),
+        ),
+    ]
+    if sequence is not None:
+        values.append(_confd.TagValue(
+            _confd.XmlTag(ns.ns.hash, ns.ns.nd_sequence),
+            _confd.Value(sequence, _confd.C_UINT32),
+        ))
+    values.append(_confd.TagValue(
+        _confd.XmlTag(ns.ns.hash, ns.ns.nd_result),
+        _confd.Value(result, _confd.C_BUF),
+    ))
+    values.append(_confd.TagValue(
+        _confd.XmlTag(ns.ns.hash, ns.ns.nd_lookup_time),
+        _confd.Value(lookup_usec, _confd.C_UINT32),
+    ))
+    return values
+
+# =============================================================================
+# アクションコールバッククラス
+# =============================================================================
+
+class AclTestActionHandler:
+    """
+    ACL検証アクションのハンドラークラス
+
+    【処理フロー】
+    1. ConfD CLIでユーザーが request access-lists test を実行
+    2. cb_action() で入力パラメータからパケットを組み立てる
+    3. コンパイル済みACLで判定し、その場で応答を返す
+    """
+
+    def cb_init(self, uinfo) -> int:
+        """アクション初期化コールバック（ワーカーソケットを関連付ける）"""
+        dp.action_set_fd(uinfo, work_sock_global)
+        return _confd.CONFD_OK
+
+    def cb_abort(self, uinfo) -> int:
+        """アクション中止コールバック（判定は即座に終わるため何もしない）"""
+        return _confd.CONFD_OK
+
+    def cb_action(self, uinfo, name, kp, params) -> int:
+        """
+        アクションコールバック
+
+        Returns:
+            _confd.CONFD_OK: 判定結果を応答した
+            _confd.CONFD_ERR: 入力エラー（エラーメッセージを設定済み）
+        """
+        number = None
+        protocol: Optional[int] = None
+        source = None
+        destination = None
+        source_port = None
+        destination_port = None
+        established = False
+
+        for param in params:
+            if param.tag == ns.ns.nd_number:
+                number = int(param.v)
+            elif param.tag == ns.ns.nd_protocol:
+                protocol = value_to_protocol(param.v)
+            elif param.tag == ns.ns.nd_source:
+                source = str(param.v)
+            elif param.tag == ns.ns.nd_destination:
+                destination = str(param.v)
+            elif param.tag == ns.ns.nd_source_port:
+                source_port = int(param.v)
+            elif param.tag == ns.ns.nd_destination_port:
+                destination_port = int(param.v)
+            elif param.tag == ns.ns.nd_established:
+                established = bool(param.v.as_pyval())
+
+        matcher = acl_matcher
+        if number not in matcher:
+            dp.action_seterr(uinfo, f"access-list {number} is not configured")
+            return _confd.CONFD_ERR
+
+        if destination is None:
+            # 標準ACLは宛先を見ないので、省略時はどの宛先でもよい
+            destination = "0.0.0.0"
+
+        # ip (プロトコル指定なし) は番号 0 の「その他のプロトコル」として判定する
+        packet = PacketTuple(
+            protocol=protocol if protocol is not None else 0,
+            source=source,
+            destination=destination,
+            source_port=source_port,
+            destination_port=destination_port,
+            established=established,
+        )
+
+        try:
+            start = time.perf_counter()
+            match = matcher.match(number, packet)
+            lookup_usec = int((time.perf_counter() - start) * 1e6)
+        except ValueError as e:
+            dp.action_seterr(uinfo, f"invalid packet: {e}")
+            return _confd.CONFD_ERR
+
+        if match.entry is None:
+            result = f"denied by implicit 'deny any' of access-list {number}"
+        else:
+            result = f"{match.action} by access-list {number} sequence {match.sequence}"
+        log(f"test {number} {packet} -> {result}", usec=lookup_usec)
+
+        dp.action_reply_values(
+            uinfo, build_result_values(match.action, match.sequence, result, lookup_usec))
+        return _confd.CONFD_OK
+
+# =============================================================================
+# デーモン管理関数
+# =============================================================================
+
+def daemonize() -> None:
+    """プロセスをデーモン化する"""
+    try:
+        # 最初のfork
+        pid = os.fork()
+        if pid > 0:
+            sys.exit(0)
+    except OSError as e:
+        log(f"First fork failed: {e}", logging.ERROR)
+        sys.exit(1)
+
+    # 環境をデタッチ
+    os.chdir('/')
+    os.setsid()
+    os.umask(0)
+
+    # 2回目のfork
+    try:
+        pid = os.fork()
+        if pid > 0:
+            sys.exit(0)
+    except OSError as e:
+        log(f"Second fork failed: {e}", logging.ERROR)
+        sys.exit(1)
+
+    # 標準入出力をリダイレクト
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    with open(os.devnull, 'r') as f:
+        os.dup2(f.fileno(), sys.stdin.fileno())
+
+    with open(os.devnull, 'a+') as f:
+        os.dup2(f.fileno(), sys.stdout.fileno())
+
+    with open(os.devnull, 'a+') as f:
+        os.dup2(f.fileno(), sys.stderr.fileno())
+
+    # PIDファイルを書き込み
+    pid = os.getpid()
+    with open(PID_FILE, 'w') as f:
+        f.write(f"{pid}\n")
+
+    # 終了時にPIDファイルを削除
+    atexit.register(lambda: PID_FILE.unlink(missing_ok=True))
+
+def read_pid() -> Optional[int]:
+    """PIDファイルからPIDを読み取る"""
+    try:
+        if PID_FILE.exists():
+            with open(PID_FILE, 'r') as f:
+                return int(f.read().strip())
+    except (OSError, ValueError):
+        pass
+    return None
+
+def is_running(pid: int) -> bool:
+    """指定されたPIDのプロセスが実行中かチェック"""
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+def stop_daemon() -> None:
+    """デーモンを停止する"""
+    pid = read_pid()
+
+    if pid is None:
+        print(f"{DAEMON_NAME} is not running (no PID file)")
+        return
+
+    if not is_running(pid):
+        print(f"{DAEMON_NAME} is not running (stale PID file)")
+        PID_FILE.unlink(missing_ok=True)
+        return
+
+    print(f"Stopping {DAEMON_NAME} (PID: {pid})...")
+
+    try:
+        os.kill(pid, signal.SIGTERM)
+
+        # プロセスが終了するまで待機
+        for _ in range(50):
+            if not is_running(pid):
+                print(f"{DAEMON_NAME} stopped")
+                PID_FILE.unlink(missing_ok=True)
+                return
+            time.sleep(0.1)
+
+        # 強制終了
+        print(f"{DAEMON_NAME} did not stop gracefully, forcing...")
+        os.kill(pid, signal.SIGKILL)
+        time.sleep(0.5)
+
+        if not is_running(pid):
+            print(f"{DAEMON_NAME} stopped")
+            PID_FILE.unlink(missing_ok=True)
+        else:
+            print(f"Failed to stop {DAEMON_NAME}")
+
+    except Exception as e:
+        print(f"Error stopping daemon: {e}")
+
+def check_status() -> None:
+    """デーモンの状態を確認する"""
+    pid = read_pid()
+
+    if pid is None:
+        print(f"{DAEMON_NAME} is not running (no PID file)")
+        return
+
+    if is_running(pid):
+        print(f"{DAEMON_NAME} is running (PID: {pid})")
+    else:
+        print(f"{DAEMON_NAME} is not running (stale PID file)")
+        PID_FILE.unlink(missing_ok=True)
+
+# =============================================================================
+# メイン処理
+# =============================================================================
+
+def run_daemon() -> None:
+    """
+    デーモンのメイン処理
+
+    アクション用の制御/ワーカーソケットと、/access-lists の
+    CDBサブスクリプションソケットを1つのselectループで監視します。
+    """
+    global work_sock_global
+
+    log(f"Starting {DAEMON_NAME}...")
+
+    daemon_ctx = dp.init_daemon(DAEMON_NAME)
+
+    ctrl_sock = socket.socket()
+    work_sock_global = socket.socket()
+    sub_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
+
+    try:
+        log(f"Connecting to ConfD at {CONFD_HOST}:{CONFD_PORT}...")
+        dp.connect(daemon_ctx, ctrl_sock, dp.CONTROL_SOCKET, CONFD_HOST, CONFD_PORT, None)
+        dp.connect(daemon_ctx, work_sock_global, dp.WORKER_SOCKET, CONFD_HOST, CONFD_PORT, None)
+
+        # /access-lists の変更を購読（コミットのたびに再コンパイルする）
+        cdb.connect(sub_sock, cdb.SUBSCRIPTION_SOCKET, CONFD_HOST, CONFD_PORT, ACL_PATH)
+        cdb.subscribe(sub_sock, 100, ns.ns.hash, ACL_PATH)
+        cdb.subscribe_done(sub_sock)
+        log(f"Subscribed to {ACL_PATH}")
+
+        # 起動時点の設定をコンパイル
+        reload_access_lists()
+
+        log(f"Registering action point: {ACTION_POINT_NAME}")
+        dp.register_action_cbs(daemon_ctx, ACTION_POINT_NAME, AclTestActionHandler())
+        dp.register_done(daemon_ctx)
+        log(f"{DAEMON_NAME} registration complete")
+
+        stop_flag = {'stop': False}
+
+        def signal_handler(signum, frame):
+            log(f"Received signal {signum}, shutting down...")
+            stop_flag['stop'] = True
+
+        signal.signal(signal.SIGTERM, signal_handler)
+        signal.signal(signal.SIGINT, signal_handler)
+
+        log("Entering event loop...")
+        sockets = [ctrl_sock, work_sock_global, sub_sock]
+
+        while not stop_flag['stop']:
+            readable, _, _ = select.select(sockets, [], [], 1.0)
+
+            for sock in readable:
+                try:
+                    if sock is sub_sock:
+                        # 設定変更通知 → 再コンパイル → ACK
+                        cdb.read_subscription_socket(sub_sock)
+                        try:
+                            reload_access_lists()
+                        except Exception as e:
+                            log(f"Error compiling access-lists: {e}")
+                        cdb.sync_subscription_socket(sub_sock, cdb.DONE_PRIORITY)
+                    else:
+                        dp.fd_ready(daemon_ctx, sock)
+                except _confd.error.Error as e:
+                    if e.confd_errno == _confd.ERR_EOF:
+                        log("ConfD closed connection, shutting down...")
+                    else:
+                        log(f"Error processing socket data: {e}")
+                    stop_flag['stop'] = True
+                    break
+                except Exception as e:
+                    log(f"Error processing socket data: {e}")
+                    stop_flag['stop'] = True
+                    break
+
+    except KeyboardInterrupt:
+        log("Keyboard interrupt received")
+
+    except Exception as e:
+        log(f"Error in main loop: {e}", logging.ERROR)
+        raise
+
+    finally:
+        log(f"Shutting down {DAEMON_NAME}")
+        sub_sock.close()
+        ctrl_sock.close()
+        if work_sock_global:
+            work_sock_global.close()
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description=f'{DAEMON_NAME} - ConfD ACL test action handler'
+    )
+
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--start', action='store_true',
+                      help='Start daemon')
+    group.add_argument('--stop', action='store_true',
+                      help='Stop daemon')
+    group.add_argument('--status', action='store_true',
+                      help='Check daemon status')
+    group.add_argument('--foreground', action='store_true',
+                      help='Run in foreground (for testing)')
+    parser.add_argument('--log-json', action='store_true',
+                        help='Write the log as JSON lines')
+
+    args = parser.parse_args()
+
+    if args.start:
+        pid = read_pid()
+        if pid and is_running(pid):
+            print(f"{DAEMON_NAME} is already running (PID: {pid})")
+            sys.exit(1)
+
+        print(f"Starting {DAEMON_NAME}...")
+        daemonize()
+        # ログのスレッドは fork で引き継がれないので、デーモン化の後で開始する
+        daemon_log.setup(LOG_FILE, json_lines=args.log_json)
+        run_daemon()
+
+    elif args.stop:
+        stop_daemon()
+
+    elif args.status:
+        check_status()
+
+    elif args.foreground:
+        print(f"Running {DAEMON_NAME} in foreground...")
+        daemon_log.setup(LOG_FILE, json_lines=args.log_json, console=True)
+        run_daemon()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+経路表 (RIB) と最長一致検索
+
+IPv4 / IPv6 の経路をパトリシアトライ (パス圧縮した 2 分岐トライ) で保持し、
+次の検索を提供します。
+
+- lookup(address)          : 最長一致 (LPM) 検索
+- longer(prefix)           : prefix に含まれる経路 (より長いプレフィックス) の一覧
+- shorter(prefix)          : prefix を含む経路 (より短いプレフィックス) の一覧
+
+【なぜトライなのか】
+経路を平坦なリストで持つと、1 回の検索ごとに全経路を走査して
+「マッチする中で最長のもの」を探すことになり、経路数に比例して遅くなります。
+パトリシアトライでは検索コストがアドレス長 (IPv4 なら最大 32 段) で抑えられ、
+経路の追加・削除もその経路の分岐点だけを書き換える差分更新になります。
+CDB の変更通知を受けたときに、経路表全体を作り直す必要はありません。
+
+このモジュールは ConfD に依存しません。
+ConfD の設定との同期は route_lookup_action.py が担当します。
+
+【使用方法】
+    python rib.py --bench 1000000 : ランダム経路で構築/検索性能を計測
+"""
+
+import argparse
+import ipaddress
+import random
+import time
+
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+# =============================================================================
+# データ型
+# =============================================================================
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+class Route(NamedTuple):
+    """経路表の 1 エントリ (YANG の routing/static/route に対応)"""
+
+    destination: str
+    next_hop: Optional[str] = None
+    interface: Optional[str] = None
+    distance: int = 1
+    permanent: bool = False
+    metric: int = 0
+
+
+class _Node:
+    """パトリシアトライのノード
+
+    key はプレフィックスのネットワークアドレス (int)、plen はプレフィックス長。
+    経路を持たないノード (route が None) は分岐のためだけの中間ノードです。
+    """
+
+    __slots__ = ("key", "plen", "children", "route")
+
+    def __init__(self, key: int, plen: int, route: Optional[Route] = None) -> None:
+        self.key = key
+        self.plen = plen
+        self.children: List[Optional["_Node"]] = [None, None]
+        self.route = route
+
+
+# =============================================================================
+# パトリシアトライ
+# =============================================================================
+
+
+class PrefixTree:
+    """1 アドレスファミリ分のパトリシアトライ
+
+    アドレスとプレフィックスはすべて int で扱います (文字列の解釈は Rib が担当)。
+    """
+
+    __slots__ = ("bits", "_root", "_count")
+
+    def __init__(self, bits: int) -> None:
+        self.bits = bits
+        # 根は常に 0/0 (デフォルトルートの位置)
+        self._root = _Node(0, 0)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _bit(self, key: int, index: int) -> int:
+        """key の先頭から index 番目のビット"""
+        return (key >> (self.bits - 1 - index)) & 1
+
+    def _covers(self, node: _Node, key: int, plen: int) -> bool:
+        """node のプレフィックスが key/plen を含むか"""
+        if node.plen > plen:
+            return False
+        shift = self.bits - node.plen
+        return (key >> shift) == (node.key >> shift)
+
+    def insert(self, key: int, plen: int, route: Route) -> None:
+        """経路を追加する (同じプレフィックスがあれば置き換える)"""
+        node = self._root
+        while True:
+            if node.plen == plen:
+                # ここに来るのは node.key == key の場合のみ (根の 0/0 を含む)
+                if node.route is None:
+                    self._count += 1
+                node.route = route
+                return
+
+            branch = self._bit(key, node.plen)
+            child = node.children[branch]
+            if child is None:
+                node.children[branch] = _Node(key, plen, route)
+                self._count += 1
+                return
+
+            # child と新しいプレフィックスの共通部分の長さ
+            diff = (key ^ child.key).bit_length()
+            common = min(plen, child.plen, self.bits - diff)
+
+            if common == child.plen:
+                # child が新しいプレフィックスを含む → さらに下る
+                node = child
+                continue
+
+            if common == plen:
+                # 新しいプレフィックスが child を含む → child の親として挿入
+                new = _Node(key, plen, route)
+                new.children[self._bit(child.key, plen)] = child
+                node.children[branch] = new
+                self._count += 1
+                return
+
+            # 途中で分岐する → 分岐用の中間ノードを作る
+            mask = ((1 << common) - 1) << (self.bits - common)
+            glue = _Node(key & mask, common)
+            glue.children[self._bit(child.key, common)] = child
+            glue.children[self._bit(key, common)] = _Node(key, plen, route)
+            node.children[branch] = glue
+            self._count += 1
+            return
+
+    def remove(self, key: int, plen: int) -> Optional[Route]:
+        """経路を削除し、削除した経路を返す (無ければ None)"""
+        path: List[Tuple[_Node, int]] = []
+        node: Optional[_Node] = self._root
+        while node is not None and node.plen < plen:
+            if not self._covers(node, key, plen):
+                return None
+            branch = self._bit(key, node.plen)
+            path.append((node, branch))
+            node = node.children[branch]
+
+        if node is None or node.plen != plen or node.key != key or node.route is None:
+            return None
+
+        removed = node.route
+        node.route = None
+        self._count -= 1
+
+        if node is self._root:
+            return removed
+
+        # 不要になった中間ノードを取り除き、パス圧縮を保つ
+        while node is not self._root and node.route is None:
+            parent, branch = path.pop()
+            left, right = node.children
+            if left is not None and right is not None:
+                break
+            parent.children[branch] = left if left is not None else right
+            node = parent
+
+        return removed
+
+    def get(self, key: int, plen: int) -> Optional[Route]:
+        """プレフィックスが完全一致する経路を返す"""
+        node: Optional[_Node] = self._root
+        while node is not None and node.plen < plen:
+            if not self._covers(node, key, plen):
+                return None
+            node = node.children[self._bit(key, node.plen)]
+        if node is not None and node.plen == plen and node.key == key:
+            return node.route
+        return None
+
+    def lookup(self, address: int) -> Optional[Route]:
+        """最長一致検索"""
+        bits = self.bits
+        best = None
+        node = self._root
+        while node is not None:
+            shift = bits - node.plen
+            if (address >> shift) != (node.key >> shift):
+                break
+            if node.route is not None:
+                best = node.route
+            if node.plen == bits:
+                break
+            node = node.children[(address >> (shift - 1)) & 1]
+        return best
+
+    def shorter(self, key: int, plen: int) -> List[Route]:
+        """key/plen を含む経路 (自身を含む) を短い順に返す"""
+        result = []
+        node: Optional[_Node] = self._root
+        while node is not None and self._covers(node, key, plen):
+            if node.route is not None:
+                result.append(node.route)
+            if node.plen == plen:
+                break
+            node = node.children[self._bit(key, node.plen)]
+        return result
+
+    def longer(self, key: int, plen: int) -> List[Route]:
+        """key/plen に含まれる経路 (自身を含む) をアドレス順に返す"""
+        node: Optional[_Node] = self._root
+        while node is not None and node.plen < plen:
+            if not self._covers(node, key, plen):
+                return []
+            node = node.children[self._bit(key, node.plen)]
+        if node is None:
+            return []
+        # node が key/plen の範囲内にあるか (途中で分岐していないか)
+        shift = self.bits - plen
+        if (node.key >> shift) != (key >> shift):
+            return []
+        return list(self._walk(node))
+
+    def routes(self) -> Iterator[Route]:
+        """全経路をアドレス順に返す"""
+        return self._walk(self._root)
+
+    def _walk(self, start: _Node) -> Iterator[Route]:
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            if node.route is not None:
+                yield node.route
+            for child in reversed(node.children):
+                if child is not None:
+                    stack.append(child)
+
+
+# =============================================================================
+# 経路表
+# =============================================================================
+
+
+def _parse_prefix(prefix: str) -> Network:
+    """'10.0.0.0/8' のような文字列を ip_network に変換する (ホスト部は切り捨て)"""
+    return ipaddress.ip_network(prefix, strict=False)
+
+
+class Rib:
+    """IPv4 / IPv6 の経路表
+
+    文字列のプレフィックス/アドレスを受け付け、ファミリごとの PrefixTree に振り分けます。
+    """
+
+    def __init__(self) -> None:
+        self._trees: Dict[int, PrefixTree] = {4: PrefixTree(32), 6: PrefixTree(128)}
+
+    def __len__(self) -> int:
+        return sum(len(tree) for tree in self._trees.values())
+
+    def _tree_for(self, network: Network) -> Tuple[PrefixTree, int, int]:
+        tree = self._trees[network.version]
+        return tree, int(network.network_address), network.prefixlen
+
+    def add(self, route: Route) -> None:
+        """経路を追加する (同じ宛先の経路は置き換える)"""
+        network = _parse_prefix(route.destination)
+        tree, key, plen = self._tree_for(network)
+        tree.insert(key, plen, route._replace(destination=str(network)))
+
+    def remove(self, destination: str) -> Optional[Route]:
+        """宛先プレフィックスの経路を削除する"""
+        tree, key, plen = self._tree_for(_parse_prefix(destination))
+        return tree.remove(key, plen)
+
+    def get(self, destination: str) -> Optional[Route]:
+        """宛先プレフィックスが完全一致する経路を返す"""
+        tree, key, plen = self._tree_for(_parse_prefix(destination))
+        return tree.get(key, plen)
+
+    def lookup(self, address: str) -> Optional[Route]:
+        """アドレスに対する最長一致の経路を返す"""
+        addr = ipaddress.ip_address(address)
+        return self._trees[addr.version].lookup(int(addr))
+
+    def longer(self, prefix: str) -> List[Route]:
+        """prefix に含まれる経路 (prefix 自身を含む)"""
+        tree, key, plen = self._tree_for(_parse_prefix(prefix))
+        return tree.longer(key, plen)
+
+    def shorter(self, prefix: str) -> List[Route]:
+        """prefix を含む経路 (prefix 自身を含む)"""
+        tree, key, plen = self._tree_for(_parse_prefix(prefix))
+        return tree.shorter(key, plen)
+
+    def routes(self, family: Optional[int] = None) -> List[Route]:
+        """全経路 (family を指定した場合はそのファミリのみ) をアドレス順に返す"""
+        versions = (family,) if family else (4, 6)
+        result: List[Route] = []
+        for version in versions:
+            result.extend(self._trees[version].routes())
+        return result
+
+
+# =============================================================================
+# ベンチマーク
+# =============================================================================
+
+
+def run_benchmark(route_count: int, lookup_count: int, seed: int = 1) -> None:
+    """ランダムな IPv4 経路で構築時間と検索時間を表示する"""
+    rng = random.Random(seed)
+    tree = PrefixTree(32)
+
+    prefixes = []
+    for _ in range(route_count):
+        plen = rng.choice((8, 16, 20, 22, 24, 24, 24, 28, 32))
+        key = rng.getrandbits(32) & (((1 << plen) - 1) << (32 - plen))
+        prefixes.append((key, plen))
+
+    start = time.perf_counter()
+    for key, plen in prefixes:
+        tree.insert(key, plen, Route(destination=f"{key}/{plen}"))
+    build_sec = time.perf_counter() - start
+
+    addresses = [rng.getrandbits(32) for _ in range(lookup_count)]
+    start = time.perf_counter()
+    for address in addresses:
+        tree.lookup(address)
+    lookup_sec = time.perf_counter() - start
+
+    print(f"routes  : {len(tree)}")
+    print(f"build   : {build_sec:.2f} s ({build_sec / route_count * 1e6:.1f} us/route)")
+    print(f"lookup  : {lookup_sec / lookup_count * 1e6:.2f} us/lookup")
+
+
+def main() -> None:
+    """メイン関数"""
+    parser = argparse.ArgumentParser(description='RIB (patricia trie) benchmark')
+    parser.add_argument('--bench', type=int, metavar='ROUTES', default=1000000,
+                        help='number of random IPv4 routes (default: 1000000)')
+    parser.add_argument('--lookups', type=int, default=100000,
+                        help='number of lookups (default: 100000)')
+    args = parser.parse_args()
+
+    run_benchmark(args.bench, args.lookups)
+
+
+if __name__ == '__main__':
+    main()
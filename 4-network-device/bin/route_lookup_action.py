@@ -0,0 +1,610 @@
+#!/usr/bin/env python3
+"""
+ConfD 経路検索アクションハンドラー
+
+このスクリプトはConfDのアクションハンドラーとして動作し、
+CLI上で 'request routing lookup ...' / 'request routing routes ...' を実行可能にします。
+
+提供する機能:
+- 経路表 (RIB) の構築: コミット済みの routing/static/route を rib.py のトライに登録
+- 差分更新: CDBサブスクリプションの diff_iterate で変更された経路だけを追加/削除
+- 最長一致検索: 宛先アドレスに最長一致する経路を返す
+- 範囲検索: プレフィックスに含まれる経路 (longer) / 含む経路 (shorter) を返す
+
+YANGモデル:
+- ファイル: yang/network-device.yang
+- 名前空間: bin/network_device_ns.py
+- アクションポイント名: route_lookup_action
+
+【使用方法】
+    --start      : デーモンとして起動
+    --stop       : デーモンを停止
+    --status     : デーモンの状態を確認
+    --foreground : フォアグラウンドで実行（テスト用）
+    --log-json   : ログをJSON Lines形式で書く
+
+【CLI使用例】
+    admin@confd> request routing lookup address 192.168.10.5
+    admin@confd> request routing routes prefix 10.0.0.0/8
+    admin@confd> request routing routes prefix 10.1.2.0/24 match shorter
+
+【設計】
+経路表全体を読み直すのは起動時だけです。
+コミット時は diff_iterate で変更のあった route の宛先 (キー) を集め、
+その経路だけを CDB から読み直してトライに追加、または削除します。
+"""
+
+import argparse
+import atexit
+import logging
+import os
+import re
+import select
+import signal
+import socket
+import sys
+import time
+
+from pathlib import Path
+from typing import List, Optional, Set
+
+try:
+    import _confd  # type: ignore
+    import _confd.cdb as cdb  # type: ignore
+    import _confd.dp as dp  # type: ignore
+except ImportError as e:
+    print(f"Error: Could not import required ConfD modules: {e}")
+    print("Make sure ConfD is installed and PYTHONPATH is set correctly.")
+    sys.exit(1)
+
+try:
+    import network_device_ns as ns
+except ImportError as e:
+    print(f"Error: Could not import network_device_ns module: {e}")
+    print("Make sure network_device_ns.py is generated by confdc from the YANG model.")
+    sys.exit(1)
+
+# リポジトリ共通のモジュール (daemon_log など) は lib/ に置いている
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'lib'))
+
+# ログはバッファに入れるだけで、ファイルへの書き込みはバックグラウンドのスレッドがまとめて行う
+# （main() で daemon_log.setup() を呼んでから使う）
+import daemon_log
+from daemon_log import log
+
+from rib import Rib, Route
+
+# =============================================================================
+# 定数定義
+# =============================================================================
+
+# スクリプトのファイル名の拡張子を取り除いた名前
+SCRIPT_BASE = Path(__file__).stem
+
+# スクリプトのディレクトリを基準にパスを設定
+SCRIPT_DIR = Path(__file__).resolve().parent.parent
+
+TMP_DIR = SCRIPT_DIR / 'tmp'
+LOG_DIR = SCRIPT_DIR / 'log'
+
+# ディレクトリが存在しない場合は作成
+TMP_DIR.mkdir(parents=True, exist_ok=True)
+LOG_DIR.mkdir(parents=True, exist_ok=True)
+
+# PIDファイル
+PID_FILE = TMP_DIR / f'{SCRIPT_BASE}.pid'
+
+# ログファイル
+LOG_FILE = LOG_DIR / f'{SCRIPT_BASE}.log'
+
+# ConfD接続設定
+CONFD_HOST = "127.0.0.1"
+CONFD_PORT = 4565
+
+# アクションポイント名（YANGファイルで定義したもの）
+ACTION_POINT_NAME = "route_lookup_action"
+
+# デーモン名
+DAEMON_NAME = "route_lookup_action_daemon"
+
+# 監視・読み込み対象のパス
+ROUTE_PATH = "/routing/static/route"
+
+# キーパス文字列から route のキー (宛先プレフィックス) を取り出す
+# 例: /nd:routing/static/route{10.0.0.0/8}/next-hop → 10.0.0.0/8
+ROUTE_KEY_RE = re.compile(r"/route\{([^}]+)\}")
+
+# 入力 leaf match (enumeration) の値: 定義順に 0 から割り当てられる
+MATCH_ENUM = {0: "longer", 1: "shorter"}
+
+# ConfDワーカーソケットのグローバル参照
+# cb_init() 内の dp.action_set_fd(uinfo, work_sock_global) で使用
+work_sock_global: Optional[socket.socket] = None
+
+# 経路表（選択ループのスレッドだけが更新・参照する）
+rib: Rib = Rib()
+
+# =============================================================================
+# CDBからの経路読み込み
+# =============================================================================
+
+def read_route(rsock, path: str) -> Route:
+    """route リストの1エントリを読み取る"""
+    next_hop = None
+    interface = None
+    if cdb.exists(rsock, f"{path}/next-hop"):
+        next_hop = str(cdb.get(rsock, f"{path}/next-hop"))
+    if cdb.exists(rsock, f"{path}/interface"):
+        interface = str(cdb.get(rsock, f"{path}/interface"))
+    return Route(
+        destination=str(cdb.get(rsock, f"{path}/destination")),
+        next_hop=next_hop,
+        interface=interface,
+        distance=int(cdb.get(rsock, f"{path}/distance")),
+        permanent=bool(cdb.get(rsock, f"{path}/permanent").as_pyval()),
+    )
+
+
+def open_read_session() -> socket.socket:
+    """running に対する読み取りセッションを開始したソケットを返す"""
+    rsock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
+    cdb.connect(rsock, cdb.READ_SOCKET, CONFD_HOST, CONFD_PORT, '/')
+    cdb.start_session(rsock, cdb.RUNNING)
+    cdb.set_namespace(rsock, ns.ns.hash)
+    return rsock
+
+
+def close_read_session(rsock: socket.socket) -> None:
+    """読み取りセッションを終了してソケットを閉じる"""
+    try:
+        cdb.end_session(rsock)
+    finally:
+        rsock.close()
+
+
+def load_routes() -> None:
+    """running の全経路を読み込み、経路表を作り直す（起動時のみ）"""
+    global rib
+
+    start = time.perf_counter()
+    new_rib = Rib()
+    rsock = open_read_session()
+    try:
+        for i in range(cdb.num_instances(rsock, ROUTE_PATH)):
+            new_rib.add(read_route(rsock, f"{ROUTE_PATH}[{i}]"))
+    finally:
+        close_read_session(rsock)
+
+    rib = new_rib
+    log(f"Loaded {len(new_rib)} routes in {time.perf_counter() - start:.3f}s")
+
+
+def collect_changed_routes(sub_sock, sub_point: int) -> Optional[Set[str]]:
+    """
+    diff_iterate で変更された route のキーを集める
+
+    Returns:
+        変更された宛先プレフィックスの集合
+        route より上位 (static コンテナ等) が変更された場合は None (全体を読み直す)
+    """
+    changed: Set[str] = set()
+    full_reload = False
+
+    def iterate(kp, op, oldv, newv, state):
+        nonlocal full_reload
+        matched = ROUTE_KEY_RE.search(str(kp))
+        if matched is None:
+            if op == _confd.MOP_DELETED:
+                full_reload = True
+                return _confd.ITER_STOP
+            return _confd.ITER_RECURSE
+        changed.add(matched.group(1))
+        # エントリが分かれば十分なので、その下の leaf までは辿らない
+        return _confd.ITER_CONTINUE
+
+    cdb.diff_iterate(sub_sock, sub_point, iterate, 0, None)
+    return None if full_reload else changed
+
+
+def apply_route_changes(destinations: Set[str]) -> None:
+    """変更された経路だけを読み直して経路表に反映する"""
+    start = time.perf_counter()
+    added = removed = 0
+    rsock = open_read_session()
+    try:
+        for destination in destinations:
+            path = f"{ROUTE_PATH}{{{destination}}}"
+            if cdb.exists(rsock, path):
+                rib.add(read_route(rsock, path))
+                added += 1
+            elif rib.remove(destination) is not None:
+                removed += 1
+    finally:
+        close_read_session(rsock)
+
+    log(f"Updated RIB: {added} added/changed, {removed} removed, "
+        f"{len(rib)} routes ({(time.perf_counter() - start) * 1e3:.1f}ms)")
+
+# =============================================================================
+# アクション応答
+# =============================================================================
+
+def _tag_value(tag: int, value, value_type: int):
+    return _confd.TagValue(_confd.XmlTag(ns.ns.hash, tag), _confd.Value(value, value_type))
+
+
+def route_values(route: Route) -> List:
+    """経路の各 leaf を TagValue のリストにする"""
+    values = [_tag_value(ns.ns.nd_destination, route.destination, _confd.C_BUF)]
+    if route.next_hop is not None:
+        values.append(_tag_value(ns.ns.nd_next_hop, route.next_hop, _confd.C_BUF))
+    if route.interface is not None:
+        values.append(_tag_value(ns.ns.nd_interface, route.interface, _confd.C_BUF))
+    values.append(_tag_value(ns.ns.nd_distance, route.distance, _confd.C_UINT8))
+    return values
+
+
+def build_lookup_values(route: Optional[Route], result: str, lookup_usec: int) -> List:
+    """lookup アクションの出力パラメータに対応するTagValueリストを生成"""
+    values = route_values(route) if route is not None else []
+    values.append(_tag_value(ns.ns.nd_result, result, _confd.C_BUF))
+    values.append(_tag_value(ns.ns.nd_lookup_time, lookup_usec, _confd.C_UINT32))
+    return values
+
+
+def build_routes_values(routes: List[Route], lookup_usec: int) -> List:
+    """routes アクションの出力パラメータ (route リスト) に対応するTagValueリストを生成"""
+    values = []
+    for route in routes:
+        # リストの各エントリは XMLBEGIN と XMLEND で囲む
+        values.append(_tag_value(ns.ns.nd_route, (ns.ns.nd_route, ns.ns.hash), _confd.C_XMLBEGIN))
+        values.extend(route_values(route))
+        values.append(_tag_value(ns.ns.nd_route, (ns.ns.nd_route, ns.ns.hash), _confd.C_XMLEND))
+    values.append(_tag_value(ns.ns.nd_lookup_time, lookup_usec, _confd.C_UINT32))
+    return values
+
+# =============================================================================
+# アクションコールバッククラス
+# =============================================================================
+
+class RouteLookupActionHandler:
+    """
+    経路検索アクションのハンドラークラス
+
+    【処理フロー】
+    1. ConfD CLIでユーザーが request routing lookup / routes を実行
+    2. cb_action() でアクション名に応じて経路表を検索する
+    3. 検索はマイクロ秒単位で終わるため、その場で応答を返す
+    """
+
+    def cb_init(self, uinfo) -> int:
+        """アクション初期化コールバック（ワーカーソケットを関連付ける）"""
+        dp.action_set_fd(uinfo, work_sock_global)
+        return _confd.CONFD_OK
+
+    def cb_abort(self, uinfo) -> int:
+        """アクション中止コールバック（検索は即座に終わるため何もしない）"""
+        return _confd.CONFD_OK
+
+    def cb_action(self, uinfo, name, kp, params) -> int:
+        """
+        アクションコールバック
+
+        Returns:
+            _confd.CONFD_OK: 検索結果を応答した
+            _confd.CONFD_ERR: 入力エラー（エラーメッセージを設定済み）
+        """
+        # name は XmlTag なので、タグの値で比べる
+        tag = getattr(name, 'tag', name)
+        if tag == ns.ns.nd_lookup:
+            return self._lookup(uinfo, params)
+        if tag == ns.ns.nd_routes:
+            return self._routes(uinfo, params)
+        dp.action_seterr(uinfo, "unknown action")
+        return _confd.CONFD_ERR
+
+    def _lookup(self, uinfo, params) -> int:
+        address = None
+        for param in params:
+            if param.tag == ns.ns.nd_address:
+                address = str(param.v)
+
+        start = time.perf_counter()
+        route = rib.lookup(address)
+        lookup_usec = int((time.perf_counter() - start) * 1e6)
+
+        if route is None:
+            result = f"no route to {address}"
+        else:
+            result = f"{address} matches {route.destination}"
+        log(f"lookup {address} -> {result}", usec=lookup_usec)
+
+        dp.action_reply_values(uinfo, build_lookup_values(route, result, lookup_usec))
+        return _confd.CONFD_OK
+
+    def _routes(self, uinfo, params) -> int:
+        prefix = None
+        match = "longer"
+        for param in params:
+            if param.tag == ns.ns.nd_prefix:
+                prefix = str(param.v)
+            elif param.tag == ns.ns.nd_match:
+                match = MATCH_ENUM[param.v.as_pyval()]
+
+        start = time.perf_counter()
+        if match == "shorter":
+            routes = rib.shorter(prefix)
+        else:
+            routes = rib.longer(prefix)
+        lookup_usec = int((time.perf_counter() - start) * 1e6)
+        log(f"routes {prefix} {match} -> {len(routes)} routes", usec=lookup_usec)
+
+        dp.action_reply_values(uinfo, build_routes_values(routes, lookup_usec))
+        return _confd.CONFD_OK
+
+# =============================================================================
+# デーモン管理関数
+# =============================================================================
+
+def daemonize() -> None:
+    """プロセスをデーモン化する"""
+    try:
+        # 最初のfork
+        pid = os.fork()
+        if pid > 0:
+            sys.exit(0)
+    except OSError as e:
+        log(f"First fork failed: {e}", logging.ERROR)
+        sys.exit(1)
+
+    # 環境をデタッチ
+    os.chdir('/')
+    os.setsid()
+    os.umask(0)
+
+    # 2回目のfork
+    try:
+        pid = os.fork()
+        if pid > 0:
+            sys.exit(0)
+    except OSError as e:
+        log(f"Second fork failed: {e}", logging.ERROR)
+        sys.exit(1)
+
+    # 標準入出力をリダイレクト
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    with open(os.devnull, 'r') as f:
+        os.dup2(f.fileno(), sys.stdin.fileno())
+
+    with open(os.devnull, 'a+') as f:
+        os.dup2(f.fileno(), sys.stdout.fileno())
+
+    with open(os.devnull, 'a+') as f:
+        os.dup2(f.fileno(), sys.stderr.fileno())
+
+    # PIDファイルを書き込み
+    pid = os.getpid()
+    with open(PID_FILE, 'w') as f:
+        f.write(f"{pid}\n")
+
+    # 終了時にPIDファイルを削除
+    atexit.register(lambda: PID_FILE.unlink(missing_ok=True))
+
+def read_pid() -> Optional[int]:
+    """PIDファイルからPIDを読み取る"""
+    try:
+        if PID_FILE.exists():
+            with open(PID_FILE, 'r') as f:
+                return int(f.read().strip())
+    except (OSError, ValueError):
+        pass
+    return None
+
+def is_running(pid: int) -> bool:
+    """指定されたPIDのプロセスが実行中かチェック"""
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+def stop_daemon() -> None:
+    """デーモンを停止する"""
+    pid = read_pid()
+
+    if pid is None:
+        print(f"{DAEMON_NAME} is not running (no PID file)")
+        return
+
+    if not is_running(pid):
+        print(f"{DAEMON_NAME} is not running (stale PID file)")
+        PID_FILE.unlink(missing_ok=True)
+        return
+
+    print(f"Stopping {DAEMON_NAME} (PID: {pid})...")
+
+    try:
+        os.kill(pid, signal.SIGTERM)
+
+        # プロセスが終了するまで待機
+        for _ in range(50):
+            if not is_running(pid):
+                print(f"{DAEMON_NAME} stopped")
+                PID_FILE.unlink(missing_ok=True)
+                return
+            time.sleep(0.1)
+
+        # 強制終了
+        print(f"{DAEMON_NAME} did not stop gracefully, forcing...")
+        os.kill(pid, signal.SIGKILL)
+        time.sleep(0.5)
+
+        if not is_running(pid):
+            print(f"{DAEMON_NAME} stopped")
+            PID_FILE.unlink(missing_ok=True)
+        else:
+            print(f"Failed to stop {DAEMON_NAME}")
+
+    except Exception as e:
+        print(f"Error stopping daemon: {e}")
+
+def check_status() -> None:
+    """デーモンの状態を確認する"""
+    pid = read_pid()
+
+    if pid is None:
+        print(f"{DAEMON_NAME} is not running (no PID file)")
+        return
+
+    if is_running(pid):
+        print(f"{DAEMON_NAME} is running (PID: {pid})")
+    else:
+        print(f"{DAEMON_NAME} is not running (stale PID file)")
+        PID_FILE.unlink(missing_ok=True)
+
+# =============================================================================
+# メイン処理
+# =============================================================================
+
+def run_daemon() -> None:
+    """
+    デーモンのメイン処理
+
+    アクション用の制御/ワーカーソケットと、routing/static/route の
+    CDBサブスクリプションソケットを1つのselectループで監視します。
+    経路表の更新と検索は同じスレッドで行うため、ロックは不要です。
+    """
+    global work_sock_global
+
+    log(f"Starting {DAEMON_NAME}...")
+
+    daemon_ctx = dp.init_daemon(DAEMON_NAME)
+
+    ctrl_sock = socket.socket()
+    work_sock_global = socket.socket()
+    sub_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, 0)
+
+    try:
+        log(f"Connecting to ConfD at {CONFD_HOST}:{CONFD_PORT}...")
+        dp.connect(daemon_ctx, ctrl_sock, dp.CONTROL_SOCKET, CONFD_HOST, CONFD_PORT, None)
+        dp.connect(daemon_ctx, work_sock_global, dp.WORKER_SOCKET, CONFD_HOST, CONFD_PORT, None)
+
+        # 経路の変更を購読（diff_iterate で差分を取り出す）
+        cdb.connect(sub_sock, cdb.SUBSCRIPTION_SOCKET, CONFD_HOST, CONFD_PORT, ROUTE_PATH)
+        sub_point = cdb.subscribe(sub_sock, 100, ns.ns.hash, ROUTE_PATH)
+        cdb.subscribe_done(sub_sock)
+        log(f"Subscribed to {ROUTE_PATH}")
+
+        # 起動時点の経路を読み込む
+        load_routes()
+
+        log(f"Registering action point: {ACTION_POINT_NAME}")
+        dp.register_action_cbs(daemon_ctx, ACTION_POINT_NAME, RouteLookupActionHandler())
+        dp.register_done(daemon_ctx)
+        log(f"{DAEMON_NAME} registration complete")
+
+        stop_flag = {'stop': False}
+
+        def signal_handler(signum, frame):
+            log(f"Received signal {signum}, shutting down...")
+            stop_flag['stop'] = True
+
+        signal.signal(signal.SIGTERM, signal_handler)
+        signal.signal(signal.SIGINT, signal_handler)
+
+        log("Entering event loop...")
+        sockets = [ctrl_sock, work_sock_global, sub_sock]
+
+        while not stop_flag['stop']:
+            readable, _, _ = select.select(sockets, [], [], 1.0)
+
+            for sock in readable:
+                try:
+                    if sock is sub_sock:
+                        # 設定変更通知 → 差分を経路表に反映 → ACK
+                        points = cdb.read_subscription_socket(sub_sock)
+                        try:
+                            if sub_point in points:
+                                changed = collect_changed_routes(sub_sock, sub_point)
+                                if changed is None:
+                                    load_routes()
+                                else:
+                                    apply_route_changes(changed)
+                        except Exception as e:
+                            log(f"Error updating RIB: {e}")
+                        cdb.sync_subscription_socket(sub_sock, cdb.DONE_PRIORITY)
+                    else:
+                        dp.fd_ready(daemon_ctx, sock)
+                except _confd.error.Error as e:
+                    if e.confd_errno == _confd.ERR_EOF:
+                        log("ConfD closed connection, shutting down...")
+                    else:
+                        log(f"Error processing socket data: {e}")
+                    stop_flag['stop'] = True
+                    break
+                except Exception as e:
+                    log(f"Error processing socket data: {e}")
+                    stop_flag['stop'] = True
+                    break
+
+    except KeyboardInterrupt:
+        log("Keyboard interrupt received")
+
+    except Exception as e:
+        log(f"Error in main loop: {e}", logging.ERROR)
+        raise
+
+    finally:
+        log(f"Shutting down {DAEMON_NAME}")
+        sub_sock.close()
+        ctrl_sock.close()
+        if work_sock_global:
+            work_sock_global.close()
+
+def main():
+    """メイン関数"""
+    parser = argparse.ArgumentParser(
+        description=f'{DAEMON_NAME} - ConfD route lookup action handler'
+    )
+
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--start', action='store_true',
+                      help='Start daemon')
+    group.add_argument('--stop', action='store_true',
+                      help='Stop daemon')
+    group.add_argument('--status', action='store_true',
+                      help='Check daemon status')
+    group.add_argument('--foreground', action='store_true',
+                      help='Run in foreground (for testing)')
+    parser.add_argument('--log-json', action='store_true',
+                        help='Write the log as JSON lines')
+
+    args = parser.parse_args()
+
+    if args.start:
+        pid = read_pid()
+        if pid and is_running(pid):
+            print(f"{DAEMON_NAME} is already running (PID: {pid})")
+            sys.exit(1)
+
+        print(f"Starting {DAEMON_NAME}...")
+        daemonize()
+        # ログのスレッドは fork で引き継がれないので、デーモン化の後で開始する
+        daemon_log.setup(LOG_FILE, json_lines=args.log_json)
+        run_daemon()
+
+    elif args.stop:
+        stop_daemon()
+
+    elif args.status:
+        check_status()
+
+    elif args.foreground:
+        print(f"Running {DAEMON_NAME} in foreground...")
+        daemon_log.setup(LOG_FILE, json_lines=args.log_json, console=True)
+        run_daemon()
+
+if __name__ == '__main__':
+    main()
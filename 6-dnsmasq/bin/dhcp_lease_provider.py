@@ -8,10 +8,13 @@ DHCP リース状態プロバイダーデーモン
 dnsmasq のリースファイル(デフォルト: /var/lib/misc/dnsmasq.leases または
 環境変数 DNSMASQ_LEASES_PATH)を読み取り、ConfD CLI から
 "show dhcp leases" で閲覧できるようにします。
+
+ログは daemon_log で log/dhcp_lease_provider.log に書きます (--log-json で JSON Lines)。
 """
 
 import argparse
 import atexit
+import logging
 import os
 import select
 import signal
@@ -34,6 +37,12 @@ except ImportError as e:
     print(f"Error: Could not import dnsmasq_dhcp_ns: {e}")
     sys.exit(1)
 
+# リポジトリ共通のモジュール (daemon_log など) は lib/ に置いている
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'lib'))
+
+import daemon_log
+from daemon_log import log
+
 SCRIPT_BASE = Path(__file__).stem
 SCRIPT_DIR = Path(__file__).resolve().parent.parent
 
@@ -68,7 +77,7 @@ class TransCallbacks:
             dp.trans_set_fd(tctx, wrksock_global)
             return _confd.OK
         except Exception as e:
-            print(f"Transaction init failed: {e}")
+            log(f"Transaction init failed: {e}", logging.ERROR)
             return _confd.ERR
 
     def cb_finish(self, tctx) -> int:
@@ -135,7 +144,7 @@ class DataCallbacks:
             dp.data_reply_value(tctx, val)
             return _confd.OK
         except Exception as e:
-            print(f"cb_get_elem failed: {e}")
+            log(f"cb_get_elem failed: {e}", logging.ERROR)
             return _confd.ERR
 
 
@@ -159,7 +168,7 @@ def _read_leases() -> List[Tuple[str, str, str, str]]:
         # 実機 dnsmasq と連携していない場合など
         pass
     except Exception as e:
-        print(f"Failed to read leases file {LEASES_FILE}: {e}")
+        log(f"Failed to read leases file {LEASES_FILE}: {e}", logging.ERROR)
 
     return leases
 
@@ -191,9 +200,11 @@ def daemonize() -> None:
     sys.stdout.flush()
     sys.stderr.flush()
 
-    with open(str(LOG_FILE), "a") as log:
-        os.dup2(log.fileno(), sys.stdout.fileno())
-        os.dup2(log.fileno(), sys.stderr.fileno())
+    # ログは daemon_log でログファイルに書くので、標準入出力は /dev/null にする
+    with open(os.devnull, "a+") as devnull:
+        os.dup2(devnull.fileno(), sys.stdin.fileno())
+        os.dup2(devnull.fileno(), sys.stdout.fileno())
+        os.dup2(devnull.fileno(), sys.stderr.fileno())
 
     with open(str(PID_FILE), "w") as f:
         f.write(str(os.getpid()))
@@ -223,7 +234,7 @@ def _is_running(pid: Optional[int]) -> bool:
         return False
 
 
-def start_daemon() -> None:
+def start_daemon(log_json: bool = False) -> None:
     pid = _get_pid()
     if _is_running(pid):
         print(f"dhcp_lease_provider is already running (PID: {pid})")
@@ -235,6 +246,8 @@ def start_daemon() -> None:
     print(f"Log file: {LOG_FILE}")
 
     daemonize()
+    # ログのスレッドは fork で引き継がれないので、デーモン化の後で開始する
+    daemon_log.setup(LOG_FILE, json_lines=log_json)
     run()
 
 
@@ -272,7 +285,7 @@ def status_daemon() -> None:
 def run() -> None:
     global wrksock_global
 
-    print(f"Initializing daemon: {DAEMON_NAME}")
+    log(f"Initializing daemon: {DAEMON_NAME}")
     dctx = dp.init_daemon(DAEMON_NAME)
 
     ctlsock = socket.socket()
@@ -291,7 +304,7 @@ def run() -> None:
     stop_flag = {"stop": False}
 
     def signal_handler(signum, frame):
-        print(f"Received signal {signum}, exiting...")
+        log(f"Received signal {signum}, exiting...")
         stop_flag["stop"] = True
 
     signal.signal(signal.SIGTERM, signal_handler)
@@ -317,15 +330,17 @@ def main() -> None:
     group.add_argument("--stop", action="store_true", help="Stop daemon")
     group.add_argument("--status", action="store_true", help="Show status")
     group.add_argument("--foreground", action="store_true", help="Run in foreground")
+    parser.add_argument("--log-json", action="store_true", help="Write the log as JSON lines")
     args = parser.parse_args()
 
     if args.start:
-        start_daemon()
+        start_daemon(args.log_json)
     elif args.stop:
         stop_daemon()
     elif args.status:
         status_daemon()
     elif args.foreground:
+        daemon_log.setup(LOG_FILE, json_lines=args.log_json, console=True)
         run()
     else:
         parser.print_help()
@@ -8,10 +8,13 @@ ConfD -> dnsmasq.conf 同期デーモン
 ConfD の CDB を監視し、/dnsmasq/dhcp の設定から dnsmasq.conf を生成します。
 初期実装では安全のため、デフォルト出力先を ./tmp/dnsmasq.conf とし、
 必要に応じて環境変数 DNSMASQ_CONF_PATH で /etc/dnsmasq.conf などに切り替え可能です。
+
+ログは daemon_log で log/dnsmasq_config_sync.log に書きます (--log-json で JSON Lines)。
 """
 
 import argparse
 import atexit
+import logging
 import os
 import signal
 import socket
@@ -34,6 +37,12 @@ except ImportError:
     print("Error: Could not import dnsmasq_dhcp_ns. Run 'make all' to generate it from YANG.")
     sys.exit(1)
 
+# リポジトリ共通のモジュール (daemon_log など) は lib/ に置いている
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'lib'))
+
+import daemon_log
+from daemon_log import log
+
 SCRIPT_BASE = Path(__file__).stem
 SCRIPT_DIR = Path(__file__).resolve().parent.parent
 
@@ -64,7 +73,7 @@ class Subscriber:
         cdb.subscribe(self.sock, self.prio, ns.ns.hash, self.path)
         cdb.subscribe_done(self.sock)
 
-        print(f"Subscribed to {self.path}")
+        log(f"Subscribed to {self.path}")
 
     def loop(self) -> None:
         while True:
@@ -113,7 +122,7 @@ class Subscriber:
                             parts.append(lease_time)
                         fp.write("dhcp-range=" + ",".join(parts) + "\n")
                 except Exception as e:
-                    print(f"Error building dhcp-range: {e}")
+                    log(f"Error building dhcp-range: {e}", logging.ERROR)
 
                 # static-lease list -> dhcp-host
                 try:
@@ -129,13 +138,13 @@ class Subscriber:
                                 fields.append(hostname)
                             fp.write("dhcp-host=" + ",".join(fields) + "\n")
                 except Exception as e:
-                    print(f"Error reading static leases: {e}")
+                    log(f"Error reading static leases: {e}", logging.ERROR)
 
         cdb.end_session(rsock)
         rsock.close()
 
         os.replace(tmp_path, DNSMASQ_CONF_PATH)
-        print(f"dnsmasq.conf written to {DNSMASQ_CONF_PATH}")
+        log(f"dnsmasq.conf written to {DNSMASQ_CONF_PATH}")
 
 
 def _safe_get_str(sock: socket.socket, path: str) -> Optional[str]:
@@ -173,9 +182,11 @@ def daemonize() -> None:
     sys.stdout.flush()
     sys.stderr.flush()
 
-    with open(str(LOG_FILE), "a") as log:
-        os.dup2(log.fileno(), sys.stdout.fileno())
-        os.dup2(log.fileno(), sys.stderr.fileno())
+    # ログは daemon_log でログファイルに書くので、標準入出力は /dev/null にする
+    with open(os.devnull, "a+") as devnull:
+        os.dup2(devnull.fileno(), sys.stdin.fileno())
+        os.dup2(devnull.fileno(), sys.stdout.fileno())
+        os.dup2(devnull.fileno(), sys.stderr.fileno())
 
     with open(str(PID_FILE), "w") as f:
         f.write(str(os.getpid()))
@@ -205,7 +216,7 @@ def _is_running(pid: Optional[int]) -> bool:
         return False
 
 
-def start_daemon() -> None:
+def start_daemon(log_json: bool = False) -> None:
     pid = _get_pid()
     if _is_running(pid):
         print(f"dnsmasq_config_sync is already running (PID: {pid})")
@@ -217,6 +228,8 @@ def start_daemon() -> None:
     print(f"Log file: {LOG_FILE}")
 
     daemonize()
+    # ログのスレッドは fork で引き継がれないので、デーモン化の後で開始する
+    daemon_log.setup(LOG_FILE, json_lines=log_json)
     run_loop()
 
 
@@ -261,7 +274,7 @@ def run_loop() -> None:
     stop_event = threading.Event()
 
     def handle_signal(signum, frame):
-        print(f"Received signal {signum}, stopping...")
+        log(f"Received signal {signum}, stopping...")
         stop_event.set()
 
     signal.signal(signal.SIGTERM, handle_signal)
@@ -280,15 +293,17 @@ def main() -> None:
     group.add_argument("--stop", action="store_true", help="Stop daemon")
     group.add_argument("--status", action="store_true", help="Show status")
     group.add_argument("--foreground", action="store_true", help="Run in foreground")
+    parser.add_argument("--log-json", action="store_true", help="Write the log as JSON lines")
     args = parser.parse_args()
 
     if args.start:
-        start_daemon()
+        start_daemon(args.log_json)
     elif args.stop:
         stop_daemon()
     elif args.status:
         status_daemon()
     elif args.foreground:
+        daemon_log.setup(LOG_FILE, json_lines=args.log_json, console=True)
         run_loop()
     else:
         parser.print_help()
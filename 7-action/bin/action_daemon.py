@@ -2,6 +2,9 @@
 """Simple ConfD action example (Python)
 
 このスクリプトは ConfD の tailf:action を Python で実装する最小構成の例です。
+ConfD との接続、コールバックの登録、入力/出力の TagValue への変換、
+遅延応答と中断は lib/action_server.py の ActionServer に任せ、
+ここではアクションの本体を関数として書くだけです。
 
 YANG モジュール (yang/example.yang):
 
@@ -10,10 +13,16 @@ YANG モジュール (yang/example.yang):
     - tailf:actionpoint hello-python
     - input:  leaf name (string)
     - output: leaf greeting (string)
+  - tailf:action countdown
+    - tailf:actionpoint hello-python
+    - input:  leaf seconds (uint8)
+    - output: leaf message (string), leaf elapsed (uint32)
 
 動き:
 - ConfD から actionpoint "hello-python" に対してコールバックが呼ばれる
-- 入力パラメータ name を受け取り、"Hello, <name>!" というメッセージを返す
+- hello: 入力パラメータ name を受け取り、"Hello, <name>!" というメッセージを返す
+- countdown: seconds 秒数えてから返す (1 秒ごとに CLI に途中経過を表示する)。
+  待っている間もほかのアクションは実行でき、Ctrl-C で中断できる
 
 使い方:
 - このディレクトリで `make init && make all && make start` を実行して ConfD とこのデーモンを起動
@@ -21,20 +30,19 @@ YANG モジュール (yang/example.yang):
 
     config
     tools hello name <your-name>
+    tools countdown seconds 5
 
   と打つと、greeting に Python で生成した文字列が返ってきます。
 """
 
-import select
-import signal
-import socket
+import asyncio
 import sys
-from typing import List
+import time
+from pathlib import Path
+from typing import NamedTuple
 
 try:
     import _confd  # type: ignore
-    import _confd.dp as dp  # type: ignore
-    import _confd.error as confd_error  # type: ignore
 except ImportError as e:  # pragma: no cover - 実行環境依存
     print(f"Error: Could not import ConfD Python modules: {e}")
     sys.exit(1)
@@ -47,108 +55,82 @@ except ImportError as e:  # pragma: no cover
     print(e)
     sys.exit(1)
 
+# リポジトリ共通のモジュール (daemon_log など) は lib/ に置いている
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'lib'))
+
+import daemon_log
+from action_server import ActionContext, ActionServer, Uint32
+
+# スクリプトのファイル名の拡張子を取り除いた名前
+SCRIPT_BASE = Path(__file__).stem
+
+# スクリプトのディレクトリを基準にパスを設定
+SCRIPT_DIR = Path(__file__).resolve().parent.parent
+LOG_DIR = SCRIPT_DIR / 'log'
+
+# ログファイル (画面にも同じ内容を表示する)
+LOG_FILE = LOG_DIR / f'{SCRIPT_BASE}.log'
+
 CONFD_HOST = "127.0.0.1"
 CONFD_PORT = _confd.CONFD_PORT
 DAEMON_NAME = "simple_python_action_daemon"
 ACTIONPOINT_NAME = "hello-python"  # YANG の tailf:actionpoint と一致させる
 
+server = ActionServer(DAEMON_NAME, ns, ACTIONPOINT_NAME, CONFD_HOST, CONFD_PORT)
 
-class HelloActionCallbacks:
-    """`tools hello` アクションのコールバック実装
 
-    - cb_init: ConfD から最初に呼ばれ、どの worker ソケットを使うか教える
-    - cb_action: 実際のアクション本体。入力パラメータを受け取り、出力を返す
-    - cb_abort: 長時間動作中のアクションがキャンセルされたときに呼ばれる
-    """
+class HelloOutput(NamedTuple):
+    """`tools hello` の出力 (フィールド名が output の leaf 名に対応する)"""
 
-    def __init__(self, worker_sock: socket.socket) -> None:
-        self._worker_sock = worker_sock
+    greeting: str
 
-    # ユーザアクションの初期化
-    def cb_init(self, uinfo) -> int:  # type: ignore[override]
-        dp.action_set_fd(uinfo, self._worker_sock)
-        return _confd.CONFD_OK
 
-    # アクション本体
-    def cb_action(self, uinfo, name, keypath, params) -> int:  # type: ignore[override]
-        # params[0] が input/name に対応する
-        if params:
-            who = str(params[0].v)
-        else:
-            who = "world"
+class CountdownOutput(NamedTuple):
+    """`tools countdown` の出力"""
 
-        greeting = f"Hello, {who}! (from Python action)"
+    message: str
+    elapsed: Uint32  # ミリ秒
 
-        # 出力 leaf greeting を 1 つだけ返す
-        result: List[_confd.TagValue] = [
-            _confd.TagValue(
-                _confd.XmlTag(ns.hash, ns.example_greeting),
-                _confd.Value(greeting, _confd.C_STR),
-            )
-        ]
-        dp.action_reply_values(uinfo, result)
-        return _confd.CONFD_OK
 
-    # アクションがキャンセルされた場合
-    def cb_abort(self, uinfo) -> None:  # type: ignore[override]
-        dp.action_delayed_reply_error(uinfo, "aborted")
+@server.action("hello", inline=True)
+def hello(name: str = "world") -> HelloOutput:
+    """`tools hello` アクションの本体
 
+    すぐに終わるので inline=True で cb_action の中から呼び出し、その場で応答する。
+    """
+    return HelloOutput(f"Hello, {name}! (from Python action)")
 
-def main() -> int:
-    """ConfD に接続して action コールバックを登録し、イベントループを回す"""
 
-    # デーモンコンテキストとソケット準備
-    dctx = dp.init_daemon(DAEMON_NAME)
-    ctlsock = socket.socket()
-    workersock = socket.socket()
-
-    try:
-        # ConfD に接続
-        dp.connect(dctx, ctlsock, dp.CONTROL_SOCKET, CONFD_HOST, CONFD_PORT, None)
-        dp.connect(dctx, workersock, dp.WORKER_SOCKET, CONFD_HOST, CONFD_PORT, None)
-
-        # アクションコールバック登録
-        acb = HelloActionCallbacks(workersock)
-        dp.register_action_cbs(dctx, ACTIONPOINT_NAME, acb)
-        dp.register_done(dctx)
-
-        print("============================================================")
-        print("Python action daemon is running.")
-        print("Try in ConfD CLI (J style):")
-        print("  config")
-        print("  tools hello name <your-name>")
-        print("============================================================")
-
-        stop = False
-
-        def _signal_handler(signum, frame):  # type: ignore[override]
-            nonlocal stop
-            stop = True
-
-        signal.signal(signal.SIGINT, _signal_handler)
-        signal.signal(signal.SIGTERM, _signal_handler)
-
-        # select() で CONTROL / WORKER ソケットのイベントを待つ
-        sockets = [ctlsock, workersock]
-        while not stop:
-            readable, _, _ = select.select(sockets, [], [], 1.0)
-            for s in readable:
-                try:
-                    dp.fd_ready(dctx, s)
-                except confd_error.Error as e:  # pragma: no cover
-                    # ユーザコールバック内の例外など
-                    if e.confd_errno is _confd.ERR_EXTERNAL:
-                        print(f"Callback error: {e}")
-                    else:
-                        raise
-
-    finally:
-        try:
-            workersock.close()
-        finally:
-            ctlsock.close()
-            dp.release_daemon(dctx)
+@server.action("countdown", timeout=300)
+async def countdown(ctx: ActionContext, seconds: int) -> CountdownOutput:
+    """`tools countdown` アクションの本体
+
+    async def なのでイベントループのタスクとして実行され、ConfD には遅延応答を返す。
+    await している間はほかのアクションも実行できる。Ctrl-C でタスクは取り消される。
+    """
+    start = time.perf_counter()
+    for remaining in range(seconds, 0, -1):
+        ctx.write(f"{remaining}...")
+        await asyncio.sleep(1)
+    elapsed = int((time.perf_counter() - start) * 1000)
+    return CountdownOutput(f"Done after {seconds} seconds", Uint32(elapsed))
 
+
+def main() -> int:
+    """ConfD に接続して action コールバックを登録し、イベントループを回す"""
+    # ActionServer のログ (logging) も daemon_log がファイルと画面に書き出す
+    daemon_log.setup(LOG_FILE, console=True)
+
+    print("============================================================")
+    print("Python action daemon is running.")
+    print("Try in ConfD CLI (J style):")
+    print("  config")
+    print("  tools hello name <your-name>")
+    print("  tools countdown seconds 5")
+    print("============================================================")
+
+    # SIGINT/SIGTERM を受けるまで実行する
+    server.run()
     return 0
 
 
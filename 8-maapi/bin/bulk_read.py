@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""Fan-out reader (MAAPI)
+
+複数のパス (leaf やサブツリー) をまとめて読み出し、dict にして返すモジュールです。
+
+maapi_demo.py の read_demo() のように leaf ごとに maapi.exists() と maapi.get_elem() を
+呼ぶと、leaf 1 つごとに 2 回の往復 (RTT) が発生します。設定全体の監査のように
+読み出す leaf が多いと、それだけで長い時間がかかります。
+
+- 同じ親 (コンテナかリストのエントリ) の leaf は、1 回の maapi.get_values() でまとめて読む。
+  無い leaf は C_NOEXISTS で返ってくるので、exists() で確かめる必要はない
+- サブツリーは、子の leaf とコンテナを C_XMLBEGIN/C_XMLEND で囲んだ 1 回の get_values() で読む。
+  リストはカーソルでキーを読んでから、エントリごとに get_values() で読む。
+  プレゼンスコンテナは別に読む (無ければ結果に含めない)
+- 読み出しは作業の単位に分けて、maapi_pool のセッションで開始した複数の READ の
+  トランザクションで並行して行う (ワーカーのスレッドごとに 1 つのトランザクション)
+
+結果はパス → 値の dict です。
+
+- leaf: 値の文字列 (leaf-list は文字列のリスト、type empty の leaf は [None])。無ければ None
+- サブツリー: bulk_config.py の入力と同じ形の dict (リストはエントリの dict のリスト)。無ければ None
+
+このため、読み出したサブツリーは bulk_config.push() でそのまま書き戻せます。
+
+並行して読む場合は、トランザクションごとに読み出す時点が異なります。
+読み出しの途中でコミットされた変更は、一部のパスにだけ反映されることがあります。
+
+使い方 (コマンドライン):
+
+    python bin/bulk_read.py /demo                      # サブツリーを読んで JSON で表示
+    python bin/bulk_read.py /demo/message /demo/last-updated
+    python bin/bulk_read.py /interfaces --workers 8
+
+使い方 (モジュール):
+
+    import bulk_read
+    import maapi_pool
+
+    with maapi_pool.MaapiPool(size=8) as pool:
+        result = bulk_read.read(pool, ["/demo", "/interfaces/interface{eth0}/mtu"])
+
+    # 開始済みのトランザクションで読む (並行しない)
+    result = bulk_read.read_values(sock, th, ["/demo/message", "/demo/last-updated"])
+"""
+
+import argparse
+import json
+import queue
+import socket
+import sys
+import threading
+import time
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import _confd  # type: ignore
+    import _confd.maapi as maapi  # type: ignore
+except ImportError as e:  # pragma: no cover - 実行環境依存
+    print(f"Error: Could not import ConfD Python modules: {e}")
+    print("Make sure ConfD is installed and PYTHONPATH is set correctly.")
+    sys.exit(1)
+
+import bulk_config
+import maapi_pool
+
+# データが無いことを表すエラー (読み出しでは None として扱う)
+_MISSING = (_confd.ERR_NOEXISTS, _confd.ERR_BADPATH)
+
+# 作業の単位: (ソケット, トランザクションハンドル) を受け取って実行する
+Task = Callable[[socket.socket, int], None]
+# 読み出した値を結果の中に置く
+Put = Callable[[Any], None]
+
+
+def split_path(path: str) -> Tuple[str, str]:
+    """キーパスを親と最後の 1 段に分ける (キーの {…} や引用符の中の '/' では分けない)"""
+    depth = 0
+    quoted = False
+    i = len(path) - 1
+    while i >= 0:
+        c = path[i]
+        if c == '"' and (i == 0 or path[i - 1] != '\\'):
+            quoted = not quoted
+        elif not quoted:
+            if c == '}':
+                depth += 1
+            elif c == '{':
+                depth -= 1
+            elif c == '/' and depth == 0:
+                return path[:i], path[i + 1:]
+        i -= 1
+    return "", path
+
+
+def _leaf(value: Any) -> Any:
+    """get_values() / get_elem() で読んだ値を、結果の値にする (無ければ None)"""
+    kind = value.confd_type()
+    if kind == _confd.C_NOEXISTS:
+        return None
+    if kind == _confd.C_XMLTAG:
+        return [None]
+    if kind == _confd.C_LIST:
+        return [str(item) for item in value.as_list()]
+    return str(value)
+
+
+class FanoutReader:
+    """パスの読み出しを作業の単位に分け、1 つ以上のトランザクションで実行する
+
+    Args:
+        db: 読み出すデータストア
+        workers: 並行して使うトランザクションの数 (run() で使う)
+
+    run() は maapi_pool のプールから workers 本のセッションを借りるので、
+    呼び出し側がプールのセッションを借りたままの場合は、size より 1 つ以上少なくすること。
+    """
+
+    def __init__(self, db: int = _confd.RUNNING, workers: int = maapi_pool.DEFAULT_SIZE) -> None:
+        self.db = db
+        self.workers = max(workers, 1)
+
+        # 名前空間のハッシュ値 → プレフィックス
+        self._prefixes = {nshash: prefix for nshash, prefix, *_ in _confd.get_nslist()}
+        # id(ノード) → (ノード, 読み出す子のノード)。ノードも持っておき、id が使い回されないようにする
+        self._children: Dict[int, Tuple[Any, List[Any]]] = {}
+        self._lock = threading.Lock()
+
+        self.get_values_calls = 0
+        self.cursors = 0
+        self.entries = 0
+
+    # -------------------------------------------------------------------------
+    # 作業の単位への分割
+    # -------------------------------------------------------------------------
+
+    def plan(self, paths: Iterable[str], result: Dict[str, Any]) -> List[Task]:
+        """*paths* を読み出す作業の単位を作る。値は実行したときに *result* に入る"""
+        tasks: List[Task] = []
+        groups: Dict[str, List[Tuple[str, Any]]] = {}
+        for path in paths:
+            path = path.rstrip("/") or "/"
+            result[path] = None
+            node = _confd.cs_node_cd(None, path)
+            if node.is_leaf() or node.is_leaf_list():
+                # 同じ親の leaf は 1 回の get_values() で読む
+                parent, _ = split_path(path)
+                groups.setdefault(parent, []).append((path, node))
+            elif node.is_list() and not path.endswith("}"):
+                tasks.append(self._list_task(path, node, self._putter(result, path)))
+            else:
+                tasks.append(self._subtree_task(path, node, self._putter(result, path)))
+
+        for parent, leaves in groups.items():
+            tasks.append(self._leaves_task(parent, leaves, result))
+        return tasks
+
+    @staticmethod
+    def _putter(target: Any, key: Any) -> Put:
+        def put(value: Any) -> None:
+            target[key] = value
+        return put
+
+    def _readable(self, node: Any) -> List[Any]:
+        """*node* の子で、読み出すもの (アクションと通知、設定のデータストアでは運用データを除く)"""
+        with self._lock:
+            entry = self._children.get(id(node))
+            if entry is None:
+                children = []
+                child = node.children()
+                while child is not None:
+                    if not (child.is_action() or child.is_notif()
+                            or (child.is_oper() and self.db != _confd.OPERATIONAL)):
+                        children.append(child)
+                    child = child.next()
+                entry = self._children[id(node)] = (node, children)
+            return entry[1]
+
+    def _name(self, node: Any, parent_ns: int) -> str:
+        """結果の dict のキー (名前空間が親と異なる場合はプレフィックスを付ける)"""
+        name = _confd.hash2str(node.tag())
+        if node.ns() == parent_ns:
+            return name
+        return f"{self._prefixes.get(node.ns(), '')}:{name}"
+
+    # -------------------------------------------------------------------------
+    # 作業の単位
+    # -------------------------------------------------------------------------
+
+    def _get_values(self, sock: socket.socket, th: int, values: List[Any], path: str) -> Optional[List[Any]]:
+        """get_values() で読む。親が無い場合は None"""
+        with self._lock:
+            self.get_values_calls += 1
+        try:
+            return maapi.get_values(sock, th, values, path)
+        except _confd.error.Error as e:
+            if e.confd_errno in _MISSING:
+                return None
+            raise
+
+    def _leaves_task(self, parent: str, leaves: List[Tuple[str, Any]], result: Dict[str, Any]) -> Task:
+        def run(sock: socket.socket, th: int) -> None:
+            if not parent:
+                # トップレベルの leaf は親のキーパスが無いので、1 つずつ読む
+                for path, _ in leaves:
+                    try:
+                        result[path] = _leaf(maapi.get_elem(sock, th, path))
+                    except _confd.error.Error as e:
+                        if e.confd_errno not in _MISSING:
+                            raise
+                return
+            request = [_confd.TagValue(_confd.XmlTag(node.ns(), node.tag()),
+                                       _confd.Value(None, _confd.C_NOEXISTS))
+                       for _, node in leaves]
+            values = self._get_values(sock, th, request, parent)
+            if values is not None:
+                for (path, _), tag_value in zip(leaves, values):
+                    result[path] = _leaf(tag_value.v)
+        return run
+
+    def _subtree_task(self, path: str, node: Any, put: Put) -> Task:
+        """コンテナかリストのエントリの中を 1 回の get_values() で読む"""
+        def run(sock: socket.socket, th: int) -> None:
+            request: List[Any] = []
+            # request の位置ごとに、値を置く先 (dict, キー)。C_XMLEND の位置は None
+            places: List[Optional[Tuple[Dict[str, Any], str]]] = []
+            later: List[Tuple[str, Any, Put]] = []
+            data: Dict[str, Any] = {}
+            self._request(node, path, data, request, places, later)
+
+            if request:
+                values = self._get_values(sock, th, request, path)
+                if values is None:
+                    return
+                for place, tag_value in zip(places, values):
+                    if place is not None:
+                        value = _leaf(tag_value.v)
+                        if value is not None:
+                            place[0][place[1]] = value
+            elif not maapi.exists(sock, th, path):
+                return
+
+            put(data)
+            # リストとプレゼンスコンテナは、見つかった順に別の作業として読む
+            for child_path, child, child_put in later:
+                if child.is_list():
+                    self.submit(self._list_task(child_path, child, child_put))
+                else:
+                    self.submit(self._subtree_task(child_path, child, child_put))
+        return run
+
+    def _request(self, node: Any, path: str, data: Dict[str, Any], request: List[Any],
+                 places: List[Optional[Tuple[Dict[str, Any], str]]],
+                 later: List[Tuple[str, Any, Put]]) -> None:
+        ns = node.ns()
+        for child in self._readable(node):
+            name = self._name(child, ns)
+            child_path = f"{path.rstrip('/')}/{name}"
+            xml_tag = _confd.XmlTag(child.ns(), child.tag())
+            if child.is_leaf() or child.is_leaf_list():
+                request.append(_confd.TagValue(xml_tag, _confd.Value(None, _confd.C_NOEXISTS)))
+                places.append((data, name))
+            elif child.is_list() or child.is_p_container():
+                later.append((child_path, child, self._putter(data, name)))
+            else:
+                inner: Dict[str, Any] = {}
+                data[name] = inner
+                begin = len(request)
+                request.append(_confd.TagValue(
+                    xml_tag, _confd.Value((child.tag(), child.ns()), _confd.C_XMLBEGIN)))
+                places.append(None)
+                self._request(child, child_path, inner, request, places, later)
+                if len(request) == begin + 1:
+                    # 読むものが無いコンテナ (子がリストだけなど) は get_values() に入れない
+                    del request[begin:], places[begin:]
+                    continue
+                request.append(_confd.TagValue(
+                    xml_tag, _confd.Value((child.tag(), child.ns()), _confd.C_XMLEND)))
+                places.append(None)
+
+    def _list_task(self, path: str, node: Any, put: Put) -> Task:
+        """リストのキーをカーソルで読み、エントリごとの作業を作る"""
+        def run(sock: socket.socket, th: int) -> None:
+            entries: List[Any] = []
+            with self._lock:
+                self.cursors += 1
+            try:
+                cursor = maapi.init_cursor(sock, th, path)
+            except _confd.error.Error as e:
+                if e.confd_errno in _MISSING:
+                    return
+                raise
+            try:
+                while True:
+                    keys = maapi.get_next(cursor)
+                    if not keys:
+                        break
+                    texts = " ".join(bulk_config.quote_key(str(key)) for key in keys)
+                    entries.append((f"{path}{{{texts}}}", len(entries)))
+            finally:
+                maapi.destroy_cursor(cursor)
+
+            items: List[Any] = [None] * len(entries)
+            put(items)
+            with self._lock:
+                self.entries += len(entries)
+            for entry_path, i in entries:
+                self.submit(self._subtree_task(entry_path, node, self._putter(items, i)))
+        return run
+
+    # -------------------------------------------------------------------------
+    # 実行
+    # -------------------------------------------------------------------------
+
+    def submit(self, task: Task) -> None:
+        """作業を追加する (実行中の作業から呼ぶ)"""
+        self._queue.put(task)
+
+    def run_inline(self, sock: socket.socket, th: int, tasks: List[Task]) -> None:
+        """開始済みのトランザクションで、作業を順に実行する"""
+        self._queue: "queue.Queue[Optional[Task]]" = queue.Queue()
+        for task in tasks:
+            self.submit(task)
+        while True:
+            try:
+                task = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            task(sock, th)
+
+    def run(self, pool: maapi_pool.MaapiPool, tasks: List[Task]) -> None:
+        """workers 個のスレッドで、それぞれプールのトランザクションを使って作業を実行する
+
+        最初に起きたエラーを、すべてのスレッドが終わってから送出する。
+        """
+        self._queue = queue.Queue()
+        for task in tasks:
+            self.submit(task)
+        errors: List[BaseException] = []
+
+        def worker(sock: socket.socket, th: int) -> None:
+            while True:
+                task = self._queue.get()
+                try:
+                    if task is None:
+                        return
+                    if not errors:
+                        task(sock, th)
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    self._queue.task_done()
+
+        def start() -> None:
+            started = False
+            try:
+                with pool.transaction(self.db, _confd.READ) as (sock, th):
+                    started = True
+                    worker(sock, th)
+            except Exception as e:
+                errors.append(e)
+                if not started:
+                    # トランザクションを開始できなかった場合も、残りの作業を片付ける
+                    worker(None, 0)
+
+        # リストのエントリは実行中に増えるので、作業の数にかかわらず workers 個のスレッドを使う
+        threads = [threading.Thread(target=start, daemon=True) for _ in range(self.workers)]
+        for t in threads:
+            t.start()
+        # 作業の中で追加された作業も含めて、すべて終わるのを待つ
+        self._queue.join()
+        for _ in threads:
+            self._queue.put(None)
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+
+
+def read(pool: maapi_pool.MaapiPool, paths: Iterable[str],
+         db: int = _confd.RUNNING, workers: Optional[int] = None) -> Dict[str, Any]:
+    """*paths* を、プールの複数の READ のトランザクションで並行して読み出す
+
+    workers を省略した場合は、プールの size と同じ数のトランザクションを使う。
+    """
+    reader = FanoutReader(db, workers or pool.size)
+    result: Dict[str, Any] = {}
+    reader.run(pool, reader.plan(paths, result))
+    return result
+
+
+def read_values(sock: socket.socket, th: int, paths: Iterable[str]) -> Dict[str, Any]:
+    """*paths* を、開始済みのトランザクション *th* で (並行せずに) 読み出す"""
+    reader = FanoutReader(workers=1)
+    result: Dict[str, Any] = {}
+    reader.run_inline(sock, th, reader.plan(paths, result))
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Read leaves and subtrees through parallel MAAPI read transactions")
+    parser.add_argument("paths", nargs="+", help="keypaths of leaves, containers, lists or list entries")
+    parser.add_argument("--workers", type=int, default=maapi_pool.DEFAULT_SIZE,
+                        help=f"parallel read transactions (default: {maapi_pool.DEFAULT_SIZE})")
+    parser.add_argument("--operational", action="store_true",
+                        help="read the operational datastore instead of running")
+    args = parser.parse_args()
+
+    db = _confd.OPERATIONAL if args.operational else _confd.RUNNING
+    start = time.perf_counter()
+    try:
+        with maapi_pool.MaapiPool(size=args.workers, context="bulk-read") as pool:
+            reader = FanoutReader(db, args.workers)
+            result: Dict[str, Any] = {}
+            reader.run(pool, reader.plan(args.paths, result))
+    except (OSError, TimeoutError, _confd.error.Error) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    print(f"Read {len(args.paths)} paths ({reader.entries} list entries) in {elapsed:.2f}s: "
+          f"get_values {reader.get_values_calls}, cursors {reader.cursors}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -11,9 +11,11 @@ YANG モジュール (yang/example.yang):
 
 動き:
 - ConfD に MAAPI で接続し、running データストア上の /demo 以下を操作
+- 既存の message / last-updated を読み出す
 - demo コンテナが存在しない場合は作成し、初期値を書き込む
-- 既存の message / last-updated を読み出して表示
-- last-updated を現在時刻で更新してコミット
+- last-updated を現在時刻で更新してコミット (読み出した値が別のクライアントに
+  変更されていたら、やり直す。maapi_rmw.py)
+- 読み出した値と、書き込んだ値 (初回は初期値) を表示
 
 使い方:
 - このディレクトリで `make init && make all && make start` を実行して ConfD を起動
@@ -24,6 +26,7 @@ YANG モジュール (yang/example.yang):
 import socket
 import sys
 from datetime import datetime
+from typing import Optional
 
 try:
     import _confd  # type: ignore
@@ -33,6 +36,11 @@ except ImportError as e:  # pragma: no cover - 実行環境依存
     print("Make sure ConfD is installed and PYTHONPATH is set correctly.")
     sys.exit(1)
 
+import bulk_config
+import bulk_read
+import maapi_pool
+import maapi_rmw
+
 CONFD_HOST = "127.0.0.1"
 CONFD_PORT = _confd.CONFD_PORT
 
@@ -42,18 +50,21 @@ DEMO_PATH = "/demo"
 MESSAGE_PATH = "/demo/message"
 LAST_UPDATED_PATH = "/demo/last-updated"
 
+# /demo が無い場合に書き込む message
+INITIAL_MESSAGE = "Hello from MAAPI!"
+
 
 def connect_maapi() -> socket.socket:
     """MAAPI ソケットに接続し、スキーマを読み込んで返す"""
     sock = socket.socket()
     # maapi_example.py と同様のスタイルで接続
     maapi.connect(sock=sock, ip=CONFD_HOST, port=CONFD_PORT)
-    maapi.load_schemas(sock)
+    maapi_pool.load_schemas_once(sock)
     return sock
 
 
-def start_rw_trans(sock: socket.socket) -> int:
-    """running データストアに対する READ_WRITE トランザクションを開始"""
+def start_session(sock: socket.socket) -> None:
+    """ユーザセッションを開始する (トランザクションは maapi_rmw.run() が開始する)"""
     user = "admin"
     groups = ["admin"]
     context = "maapi-demo"
@@ -68,34 +79,30 @@ def start_rw_trans(sock: socket.socket) -> int:
         _confd.PROTO_TCP,
     )
 
-    # running に対する書き込み可能トランザクションを開始
-    th = maapi.start_trans(sock, _confd.RUNNING, _confd.READ_WRITE)
-    return th
 
+def ensure_demo_exists(sock: socket.socket, th: int) -> Optional[str]:
+    """/demo が存在しなければ、初期値を書き込んで、その message を返す (存在すれば None)"""
 
-def ensure_demo_exists(sock: socket.socket, th: int) -> None:
-    """/demo が存在しなければ作成し、初期値を書き込む"""
-
-    if not maapi.exists(sock, th, DEMO_PATH):
-        # コンテナ demo を作成
-        maapi.create(sock, th, DEMO_PATH)
-        # 初期メッセージとタイムスタンプを書き込み
-        maapi.set_elem(sock, th, "Hello from MAAPI!", MESSAGE_PATH)
-        now = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
-        maapi.set_elem(sock, th, now, LAST_UPDATED_PATH)
+    if maapi.exists(sock, th, DEMO_PATH):
+        return None
+    # 初期メッセージとタイムスタンプを、leaf ごとの set_elem ではなく
+    # 1 回の set_values でまとめて書き込む (bulk_config.py)
+    now = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    bulk_config.BulkLoader(sock, th).load({
+        "demo": {
+            "message": INITIAL_MESSAGE,
+            "last-updated": now,
+        },
+    })
+    return INITIAL_MESSAGE
 
 
-def read_demo(sock: socket.socket, th: int) -> tuple[str, str]:
+def read_demo(txn: maapi_rmw.Transaction) -> tuple[str, str]:
     """/demo/message と /demo/last-updated を読み出す"""
-    msg = ""
-    ts = ""
-
-    if maapi.exists(sock, th, MESSAGE_PATH):
-        msg = str(maapi.get_elem(sock, th, MESSAGE_PATH))
-    if maapi.exists(sock, th, LAST_UPDATED_PATH):
-        ts = str(maapi.get_elem(sock, th, LAST_UPDATED_PATH))
-
-    return msg, ts
+    # leaf ごとの exists + get_elem ではなく、1 回の get_values でまとめて読む (bulk_read.py)。
+    # txn で読んだ値は、適用する前に maapi_rmw が読み直して、変わっていないか確かめる
+    values = txn.read([MESSAGE_PATH, LAST_UPDATED_PATH])
+    return values[MESSAGE_PATH] or "", values[LAST_UPDATED_PATH] or ""
 
 
 def update_last_updated(sock: socket.socket, th: int) -> str:
@@ -108,27 +115,31 @@ def update_last_updated(sock: socket.socket, th: int) -> str:
 def main() -> int:
     sock = connect_maapi()
     try:
-        th = start_rw_trans(sock)
+        start_session(sock)
 
-        # /demo が無ければ作成して初期値投入
-        ensure_demo_exists(sock, th)
+        def touch(txn: maapi_rmw.Transaction) -> tuple[str, str, str, str]:
+            # 現在値を読み出し (/demo が無ければ空のまま)。
+            # 書き込んだ後に読むと必ず競合になるので、読み出しは書き込みより先に行う
+            msg, ts = read_demo(txn)
 
-        # 現在値を読み出し
-        msg, ts = read_demo(sock, th)
-        print("[before]")
-        print(f"  message      : {msg}")
-        print(f"  last-updated : {ts}")
+            # /demo が無ければ作成して初期値投入 (その場合は初期値が更新後の message)
+            new_msg = ensure_demo_exists(txn.sock, txn.th) or msg
 
-        # last-updated を更新
-        new_ts = update_last_updated(sock, th)
+            # last-updated を更新
+            return msg, ts, new_msg, update_last_updated(txn.sock, txn.th)
 
-        # 変更を適用
-        maapi.apply_trans(sock, th, False)
-        maapi.finish_trans(sock, th)
+        # トランザクションを開始して touch を実行し、変更を適用する。
+        # 読み出してから適用するまでに別のクライアントが /demo を変更していたら、やり直す
+        metrics = maapi_rmw.Metrics()
+        msg, ts, new_msg, new_ts = maapi_rmw.run(sock, touch, metrics=metrics)
 
-        print("[after]")
+        print("[before]")
         print(f"  message      : {msg}")
+        print(f"  last-updated : {ts}")
+        print("[after]")
+        print(f"  message      : {new_msg}")
         print(f"  last-updated : {new_ts}")
+        print(f"  attempts     : {metrics.attempts}")
 
     finally:
         try:
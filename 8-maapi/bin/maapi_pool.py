@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""MAAPI connection pool
+
+MAAPI のソケット (ユーザセッション付き) を使い回すためのプールです。
+
+maapi_demo.py の connect_maapi() は、実行のたびに次の処理をします。
+
+- ソケットを開いて maapi.connect()
+- maapi.load_schemas() (スキーマの量によっては、これだけで数百ミリ秒から数秒かかる)
+- maapi.start_user_session()
+
+小さな読み書きを何千回も繰り返す自動化のスクリプトでは、この準備の時間が処理の大半を占めます。
+MaapiPool は次のようにして、その時間を 1 回分にまとめます。
+
+- スキーマはプロセスで 1 回だけ読み込む (load_schemas_once())。
+  読み込んだスキーマはプロセス全体で共有されるので、2 本目以降のソケットでは読み込まない
+- ユーザセッションを開始したソケットを最大 size 本まで作り、返却されたものを次の利用者に渡す
+- 利用者には transaction() でトランザクションを渡す。トランザクションは毎回 start_trans() で
+  開始し、ブロックを抜けるときに apply_trans() / finish_trans() で終える
+  (1 本のソケットを同時に使うのは 1 つのスレッドだけ)
+- 壊れたソケット (ConfD の再起動などで finish_trans() が失敗したもの) はプールに戻さずに閉じる。
+  貸し出すときに start_trans() が失敗した場合は、新しいソケットで 1 回だけやり直す
+
+使い方:
+
+    import maapi_pool
+
+    pool = maapi_pool.MaapiPool(size=4, context="automation")
+    try:
+        for i in range(1000):
+            # ブロックを正常に抜けると apply_trans()、例外の場合は適用せずに終える
+            with pool.transaction() as (sock, th):
+                maapi.set_elem(sock, th, f"message {i}", "/demo/message")
+
+        # 読み出しだけ
+        with pool.transaction(mode=_confd.READ) as (sock, th):
+            print(maapi.get_elem(sock, th, "/demo/message"))
+    finally:
+        pool.close()
+
+コマンドラインから実行すると、/demo/last-updated の読み出しと書き込みを繰り返して、
+プールを使う場合と、1 回ごとに接続する場合の時間を比べます。
+
+    python bin/maapi_pool.py --cycles 1000 --threads 4
+    python bin/maapi_pool.py --cycles 100 --no-pool
+"""
+
+import argparse
+import socket
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+
+try:
+    import _confd  # type: ignore
+    import _confd.maapi as maapi  # type: ignore
+except ImportError as e:  # pragma: no cover - 実行環境依存
+    print(f"Error: Could not import ConfD Python modules: {e}")
+    print("Make sure ConfD is installed and PYTHONPATH is set correctly.")
+    sys.exit(1)
+
+CONFD_HOST = "127.0.0.1"
+CONFD_PORT = _confd.CONFD_PORT
+
+DEFAULT_SIZE = 4
+
+# 貸し出しを待つ時間の既定値 (秒)
+DEFAULT_TIMEOUT = 30.0
+
+LAST_UPDATED_PATH = "/demo/last-updated"
+
+_schemas_lock = threading.Lock()
+_schemas_loaded = False
+
+
+def load_schemas_once(sock: socket.socket) -> None:
+    """プロセスでまだ読み込んでいなければ、*sock* でスキーマを読み込む"""
+    global _schemas_loaded
+    if _schemas_loaded:
+        return
+    with _schemas_lock:
+        if not _schemas_loaded:
+            maapi.load_schemas(sock)
+            _schemas_loaded = True
+
+
+class PoolClosed(Exception):
+    """close() したプールから借りようとした"""
+
+
+class MaapiPool:
+    """ユーザセッション付きの MAAPI ソケットのプール (スレッドセーフ)"""
+
+    def __init__(self, size: int = DEFAULT_SIZE, user: str = "admin",
+                 groups: Optional[List[str]] = None, context: str = "maapi-pool",
+                 host: str = CONFD_HOST, port: int = CONFD_PORT,
+                 timeout: float = DEFAULT_TIMEOUT) -> None:
+        if size < 1:
+            raise ValueError(f"size must be at least 1: {size}")
+        self.size = size
+        self.user = user
+        self.groups = groups if groups is not None else [user]
+        self.context = context
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+        # 待機中のソケット。最後に返されたものから貸す (使っていないソケットを増やさない)
+        self._idle: List[socket.socket] = []
+        # 作ってよいソケットの残り (貸し出し中と待機中の合計が size を超えないように)
+        self._free = size
+        # 待機中のソケットと _free の変化 (返却、破棄) を、借りるのを待っているスレッドに知らせる
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._all: List[socket.socket] = []
+        self._closed = False
+
+        # 作ったソケットの数 (ベンチマークや確認用)
+        self.opened = 0
+
+    def _open(self) -> socket.socket:
+        """新しいソケットを接続し、ユーザセッションを開始する"""
+        sock = socket.socket()
+        try:
+            maapi.connect(sock=sock, ip=self.host, port=self.port)
+            load_schemas_once(sock)
+            maapi.start_user_session(sock, self.user, self.context, self.groups,
+                                     self.host, _confd.PROTO_TCP)
+        except BaseException:
+            sock.close()
+            raise
+        with self._lock:
+            self._all.append(sock)
+            self.opened += 1
+        return sock
+
+    def _discard(self, sock: socket.socket) -> None:
+        """壊れたソケットを閉じて、作れる数を 1 つ戻す (待っているスレッドが新しく作れる)"""
+        with self._changed:
+            if sock in self._all:
+                self._all.remove(sock)
+            self._free += 1
+            self._changed.notify()
+        sock.close()
+
+    def _acquire(self) -> Tuple[socket.socket, bool]:
+        """ソケットを借りる。待機中のものが無く、まだ作れる場合は作る
+
+        戻り値の 2 つ目は、使い回したソケットかどうか
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._changed:
+            while True:
+                if self._closed:
+                    raise PoolClosed("the MAAPI pool is closed")
+                if self._idle:
+                    return self._idle.pop(), True
+                if self._free > 0:
+                    self._free -= 1
+                    break
+                # size 本すべてが貸し出し中なので、返却か破棄を待つ
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"no MAAPI session became free within {self.timeout}s")
+                self._changed.wait(remaining)
+
+        # 接続には時間がかかるので、ロックの外で作る
+        try:
+            return self._open(), False
+        except BaseException:
+            with self._changed:
+                self._free += 1
+                self._changed.notify()
+            raise
+
+    def _release(self, sock: socket.socket) -> None:
+        with self._changed:
+            if not self._closed:
+                self._idle.append(sock)
+                self._changed.notify()
+                return
+        self._discard(sock)
+
+    @contextmanager
+    def session(self) -> Iterator[socket.socket]:
+        """ユーザセッション付きのソケットを借りる
+
+        トランザクションは借りた側で開始し、返す前に finish_trans() で終えること。
+        ブロックの中で例外が起きた場合は、ソケットを閉じる (状態がわからないため)。
+        """
+        sock, _ = self._acquire()
+        try:
+            yield sock
+        except BaseException:
+            self._discard(sock)
+            raise
+        self._release(sock)
+
+    @contextmanager
+    def transaction(self, db: int = _confd.RUNNING, mode: int = _confd.READ_WRITE,
+                    apply: bool = True) -> Iterator[Tuple[socket.socket, int]]:
+        """トランザクションを開始して (sock, th) を渡す
+
+        ブロックを正常に抜けると、READ_WRITE で apply=True なら apply_trans() してから
+        finish_trans() する。例外の場合は適用せずに finish_trans() する
+        (apply_trans() の検証エラーなども、そのまま呼び出し側に伝わる)。
+        """
+        sock, reused = self._acquire()
+        try:
+            th = maapi.start_trans(sock, db, mode)
+        except (OSError, _confd.error.Error):
+            self._discard(sock)
+            if not reused:
+                raise
+            # 待機中に切れていたソケット。新しいソケットで 1 回だけやり直す
+            sock, _ = self._acquire()
+            try:
+                th = maapi.start_trans(sock, db, mode)
+            except BaseException:
+                self._discard(sock)
+                raise
+
+        try:
+            yield sock, th
+            if apply and mode == _confd.READ_WRITE:
+                maapi.apply_trans(sock, th, False)
+        finally:
+            try:
+                maapi.finish_trans(sock, th)
+            except (OSError, _confd.error.Error):
+                self._discard(sock)
+                sock = None
+            if sock is not None:
+                self._release(sock)
+
+    def close(self) -> None:
+        """待機中のソケットのユーザセッションを終えて閉じる
+
+        貸し出し中のソケットは、返却されたときに閉じる。
+        """
+        with self._changed:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            # 待っているスレッドには PoolClosed を送出させる
+            self._changed.notify_all()
+        for sock in idle:
+            try:
+                maapi.end_user_session(sock)
+            except Exception:
+                pass
+            self._discard(sock)
+
+    def __enter__(self) -> "MaapiPool":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def touch_last_updated(sock: socket.socket, th: int) -> None:
+    """/demo/last-updated を読み出して、現在時刻で書き換える (ベンチマークの 1 回分)"""
+    if maapi.exists(sock, th, LAST_UPDATED_PATH):
+        maapi.get_elem(sock, th, LAST_UPDATED_PATH)
+    now = datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+    maapi.set_elem(sock, th, now, LAST_UPDATED_PATH)
+
+
+def run_unpooled(cycles: int) -> None:
+    """1 回ごとに接続、スキーマの読み込み、ユーザセッションの開始をする (比較用)"""
+    for _ in range(cycles):
+        sock = socket.socket()
+        try:
+            maapi.connect(sock=sock, ip=CONFD_HOST, port=CONFD_PORT)
+            maapi.load_schemas(sock)
+            maapi.start_user_session(sock, "admin", "maapi-pool", ["admin"],
+                                     CONFD_HOST, _confd.PROTO_TCP)
+            th = maapi.start_trans(sock, _confd.RUNNING, _confd.READ_WRITE)
+            try:
+                touch_last_updated(sock, th)
+                maapi.apply_trans(sock, th, False)
+            finally:
+                maapi.finish_trans(sock, th)
+            maapi.end_user_session(sock)
+        finally:
+            sock.close()
+
+
+def run_pooled(pool: MaapiPool, cycles: int, threads: int) -> None:
+    """*threads* 個のスレッドで、合わせて *cycles* 回の読み書きをする"""
+    counter = iter(range(cycles))
+    counter_lock = threading.Lock()
+    errors: List[BaseException] = []
+
+    def worker() -> None:
+        while True:
+            with counter_lock:
+                if next(counter, None) is None:
+                    return
+            try:
+                with pool.transaction() as (sock, th):
+                    touch_last_updated(sock, th)
+            except Exception as e:
+                errors.append(e)
+                return
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    if errors:
+        raise errors[0]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Time read/modify/write cycles on /demo with and without a MAAPI pool")
+    parser.add_argument("--cycles", type=int, default=1000, help="number of transactions (default: 1000)")
+    parser.add_argument("--threads", type=int, default=1, help="worker threads sharing the pool (default: 1)")
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE,
+                        help=f"max sessions in the pool (default: {DEFAULT_SIZE})")
+    parser.add_argument("--no-pool", action="store_true",
+                        help="connect, load schemas and start a session for every cycle")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        if args.no_pool:
+            run_unpooled(args.cycles)
+            sessions = args.cycles
+        else:
+            with MaapiPool(size=args.size) as pool:
+                run_pooled(pool, args.cycles, args.threads)
+                sessions = pool.opened
+    except (OSError, TimeoutError, _confd.error.Error) as e:
+        print(f"Error: {e}")
+        return 1
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.cycles} transactions in {elapsed:.2f}s "
+          f"({args.cycles / elapsed:.1f}/s, {sessions} sessions)")
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
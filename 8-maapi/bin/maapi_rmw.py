@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""Read-modify-write with retry (MAAPI)
+
+関数をトランザクションの中で実行し、適用するときに競合を見つけたらやり直すモジュールです。
+
+maapi_demo.py の main() は、値を読み出して last-updated を書き換え、そのまま apply_trans() します。
+読み出してから適用するまでの間に別のクライアントがコミットしていても気付かないので、
+並行して動く自動化のスクリプトどうしで、相手の変更を上書きしてしまいます。
+maapi.lock() で running をロックすれば防げますが、書き込むクライアントがすべて 1 列に並びます。
+
+run() はロックを取らずに、次のように楽観的に実行します。
+
+1. READ_WRITE のトランザクションを開始し、関数 fn(txn) を呼ぶ。
+   fn は txn.read() / txn.get() で値を読み、txn.sock / txn.th で書き込む
+2. 適用する前に、同じソケットで別の READ のトランザクションを開始して、fn が txn で読んだ
+   パスを読み直す。値が変わっていれば競合として、適用せずにトランザクションを終える
+3. apply_trans() する。ConfD が競合やロックのエラー (ERR_TRANSACTION_CONFLICT、
+   ERR_INUSE、ERR_LOCKED) を返した場合も競合として扱う
+4. 競合した場合は、待ち時間 (指数的に延ばし、ゆらぎを入れる) の後で 1 からやり直す。
+   retries 回やり直しても競合する場合は ConflictError を送出する
+
+fn はやり直しで何回か呼ばれるので、トランザクションの外に副作用を残さないこと。
+2 の読み直しから 3 の適用までの間にコミットされた変更は 2 では見つからないので、
+その間の競合は ConfD が返すエラーに頼ります。
+
+呼び出しごとの時間、試行の回数、競合の回数は Metrics に集計されます。
+
+使い方:
+
+    import maapi_rmw
+    import maapi_pool
+
+    def bump(txn):
+        count = int(txn.get("/demo/message") or 0)
+        maapi.set_elem(txn.sock, txn.th, str(count + 1), "/demo/message")
+        return count + 1
+
+    metrics = maapi_rmw.Metrics()
+    with maapi_pool.MaapiPool(size=4) as pool:
+        value = maapi_rmw.run_pooled(pool, bump, metrics=metrics)
+    print(metrics.summary())
+
+コマンドラインから実行すると、複数のスレッドで /demo/message のカウンタを 1 ずつ増やし、
+最後の値と集計を表示します (増えた数が回数と一致すれば、上書きは起きていない)。
+
+    python bin/maapi_rmw.py --threads 8 --cycles 100
+"""
+
+import argparse
+import collections
+import random
+import socket
+import sys
+import threading
+import time
+
+from typing import Any, Callable, Deque, Dict, Iterable, Optional
+
+try:
+    import _confd  # type: ignore
+    import _confd.maapi as maapi  # type: ignore
+except ImportError as e:  # pragma: no cover - 実行環境依存
+    print(f"Error: Could not import ConfD Python modules: {e}")
+    print("Make sure ConfD is installed and PYTHONPATH is set correctly.")
+    sys.exit(1)
+
+import bulk_read
+import maapi_pool
+
+DEFAULT_RETRIES = 5
+# 最初のやり直しの前に待つ時間の上限 (秒)。やり直すごとに 2 倍にする
+DEFAULT_BACKOFF = 0.02
+DEFAULT_MAX_BACKOFF = 1.0
+
+# apply_trans() が返したときに、競合としてやり直すエラー
+# (ERR_TRANSACTION_CONFLICT は、ConfD のバージョンによっては定義されていない)
+_CONFLICT_ERRORS = tuple(
+    getattr(_confd, name) for name in ("ERR_TRANSACTION_CONFLICT", "ERR_INUSE", "ERR_LOCKED")
+    if hasattr(_confd, name))
+
+COUNTER_PATH = "/demo/message"
+
+
+class ConflictError(Exception):
+    """やり直しても競合した"""
+
+    def __init__(self, attempts: int, reason: str) -> None:
+        super().__init__(f"gave up after {attempts} attempts: {reason}")
+        self.attempts = attempts
+        self.reason = reason
+
+
+class _Conflict(Exception):
+    """この試行で競合を見つけた (run() の中だけで使う)"""
+
+
+class Transaction:
+    """fn に渡すトランザクション。txn で読んだ値は、適用する前に読み直して確かめる"""
+
+    def __init__(self, sock: socket.socket, th: int, db: int) -> None:
+        self.sock = sock
+        self.th = th
+        self.db = db
+        # 読んだパス → 値 (bulk_read と同じ形)
+        self.reads: Dict[str, Any] = {}
+
+    def read(self, paths: Iterable[str]) -> Dict[str, Any]:
+        """*paths* (leaf やサブツリー) を読み出す。bulk_read.read_values() と同じ
+
+        最初に読んだ値を覚えておき、適用する前に読み直して比べる。
+        自分で書き込んだ後に読むと必ず競合になるので、読むのは書き込む前にすること。
+        """
+        values = bulk_read.read_values(self.sock, self.th, paths)
+        for path, value in values.items():
+            self.reads.setdefault(path, value)
+        return values
+
+    def get(self, path: str) -> Any:
+        """leaf を 1 つ読み出す。無ければ None"""
+        return self.read([path])[path.rstrip("/") or "/"]
+
+    def changed(self) -> Optional[str]:
+        """読んだ値が、別のトランザクションのコミットで変わっていれば、そのパス"""
+        if not self.reads:
+            return None
+        th = maapi.start_trans(self.sock, self.db, _confd.READ)
+        try:
+            current = bulk_read.read_values(self.sock, th, self.reads)
+        finally:
+            maapi.finish_trans(self.sock, th)
+        for path, value in self.reads.items():
+            if current.get(path) != value:
+                return path
+        return None
+
+
+class Metrics:
+    """run() の呼び出しごとの時間と試行の回数の集計 (スレッドセーフ)
+
+    時間は最後の *window* 回分だけを持つ。
+    """
+
+    def __init__(self, window: int = 10000) -> None:
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.attempts = 0
+        self.conflicts = 0
+        self.failures = 0
+        self._seconds: Deque[float] = collections.deque(maxlen=window)
+
+    def record(self, attempts: int, conflicts: int, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.calls += 1
+            self.attempts += attempts
+            self.conflicts += conflicts
+            if not ok:
+                self.failures += 1
+            self._seconds.append(seconds)
+
+    def summary(self) -> Dict[str, float]:
+        """回数と、呼び出しの時間の p50 / p99 / 最大 (ミリ秒)"""
+        with self._lock:
+            seconds = sorted(self._seconds)
+            result: Dict[str, float] = {
+                "calls": self.calls,
+                "attempts": self.attempts,
+                "retries": self.attempts - self.calls,
+                "conflicts": self.conflicts,
+                "failures": self.failures,
+            }
+        if seconds:
+            result["p50_ms"] = seconds[len(seconds) // 2] * 1000
+            result["p99_ms"] = seconds[min(len(seconds) - 1, int(len(seconds) * 0.99))] * 1000
+            result["max_ms"] = seconds[-1] * 1000
+        return result
+
+
+def _attempt(sock: socket.socket, fn: Callable[[Transaction], Any], db: int) -> Any:
+    """1 回の試行。競合した場合は _Conflict を送出する (トランザクションは適用せずに終える)"""
+    th = maapi.start_trans(sock, db, _confd.READ_WRITE)
+    try:
+        txn = Transaction(sock, th, db)
+        result = fn(txn)
+        path = txn.changed()
+        if path is not None:
+            raise _Conflict(f"{path} was changed by another transaction")
+        try:
+            maapi.apply_trans(sock, th, False)
+        except _confd.error.Error as e:
+            if e.confd_errno in _CONFLICT_ERRORS:
+                raise _Conflict(str(e)) from e
+            raise
+        return result
+    finally:
+        maapi.finish_trans(sock, th)
+
+
+def run(sock: socket.socket, fn: Callable[[Transaction], Any], db: int = _confd.RUNNING,
+        retries: int = DEFAULT_RETRIES, backoff: float = DEFAULT_BACKOFF,
+        max_backoff: float = DEFAULT_MAX_BACKOFF, metrics: Optional[Metrics] = None) -> Any:
+    """ユーザセッションを開始した *sock* で fn(txn) を実行して適用し、fn の戻り値を返す
+
+    競合した場合は、最大 retries 回やり直す。fn が送出した例外はやり直さずにそのまま伝える。
+    データストアはロックしない。読み直しから apply_trans() までの間にコミットされた変更は
+    読み直しでは見つからず、apply_trans() が返す競合のエラーでしか見つからない。
+    """
+    start = time.perf_counter()
+    attempts = 0
+    conflicts = 0
+    ok = False
+    try:
+        while True:
+            attempts += 1
+            try:
+                result = _attempt(sock, fn, db)
+                ok = True
+                return result
+            except _Conflict as e:
+                conflicts += 1
+                if attempts > retries:
+                    raise ConflictError(attempts, str(e)) from None
+            # 0 から上限までの間でばらつかせて、同時に競合したクライアントがまた揃わないようにする
+            time.sleep(random.uniform(0, min(max_backoff, backoff * 2 ** (attempts - 1))))
+    finally:
+        if metrics is not None:
+            metrics.record(attempts, conflicts, time.perf_counter() - start, ok)
+
+
+def run_pooled(pool: maapi_pool.MaapiPool, fn: Callable[[Transaction], Any], **kwargs: Any) -> Any:
+    """プールのセッションで run() する (やり直しの間もセッションは借りたまま)"""
+    with pool.session() as sock:
+        try:
+            return run(sock, fn, **kwargs)
+        except ConflictError as e:
+            conflict = e
+    # 競合はソケットの問題ではないので、ソケットをプールに返してから送出する
+    raise conflict
+
+
+def read_counter(pool: maapi_pool.MaapiPool) -> Any:
+    with pool.transaction(mode=_confd.READ) as (sock, th):
+        return bulk_read.read_values(sock, th, [COUNTER_PATH])[COUNTER_PATH]
+
+
+def bump_counter(txn: Transaction) -> int:
+    """/demo/message を数として 1 増やす (数でなければ 0 から)"""
+    text = txn.get(COUNTER_PATH) or ""
+    count = int(text) + 1 if text.isdigit() else 1
+    maapi.set_elem(txn.sock, txn.th, str(count), COUNTER_PATH)
+    return count
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Increment /demo/message from several threads with optimistic retries")
+    parser.add_argument("--threads", type=int, default=4, help="concurrent writers (default: 4)")
+    parser.add_argument("--cycles", type=int, default=100, help="increments per writer (default: 100)")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES,
+                        help=f"retries per increment on conflict (default: {DEFAULT_RETRIES})")
+    args = parser.parse_args()
+
+    metrics = Metrics()
+    errors = []
+
+    def writer(pool: maapi_pool.MaapiPool) -> None:
+        for _ in range(args.cycles):
+            try:
+                run_pooled(pool, bump_counter, retries=args.retries, metrics=metrics)
+            except ConflictError:
+                pass
+            except Exception as e:
+                errors.append(e)
+                return
+
+    try:
+        with maapi_pool.MaapiPool(size=args.threads, context="maapi-rmw") as pool:
+            before = read_counter(pool)
+            threads = [threading.Thread(target=writer, args=(pool,)) for _ in range(args.threads)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            after = read_counter(pool)
+    except (OSError, TimeoutError, _confd.error.Error) as e:
+        print(f"Error: {e}")
+        return 1
+    if errors:
+        print(f"Error: {errors[0]}")
+        return 1
+
+    summary = metrics.summary()
+    print(f"{COUNTER_PATH}: {before} -> {after} "
+          f"({summary['calls'] - summary['failures']} increments applied)")
+    print("  " + ", ".join(f"{name}: {value:.2f}" if isinstance(value, float) else f"{name}: {value}"
+                           for name, value in summary.items()))
+    return 0
+
+
+if __name__ == "__main__":  # pragma: no cover
+    raise SystemExit(main())
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+サンプルのデーモンのベンチマーク (ConfD 不要)
+
+ConfD の代わりに FakeConfd (fake_confd.py) を起動し、サンプルのデーモンを
+子プロセス (run_daemon.py) として _confd のスタブで動かして、要求を送り続けます。
+デーモンのコードは本物の ConfD で動かす場合と同じで、FakeConfd とは
+ループバックのソケットでやり取りします。
+
+対象:
+    hello       7-action  tools hello (inline のアクション。cb_action の中で応答する)
+    countdown   7-action  tools countdown seconds 0 (async のアクション。遅延応答になる)
+    ping-stats  3-ping    ping statistics (inline のアクション)
+    ping        3-ping    ping destination 127.0.0.1 count 1 (ICMP をループバックに送る)
+    get-elem    2-state   server-status の uptime / last-checked-at (DataCallbacks.cb_get_elem)
+    subscriber  1-config  server-config/ip-address の変更 → 通知 → 読み取り → sync (Subscriber)
+
+負荷のかけ方:
+- --rate を指定しない場合 (0) は、--concurrency 個の要求を常に実行中にして、
+  応答が届くたびに次を送る (最大のスループット)
+- --rate R を指定すると、1 秒に R 個の決まった時刻に要求を送る。遅延は予定の時刻から測るので、
+  デーモンが追いつかずに送れなかった時間も遅延に含まれる (--concurrency は実行中の上限)
+- subscriber は ConfD と同じく、前の通知の sync が返るまで次の変更を通知しない (並行数は常に 1)
+
+結果として、対象ごとに ops/s、遅延の p50/p99/最大、エラー数、デーモンの RSS (最後/最大) を表示する。
+--json で結果を保存し、--baseline で保存した結果と比べて、スループットが落ちた、
+または p99 が延びた対象があれば終了コード 1 で終わる。
+
+    python3 bench/bench_daemons.py                       # すべての対象を 5 秒ずつ
+    python3 bench/bench_daemons.py hello get-elem -c 8   # 対象を選び、8 並行で
+    python3 bench/bench_daemons.py ping --rate 200 --duration 10
+    python3 bench/bench_daemons.py --json result.json
+    python3 bench/bench_daemons.py --baseline result.json --tolerance 0.3
+"""
+
+import argparse
+import json
+import math
+import os
+import resource
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from fake_confd import DaemonGone, Done, FakeConfd
+
+import _confd  # confd_stub (fake_confd が sys.path に入れる)
+
+import yang_ns
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+
+# デーモンが登録を終えるまで待つ秒数
+STARTUP_TIMEOUT = 15.0
+
+# 計測の終わりに、実行中の要求の応答を待つ秒数
+DRAIN_TIMEOUT = 10.0
+
+# 要求を送る関数: submit(通し番号, 応答を受け取る関数)
+Submit = Callable[[int, Done], None]
+
+
+# =============================================================================
+# 対象
+# =============================================================================
+
+
+class Target(NamedTuple):
+    name: str
+    example: str
+    # FakeConfd と名前空間から、要求を送る関数を作る
+    prepare: Callable[[FakeConfd, Any], Submit]
+    # サブスクライバーは通知を 1 つずつしか処理しない
+    subscriber: bool = False
+
+
+def _tag(ns: Any, name: str) -> Any:
+    return _confd.XmlTag(ns.hash, getattr(ns, f"{ns.prefix}_{name.replace('-', '_')}"))
+
+
+def _param(ns: Any, name: str, value: Any, type: int) -> Any:
+    return _confd.TagValue(_tag(ns, name), _confd.Value(value, type))
+
+
+def _keypath(ns: Any, *names: str) -> Any:
+    # HKeypathRef は末端が先頭
+    return _confd.HKeypathRef([_tag(ns, name) for name in reversed(names)])
+
+
+def prepare_hello(confd: FakeConfd, ns: Any) -> Submit:
+    name, kp = _tag(ns, 'hello'), _keypath(ns, 'tools')
+
+    def submit(i: int, done: Done) -> None:
+        confd.action('hello-python', name, kp, [_param(ns, 'name', f"user{i}", _confd.C_BUF)], done)
+    return submit
+
+
+def prepare_countdown(confd: FakeConfd, ns: Any) -> Submit:
+    name, kp = _tag(ns, 'countdown'), _keypath(ns, 'tools')
+    # YANG の範囲 (1..60) の外だが、FakeConfd は検証しないので待たずに遅延応答の経路だけを通る
+    params = [_param(ns, 'seconds', 0, _confd.C_UINT8)]
+
+    def submit(i: int, done: Done) -> None:
+        confd.action('hello-python', name, kp, params, done)
+    return submit
+
+
+def prepare_ping_stats(confd: FakeConfd, ns: Any) -> Submit:
+    name, kp = _tag(ns, 'statistics'), _keypath(ns, 'ping')
+
+    def submit(i: int, done: Done) -> None:
+        confd.action('ping_action', name, kp, [], done)
+    return submit
+
+
+def prepare_ping(confd: FakeConfd, ns: Any) -> Submit:
+    name, kp = _tag(ns, 'destination'), _keypath(ns, 'ping')
+    params = [_param(ns, 'destination', '127.0.0.1', _confd.C_BUF),
+              _param(ns, 'count', 1, _confd.C_UINT8)]
+
+    def submit(i: int, done: Done) -> None:
+        # 並行する要求はそれぞれ別のユーザーセッションから実行する
+        confd.action('ping_action', name, kp, params, done, user=(f"user{i % 64}", i % 64 + 1, 'cli'))
+    return submit
+
+
+def prepare_get_elem(confd: FakeConfd, ns: Any) -> Submit:
+    keypaths = [_keypath(ns, 'server-status', 'uptime'),
+                _keypath(ns, 'server-status', 'last-checked-at')]
+
+    def submit(i: int, done: Done) -> None:
+        confd.get_elem('server_status_cp', keypaths[i % 2], done)
+    return submit
+
+
+def prepare_subscriber(confd: FakeConfd, ns: Any) -> Submit:
+    path = '/server-config/ip-address'
+    confd.datastore[path] = _confd.Value('192.0.2.1', _confd.C_IPV4)
+
+    def submit(i: int, done: Done) -> None:
+        address = f"10.{i // 62500 % 250}.{i // 250 % 250}.{i % 250 + 1}"
+        confd.commit({path: _confd.Value(address, _confd.C_IPV4)}, done)
+    return submit
+
+
+TARGETS: Dict[str, Target] = {target.name: target for target in [
+    Target('hello', '7-action', prepare_hello),
+    Target('countdown', '7-action', prepare_countdown),
+    Target('ping-stats', '3-ping', prepare_ping_stats),
+    Target('ping', '3-ping', prepare_ping),
+    Target('get-elem', '2-state', prepare_get_elem),
+    Target('subscriber', '1-config', prepare_subscriber, subscriber=True),
+]}
+
+
+# =============================================================================
+# 負荷と計測
+# =============================================================================
+
+
+class Result(NamedTuple):
+    target: str
+    ops: int
+    ops_per_sec: float
+    p50_ms: float
+    p99_ms: float
+    max_ms: float
+    errors: int
+    rss_mib: Optional[float]
+    max_rss_mib: Optional[float]
+    first_error: Optional[str] = None
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """nearest-rank 法のパーセンタイル"""
+    if not sorted_values:
+        return math.nan
+    rank = max(math.ceil(q * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class Load:
+    """要求を送り、予定の時刻から応答までの時間を記録する"""
+
+    def __init__(self, submit: Submit, rate: float, concurrency: int,
+                 warmup: float, duration: float) -> None:
+        self.submit = submit
+        self.rate = rate
+        self.concurrency = concurrency
+        self.warmup = warmup
+        self.duration = duration
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.first_error: Optional[str] = None
+        self._slots = threading.Semaphore(concurrency)
+        self._lock = threading.Lock()
+        self._last_done = 0.0
+
+    def run(self) -> float:
+        """計測の区間の長さ (秒) を返す"""
+        start = time.perf_counter()
+        measure_from = start + self.warmup
+        end = measure_from + self.duration
+        i = 0
+        while True:
+            if self.rate:
+                due = start + i / self.rate
+                if due >= end:
+                    break
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            elif time.perf_counter() >= end:
+                break
+            self._slots.acquire()
+            sent = due if self.rate else time.perf_counter()
+            measured = sent >= measure_from
+            try:
+                self.submit(i, lambda ok, payload, sent=sent, measured=measured:
+                            self._done(ok, payload, sent, measured))
+            except DaemonGone as e:
+                self._done(False, f"daemon is gone: {e}", sent, measured)
+                break
+            i += 1
+
+        # 実行中の要求の応答を待つ (届かなかったものはエラーとして数える)
+        deadline = time.perf_counter() + DRAIN_TIMEOUT
+        for _ in range(self.concurrency):
+            if not self._slots.acquire(timeout=max(deadline - time.perf_counter(), 0)):
+                with self._lock:
+                    self.errors += 1
+                    self.first_error = self.first_error or "no reply before the drain timeout"
+        return max(end, self._last_done) - measure_from
+
+    def _done(self, ok: bool, payload: Any, sent: float, measured: bool) -> None:
+        now = time.perf_counter()
+        self._slots.release()
+        if not measured:
+            return
+        with self._lock:
+            self._last_done = max(self._last_done, now)
+            if ok:
+                self.latencies.append(now - sent)
+            else:
+                self.errors += 1
+                self.first_error = self.first_error or str(payload)
+
+
+def read_rss(pid: int) -> Dict[str, float]:
+    """/proc/<pid>/status の VmRSS (現在) と VmHWM (最大) を MiB で返す (Linux 以外では空)"""
+    values: Dict[str, float] = {}
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in ('VmRSS', 'VmHWM'):
+                    values[key] = int(rest.split()[0]) / 1024
+    except OSError:
+        pass
+    return values
+
+
+def run_target(target: Target, args: argparse.Namespace) -> Result:
+    """デーモンを起動し、負荷をかけて、結果を返す"""
+    confd = FakeConfd()
+    ns = yang_ns.load(REPO_DIR / target.example).ns
+    submit = target.prepare(confd, ns)
+
+    command = [sys.executable, str(BENCH_DIR / 'run_daemon.py'), target.example,
+               '--cache-ttl', str(args.cache_ttl)]
+    env = dict(os.environ, CONFD_BENCH_PORT=str(confd.port))
+    daemon = subprocess.Popen(command, env=env)
+    try:
+        ready = confd.wait_subscribed if target.subscriber else confd.wait_registered
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while not ready(0.1):
+            if daemon.poll() is not None:
+                raise RuntimeError(f"{target.example} daemon exited with status {daemon.returncode}")
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{target.example} daemon did not register within {STARTUP_TIMEOUT:g}s")
+
+        concurrency = 1 if target.subscriber else args.concurrency
+        load = Load(submit, args.rate, concurrency, args.warmup, args.duration)
+        elapsed = load.run()
+        rss = read_rss(daemon.pid)
+    finally:
+        if daemon.poll() is None:
+            daemon.send_signal(signal.SIGTERM)
+            try:
+                daemon.wait(5)
+            except subprocess.TimeoutExpired:
+                daemon.kill()
+                daemon.wait()
+        confd.close()
+
+    if not rss:
+        # /proc が無い場合は、終了した子プロセスの最大 RSS (Linux は KiB、macOS はバイト)
+        maxrss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        rss = {'VmHWM': maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)}
+
+    latencies = sorted(load.latencies)
+    return Result(
+        target=target.name,
+        ops=len(latencies),
+        ops_per_sec=len(latencies) / elapsed if elapsed > 0 else 0.0,
+        p50_ms=percentile(latencies, 0.50) * 1000,
+        p99_ms=percentile(latencies, 0.99) * 1000,
+        max_ms=(latencies[-1] if latencies else math.nan) * 1000,
+        errors=load.errors,
+        rss_mib=rss.get('VmRSS'),
+        max_rss_mib=rss.get('VmHWM'),
+        first_error=load.first_error,
+    )
+
+
+# =============================================================================
+# 結果
+# =============================================================================
+
+
+def _mib(value: Optional[float]) -> str:
+    return f"{value:.1f}" if value is not None else '-'
+
+
+def print_results(results: List[Result]) -> None:
+    print(f"{'target':<12} {'ops':>8} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} "
+          f"{'errors':>7} {'rss MiB':>8} {'max MiB':>8}")
+    for r in results:
+        print(f"{r.target:<12} {r.ops:>8} {r.ops_per_sec:>10.1f} {r.p50_ms:>9.3f} {r.p99_ms:>9.3f} "
+              f"{r.max_ms:>9.3f} {r.errors:>7} {_mib(r.rss_mib):>8} {_mib(r.max_rss_mib):>8}")
+    for r in results:
+        if r.first_error:
+            print(f"{r.target}: first error: {r.first_error}")
+
+
+def compare(results: List[Result], baseline: List[Dict[str, Any]], tolerance: float) -> List[str]:
+    """基準の結果と比べ、悪くなった対象の説明のリストを返す"""
+    base = {entry['target']: entry for entry in baseline}
+    regressions: List[str] = []
+    for r in results:
+        b = base.get(r.target)
+        if b is None:
+            continue
+        if r.ops_per_sec < b['ops_per_sec'] * (1 - tolerance):
+            regressions.append(f"{r.target}: ops/s {b['ops_per_sec']:.1f} -> {r.ops_per_sec:.1f}")
+        if r.p99_ms > b['p99_ms'] * (1 + tolerance):
+            regressions.append(f"{r.target}: p99 {b['p99_ms']:.3f} ms -> {r.p99_ms:.3f} ms")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description='Benchmark the example daemons against a fake ConfD',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog='targets: ' + ', '.join(TARGETS))
+    parser.add_argument('targets', nargs='*', metavar='target',
+                        help='targets to run (default: all)')
+    parser.add_argument('-d', '--duration', type=float, default=5.0,
+                        help='seconds to measure per target (default: 5)')
+    parser.add_argument('-w', '--warmup', type=float, default=1.0,
+                        help='seconds of load before measuring (default: 1)')
+    parser.add_argument('-r', '--rate', type=float, default=0.0,
+                        help='requests per second (default: 0 = as fast as the daemon replies)')
+    parser.add_argument('-c', '--concurrency', type=int, default=1,
+                        help='requests in flight at once (default: 1)')
+    parser.add_argument('--cache-ttl', type=float, default=0.0,
+                        help='3-ping: seconds to keep ping results (default: 0 = no cache)')
+    parser.add_argument('--json', metavar='FILE', type=Path,
+                        help='write the results to FILE as JSON')
+    parser.add_argument('--baseline', metavar='FILE', type=Path,
+                        help='compare with results saved by --json; exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed ops/s drop and p99 increase against --baseline (default: 0.25)')
+    args = parser.parse_args()
+
+    unknown = [name for name in args.targets if name not in TARGETS]
+    if unknown:
+        parser.error(f"unknown target: {', '.join(unknown)} (choose from {', '.join(TARGETS)})")
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    results: List[Result] = []
+    failed = False
+    for name in args.targets or TARGETS:
+        print(f"Running {name} ...", file=sys.stderr)
+        try:
+            results.append(run_target(TARGETS[name], args))
+        except RuntimeError as e:
+            print(f"{name}: {e}", file=sys.stderr)
+            failed = True
+
+    print_results(results)
+
+    if args.json:
+        args.json.write_text(json.dumps([r._asdict() for r in results], indent=2) + '\n')
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        failed = failed or bool(regressions)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,195 @@
+"""
+_confd の代わり (ベンチマーク用のスタブ)
+
+ConfD の無い環境でデーモンのコードを動かすための、ConfD の Python API (_confd) の
+最小限の代わりです。デーモンが使う関数と型だけを、同じ名前と引数で用意しています。
+
+- _confd.dp / _confd.cdb / _confd.maapi は、本物と同じようにソケットで接続し、
+  bench/fake_confd.py の FakeConfd (ConfD の代わりをするサーバー) と要求/応答をやり取りする
+- 接続先のポートは、環境変数 CONFD_BENCH_PORT があればそちらを使う
+  (デーモンのコードに書かれた 4565 のままで、ベンチマークの FakeConfd につながる)
+- 型の番号 (C_BUF など) やエラー番号は、本物と同じ値とは限らない。
+  名前で比較するコードだけが動く前提
+
+このディレクトリを sys.path に入れるのは bench/run_daemon.py だけです
+(本物の _confd がインストールされていても、ベンチマーク以外では隠さない)。
+"""
+
+from typing import Any, Iterable, List
+
+# =============================================================================
+# 戻り値とエラー番号
+# =============================================================================
+
+CONFD_OK = 0
+CONFD_ERR = -1
+CONFD_EOF = -2
+CONFD_DELAYED_RESPONSE = 2
+DELAYED_RESPONSE = CONFD_DELAYED_RESPONSE
+OK = CONFD_OK
+ERR = CONFD_ERR
+EOF = CONFD_EOF
+
+ERR_NOEXISTS = 1
+ERR_BADPATH = 8
+ERR_PROTOUSAGE = 21
+ERR_EXTERNAL = 19
+ERR_OS = 24
+ERR_EOF = 45
+
+CONFD_PORT = 4565
+
+# =============================================================================
+# 値の型
+# =============================================================================
+
+C_NOEXISTS = 1
+C_XMLTAG = 2
+C_SYMBOL = 3
+C_STR = 4
+C_BUF = 5
+C_INT8 = 6
+C_INT16 = 7
+C_INT32 = 8
+C_INT64 = 9
+C_UINT8 = 10
+C_UINT16 = 11
+C_UINT32 = 12
+C_UINT64 = 13
+C_DOUBLE = 14
+C_IPV4 = 15
+C_IPV6 = 16
+C_BOOL = 17
+C_QNAME = 18
+C_DATETIME = 19
+C_DATE = 20
+C_ENUM_VALUE = 28
+C_LIST = 31
+C_XMLBEGIN = 32
+C_XMLEND = 33
+
+from . import error  # noqa: E402  (本物と同じく _confd.error で参照できるようにする)
+
+
+class Value:
+    """_confd.Value の代わり (値と型の組)"""
+
+    __slots__ = ('_value', '_type')
+
+    def __init__(self, init: Any, type: int = C_BUF) -> None:
+        self._value = init
+        self._type = type
+
+    def as_pyval(self) -> Any:
+        return self._value
+
+    def confd_type(self) -> int:
+        return self._type
+
+    def __str__(self) -> str:
+        if self._type == C_BOOL:
+            return 'true' if self._value else 'false'
+        return str(self._value)
+
+    def __int__(self) -> int:
+        return int(self._value)
+
+    def __float__(self) -> float:
+        return float(self._value)
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Value):
+            return NotImplemented
+        return self._type == other._type and self._value == other._value
+
+    def __hash__(self) -> int:
+        return hash((self._type, repr(self._value)))
+
+    def __repr__(self) -> str:
+        return f"<_confd.Value type={self._type} value={self._value!r}>"
+
+    def __getstate__(self):
+        return (self._value, self._type)
+
+    def __setstate__(self, state) -> None:
+        self._value, self._type = state
+
+
+class XmlTag:
+    """_confd.XmlTag の代わり (名前空間とタグのハッシュ値)"""
+
+    __slots__ = ('ns', 'tag')
+
+    def __init__(self, ns: int, tag: int) -> None:
+        self.ns = ns
+        self.tag = tag
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, XmlTag) and (self.ns, self.tag) == (other.ns, other.tag)
+
+    def __hash__(self) -> int:
+        return hash((self.ns, self.tag))
+
+    def __str__(self) -> str:
+        return str(self.tag)
+
+    def __repr__(self) -> str:
+        return f"<_confd.XmlTag ns={self.ns} tag={self.tag}>"
+
+    def __getstate__(self):
+        return (self.ns, self.tag)
+
+    def __setstate__(self, state) -> None:
+        self.ns, self.tag = state
+
+
+class TagValue:
+    """_confd.TagValue の代わり (XmlTag と Value の組)"""
+
+    __slots__ = ('ns', 'tag', 'v')
+
+    def __init__(self, xmltag: XmlTag, v: Value) -> None:
+        self.ns = xmltag.ns
+        self.tag = xmltag.tag
+        self.v = v
+
+    def __repr__(self) -> str:
+        return f"<_confd.TagValue tag={self.tag} v={self.v!r}>"
+
+    def __getstate__(self):
+        return (self.ns, self.tag, self.v)
+
+    def __setstate__(self, state) -> None:
+        self.ns, self.tag, self.v = state
+
+
+class HKeypathRef:
+    """_confd.HKeypathRef の代わり
+
+    本物と同じく、kp[0] が末端 (要求されたノード) で、kp[len(kp) - 1] がトップの要素。
+    スキーマを読み込んでいない場合の本物と同じく、文字列にするとタグはハッシュ値で表示される
+    (例: /1234/5678)。
+    """
+
+    __slots__ = ('_elements',)
+
+    def __init__(self, elements: Iterable[Any]) -> None:
+        self._elements: List[Any] = list(elements)
+
+    def __len__(self) -> int:
+        return len(self._elements)
+
+    def __getitem__(self, index: int) -> Any:
+        return self._elements[index]
+
+    def __str__(self) -> str:
+        return '/' + '/'.join(str(element) for element in reversed(self._elements))
+
+    def __repr__(self) -> str:
+        return f"<_confd.HKeypathRef {self}>"
+
+    def __getstate__(self):
+        return self._elements
+
+    def __setstate__(self, state) -> None:
+        self._elements = state
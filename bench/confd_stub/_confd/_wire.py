@@ -0,0 +1,58 @@
+"""
+スタブと FakeConfd の間の通信 (ループバックの TCP)
+
+1 つのメッセージは、4 バイトの長さ (ビッグエンディアン) と pickle したタプル。
+接続した直後に ('hello', 種類, 付加情報) を送り、FakeConfd はそれでソケットの役割を知る。
+種類は 'control' / 'worker' (dp)、'cdb' (付加情報はソケットの種類)、'maapi'。
+"""
+
+import os
+import pickle
+import socket
+import struct
+
+from typing import Any, Tuple
+
+from . import ERR_OS
+from .error import Error
+
+_HEADER = struct.Struct('!I')
+
+# dp/cdb/maapi の connect() に渡されたポートの代わりに使うポート
+PORT_ENV = 'CONFD_BENCH_PORT'
+
+
+def connect(sock: socket.socket, ip: str, port: int, kind: str, info: Any = None) -> None:
+    """FakeConfd に接続して、ソケットの種類を伝える"""
+    port = int(os.environ.get(PORT_ENV, port))
+    try:
+        sock.connect((ip, port))
+    except OSError as e:
+        raise Error(ERR_OS, f"Failed to connect to ConfD at {ip}:{port}: {e}") from None
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    send(sock, 'hello', kind, info)
+
+
+def send(sock: socket.socket, *message: Any) -> None:
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def recv(sock: socket.socket) -> Tuple[Any, ...]:
+    """メッセージを 1 つ読む (接続が閉じられた場合は EOFError)
+
+    ソケットが読めるようになってから呼ばれるので、1 つ分だけを読み、
+    次のメッセージはソケットに残しておく (select/add_reader で次も検知できるように)。
+    """
+    (length,) = _HEADER.unpack(_recv_exact(sock, _HEADER.size))
+    return pickle.loads(_recv_exact(sock, length))
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise EOFError("connection closed")
+        buf += chunk
+    return bytes(buf)
@@ -0,0 +1,104 @@
+"""
+_confd.cdb の代わり (CDB の読み取りとサブスクリプションの API)
+
+- サブスクリプションソケット: subscribe() で登録し、read_subscription_socket() で
+  FakeConfd からの変更通知 ('notify', [サブスクリプションの番号]) を待つ。
+  sync_subscription_socket() で処理の完了を返すまで、次の通知は届かない
+- 読み取りソケット: start_session()/get()/end_session() は 1 回ずつ FakeConfd に
+  問い合わせる (本物と同じく、要求ごとに往復が発生する)
+"""
+
+import socket
+
+from typing import Any, List, Tuple
+
+from . import ERR_EOF, _wire
+from .error import Error
+
+READ_SOCKET = 0
+SUBSCRIPTION_SOCKET = 1
+DATA_SOCKET = 2
+
+RUNNING = 1
+STARTUP = 2
+OPERATIONAL = 3
+PRE_COMMIT_RUNNING = 4
+
+DONE_PRIORITY = 1
+DONE_SOCKET = 2
+DONE_TRANSACTION = 3
+DONE_OPERATIONAL = 4
+
+
+def connect(sock: socket.socket, type: int, ip: str, port: int, path: str = '/') -> None:
+    _wire.connect(sock, ip, port, 'cdb', type)
+
+
+def subscribe(sock: socket.socket, prio: int, nspace: int, path: str) -> int:
+    return _call(sock, 'subscribe', prio, nspace, path)
+
+
+def subscribe_done(sock: socket.socket) -> None:
+    _call(sock, 'subscribe_done')
+
+
+def read_subscription_socket(sock: socket.socket) -> List[int]:
+    """変更通知を待つ (ブロッキング)。変更のあったサブスクリプションの番号のリストを返す"""
+    op, points = _recv(sock)
+    return points
+
+
+def sync_subscription_socket(sock: socket.socket, st: int) -> None:
+    _send(sock, 'sync', st)
+
+
+def start_session(sock: socket.socket, db: int) -> None:
+    _call(sock, 'start_session', db)
+
+
+def start_session2(sock: socket.socket, db: int, flags: int) -> None:
+    _call(sock, 'start_session', db)
+
+
+def set_namespace(sock: socket.socket, hashed_ns: int) -> None:
+    # 本物でもライブラリの中で名前空間を覚えるだけで、ConfD とは通信しない
+    pass
+
+
+def get(sock: socket.socket, path: str) -> Any:
+    return _call(sock, 'get', path)
+
+
+def exists(sock: socket.socket, path: str) -> bool:
+    return _call(sock, 'exists', path)
+
+
+def end_session(sock: socket.socket) -> None:
+    _call(sock, 'end_session')
+
+
+def close(sock: socket.socket) -> None:
+    sock.close()
+
+
+def _call(sock: socket.socket, *request: Any) -> Any:
+    _send(sock, *request)
+    op, payload = _recv(sock)
+    if op == 'error':
+        errno, errstr = payload
+        raise Error(errno, errstr)
+    return payload
+
+
+def _send(sock: socket.socket, *message: Any) -> None:
+    try:
+        _wire.send(sock, *message)
+    except OSError as e:
+        raise Error(ERR_EOF, f"Failed to send to ConfD: {e}") from None
+
+
+def _recv(sock: socket.socket) -> Tuple[Any, ...]:
+    try:
+        return _wire.recv(sock)
+    except (EOFError, OSError):
+        raise Error(ERR_EOF, "Socket closed") from None
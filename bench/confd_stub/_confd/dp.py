@@ -0,0 +1,250 @@
+"""
+_confd.dp の代わり (データプロバイダー/アクションの API)
+
+fd_ready() はワーカーソケットから要求を 1 つ読み、登録されたコールバックを呼び出す。
+- ('action', 要求番号, actionpoint, (username, usid, context), name, kp, params)
+    cb_init(uinfo) → cb_action(uinfo, name, kp, params)
+- ('abort', 要求番号)
+    遅延応答を待っているアクションの cb_abort(uinfo)
+- ('get_elem', 要求番号, callpoint, kp)
+    1 つのトランザクションとして cb_init(tctx) → cb_get_elem(tctx, kp) → cb_finish(tctx)
+
+応答は、uinfo/tctx に紐付けたワーカーソケットから ('reply', 要求番号, 値) または
+('error', 要求番号, メッセージ) として返す。
+"""
+
+import socket
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import CONFD_OK, DELAYED_RESPONSE, ERR_EOF, ERR_EXTERNAL, ERR_PROTOUSAGE, _wire
+from .error import Error
+
+CONTROL_SOCKET = 0
+WORKER_SOCKET = 1
+
+
+class DaemonCtx:
+    """dp.init_daemon() が返すデーモンのコンテキスト"""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.ctrl_sock: Optional[socket.socket] = None
+        self.trans_cb: Any = None
+        self.data_cbs: Dict[str, Any] = {}
+        self.action_cbs: Dict[str, Any] = {}
+        # 遅延応答を待っているアクション (要求番号 → uinfo)
+        self.delayed: Dict[int, 'UserInfo'] = {}
+
+
+class UserInfo:
+    """アクションのコールバックに渡す uinfo"""
+
+    def __init__(self, daemon: DaemonCtx, actionpoint: str, request: int,
+                 user: Tuple[str, int, str]) -> None:
+        self.username, self.usid, self.context = user
+        self.actx_thandle = -1
+        self._daemon = daemon
+        self._actionpoint = actionpoint
+        self._request = request
+        self._sock: Optional[socket.socket] = None
+        self._error: Optional[str] = None
+        self._replied = False
+
+    def __str__(self) -> str:
+        return f"UserInfo(user={self.username}, usid={self.usid}, request={self._request})"
+
+
+class TransCtx:
+    """データのコールバックに渡す tctx"""
+
+    def __init__(self, request: int) -> None:
+        self._request = request
+        self._sock: Optional[socket.socket] = None
+        self._error: Optional[str] = None
+        self._replied = False
+
+
+# =============================================================================
+# 接続と登録
+# =============================================================================
+
+
+def init_daemon(name: str) -> DaemonCtx:
+    return DaemonCtx(name)
+
+
+def connect(dx: DaemonCtx, sock: socket.socket, type: int, ip: str, port: int,
+            path: Optional[str] = None) -> None:
+    kind = 'control' if type == CONTROL_SOCKET else 'worker'
+    _wire.connect(sock, ip, port, kind, dx.name)
+    if type == CONTROL_SOCKET:
+        dx.ctrl_sock = sock
+
+
+def register_trans_cb(dx: DaemonCtx, trans: Any) -> None:
+    dx.trans_cb = trans
+
+
+def register_data_cb(dx: DaemonCtx, callpoint: str, data: Any, flags: int = 0) -> None:
+    dx.data_cbs[callpoint] = data
+
+
+def register_action_cbs(dx: DaemonCtx, actionpoint: str, acb: Any) -> None:
+    dx.action_cbs[actionpoint] = acb
+
+
+def register_done(dx: DaemonCtx) -> None:
+    if dx.ctrl_sock is None:
+        raise Error(ERR_PROTOUSAGE, "register_done() before connecting the control socket")
+    _wire.send(dx.ctrl_sock, 'registered', sorted(dx.action_cbs), sorted(dx.data_cbs))
+
+
+def release_daemon(dx: DaemonCtx) -> None:
+    dx.delayed.clear()
+
+
+# =============================================================================
+# 要求の処理
+# =============================================================================
+
+
+def fd_ready(dx: DaemonCtx, sock: socket.socket) -> None:
+    """ソケットに届いた要求を 1 つ処理する"""
+    try:
+        message = _wire.recv(sock)
+    except (EOFError, OSError):
+        raise Error(ERR_EOF, "Socket closed") from None
+
+    op = message[0]
+    if op == 'action':
+        _action(dx, *message[1:])
+    elif op == 'abort':
+        _abort(dx, message[1])
+    elif op == 'get_elem':
+        _get_elem(dx, *message[1:])
+    else:
+        raise Error(ERR_PROTOUSAGE, f"unexpected request {op!r}")
+
+
+def _action(dx: DaemonCtx, request: int, actionpoint: str, user: Tuple[str, int, str],
+            name: Any, kp: Any, params: List[Any]) -> None:
+    acb = dx.action_cbs.get(actionpoint)
+    uinfo = UserInfo(dx, actionpoint, request, user)
+    if acb is None:
+        raise Error(ERR_PROTOUSAGE, f"no callbacks registered for actionpoint {actionpoint}")
+    try:
+        ret = acb.cb_init(uinfo)
+        if ret == CONFD_OK:
+            ret = acb.cb_action(uinfo, name, kp, params)
+    except Exception as e:
+        if uinfo._sock is not None and not uinfo._replied:
+            _send_error(uinfo, f"Python cb_action error. {e}")
+        raise Error(ERR_EXTERNAL, f"Python cb_action error. {e}") from e
+
+    if ret == DELAYED_RESPONSE:
+        if not uinfo._replied:
+            dx.delayed[request] = uinfo
+    elif ret == CONFD_OK:
+        if not uinfo._replied:
+            action_reply_values(uinfo, [])
+    elif not uinfo._replied:
+        _send_error(uinfo, uinfo._error or "application communication failure")
+
+
+def _abort(dx: DaemonCtx, request: int) -> None:
+    uinfo = dx.delayed.get(request)
+    if uinfo is None:
+        return
+    acb = dx.action_cbs[uinfo._actionpoint]
+    try:
+        acb.cb_abort(uinfo)
+    except Exception as e:
+        raise Error(ERR_EXTERNAL, f"Python cb_abort error. {e}") from e
+
+
+def _get_elem(dx: DaemonCtx, request: int, callpoint: str, kp: Any) -> None:
+    dcb = dx.data_cbs.get(callpoint)
+    if dcb is None:
+        raise Error(ERR_PROTOUSAGE, f"no callbacks registered for callpoint {callpoint}")
+    tctx = TransCtx(request)
+    trans = dx.trans_cb
+    try:
+        ret = trans.cb_init(tctx) if trans is not None else CONFD_OK
+        if ret == CONFD_OK:
+            try:
+                ret = dcb.cb_get_elem(tctx, kp)
+            finally:
+                if trans is not None:
+                    trans.cb_finish(tctx)
+    except Exception as e:
+        if tctx._sock is not None and not tctx._replied:
+            _send_error(tctx, f"Python cb_get_elem error. {e}")
+        raise Error(ERR_EXTERNAL, f"Python cb_get_elem error. {e}") from e
+
+    if tctx._sock is None:
+        raise Error(ERR_PROTOUSAGE, "no worker socket set for the transaction (trans_set_fd)")
+    if not tctx._replied:
+        if ret == CONFD_OK:
+            data_reply_not_found(tctx)
+        else:
+            _send_error(tctx, tctx._error or f"cb_get_elem returned {ret}")
+
+
+# =============================================================================
+# 応答
+# =============================================================================
+
+
+def action_set_fd(uinfo: UserInfo, sock: socket.socket) -> None:
+    uinfo._sock = sock
+
+
+def action_reply_values(uinfo: UserInfo, values: List[Any]) -> None:
+    _send(uinfo, 'reply', values)
+    uinfo._daemon.delayed.pop(uinfo._request, None)
+
+
+def action_seterr(uinfo: UserInfo, errstr: str) -> None:
+    uinfo._error = errstr
+
+
+def action_delayed_reply_ok(uinfo: UserInfo) -> None:
+    action_reply_values(uinfo, [])
+
+
+def action_delayed_reply_error(uinfo: UserInfo, errstr: str) -> None:
+    _send_error(uinfo, errstr)
+    uinfo._daemon.delayed.pop(uinfo._request, None)
+
+
+def trans_set_fd(tctx: TransCtx, sock: socket.socket) -> None:
+    tctx._sock = sock
+
+
+def data_reply_value(tctx: TransCtx, v: Any) -> None:
+    _send(tctx, 'reply', v)
+
+
+def data_reply_not_found(tctx: TransCtx) -> None:
+    _send(tctx, 'reply', None)
+
+
+def trans_seterr(tctx: TransCtx, errstr: str) -> None:
+    tctx._error = errstr
+
+
+def _send_error(ctx: Any, errstr: str) -> None:
+    _send(ctx, 'error', errstr)
+
+
+def _send(ctx: Any, op: str, payload: Any) -> None:
+    if ctx._sock is None:
+        raise Error(ERR_PROTOUSAGE, "no worker socket set (action_set_fd/trans_set_fd)")
+    if ctx._replied:
+        raise Error(ERR_PROTOUSAGE, "reply already sent")
+    ctx._replied = True
+    try:
+        _wire.send(ctx._sock, op, ctx._request, payload)
+    except OSError as e:
+        raise Error(ERR_EOF, f"Failed to send reply: {e}") from None
@@ -0,0 +1,13 @@
+"""_confd.error の代わり"""
+
+
+class Error(Exception):
+    """ConfD の API のエラー (confd_errno にエラー番号、confd_str にメッセージ)"""
+
+    def __init__(self, confd_errno: int, confd_str: str) -> None:
+        super().__init__(confd_str)
+        self.confd_errno = confd_errno
+        self.confd_str = confd_str
+
+    def __str__(self) -> str:
+        return self.confd_str
@@ -0,0 +1,24 @@
+"""
+_confd.maapi の代わり
+
+デーモンが使う cli_write() (CLI への途中経過の書き込み) だけを用意している。
+書き込みは FakeConfd に送って数えるだけで、応答は待たない。
+"""
+
+import socket
+
+from typing import Optional
+
+from . import ERR_EOF, _wire
+from .error import Error
+
+
+def connect(sock: socket.socket, ip: str, port: int, path: Optional[str] = None) -> None:
+    _wire.connect(sock, ip, port, 'maapi')
+
+
+def cli_write(sock: socket.socket, usess: int, buf: str) -> None:
+    try:
+        _wire.send(sock, 'cli_write', usess, buf)
+    except OSError as e:
+        raise Error(ERR_EOF, f"Failed to write to CLI session {usess}: {e}") from None
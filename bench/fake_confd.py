@@ -0,0 +1,275 @@
+"""
+FakeConfd: ベンチマーク用の ConfD の代わり (サーバー側)
+
+デーモンのプロセスでは bench/confd_stub の _confd が、本物と同じようにソケットで
+ここに接続します。FakeConfd は ConfD の役割のうち、ベンチマークに必要なものだけを行います。
+
+- 制御ソケットの登録完了 (register_done) を待つ
+- ワーカーソケットにアクション (action) / 中断 (abort) / データの取得 (get_elem) の要求を送り、
+  応答が届いたら要求ごとのコールバックを呼ぶ
+- 設定を変更して (commit)、サブスクライバーに通知し、sync が返るのを待つ
+- CDB の読み取りセッション (start_session / get / end_session) に答える
+- MAAPI の cli_write を数える
+
+接続ごとにスレッドを 1 つ使う。要求を送る側 (ベンチマークの負荷) はどのスレッドからでもよい。
+"""
+
+import itertools
+import socket
+import sys
+import threading
+
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / 'confd_stub'))
+
+import _confd  # noqa: E402
+from _confd import _wire  # noqa: E402
+import _confd.cdb as cdb  # noqa: E402
+
+# 応答を受け取る関数: done(成功したか, 応答の値またはエラーメッセージ)
+Done = Callable[[bool, Any], None]
+
+
+class DaemonGone(Exception):
+    """デーモンとの接続が切れた"""
+
+
+class FakeConfd:
+    """ループバックで待ち受け、接続してきたデーモンに要求を送る"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0) -> None:
+        self._listener = socket.create_server((host, port))
+        self.host, self.port = self._listener.getsockname()[:2]
+
+        # 設定のデータストア (パス → _confd.Value)。commit() で書き換える
+        self.datastore: Dict[str, Any] = {}
+
+        self.daemon_name: Optional[str] = None
+        self.actionpoints: List[str] = []
+        self.callpoints: List[str] = []
+        self.cli_writes = 0
+        self.cdb_sessions = 0
+
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._worker: Optional[socket.socket] = None
+        self._worker_connected = threading.Event()
+        self._registered = threading.Event()
+        self._subscriber: Optional[socket.socket] = None
+        self._subscriptions: List[Tuple[int, str]] = []
+        self._subscribed = threading.Event()
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Done] = {}
+        self._commit: Optional[Done] = None
+        self._gone = threading.Event()
+        self._closing = False
+        self._connections: List[socket.socket] = []
+
+        threading.Thread(target=self._accept, name='fake-confd', daemon=True).start()
+
+    # -------------------------------------------------------------------------
+    # 準備
+    # -------------------------------------------------------------------------
+
+    def wait_registered(self, timeout: float) -> bool:
+        """デーモンがコールバックの登録を終えるまで待つ"""
+        return self._registered.wait(timeout)
+
+    def wait_subscribed(self, timeout: float) -> bool:
+        """サブスクライバーが subscribe_done を送るまで待つ"""
+        return self._subscribed.wait(timeout)
+
+    @property
+    def gone(self) -> bool:
+        return self._gone.is_set()
+
+    # -------------------------------------------------------------------------
+    # 要求
+    # -------------------------------------------------------------------------
+
+    def action(self, actionpoint: str, name: Any, kp: Any, params: List[Any], done: Done,
+               user: Tuple[str, int, str] = ('admin', 1, 'cli')) -> int:
+        """アクションを実行する。応答が届いたら done() を呼ぶ。要求番号を返す (abort に使う)"""
+        return self._request(done, 'action', actionpoint, user, name, kp, params)
+
+    def abort(self, request: int) -> None:
+        """実行中のアクションを中断する (CLI での Ctrl-C)"""
+        self._send_worker('abort', request)
+
+    def get_elem(self, callpoint: str, kp: Any, done: Done) -> int:
+        """運用データの leaf を 1 つ取得する"""
+        return self._request(done, 'get_elem', callpoint, kp)
+
+    def commit(self, changes: Dict[str, Any], done: Done) -> None:
+        """設定を変更してサブスクライバーに通知する。sync が返ったら done() を呼ぶ
+
+        ConfD と同じく、前の通知の sync が返るまで次の commit はできない。
+        """
+        with self._lock:
+            if self._commit is not None:
+                raise RuntimeError("previous commit is still waiting for the subscriber")
+            if self._subscriber is None:
+                raise DaemonGone("no subscriber")
+            self.datastore.update(changes)
+            self._commit = done
+            points = [point for point, path in self._subscriptions
+                      if any(changed.startswith(path) for changed in changes)]
+            try:
+                _wire.send(self._subscriber, 'notify', points)
+            except OSError as e:
+                self._commit = None
+                raise DaemonGone(str(e)) from None
+
+    def _request(self, done: Done, op: str, *args: Any) -> int:
+        request = next(self._ids)
+        with self._lock:
+            self._pending[request] = done
+        try:
+            self._send_worker(op, request, *args)
+        except DaemonGone:
+            with self._lock:
+                self._pending.pop(request, None)
+            raise
+        return request
+
+    def _send_worker(self, *message: Any) -> None:
+        # 送信中に応答を受け取れるように、_lock とは別のロックで送信を順番にする
+        with self._send_lock:
+            worker = self._worker
+            if worker is None:
+                raise DaemonGone("no worker socket")
+            try:
+                _wire.send(worker, *message)
+            except OSError as e:
+                raise DaemonGone(str(e)) from None
+
+    # -------------------------------------------------------------------------
+    # 接続の処理
+    # -------------------------------------------------------------------------
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn, _ = self._listener.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            with self._lock:
+                self._connections.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn: socket.socket) -> None:
+        kind = info = None
+        try:
+            _, kind, info = _wire.recv(conn)
+            if kind == 'control':
+                self._serve_control(conn, info)
+            elif kind == 'worker':
+                self._serve_worker(conn)
+            elif kind == 'cdb' and info == cdb.SUBSCRIPTION_SOCKET:
+                self._serve_subscriber(conn)
+            elif kind == 'cdb':
+                self._serve_cdb_read(conn)
+            elif kind == 'maapi':
+                self._serve_maapi(conn)
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+            if kind in ('control', 'worker') or (kind == 'cdb' and info == cdb.SUBSCRIPTION_SOCKET):
+                self._lost()
+
+    def _serve_control(self, conn: socket.socket, daemon_name: str) -> None:
+        self.daemon_name = daemon_name
+        while True:
+            message = _wire.recv(conn)
+            if message[0] == 'registered':
+                self.actionpoints, self.callpoints = message[1], message[2]
+                # ワーカーソケットの接続を受け付け終えてから、準備完了にする
+                self._worker_connected.wait(5.0)
+                self._registered.set()
+
+    def _serve_worker(self, conn: socket.socket) -> None:
+        with self._lock:
+            self._worker = conn
+        self._worker_connected.set()
+        while True:
+            op, request, payload = _wire.recv(conn)
+            with self._lock:
+                done = self._pending.pop(request, None)
+            if done is not None:
+                done(op == 'reply', payload)
+
+    def _serve_subscriber(self, conn: socket.socket) -> None:
+        while True:
+            message = _wire.recv(conn)
+            op = message[0]
+            if op == 'subscribe':
+                _, prio, nspace, path = message
+                point = len(self._subscriptions) + 1
+                self._subscriptions.append((point, path))
+                _wire.send(conn, 'ok', point)
+            elif op == 'subscribe_done':
+                with self._lock:
+                    self._subscriber = conn
+                _wire.send(conn, 'ok', None)
+                self._subscribed.set()
+            elif op == 'sync':
+                with self._lock:
+                    done, self._commit = self._commit, None
+                if done is not None:
+                    done(True, None)
+
+    def _serve_cdb_read(self, conn: socket.socket) -> None:
+        while True:
+            message = _wire.recv(conn)
+            op = message[0]
+            if op == 'start_session':
+                self.cdb_sessions += 1
+                _wire.send(conn, 'ok', None)
+            elif op == 'get':
+                value = self.datastore.get(message[1])
+                if value is None:
+                    _wire.send(conn, 'error', (_confd.ERR_NOEXISTS, f"{message[1]}: item does not exist"))
+                else:
+                    _wire.send(conn, 'ok', value)
+            elif op == 'exists':
+                _wire.send(conn, 'ok', message[1] in self.datastore)
+            elif op == 'end_session':
+                _wire.send(conn, 'ok', None)
+            else:
+                _wire.send(conn, 'error', (_confd.ERR_PROTOUSAGE, f"unsupported request {op!r}"))
+
+    def _serve_maapi(self, conn: socket.socket) -> None:
+        while True:
+            message = _wire.recv(conn)
+            if message[0] == 'cli_write':
+                self.cli_writes += 1
+
+    def _lost(self) -> None:
+        """デーモンとの接続が切れた。応答を待っている要求はエラーにする"""
+        with self._lock:
+            if self._closing:
+                return
+            self._worker = None
+            self._subscriber = None
+            pending, self._pending = self._pending, {}
+            commit, self._commit = self._commit, None
+        self._gone.set()
+        for done in pending.values():
+            done(False, "connection to the daemon closed")
+        if commit is not None:
+            commit(False, "connection to the subscriber closed")
+
+    def close(self) -> None:
+        with self._lock:
+            self._closing = True
+            connections, self._connections = self._connections, []
+        self._listener.close()
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+ベンチマークのデーモン側のプロセス
+
+bench_daemons.py が、ベンチマークの対象ごとに子プロセスとして起動します。
+confd_stub の _confd と、名前空間モジュール (example_ns) を import できるようにしてから、
+サンプルのデーモンをフォアグラウンドで実行します (デーモン化はしない)。
+接続先は環境変数 CONFD_BENCH_PORT で渡された FakeConfd のポートです。
+
+    python3 bench/run_daemon.py 7-action
+    python3 bench/run_daemon.py 3-ping --cache-ttl 0
+    python3 bench/run_daemon.py 2-state
+    python3 bench/run_daemon.py 1-config
+
+SIGTERM で終了します。
+"""
+
+import argparse
+import logging
+import sys
+import tempfile
+
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_DIR = BENCH_DIR.parent
+
+EXAMPLES = ('1-config', '2-state', '3-ping', '7-action')
+
+
+def setup_path(example: str) -> Path:
+    """_confd のスタブ、サンプルの bin、名前空間モジュールを import できるようにする"""
+    example_dir = REPO_DIR / example
+    sys.path[:0] = [str(BENCH_DIR / 'confd_stub'), str(example_dir / 'bin')]
+
+    import yang_ns
+    yang_ns.install(example_dir)
+    return example_dir
+
+
+def run_action_daemon(args: argparse.Namespace) -> None:
+    """7-action: hello / countdown のアクションサーバー"""
+    import action_daemon
+    action_daemon.server.run()
+
+
+def run_ping_daemon(args: argparse.Namespace) -> None:
+    """3-ping: ping のアクションサーバー (ICMP はループバックにだけ送る)"""
+    import ping_action
+    from icmp_prober import IcmpProber
+
+    ping_action.run_daemon(loopback_only=IcmpProber.supported(), cache_ttl=args.cache_ttl)
+
+
+def run_status_provider(args: argparse.Namespace) -> None:
+    """2-state: 運用データのデータプロバイダー"""
+    import status_provider
+    status_provider.run()
+
+
+def run_config_monitor(args: argparse.Namespace) -> None:
+    """1-config: 設定変更のサブスクライバー (設定ファイルは一時ディレクトリに書く)"""
+    import config_monitor
+
+    cdb_dir = Path(tempfile.mkdtemp(prefix='bench-config-monitor-'))
+    config_monitor.CDB_DIR = cdb_dir
+    config_monitor.CONFIG_FILE = cdb_dir / f'{config_monitor.SCRIPT_BASE}.conf'
+    config_monitor.run_subscription_loop()
+
+
+RUNNERS = {
+    '1-config': run_config_monitor,
+    '2-state': run_status_provider,
+    '3-ping': run_ping_daemon,
+    '7-action': run_action_daemon,
+}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Run an example daemon against FakeConfd')
+    parser.add_argument('example', choices=EXAMPLES)
+    parser.add_argument('--cache-ttl', type=float, default=0.0,
+                        help='3-ping: seconds to keep ping results (default: 0)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='[%(name)s] %(message)s')
+    setup_path(args.example)
+    RUNNERS[args.example](args)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
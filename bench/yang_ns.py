@@ -0,0 +1,74 @@
+"""
+名前空間モジュール (example_ns) の用意
+
+デーモンは confdc --emit-python で生成した example_ns.py からタグのハッシュ値を得ます。
+生成には confdc (ConfD) が必要なので、生成済みのファイルが無い場合は YANG ファイルから
+同じ形のクラスを作ります。
+
+- 名前空間のクラス ns に、hash / id / uri / prefix と、ノードごとに
+  <prefix>_<名前> (YANG の '-' は '_') = ハッシュ値 の属性を持たせる
+- ハッシュ値は名前の CRC32 (本物の値とは異なるが、同じ名前には同じ値になる)。
+  デーモンのプロセスとベンチマークのプロセスが同じ値を使えればよい
+
+生成済みの example_ns.py がある場合は、それをそのまま使う (ハッシュ値も本物になる)。
+"""
+
+import importlib.util
+import re
+import sys
+import types
+import zlib
+
+from pathlib import Path
+
+# ノードの名前を取り出す文 (description の中の文字列は行頭に来ない前提)
+_NODE = re.compile(
+    r'^\s*(?:container|leaf-list|leaf|list|choice|case|rpc|action|tailf:action|notification)'
+    r'\s+([A-Za-z_][\w.-]*)\s*[{;]', re.MULTILINE)
+_PREFIX = re.compile(r'^\s*prefix\s+"?([\w-]+)"?\s*;', re.MULTILINE)
+_NAMESPACE = re.compile(r'^\s*namespace\s+"([^"]+)"\s*;', re.MULTILINE)
+# 行コメント (文字列の中の http:// は消さない)
+_COMMENT = re.compile(r'(^|\s)//[^\n]*', re.MULTILINE)
+
+
+def tag_hash(name: str) -> int:
+    return zlib.crc32(name.encode('utf-8')) & 0x7fffffff
+
+
+def from_yang(path: Path) -> type:
+    """YANG ファイルから名前空間のクラスを作る"""
+    text = _COMMENT.sub(r'\1', Path(path).read_text(encoding='utf-8'))
+    # モジュールの prefix は import の prefix より前に書かれている
+    prefix = _PREFIX.search(text).group(1)
+    uri = _NAMESPACE.search(text).group(1)
+    attrs = {
+        'hash': tag_hash(uri),
+        'id': f"_{prefix}",
+        'uri': uri,
+        'prefix': prefix,
+    }
+    for name in _NODE.findall(text):
+        py_name = name.replace('-', '_').replace('.', '_')
+        attrs[f"{prefix}_{py_name}"] = tag_hash(name)
+        attrs[f"{prefix}_{py_name}_"] = name
+    return type('ns', (), attrs)
+
+
+def load(example_dir: Path, module_name: str = 'example_ns') -> types.ModuleType:
+    """*example_dir* の名前空間モジュール (生成済みのものがあればそれ、無ければ YANG から作ったもの)"""
+    example_dir = Path(example_dir)
+    generated = example_dir / 'bin' / f'{module_name}.py'
+    if generated.exists():
+        spec = importlib.util.spec_from_file_location(module_name, generated)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+    module = types.ModuleType(module_name, f"stand-in for {generated} (built from the YANG model)")
+    module.ns = from_yang(example_dir / 'yang' / 'example.yang')
+    return module
+
+
+def install(example_dir: Path, module_name: str = 'example_ns') -> None:
+    """デーモンのプロセスで、import example_ns が使えるようにする"""
+    sys.modules[module_name] = load(example_dir, module_name)
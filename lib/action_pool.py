@@ -0,0 +1,124 @@
+"""
+アクションの実行数の制限 (受付制御)
+
+ping アクションは、これまで呼び出しのたびにスレッドと ping プロセスを作っていたため、
+スクリプトから 500 回呼ばれると 500 個のスレッドとプロセスが同時に動いていました。
+ActionPool は、デーモンのイベントループで実行するアクションの数を制限します。
+
+- 同時に実行するアクションは workers 個まで (残りは待ち行列で順番を待つ)
+- 待ち行列の長さは queue_size 個まで。あふれた場合は待たせずにすぐ拒否する
+- 1 ユーザーが同時に投入できるアクション (実行中 + 待ち) は per_user 個まで
+
+拒否した場合は ActionRejected を送出するので、呼び出し側は
+その場でエラーを応答します (dp.action_seterr)。
+待ち行列の長さなどの統計は snapshot() で取得できます。
+"""
+
+import asyncio
+
+from collections import Counter
+from typing import Any, Awaitable, Dict
+
+DEFAULT_WORKERS = 16
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_PER_USER = 8
+
+
+class ActionRejected(Exception):
+    """待ち行列がいっぱい、またはユーザーごとの上限に達したため受け付けなかった"""
+
+
+class ActionPool:
+    """イベントループ上で実行するアクションの数を制限する
+
+    submit() はイベントループのスレッドから呼び出してください
+    (ConfD のコールバックはイベントループの中で呼ばれます)。
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        per_user: int = DEFAULT_PER_USER,
+    ) -> None:
+        self.workers = max(workers, 1)
+        self.queue_size = max(queue_size, 0)
+        self.per_user = max(per_user, 1)
+        self._slots = asyncio.Semaphore(self.workers)
+        self._users: Counter = Counter()
+
+        # 統計
+        self.in_flight = 0      # 受け付けて、まだ終わっていないアクション (実行中 + 待ち)
+        self.running = 0        # 実行枠を得て実行中のアクション
+        self.max_queued = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.completed = 0
+
+    @property
+    def queued(self) -> int:
+        """実行枠が空くのを待っているアクションの数 (待ち行列の長さ)"""
+        return self.in_flight - self.running
+
+    def submit(self, user: str, coro: Awaitable[Any]) -> asyncio.Task:
+        """*coro* を受け付けてタスクとして実行する
+
+        実行枠が空いていなければ待ち行列に入り、空いた順に実行される。
+        受け付けられない場合は ActionRejected (coro は実行せずに閉じる)。
+        """
+        reason = None
+        if self.in_flight >= self.workers + self.queue_size:
+            reason = (f"server busy: {self.in_flight} actions in progress "
+                      f"(up to {self.workers} run at once, queue limit {self.queue_size}), try again later")
+        elif self._users[user] >= self.per_user:
+            reason = (f"too many actions for user '{user}' "
+                      f"({self._users[user]} in progress, limit {self.per_user})")
+        if reason is not None:
+            self.rejected += 1
+            _close(coro)
+            raise ActionRejected(reason)
+
+        self.accepted += 1
+        self.in_flight += 1
+        self._users[user] += 1
+        self.max_queued = max(self.max_queued, self.in_flight - self.workers, 0)
+        task = asyncio.get_running_loop().create_task(self._run(coro))
+        # 待ち行列にいる間に取り消されると _run() は開始すらされないので、
+        # 後始末はタスクの完了時に行う
+        task.add_done_callback(lambda _task: self._finished(user, coro))
+        return task
+
+    async def _run(self, coro: Awaitable[Any]) -> Any:
+        async with self._slots:
+            self.running += 1
+            try:
+                return await coro
+            finally:
+                self.running -= 1
+
+    def _finished(self, user: str, coro: Awaitable[Any]) -> None:
+        self.in_flight -= 1
+        self.completed += 1
+        # 実行されずに終わったコルーチンを閉じる (実行済みなら何もしない)
+        _close(coro)
+        self._users[user] -= 1
+        if self._users[user] <= 0:
+            del self._users[user]
+
+    def snapshot(self) -> Dict[str, int]:
+        """統計 (実行中の数、待ち行列の長さ、受付/拒否/完了の件数)"""
+        return {
+            'workers': self.workers,
+            'running': self.running,
+            'queued': self.queued,
+            'queue-size': self.queue_size,
+            'max-queued': self.max_queued,
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'completed': self.completed,
+        }
+
+
+def _close(coro: Awaitable[Any]) -> None:
+    if hasattr(coro, 'close'):
+        coro.close()
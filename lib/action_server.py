@@ -0,0 +1,669 @@
+"""
+アクションサーバー (ConfD の tailf:action を関数で書くための枠組み)
+
+アクションデーモンはどれも、
+- デーモンの初期化と制御/ワーカーソケットの接続
+- アクションポイントの登録 (cb_init, cb_action, cb_abort)
+- 入力パラメータ (TagValue のリスト) の解析と、出力の TagValue のリストの組み立て
+- 時間のかかるアクションの遅延応答 (DELAYED_RESPONSE) と Ctrl-C での中断
+- ソケットを待つループ
+を同じように書いていました。ActionServer はこれらをまとめて引き受け、
+アクションの本体は関数として書くだけで済むようにします。
+
+    server = ActionServer("my_daemon", ns.ns, "my-actionpoint")
+
+    class Greeting(NamedTuple):
+        greeting: str
+
+    @server.action("hello")
+    def hello(name: str = "world") -> Greeting:
+        return Greeting(f"Hello, {name}!")
+
+    server.run()
+
+【入力と出力の対応】
+- 関数の引数名が、入力の leaf の名前に対応する (YANG の '-' は '_' にする)。
+  タグは生成された名前空間モジュールの <prefix>_<名前> を使い、値は引数の型ヒントに変換する
+  (str, int, float, bool と、leaf-list は List[...])。既定値の無い引数が無ければエラー
+- 戻り値は NamedTuple で、フィールド名が出力の leaf に対応する。
+  フィールドの型ヒントで ConfD の型を決める (str は C_BUF、bool は C_BOOL。
+  整数は YANG の型に合わせて Uint32 などを使う)。値が None のフィールドは出力しない。
+  NamedTuple のフィールドはコンテナ、List[NamedTuple] はリストのエントリになる
+- 出力の XmlTag と、コンテナ/リストのエントリを囲む TagValue は、登録時に NamedTuple の
+  クラスごとに型紙として作っておき、応答のたびには値を詰めるだけにする
+- TagValue のリストをそのまま返してもよい (None なら出力なし)
+- 最初の引数の型ヒントが ActionContext なら、呼び出し元の情報 (uinfo など) を渡す
+
+【実行】
+- async def の関数は、デーモンのイベントループのタスクとして実行する
+- 普通の関数は、共有のスレッドプールで実行する (ブロックしてもループは止まらない)
+- どちらも ActionPool を通すので、同時に実行する数、待ち行列、ユーザーごとの数に上限がある。
+  あふれた要求はその場でエラーになる
+- 遅延応答にして、終わったら結果を返す。timeout 秒を超えたらエラーを返す
+- Ctrl-C (cb_abort) ではタスクを取り消し、スレッドで実行中の関数には
+  ActionContext.cancelled で知らせる
+- inline=True の関数は cb_action の中でそのまま呼び出し、すぐに応答する。
+  inline の関数がコルーチンを返した場合は、その続きを遅延応答として実行する
+  (「結果が手元にあればすぐ返し、無ければ時間をかけて求める」アクション用)
+
+ActionError を送出すると、そのメッセージがエラーとしてユーザーに返ります。
+"""
+
+import asyncio
+import functools
+import inspect
+import logging
+import signal
+import socket
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import (Any, Callable, Dict, List, NamedTuple, NewType, Optional, Tuple,
+                    Union, get_args, get_origin, get_type_hints)
+
+import _confd  # type: ignore
+import _confd.dp as dp  # type: ignore
+import _confd.maapi as maapi  # type: ignore
+
+from action_pool import (DEFAULT_PER_USER, DEFAULT_QUEUE_SIZE, DEFAULT_WORKERS,
+                         ActionPool, ActionRejected)
+
+logger = logging.getLogger(__name__)
+
+# 出力の leaf の型 (Python の int だけでは YANG の整数型を決められないので、型ヒントで指定する)
+Int8 = NewType('Int8', int)
+Int16 = NewType('Int16', int)
+Int32 = NewType('Int32', int)
+Int64 = NewType('Int64', int)
+Uint8 = NewType('Uint8', int)
+Uint16 = NewType('Uint16', int)
+Uint32 = NewType('Uint32', int)
+Uint64 = NewType('Uint64', int)
+
+_VALUE_TYPES: Dict[Any, int] = {
+    str: _confd.C_BUF,
+    bool: _confd.C_BOOL,
+    int: _confd.C_INT64,
+    float: _confd.C_DOUBLE,
+    Int8: _confd.C_INT8,
+    Int16: _confd.C_INT16,
+    Int32: _confd.C_INT32,
+    Int64: _confd.C_INT64,
+    Uint8: _confd.C_UINT8,
+    Uint16: _confd.C_UINT16,
+    Uint32: _confd.C_UINT32,
+    Uint64: _confd.C_UINT64,
+}
+
+
+class ActionError(Exception):
+    """アクションのエラー (メッセージをそのままユーザーに返す)"""
+
+
+def user_of(uinfo) -> str:
+    """ユーザーごとの上限に使うユーザー名"""
+    return getattr(uinfo, 'username', None) or str(uinfo)
+
+
+def _unwrap_optional(hint: Any) -> Any:
+    if get_origin(hint) is Union:
+        args = [a for a in get_args(hint) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return hint
+
+
+def _is_record(hint: Any) -> bool:
+    """NamedTuple のクラスか"""
+    return isinstance(hint, type) and issubclass(hint, tuple) and hasattr(hint, '_fields')
+
+
+# =============================================================================
+# 呼び出し元の情報
+# =============================================================================
+
+
+class ActionContext:
+    """実行中のアクション 1 回分の情報
+
+    - uinfo, keypath: cb_action に渡された値
+    - name: アクションの名前
+    - cancelled: 中断 (Ctrl-C) または時間切れでセットされる。スレッドで実行する関数は、
+      時間のかかる処理の合間にこれを確かめて、早めに終わらせる
+    """
+
+    def __init__(self, server: 'ActionServer', uinfo: Any, name: str, keypath: Any) -> None:
+        self.server = server
+        self.uinfo = uinfo
+        self.name = name
+        self.keypath = keypath
+        self.user = user_of(uinfo)
+        self.cancelled = threading.Event()
+        self.aborted = False
+        self.task: Optional[asyncio.Task] = None
+
+    def write(self, text: str) -> bool:
+        """アクションを実行したユーザーのCLIに途中経過を1行書く (CLI以外から呼ばれた場合は False)"""
+        return self.server.write_progress(self.uinfo, text)
+
+
+# =============================================================================
+# アクションの登録情報
+# =============================================================================
+
+
+class _Field(NamedTuple):
+    """出力の 1 フィールド (登録時に作った XmlTag と、値の型)
+
+    コンテナ/リストのフィールドは、中身の型紙 (child) と、エントリを囲む
+    XMLBEGIN/XMLEND の TagValue (begin, end) を持つ。これらは応答ごとに作り直さずに使い回す。
+    """
+
+    index: int
+    xml_tag: Any
+    value_type: Optional[int]
+    child: Optional['_Template']
+    many: bool
+    begin: Any = None
+    end: Any = None
+
+
+class _Template:
+    """出力の NamedTuple 1 つ分の型紙
+
+    タグの解決と XmlTag の作成は登録時に 1 回だけ行い、応答のたびには
+    値 (_confd.Value) と TagValue だけを作る。
+    """
+
+    def __init__(self, fields: List[_Field]) -> None:
+        self.fields = fields
+        # 値の leaf だけの型紙 (リストのエントリをまとめて組み立てるのに使う)
+        self.flat = all(f.child is None and not f.many for f in fields)
+        self._leaves = [(f.index, f.xml_tag, f.value_type) for f in fields]
+
+    def fill(self, record: Any, values: List[Any]) -> None:
+        """*record* の値を TagValue にして *values* に追加する"""
+        TagValue, Value = _confd.TagValue, _confd.Value
+        if self.flat:
+            values.extend([TagValue(xml_tag, Value(record[index], value_type))
+                           for index, xml_tag, value_type in self._leaves
+                           if record[index] is not None])
+            return
+        for field in self.fields:
+            value = record[field.index]
+            if value is None:
+                continue
+            if field.child is not None:
+                # コンテナとリストのエントリは XMLBEGIN と XMLEND で囲む
+                for entry in (value if field.many else (value,)):
+                    values.append(field.begin)
+                    field.child.fill(entry, values)
+                    values.append(field.end)
+            elif field.many:
+                # leaf-list
+                items = [Value(item, field.value_type) for item in value]
+                values.append(TagValue(field.xml_tag, Value(items, _confd.C_LIST)))
+            else:
+                values.append(TagValue(field.xml_tag, Value(value, field.value_type)))
+
+
+class _Action:
+    """登録されたアクション 1 つ"""
+
+    def __init__(self, server: 'ActionServer', func: Callable, name: str,
+                 timeout: Optional[float], inline: bool) -> None:
+        self.func = func
+        self.name = name
+        self.timeout = timeout
+        self.inline = inline
+        self.is_async = inspect.iscoroutinefunction(func)
+        if inline and self.is_async:
+            raise TypeError(f"{name}: inline actions must be plain functions")
+
+        hints = get_type_hints(func)
+        params = list(inspect.signature(func).parameters.values())
+        self.wants_context = bool(params) and hints.get(params[0].name) is ActionContext
+        if self.wants_context:
+            params = params[1:]
+
+        # 入力のタグ → (引数名, 型ヒント)
+        self.inputs: Dict[int, Tuple[str, Any]] = {}
+        self.required: List[str] = []
+        for param in params:
+            self.inputs[server.tag(param.name)] = (param.name, _unwrap_optional(hints.get(param.name)))
+            if param.default is inspect.Parameter.empty:
+                self.required.append(param.name)
+
+        # 戻り値が NamedTuple なら、出力の型紙を登録時に作っておく (名前の誤りはここで分かる)
+        output = _unwrap_optional(hints.get('return'))
+        if _is_record(output):
+            server.template(output)
+
+    def decode(self, params: List[Any]) -> Dict[str, Any]:
+        """入力パラメータ (TagValue のリスト) を、関数のキーワード引数にする"""
+        kwargs: Dict[str, Any] = {}
+        for param in params:
+            tag = getattr(param.tag, 'tag', param.tag)
+            entry = self.inputs.get(tag)
+            if entry is None:
+                continue
+            name, hint = entry
+            try:
+                kwargs[name] = _decode(param.v, hint)
+            except (TypeError, ValueError) as e:
+                raise ActionError(f"invalid value for {name}: {e}")
+        missing = [name for name in self.required if name not in kwargs]
+        if missing:
+            raise ActionError(f"missing input: {', '.join(missing)}")
+        return kwargs
+
+    def call(self, ctx: ActionContext, kwargs: Dict[str, Any]) -> Any:
+        if self.wants_context:
+            return self.func(ctx, **kwargs)
+        return self.func(**kwargs)
+
+
+def _decode(value: Any, hint: Any) -> Any:
+    if get_origin(hint) in (list, List):
+        item_hint = (get_args(hint) or (None,))[0]
+        items = value.as_pyval()
+        if not isinstance(items, list):
+            items = [items]
+        return [_decode_item(item, item_hint) for item in items]
+    if hint is bool:
+        return bool(value.as_pyval())
+    if hint is str:
+        return str(value)
+    if hint is not None and getattr(hint, '__supertype__', hint) in (int, float):
+        return getattr(hint, '__supertype__', hint)(value)
+    return value.as_pyval()
+
+
+def _decode_item(item: Any, hint: Any) -> Any:
+    if hint is str:
+        return str(item)
+    if hint is not None and getattr(hint, '__supertype__', hint) in (int, float):
+        return getattr(hint, '__supertype__', hint)(item)
+    return item
+
+
+# =============================================================================
+# アクションサーバー
+# =============================================================================
+
+
+class _Callbacks:
+    """アクションポイント 1 つ分のコールバック (ConfD に登録するオブジェクト)"""
+
+    def __init__(self, server: 'ActionServer', actionpoint: str) -> None:
+        self._server = server
+        self._actionpoint = actionpoint
+
+    def cb_init(self, uinfo) -> int:
+        # このユーザーのアクションの応答はワーカーソケットから返す
+        dp.action_set_fd(uinfo, self._server.worker_sock)
+        return _confd.CONFD_OK
+
+    def cb_action(self, uinfo, name, kp, params) -> int:
+        return self._server.dispatch(self._actionpoint, uinfo, name, kp, params)
+
+    def cb_abort(self, uinfo) -> int:
+        self._server.abort(uinfo)
+        return _confd.CONFD_OK
+
+
+class ActionServer:
+    """関数として登録したアクションを、ConfD のアクションポイントで実行する
+
+    Args:
+        daemon_name: デーモン名 (dp.init_daemon に渡す)
+        ns: confdc --emit-python で生成した名前空間のクラス (入力/出力のタグの解決に使う)
+        actionpoint: action() で指定しない場合のアクションポイント名
+        host, port: ConfD のアドレス
+        timeout: action() で指定しない場合のタイムアウト (秒、None なら無制限)
+    """
+
+    def __init__(
+        self,
+        daemon_name: str,
+        ns: Any,
+        actionpoint: Optional[str] = None,
+        host: str = '127.0.0.1',
+        port: int = _confd.CONFD_PORT,
+        timeout: Optional[float] = None,
+    ) -> None:
+        self.daemon_name = daemon_name
+        self.ns = ns
+        self.actionpoint = actionpoint
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+        # (アクションポイント, アクションのタグ) → アクション
+        self._actions: Dict[Tuple[str, int], _Action] = {}
+        # 出力の NamedTuple → 型紙
+        self._templates: Dict[type, _Template] = {}
+        # 実行中のアクション (キー: str(uinfo))
+        self._active: Dict[str, ActionContext] = {}
+
+        # run() で作成する
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.pool: Optional[ActionPool] = None
+        self.worker_sock: Optional[socket.socket] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._loop_thread: Optional[int] = None
+        self._progress_sock: Optional[socket.socket] = None
+
+    # -------------------------------------------------------------------------
+    # 登録
+    # -------------------------------------------------------------------------
+
+    def tag(self, name: str) -> int:
+        """入力/出力の leaf の名前 (Python の名前) に対応するタグ"""
+        attr = f"{self.ns.prefix}_{name}"
+        try:
+            return getattr(self.ns, attr)
+        except AttributeError:
+            raise ValueError(f"{name}: no '{attr}' in the namespace module "
+                             f"(does the YANG model define '{name.replace('_', '-')}'?)") from None
+
+    def action(
+        self,
+        name: Optional[str] = None,
+        actionpoint: Optional[str] = None,
+        timeout: Optional[float] = None,
+        inline: bool = False,
+    ) -> Callable[[Callable], Callable]:
+        """関数をアクションとして登録するデコレーター
+
+        Args:
+            name: YANG のアクション名 (省略時は関数名)
+            actionpoint: アクションポイント名 (省略時はサーバーの既定値)
+            timeout: タイムアウト (秒、省略時はサーバーの既定値)
+            inline: cb_action の中でそのまま呼び出す (すぐに終わる関数用)
+        """
+        def register(func: Callable) -> Callable:
+            action_name = name or func.__name__
+            point = actionpoint or self.actionpoint
+            if point is None:
+                raise ValueError(f"{action_name}: no actionpoint")
+            tag = self.tag(action_name.replace('-', '_'))
+            self._actions[(point, tag)] = _Action(
+                self, func, action_name,
+                timeout if timeout is not None else self.timeout, inline)
+            return func
+        return register
+
+    def template(self, record: type) -> _Template:
+        """NamedTuple の各フィールドを出力の leaf に対応させた型紙 (作るのはクラスごとに 1 回)"""
+        template = self._templates.get(record)
+        if template is not None:
+            return template
+        ns_hash = self.ns.hash
+        fields = []
+        hints = get_type_hints(record)
+        for index, field_name in enumerate(record._fields):
+            hint = _unwrap_optional(hints[field_name])
+            many = get_origin(hint) in (list, List)
+            if many:
+                hint = (get_args(hint) or (str,))[0]
+            tag = self.tag(field_name)
+            xml_tag = _confd.XmlTag(ns_hash, tag)
+            if _is_record(hint):
+                fields.append(_Field(
+                    index, xml_tag, None, self.template(hint), many,
+                    _confd.TagValue(xml_tag, _confd.Value((tag, ns_hash), _confd.C_XMLBEGIN)),
+                    _confd.TagValue(xml_tag, _confd.Value((tag, ns_hash), _confd.C_XMLEND)),
+                ))
+            elif hint in _VALUE_TYPES:
+                fields.append(_Field(index, xml_tag, _VALUE_TYPES[hint], None, many))
+            else:
+                raise TypeError(f"{record.__name__}.{field_name}: unsupported output type {hint!r}")
+        template = self._templates[record] = _Template(fields)
+        return template
+
+    # -------------------------------------------------------------------------
+    # 出力
+    # -------------------------------------------------------------------------
+
+    def encode(self, result: Any) -> List[Any]:
+        """関数の戻り値を、出力の TagValue のリストにする"""
+        if result is None:
+            return []
+        if isinstance(result, list):
+            return result
+        template = self._templates.get(type(result))
+        if template is None:
+            if not _is_record(type(result)):
+                raise TypeError(f"action returned {type(result).__name__}, expected a NamedTuple")
+            template = self.template(type(result))
+        values: List[Any] = []
+        template.fill(result, values)
+        return values
+
+    # -------------------------------------------------------------------------
+    # 実行
+    # -------------------------------------------------------------------------
+
+    def dispatch(self, actionpoint: str, uinfo: Any, name: Any, kp: Any, params: List[Any]) -> int:
+        """cb_action の本体"""
+        tag = getattr(name, 'tag', name)
+        action = self._actions.get((actionpoint, tag))
+        if action is None:
+            dp.action_seterr(uinfo, f"no handler for action {name} on {actionpoint}")
+            return _confd.CONFD_ERR
+
+        ctx = ActionContext(self, uinfo, action.name, kp)
+        logger.debug("Action %s invoked by %s", action.name, ctx.user)
+        try:
+            kwargs = action.decode(params)
+            if action.inline:
+                result = action.call(ctx, kwargs)
+                if not inspect.isawaitable(result):
+                    dp.action_reply_values(uinfo, self.encode(result))
+                    return _confd.CONFD_OK
+                work = result
+            elif action.is_async:
+                work = action.call(ctx, kwargs)
+            else:
+                work = self._in_thread(action, ctx, kwargs)
+        except ActionError as e:
+            logger.info("Action %s failed: %s", action.name, e)
+            dp.action_seterr(uinfo, str(e))
+            return _confd.CONFD_ERR
+        except Exception as e:
+            logger.exception("Action %s failed", action.name)
+            dp.action_seterr(uinfo, str(e))
+            return _confd.CONFD_ERR
+
+        try:
+            task = self.pool.submit(ctx.user, self._execute(action, ctx, work))
+        except ActionRejected as e:
+            logger.info("Rejected action %s: %s %s", action.name, e, self.pool.snapshot())
+            work.close()
+            dp.action_seterr(uinfo, str(e))
+            return _confd.CONFD_ERR
+
+        ctx.task = task
+        self._active[str(uinfo)] = ctx
+        task.add_done_callback(lambda task: self._reply(ctx, task, work))
+        return _confd.DELAYED_RESPONSE
+
+    async def _in_thread(self, action: _Action, ctx: ActionContext, kwargs: Dict[str, Any]) -> Any:
+        # 実行枠を得てから、共有のスレッドプールで関数を呼び出す
+        return await self.loop.run_in_executor(
+            self._executor, functools.partial(action.call, ctx, kwargs))
+
+    async def _execute(self, action: _Action, ctx: ActionContext, work: Any) -> List[Any]:
+        try:
+            if action.timeout:
+                result = await asyncio.wait_for(work, action.timeout)
+            else:
+                result = await work
+        except asyncio.TimeoutError:
+            ctx.cancelled.set()
+            raise ActionError(f"{action.name} timed out after {action.timeout:g} seconds") from None
+        return self.encode(result)
+
+    def _reply(self, ctx: ActionContext, task: asyncio.Task, work: Any) -> None:
+        """アクションのタスクが終わったときに、遅延応答を返す"""
+        # 待ち行列にいる間に取り消された場合、work は開始すらされていないので閉じる
+        if inspect.iscoroutine(work):
+            work.close()
+        key = str(ctx.uinfo)
+        if self._active.get(key) is ctx:
+            del self._active[key]
+        if task.cancelled() or ctx.aborted:
+            # cb_abort が既に応答を返している (またはデーモンの終了)
+            return
+        try:
+            dp.action_reply_values(ctx.uinfo, task.result())
+            logger.debug("Action %s replied", ctx.name)
+        except Exception as e:
+            if isinstance(e, ActionError):
+                logger.info("Action %s failed: %s", ctx.name, e)
+            else:
+                logger.error("Action %s failed", ctx.name, exc_info=e)
+            try:
+                dp.action_delayed_reply_error(ctx.uinfo, str(e))
+            except Exception as e2:
+                logger.warning("Could not send error reply (connection may be closed): %s", e2)
+
+    def abort(self, uinfo: Any) -> None:
+        """cb_abort の本体: 実行中 (または待ち行列にいる) アクションを取り消す"""
+        ctx = self._active.pop(str(uinfo), None)
+        if ctx is None:
+            logger.debug("No active action to abort")
+            return
+        logger.info("Action %s aborted by %s", ctx.name, ctx.user)
+        ctx.aborted = True
+        ctx.cancelled.set()
+        ctx.task.cancel()
+        try:
+            # Ctrl-C の後は結果を CLI に表示できないので、エラーだけを返す
+            dp.action_delayed_reply_error(uinfo, "Action aborted by user")
+        except Exception as e:
+            logger.warning("Error sending abort reply: %s", e)
+
+    # -------------------------------------------------------------------------
+    # 途中経過の表示
+    # -------------------------------------------------------------------------
+
+    def write_progress(self, uinfo: Any, text: str) -> bool:
+        """
+        アクションを実行したユーザーのCLIセッションに、途中経過を1行書き込む
+
+        アクションの応答は完了時に一度しか返せないため、実行中の出力は
+        MAAPI の cli_write() でユーザーセッション (uinfo.usid) に直接書き込みます。
+        MAAPIのソケットは最初に書き込むときに接続し、以降は使い回します。
+        スレッドで実行中の関数から呼ばれた場合は、イベントループで書き込みます。
+
+        Returns:
+            書き込めた場合は True。CLI以外から実行された場合や書き込みに失敗した場合は False
+        """
+        if getattr(uinfo, 'context', 'cli') != 'cli':
+            return False
+        if self._loop_thread is not None and threading.get_ident() != self._loop_thread:
+            self.loop.call_soon_threadsafe(self.write_progress, uinfo, text)
+            return True
+
+        try:
+            if self._progress_sock is None:
+                self._progress_sock = socket.socket()
+                maapi.connect(sock=self._progress_sock, ip=self.host, port=self.port)
+            maapi.cli_write(self._progress_sock, uinfo.usid, text + '\n')
+            return True
+        except Exception as e:
+            # セッションが終わっている場合など。次に書き込むときに接続し直す
+            logger.info("Could not write progress to CLI: %s", e)
+            if self._progress_sock is not None:
+                self._progress_sock.close()
+                self._progress_sock = None
+            return False
+
+    # -------------------------------------------------------------------------
+    # イベントループ
+    # -------------------------------------------------------------------------
+
+    def run(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        per_user: int = DEFAULT_PER_USER,
+    ) -> None:
+        """ConfD に接続してアクションポイントを登録し、シグナルを受けるまでイベントループを実行する
+
+        Args:
+            workers: 同時に実行するアクションの数 (スレッドプールの大きさも同じ)
+            queue_size: 実行を待つアクションの数の上限
+            per_user: 1ユーザーが同時に投入できるアクションの数
+        """
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._loop_thread = threading.get_ident()
+        self.pool = ActionPool(workers, queue_size, per_user)
+        self._executor = ThreadPoolExecutor(max_workers=self.pool.workers, thread_name_prefix='action')
+        logger.info("Action pool: %d workers, queue size %d, %d per user", workers, queue_size, per_user)
+
+        daemon_ctx = dp.init_daemon(self.daemon_name)
+        ctrl_sock = socket.socket()
+        self.worker_sock = socket.socket()
+
+        try:
+            logger.info("Connecting to ConfD at %s:%d...", self.host, self.port)
+            dp.connect(daemon_ctx, ctrl_sock, dp.CONTROL_SOCKET, self.host, self.port, None)
+            dp.connect(daemon_ctx, self.worker_sock, dp.WORKER_SOCKET, self.host, self.port, None)
+
+            for actionpoint in sorted({point for point, _ in self._actions}):
+                logger.info("Registering action point: %s", actionpoint)
+                dp.register_action_cbs(daemon_ctx, actionpoint, _Callbacks(self, actionpoint))
+            dp.register_done(daemon_ctx)
+            logger.info("%s registration complete", self.daemon_name)
+
+            def on_readable(sock: socket.socket) -> None:
+                try:
+                    dp.fd_ready(daemon_ctx, sock)
+                except _confd.error.Error as e:
+                    if e.confd_errno == _confd.ERR_EXTERNAL:
+                        # コールバックの中の例外。デーモンは続ける
+                        logger.error("Callback error: %s", e)
+                        return
+                    if e.confd_errno == _confd.ERR_EOF:
+                        logger.info("ConfD closed connection, shutting down...")
+                    else:
+                        logger.error("Error processing socket data: %s", e)
+                    self.loop.stop()
+                except Exception as e:
+                    logger.error("Error processing socket data: %s", e)
+                    self.loop.stop()
+
+            def on_signal(signum: int) -> None:
+                logger.info("Received signal %d, shutting down...", signum)
+                self.loop.stop()
+
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                self.loop.add_signal_handler(signum, on_signal, signum)
+            for sock in (ctrl_sock, self.worker_sock):
+                self.loop.add_reader(sock.fileno(), on_readable, sock)
+            self.loop.run_forever()
+
+        finally:
+            logger.info("Shutting down %s", self.daemon_name)
+            # 実行中のアクションのタスクを止めてからループを閉じる
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            for ctx in self._active.values():
+                ctx.cancelled.set()
+            self._executor.shutdown(wait=False)
+            if self._progress_sock is not None:
+                self._progress_sock.close()
+                self._progress_sock = None
+            self.loop.close()
+            self._loop_thread = None
+            ctrl_sock.close()
+            self.worker_sock.close()
+            dp.release_daemon(daemon_ctx)
+
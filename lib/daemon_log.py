@@ -0,0 +1,309 @@
+"""
+デーモンのログ出力 (バッファ付き・非同期)
+
+これまで各デーモンのログは、
+- log() のたびにログファイルを開いて 1 行追記して閉じる
+- 標準出力をログファイルに dup2 して print() する
+のどちらかでした。前者は 1 行ごとに open/write/close のシステムコールが発生し、
+アクションやデータ取得のコールバックの中で何度も呼ばれると無視できない負荷になります。
+
+daemon_log は、ログの書き込みをコールバックの処理から切り離します。
+
+- log() は行をバッファ (deque) に追加するだけで、すぐに戻る
+  (文字列への整形もファイルへの書き込みも、呼び出し元では行わない)
+- バックグラウンドのスレッドが flush_interval 秒ごと (または行が溜まったとき) に
+  バッファの行をまとめて整形し、開いたままのファイルに 1 回の write で書く
+- バッファの長さには上限があり、あふれた行は捨てて件数を数える
+  (ログが詰まってもデーモンの処理は止めない。捨てた件数はログに書く)
+- ファイルが max_bytes を超えたらローテーションする (xxx.log.1, xxx.log.2, ...)
+- json_lines=True にすると、1 行に 1 つの JSON オブジェクトを書く
+    {"time": "...", "level": "INFO", "daemon": "ping_action", "message": "...", ...}
+- 捕捉されなかった例外 (メインスレッド、その他のスレッド) と、標準ライブラリの
+  logging で書かれたログも同じファイルに出力する
+
+リポジトリ直下の lib/ に 1 つだけ置き、各デーモンは lib/ を sys.path に加えて import します。
+
+【使い方】
+    sys.path.insert(0, str(Path(__file__).resolve().parents[2] / 'lib'))
+    import daemon_log
+    from daemon_log import log
+
+    daemonize()                                   # fork の後で開始する (スレッドは fork で引き継がれない)
+    daemon_log.setup(LOG_FILE, json_lines=args.log_json)
+    log("started")
+    log("lookup done", usec=12)                   # 追加のフィールド (JSON ではキーになる)
+    log("failed", logging.ERROR)
+
+setup() の前に書いたログは、警告以上のものだけが標準エラー出力に出ます。
+終了時 (atexit) に、残っている行を書き出してファイルを閉じます。
+"""
+
+import atexit
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+DEFAULT_BUFFER_SIZE = 10000
+DEFAULT_FLUSH_INTERVAL = 0.1
+
+# この行数が溜まったら、flush_interval を待たずに書き出す
+_BATCH = 512
+
+# バッファに入れる 1 行分: (時刻, レベル, メッセージ, フィールド, 例外のトレースバック, ロガー名)
+_Entry = Tuple[float, int, str, Optional[Dict[str, Any]], Optional[str], Optional[str]]
+
+_writer: Optional['_Writer'] = None
+_atexit_registered = False
+
+
+# =============================================================================
+# 書き込み
+# =============================================================================
+
+
+class _Writer:
+    """バッファの行をバックグラウンドのスレッドでファイルに書く"""
+
+    def __init__(self, path: Path, json_lines: bool, console: bool, level: int,
+                 max_bytes: int, backup_count: int, buffer_size: int, flush_interval: float) -> None:
+        self.path = path
+        self.json_lines = json_lines
+        self.console = console
+        self.level = level
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer_size = max(buffer_size, 1)
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._daemon = path.stem
+        self._buffer: Deque[_Entry] = deque()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._file = open(path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+        # 同じ秒の時刻文字列は使い回す
+        self._second = -1
+        self._stamp = ''
+        self._thread = threading.Thread(target=self._run, name='daemon-log', daemon=True)
+        self._thread.start()
+
+    def put(self, entry: _Entry) -> None:
+        # deque.append() はスレッドセーフなので、ロックは取らない
+        if len(self._buffer) >= self.buffer_size:
+            self.dropped += 1
+            return
+        self._buffer.append(entry)
+        if len(self._buffer) >= _BATCH:
+            self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._write_pending()
+        self._write_pending()
+
+    def _write_pending(self) -> None:
+        lines: List[str] = []
+        buffer = self._buffer
+        while buffer:
+            lines.append(self._format(buffer.popleft()))
+        if self.dropped:
+            dropped, self.dropped = self.dropped, 0
+            lines.append(self._format((time.time(), logging.WARNING,
+                                       f"{dropped} log records dropped (buffer full)", None, None, None)))
+        if not lines:
+            return
+        text = '\n'.join(lines) + '\n'
+        try:
+            if self.max_bytes and self._size + len(text) > self.max_bytes and self._size:
+                self._rotate()
+            self._file.write(text)
+            self._file.flush()
+            self._size += len(text.encode('utf-8'))
+        except (OSError, ValueError) as e:
+            # ValueError は閉じたファイルへの書き込み。ここで止めるとスレッドが終わり、
+            # 以降のログがすべて失われるので、エラーを出して次の書き出しを続ける
+            sys.stderr.write(f"daemon_log: could not write {self.path}: {e}\n")
+        if self.console:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+    def _rotate(self) -> None:
+        """ファイルを xxx.log.1 にずらして開き直す
+
+        名前を変えられなかった場合 (権限やディスクの問題) は、今のファイルにそのまま書き続ける。
+        開き直せなかった場合は、今のファイルを開いたままにする。
+        """
+        try:
+            if self.backup_count > 0:
+                for i in range(self.backup_count - 1, 0, -1):
+                    src = Path(f"{self.path}.{i}")
+                    if src.exists():
+                        os.replace(src, f"{self.path}.{i + 1}")
+                os.replace(self.path, f"{self.path}.1")
+            else:
+                self.path.unlink(missing_ok=True)
+        except OSError as e:
+            sys.stderr.write(f"daemon_log: could not rotate {self.path}: {e}\n")
+        # 失敗した場合も、書き出しのたびにローテーションし直さないよう、数え直す
+        self._size = 0
+        try:
+            new_file = open(self.path, 'a', encoding='utf-8')
+        except OSError as e:
+            sys.stderr.write(f"daemon_log: could not reopen {self.path}: {e}\n")
+            return
+        self._file.close()
+        self._file = new_file
+
+    def _format(self, entry: _Entry) -> str:
+        created, level, message, fields, exc_text, logger = entry
+        if self.json_lines:
+            record: Dict[str, Any] = {
+                'time': datetime.fromtimestamp(created).astimezone().isoformat(timespec='milliseconds'),
+                'level': logging.getLevelName(level),
+                'daemon': self._daemon,
+                'message': message,
+            }
+            if logger:
+                record['logger'] = logger
+            for key, value in (fields or {}).items():
+                record.setdefault(key, value)
+            if exc_text:
+                record['exception'] = exc_text
+            return json.dumps(record, ensure_ascii=False, default=str)
+
+        # [2025-01-01 12:00:00] message key=value (これまでの log() と同じ形式)
+        # INFO 以外はレベルを前に付ける: [2025-01-01 12:00:00] ERROR: message
+        second = int(created)
+        if second != self._second:
+            self._second = second
+            self._stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(second))
+        if level == logging.INFO:
+            line = f"[{self._stamp}] {message}"
+        else:
+            line = f"[{self._stamp}] {logging.getLevelName(level)}: {message}"
+        if fields:
+            line += ' ' + ' '.join(f"{k}={v}" for k, v in fields.items())
+        if exc_text:
+            line += '\n' + exc_text
+        return line
+
+    def close(self) -> None:
+        """残っている行を書き出してから閉じる"""
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout=5)
+        self._file.close()
+
+
+class _Bridge(logging.Handler):
+    """標準ライブラリの logging で書かれたログを、同じバッファに入れる"""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        writer = _writer
+        if writer is None:
+            return
+        exc_text = None
+        if record.exc_info:
+            exc_text = ''.join(traceback.format_exception(*record.exc_info)).rstrip()
+        writer.put((record.created, record.levelno, record.getMessage(),
+                    getattr(record, 'fields', None), exc_text, record.name))
+
+
+# =============================================================================
+# 公開関数
+# =============================================================================
+
+
+def setup(
+    path: Path,
+    json_lines: bool = False,
+    console: bool = False,
+    level: int = logging.INFO,
+    max_bytes: int = DEFAULT_MAX_BYTES,
+    backup_count: int = DEFAULT_BACKUP_COUNT,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+) -> None:
+    """*path* へのログの書き込みを開始する (デーモン化の fork の後で呼ぶ)
+
+    console=True の場合は標準出力にも書く (フォアグラウンドで実行する場合)。
+    """
+    global _writer, _atexit_registered
+
+    shutdown()
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _writer = _Writer(path, json_lines, console, level,
+                      max_bytes, backup_count, buffer_size, flush_interval)
+
+    root = logging.getLogger()
+    root.addHandler(_Bridge())
+    root.setLevel(level)
+
+    # 捕捉されなかった例外もログに残す (標準エラー出力はデーモン化で /dev/null になっている)
+    sys.excepthook = _log_uncaught
+    threading.excepthook = _log_uncaught_in_thread
+
+    if not _atexit_registered:
+        atexit.register(shutdown)
+        _atexit_registered = True
+
+
+def log(message: str, level: int = logging.INFO, **fields: Any) -> None:
+    """ログを 1 行書く (バッファに入れるだけで、すぐに戻る)
+
+    fields はテキスト形式では key=value として、JSON 形式ではキーとして出力する。
+    """
+    writer = _writer
+    if writer is None:
+        # setup() の前 (デーモン化の前など) は警告以上だけを標準エラー出力に出す
+        if level >= logging.WARNING:
+            sys.stderr.write(f"{message}\n")
+        return
+    if level >= writer.level:
+        writer.put((time.time(), level, message, fields or None, None, None))
+
+
+def shutdown() -> None:
+    """残っている行を書き出して、ログファイルを閉じる"""
+    global _writer
+
+    if _writer is None:
+        return
+    root = logging.getLogger()
+    for handler in [h for h in root.handlers if isinstance(h, _Bridge)]:
+        root.removeHandler(handler)
+    writer, _writer = _writer, None
+    writer.close()
+
+
+def _log_uncaught(exc_type, exc, tb) -> None:
+    _put_exception("Uncaught exception", exc_type, exc, tb)
+
+
+def _log_uncaught_in_thread(args: threading.ExceptHookArgs) -> None:
+    thread = args.thread.name if args.thread is not None else '?'
+    _put_exception(f"Uncaught exception in thread {thread}",
+                   args.exc_type, args.exc_value, args.exc_traceback)
+
+
+def _put_exception(message: str, exc_type, exc, tb) -> None:
+    writer = _writer
+    exc_text = ''.join(traceback.format_exception(exc_type, exc, tb)).rstrip()
+    if writer is None:
+        sys.stderr.write(f"{message}\n{exc_text}\n")
+        return
+    writer.put((time.time(), logging.CRITICAL, message, None, exc_text, None))
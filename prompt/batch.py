@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+"""CLI のバッチモード (対話なしでコマンドを流し込む) を提供するモジュール。
+
+``cli.py -c "hello name=a" -c "add x=1 y=2"`` や ``cli.py --batch commands.txt``
+(``-`` なら標準入力) で使う。PromptSession は作らず、対話モードと同じ
+ExampleCli._handle_line() と YANG で指定された handler でコマンドを実行する。
+
+* 1 コマンドの結果を JSON 1 行で出力する (JSON Lines)
+* 同期的な handler は入力順にその場で実行される。
+  コルーチンを返す handler (ping など) はジョブとして並行に動き、
+  同時に動かすコマンドの数は *concurrency* で制限する
+* 結果は終わった順に出力する。入力の何行目かは "line" で対応付ける
+
+handler が print() した内容は、コマンドごとに取り込んで "output" に入れる。
+並行に動くコマンドの出力が混ざらないように、sys.stdout を差し替えて
+コマンドのタスクごとのバッファ (contextvars) に振り分ける。
+"""
+
+import asyncio
+import contextvars
+import io
+import json
+import sys
+import time
+from typing import Any, Dict, Iterable, Optional, TextIO
+
+from cli_core import ExampleCli
+
+# 実行中のコマンドの出力バッファ (コマンドのタスクの中でだけ設定される)
+_capture: contextvars.ContextVar[Optional[io.StringIO]] = contextvars.ContextVar(
+    "_capture",
+    default=None,
+)
+
+
+class _CapturedStdout(io.TextIOBase):
+    """コマンドのタスクの中で書かれた出力を、そのコマンドのバッファに振り分ける。"""
+
+    def __init__(self, real: TextIO) -> None:
+        self._real = real
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, s: str) -> int:
+        buf = _capture.get()
+        if buf is None:
+            return self._real.write(s)
+        return buf.write(s)
+
+    def flush(self) -> None:
+        self._real.flush()
+
+
+async def _run_command(cli: ExampleCli, number: int, line: str) -> Dict[str, Any]:
+    buf = io.StringIO()
+    _capture.set(buf)
+    start = time.perf_counter()
+
+    # _handle_line() は途中で await しないので、ここまでは他のコマンドと混ざらない
+    try:
+        keep_going = cli._handle_line(line)
+        failed = cli.command_failed
+    except Exception as e:  # noqa: BLE001
+        print(f"Error: {e}")
+        keep_going, failed = True, True
+    job, cli._foreground = cli._foreground, None
+
+    if job is not None and job.task is not None:
+        await asyncio.wait({job.task})
+        failed = failed or job.status != "Done"
+
+    return {
+        "line": number,
+        "command": line,
+        "ok": not failed,
+        "output": buf.getvalue().splitlines(),
+        "elapsed": round(time.perf_counter() - start, 6),
+        "exit": not keep_going,
+    }
+
+
+async def run_batch(
+    cli: ExampleCli,
+    lines: Iterable[str],
+    out: TextIO,
+    concurrency: int = 16,
+) -> int:
+    """*lines* のコマンドを実行し、結果を JSON Lines で *out* に書く。
+
+    空行と "#" で始まる行は読み飛ばす。exit / quit の行でそれ以降を読むのをやめる。
+    すべて成功すれば 0、失敗したコマンドがあれば 1 を返す。
+    """
+
+    cli.batch = True
+    semaphore = asyncio.Semaphore(max(concurrency, 1))
+    pending = set()
+    failures = 0
+
+    def _done(task: "asyncio.Task[Dict[str, Any]]") -> None:
+        nonlocal failures
+        semaphore.release()
+        pending.discard(task)
+        result = task.result()
+        if not result.pop("exit"):
+            if not result["ok"]:
+                failures += 1
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+    real_stdout = sys.stdout
+    sys.stdout = _CapturedStdout(real_stdout)
+    try:
+        for number, raw in enumerate(lines, 1):
+            line = raw.strip()
+            if not line or line.startswith("#"):
+                continue
+            await semaphore.acquire()
+            task = asyncio.get_running_loop().create_task(_run_command(cli, number, line))
+            task.add_done_callback(_done)
+            pending.add(task)
+            if line in {"exit", "quit"}:
+                break
+            # 入力が多い場合でも、動いているジョブと結果の出力を進める
+            await asyncio.sleep(0)
+
+        if pending:
+            await asyncio.wait(set(pending))
+        await cli.jobs.cancel_all()
+    finally:
+        sys.stdout = real_stdout
+        out.flush()
+
+    return 1 if failures else 0
@@ -12,36 +12,112 @@ ConfD の Python API を一切使わず、以下を行う簡易 CLI を提供す
 このファイルは CLI のエントリポイントのみを提供し、YANG モデルの
 読み込みロジックは yang_model モジュールに、CLI 本体とハンドラ類は
 cli_core モジュールに分離している。
+
+起動時は YANG ファイルを事前スキャンして索引だけを作り、pyang による
+解析は rpc や show を初めて使ったときに必要なファイルに限って行う。
+索引と解析結果は tmp/ 配下にキャッシュし、変更の無いファイルは次回以降再利用する。
+
+-c または --batch を指定するとバッチモードになり、対話せずにコマンドを実行して
+結果を JSON Lines で出力する (batch モジュール)。
 """
 
 from __future__ import annotations
 
+import argparse
+import asyncio
+import hashlib
 import sys
 from pathlib import Path
 from typing import List
 
+from batch import run_batch
 from cli_core import ExampleCli
-from yang_model import load_example_yang
+from yang_model import load_example_yang, load_yang_lazily
 
 
 HERE = Path(__file__).resolve().parent
 YANG_DIR = HERE / "yang"
+CACHE_DIR = HERE / "tmp"
 
 
-def main(argv: List[str]) -> int:
-    """CLI エントリポイント関数。
+def cache_path_for(yang_dir: Path) -> Path:
+    """YANG ディレクトリごとのキャッシュファイルのパスを返す。"""
+
+    digest = hashlib.sha1(str(yang_dir.resolve()).encode("utf-8")).hexdigest()[:12]
+    return CACHE_DIR / f"yang-cache-{digest}.pickle"
 
-    現時点では *argv* は使用していないが、将来的にコマンドライン
-    オプションを追加する際の拡張余地として受け取っている。
-    """
+
+def main(argv: List[str]) -> int:
+    """CLI エントリポイント関数。"""
+
+    parser = argparse.ArgumentParser(description="Example YANG CLI")
+    parser.add_argument(
+        "--yang-dir",
+        type=Path,
+        default=YANG_DIR,
+        help=f"directory containing *.yang files (default: {YANG_DIR})",
+    )
+    parser.add_argument(
+        "--eager",
+        action="store_true",
+        help="parse all YANG files at startup instead of on demand",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="do not read or write the YANG cache",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="number of processes used to parse YANG files (default: CPU count)",
+    )
+    parser.add_argument(
+        "-c",
+        "--command",
+        action="append",
+        dest="commands",
+        metavar="COMMAND",
+        help="run COMMAND in batch mode (can be repeated)",
+    )
+    parser.add_argument(
+        "--batch",
+        metavar="FILE",
+        help="run commands read from FILE ('-' for stdin) in batch mode",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=16,
+        help="maximum number of commands running at once in batch mode (default: 16)",
+    )
+    args = parser.parse_args(argv)
 
     try:
-        model = load_example_yang(YANG_DIR)
+        if args.eager:
+            model = load_example_yang(args.yang_dir, args.jobs)
+        else:
+            cache_path = None if args.no_cache else cache_path_for(args.yang_dir)
+            model = load_yang_lazily(args.yang_dir, cache_path, args.jobs)
     except Exception as e:  # noqa: BLE001
         print(f"Failed to load YANG model: {e}", file=sys.stderr)
         return 1
 
     cli = ExampleCli(model)
+
+    if args.commands:
+        return asyncio.run(run_batch(cli, args.commands, sys.stdout, args.concurrency))
+    if args.batch:
+        if args.batch == "-":
+            return asyncio.run(run_batch(cli, sys.stdin, sys.stdout, args.concurrency))
+        try:
+            with open(args.batch, encoding="utf-8") as f:
+                return asyncio.run(run_batch(cli, f, sys.stdout, args.concurrency))
+        except OSError as e:
+            print(f"Failed to read batch file: {e}", file=sys.stderr)
+            return 1
+
     cli.run()
     return 0
 
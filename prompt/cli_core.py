@@ -2,15 +2,35 @@ from __future__ import annotations
 
 """Example YANG CLI 本体と補完、各種ハンドラ群を集約したモジュール。"""
 
-import importlib
+import asyncio
+import inspect
+import ipaddress
 import shlex
+import signal
 import socket
 import subprocess
-from typing import Dict, List, Optional, Sequence, Union
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Dict, List, Optional, Sequence, Tuple, Union
 
 from prompt_toolkit import PromptSession
 from prompt_toolkit.completion import Completer, Completion
+from prompt_toolkit.patch_stdout import patch_stdout
 
+from completion_index import CompletionIndex, KeyProvider, LineTokenizer, PathCompleter
+from handler_table import HandlerTable
+from jobs import Job, JobTable, emit
+
+# ping_sweep と rib は ConfD に依存しないので、各例の bin/ にあるものをそのまま使う
+# (このディレクトリのモジュールが優先されるよう、末尾に加える)
+_REPO_DIR = Path(__file__).resolve().parent.parent
+for _bin_dir in (_REPO_DIR / "3-ping" / "bin", _REPO_DIR / "4-network-device" / "bin"):
+    if str(_bin_dir) not in sys.path:
+        sys.path.append(str(_bin_dir))
+
+from ping_sweep import DEFAULT_CONCURRENCY, expand_targets, format_table, summarize, sweep
+from rib import Rib, Route
 from yang_model import YangModel
 
 
@@ -22,61 +42,121 @@ class ExampleCli:
 
     def __init__(self, model: YangModel) -> None:
         self.model = model
-        self.session = PromptSession()
+        # 対話モードでだけ使う (バッチモードでは作らない)
+        self.session: Optional[PromptSession] = None
 
         # 非永続な簡易 state 形
-        # YANGのstate leafから生成する。
-        self.state: Dict[str, Optional[str]] = {
-            leaf: None for leaf in self.model.state_leaf_names
-        }
+        # 値が無い leaf は None として表示する (self.state.get(leaf))。
+        self.state: Dict[str, Optional[str]] = {}
 
-        # いくつかのよくある項目だけ、存在すればデフォルト値を与える。
-        if "hostname" in self.state:
-            self.state["hostname"] = socket.gethostname()
+        # いくつかのよくある項目だけデフォルト値を与える。
+        # state leaf の一覧は最初の show まで読み込まれないことがあるため、
+        # YANG に存在するかどうかに関係なく設定しておく
+        # (YANG に無い leaf は show で参照できないので表示には影響しない)。
+        self.state["hostname"] = socket.gethostname()
 
-        if "mgmt-ip" in self.state:
-            # demo 用の固定値 (必要なら YANG 側に default を追加してもよい)
-            self.state["mgmt-ip"] = "192.0.2.1"
+        # demo 用の固定値 (必要なら YANG 側に default を追加してもよい)
+        self.state["mgmt-ip"] = "192.0.2.1"
 
-        if "route" in self.state:
-            # route は詳細表示用サマリ
-            self.state["route"] = "use 'show route [ipv4|ipv6]'"
+        # route は詳細表示用サマリ
+        self.state["route"] = "use 'show route [ipv4|ipv6|<address>]'"
+
+        # Demo 用のダミー経路データ
+        # 最長一致検索できるように経路表 (パトリシアトライ) に登録しておく
+        self.rib = Rib()
+        for route in (
+            Route("0.0.0.0/0", next_hop="192.0.2.254", metric=1),
+            Route("192.0.2.0/24", next_hop="0.0.0.0", metric=0),
+            Route("::/0", next_hop="2001:db8::ffff", metric=1),
+            Route("2001:db8::/64", next_hop="::", metric=0),
+        ):
+            self.rib.add(route)
+
+        # list のキーの値を補完するための実データ (list のスキーマパス → 取得関数)
+        # 例: OpenConfig の /interfaces/interface はこのホストのインターフェース名で補完する
+        self.key_providers: Dict[str, KeyProvider] = {
+            "/interfaces/interface": _host_interface_keys,
+        }
+
+        # コルーチンを返す handler (ping など) はジョブとして asyncio のタスクで動かす
+        self.jobs = JobTable()
+        # 処理中の行 (ジョブ表に表示する) と、末尾に "&" が付いていたか
+        self._command_line = ""
+        self._background = False
+        # 行の処理後に終了を待つフォアグラウンドのジョブ
+        self._foreground: Optional[Job] = None
+
+        # バッチモード (batch.py) では "&" を無視し、すべてのジョブの終了を待つ
+        self.batch = False
+        # 直前に処理した行がエラーになったか (バッチモードの結果に使う)
+        self.command_failed = False
+
+        # YANG で指定された handler は起動時にまとめて解決しておき、
+        # 解決できないものはここで報告する (実行時には表を引くだけにする)
+        self.handlers = HandlerTable()
+        for symbol, reason in self.handlers.preload(model.handler_symbols()).items():
+            print(f"Warning: cannot resolve handler '{symbol}': {reason}", file=sys.stderr)
 
     def run(self) -> None:
         """メインの REPL ループを実行する。"""
 
-        print(self.intro)
-        completer = CliCompleter(self)
-        while True:
-            try:
-                line = self.session.prompt(self.prompt, completer=completer)
-            except EOFError:
-                # Ctrl-D で終了
-                print()
-                break
-            except KeyboardInterrupt:
-                # Ctrl-C では行をキャンセルして再度プロンプト
-                print()
-                continue
+        asyncio.run(self.run_async())
 
-            line = line.strip()
-            if not line:
-                # 空行では何もしない
-                continue
+    async def run_async(self) -> None:
+        """REPL ループ本体。
+
+        入力待ちの間もイベントループが回るので、バックグラウンドのジョブは実行を続け、
+        その出力は patch_stdout によってプロンプトの上に表示される。
+        """
+
+        if self.session is None:
+            self.session = PromptSession()
 
-            if not self._handle_line(line):
-                break
+        print(self.intro)
+        completer = CliCompleter(self)
+        with patch_stdout():
+            while True:
+                try:
+                    line = await self.session.prompt_async(self.prompt, completer=completer)
+                except EOFError:
+                    # Ctrl-D で終了
+                    print()
+                    break
+                except KeyboardInterrupt:
+                    # Ctrl-C では行をキャンセルして再度プロンプト
+                    print()
+                    continue
+
+                line = line.strip()
+                if not line:
+                    # 空行では何もしない
+                    continue
+
+                if not self._handle_line(line):
+                    break
+
+                if self._foreground is not None:
+                    await self._wait_foreground()
+
+            # 終了時に残っているジョブは止める
+            await self.jobs.cancel_all()
 
     def _handle_line(self, line: str) -> bool:
         """1 行分の入力を処理する。
 
         戻り値が False の場合、REPL を終了する。
+        エラーになった場合は command_failed が True になる。
         """
 
+        self.command_failed = False
+
         # 組み込み bash サブシェル起動
         # "bash" と入力すると /usr/bin/bash を起動し、終了後に CLI に戻る。
         if line == "bash":
-            self._run_bash_shell()
+            if self.batch:
+                self._error("bash is not available in batch mode")
+            else:
+                self._run_bash_shell()
             return True
 
         # 終了系
@@ -91,22 +171,36 @@ class ExampleCli:
         try:
             tokens = shlex.split(line)
         except ValueError as e:
-            print(f"parse error: {e}")
+            self._error(f"parse error: {e}")
             return True
 
+        # 末尾の "&" はジョブをバックグラウンドで動かす指定 (シェルと同じ)
+        self._background = bool(tokens) and tokens[-1].endswith("&")
+        if self._background:
+            tokens[-1] = tokens[-1][:-1]
+            if not tokens[-1]:
+                tokens.pop()
+            self._background = not self.batch
+        self._command_line = " ".join(tokens)
+
         if not tokens:
             return True
 
+        # ジョブ制御
+        if tokens[0] in {"jobs", "fg", "kill"}:
+            self.do_job_control(tokens[0], tokens[1:])
+            return True
+
         # show 系コマンド
         if tokens[0] == "show":
             # 2語目以降が無い場合は使い方を案内
             if len(tokens) == 1:
-                print("Usage: show <leaf> [<args>]")
+                self._error("Usage: show <leaf> [<args>]")
                 return True
 
             # show state ... はサポートしない (古い書き方を明示的に拒否)
             if tokens[1] == "state":
-                print("Do not use 'state'. Use: show <leaf> [...]")
+                self._error("Do not use 'state'. Use: show <leaf> [...]")
                 return True
 
             # show <leaf> [...] を内部的に
@@ -117,11 +211,19 @@ class ExampleCli:
             self.do_show(arg)
             return True
 
+        # schema [<path>|<node> ...] [depth=<n>]
+        if tokens[0] == "schema":
+            self.do_schema(tokens[1:])
+            return True
+
         name = tokens[0]
-        if name not in self.model.rpc_names:
-            print(f"Unknown command: {name}")
+        if not self.model.has_rpc(name):
+            self._error(f"Unknown command: {name}")
             return True
 
+        # rpc の詳細 (handler, usage など) は初めて使うときに読み込まれる
+        self.model.ensure_rpc(name)
+
         # "<rpc> help" / "<rpc> ?" でその RPC の usage を表示
         if len(tokens) == 2 and tokens[1] in {"help", "?"}:
             usage = self.model.rpc_usages.get(name) or name
@@ -146,9 +248,11 @@ class ExampleCli:
             else:
                 # 後方互換: 既存のハードコード実装を使用
                 if name == "ping":
-                    self._rpc_ping(payload)
+                    coro = self._rpc_ping(payload)
+                    if coro is not None:
+                        self._start_job(name, coro)
                 else:
-                    print(f"rpc '{name}' (positional) has no handler.")
+                    self._error(f"rpc '{name}' (positional) has no handler.")
             return True
 
         # デフォルトは key=value 形式でパース
@@ -167,7 +271,7 @@ class ExampleCli:
             elif name == "set-hostname":
                 self._rpc_set_hostname(args)
             else:
-                print(f"rpc '{name}' is defined in YANG but not implemented.")
+                self._error(f"rpc '{name}' is defined in YANG but not implemented.")
 
         return True
 
@@ -176,6 +280,11 @@ class ExampleCli:
 
         print("Available built-in commands:")
         print("  show <leaf> [<args>]  - Show operational state")
+        print("  schema [<path>] [depth=<n>] - Show YANG schema tree")
+        print("  <command> &           - Run a command as a background job")
+        print("  jobs                  - List running jobs")
+        print("  fg [<job>]            - Wait for a job in the foreground")
+        print("  kill [<job>]          - Stop a job")
         print("  bash                  - Start /usr/bin/bash shell")
         print("  exit, quit            - Exit the CLI")
         print("  help, ?               - Show this help")
@@ -183,6 +292,7 @@ class ExampleCli:
         print("")
         print("RPC commands (from YANG):")
         for name in sorted(self.model.rpc_names):
+            self.model.ensure_rpc(name)
             desc = self.model.rpc_descriptions.get(name, "")
             # usage は YANG の cli-usage 拡張から取得
             usage = self.model.rpc_usages.get(name)
@@ -206,18 +316,20 @@ class ExampleCli:
         try:
             tokens = shlex.split(arg)
         except ValueError as e:  # 不正なクオートなど
-            print(f"parse error: {e}")
+            self._error(f"parse error: {e}")
             return
 
         if not tokens:
-            print("Usage: show <leaf> [<args>]")
+            self._error("Usage: show <leaf> [<args>]")
             return
 
         if tokens[0] != "state":
             # 内部的には常に "state ..." で呼ばれる想定
-            print("Internal error: unexpected show argument")
+            self._error("Internal error: unexpected show argument")
             return
 
+        self.model.ensure_state()
+
         # すべての leaf を表示
         if len(tokens) == 1:
             print("state:")
@@ -228,8 +340,8 @@ class ExampleCli:
 
         # 通常の 1 レベル leaf 表示
         leaf = tokens[1]
-        if leaf not in self.model.state_leaf_names:
-            print(f"Unknown state leaf: {leaf}")
+        if not self.model.has_state_leaf(leaf):
+            self._error(f"Unknown state leaf: {leaf}")
             return
 
         # YANG で state leaf 用の Python handler が定義されていれば、
@@ -245,6 +357,45 @@ class ExampleCli:
         value = self.state.get(leaf)
         print(f"state {leaf}: {value}")
 
+    # --- schema コマンド -----------------------------------------------
+
+    def do_schema(self, args: Sequence[str]) -> None:
+        """schema [<path>|<node> ...] [depth=<n>]
+
+        uses / augment を展開したスキーマツリーを pyang の tree 形式で表示する。
+        "/" で始まる引数はスキーマパス、それ以外はトップからのノード名の並びとみなす。
+        """
+
+        depth = 2
+        names: List[str] = []
+        for token in args:
+            if token.startswith("depth="):
+                try:
+                    depth = int(token.split("=", 1)[1])
+                except ValueError:
+                    self._error(f"Invalid depth: {token}")
+                    return
+            else:
+                names.append(token)
+
+        tree = self.model.ensure_schema()
+        if tree is None:
+            self._error("Schema is not available.")
+            return
+
+        if len(names) == 1 and names[0].startswith("/"):
+            node = tree.find(names[0])
+        else:
+            # list の後ろにキーの値を書いてもよい (例: schema interfaces interface eth0)
+            found = tree.walk(names)
+            node = found[0] if found is not None else None
+        if node is None:
+            self._error(f"Unknown schema node: {' '.join(names)}")
+            return
+
+        for line in tree.render(node, depth):
+            print(line)
+
     # --- rpc 実装 ------------------------------------------------------
 
     def _rpc_hello(self, args: Dict[str, str]) -> None:
@@ -266,7 +417,7 @@ class ExampleCli:
             x = int(args.get("x", "0"))
             y = int(args.get("y", "0"))
         except ValueError:
-            print("x と y は整数で指定してください (例: add x=1 y=2)")
+            self._error("x と y は整数で指定してください (例: add x=1 y=2)")
             return
 
         result = x + y
@@ -281,24 +432,27 @@ class ExampleCli:
 
         hostname = args.get("hostname")
         if not hostname:
-            print("Usage: set-hostname hostname=<name>")
+            self._error("Usage: set-hostname hostname=<name>")
             return
 
         self.state["hostname"] = hostname
         print(f"result=hostname set to '{hostname}'")
 
-    def _rpc_ping(self, tokens: Sequence[str]) -> None:
+    def _rpc_ping(self, tokens: Sequence[str]) -> Optional[Awaitable[None]]:
         """Implementation of rpc ping.
 
         実際の OS の `ping` コマンドを呼び出し、その成否を state に反映する。
         CLI からは次のように呼び出す:
 
-          ping <destination> [count]
+          ping <destination> [count] [&]
+
+        引数の誤りはジョブを起動する前にその場で報告し、
+        ping 本体はコルーチンとして返す (ジョブとして実行され、出力は 1 行ずつ表示される)。
         """
 
         if not tokens:
-            print("Usage: ping <destination> [count]")
-            return
+            self._error("Usage: ping <destination> [count]")
+            return None
 
         dest = tokens[0]
         count = 4
@@ -306,66 +460,157 @@ class ExampleCli:
             try:
                 count = int(tokens[1])
             except ValueError:
-                print("count は整数で指定してください (例: ping 1.1.1.1 3)")
-                return
+                self._error("count は整数で指定してください (例: ping 1.1.1.1 3)")
+                return None
+
+        return self._ping(dest, count)
 
-        print(f"PING {dest} with {count} packets (system ping)...")
+    async def _ping(self, dest: str, count: int) -> None:
+        """ping のジョブ本体。"""
 
-        # システムの ping コマンドを使って簡易に成否だけ確認する
+        emit(f"PING {dest} with {count} packets (system ping)...")
+
+        # システムの ping コマンドを子プロセスで動かし、出力を流しながら終了を待つ
         try:
-            completed = subprocess.run(
-                ["ping", "-c", str(count), dest],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                check=False,
+            proc = await asyncio.create_subprocess_exec(
+                "ping",
+                "-c",
+                str(count),
+                dest,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
             )
-            success = completed.returncode == 0
         except FileNotFoundError:
-            print("system 'ping' command not found; treating as success for demo.")
+            emit("system 'ping' command not found; treating as success for demo.")
             success = True
-        except KeyboardInterrupt:
-            # ユーザが Ctrl-C で ping を中断した場合
-            print("\nPing aborted by user.")
-            self.state["last-ping-target"] = dest
-            self.state["last-ping-success"] = "false"
-            return
-
-        print(f"success={'true' if success else 'false'}")
+        else:
+            try:
+                assert proc.stdout is not None
+                async for raw in proc.stdout:
+                    emit(raw.decode(errors="replace").rstrip())
+                success = await proc.wait() == 0
+            except asyncio.CancelledError:
+                # kill や Ctrl-C でジョブが止められた場合
+                proc.kill()
+                await proc.wait()
+                emit("Ping aborted by user.")
+                self.state["last-ping-target"] = dest
+                self.state["last-ping-success"] = "false"
+                raise
+
+        emit(f"success={'true' if success else 'false'}")
 
         self.state["last-ping-target"] = dest
         self.state["last-ping-success"] = "true" if success else "false"
 
+    def _rpc_ping_sweep(self, tokens: Sequence[str]) -> Optional[Awaitable[None]]:
+        """Implementation of rpc ping-sweep.
+
+        複数の宛先 (カンマ区切りやプレフィックスも可) に並行して ping を実行し、
+        宛先ごとの損失率と RTT、全体の集計を表示する。CLI からは次のように呼び出す:
+
+          ping-sweep 192.0.2.0/24 198.51.100.1,198.51.100.2 [count=N] [concurrency=N] [timeout=S] [&]
+
+        引数の誤りはジョブを起動する前にその場で報告し、
+        スイープ本体はコルーチンとして返す (ジョブとして実行される)。
+        """
+
+        usage = "Usage: ping-sweep <target|prefix>[,...] ... [count=N] [concurrency=N] [timeout=S]"
+        options = {"count": 1, "concurrency": DEFAULT_CONCURRENCY, "timeout": 1}
+        specs: List[str] = []
+        for token in tokens:
+            key, sep, value = token.partition("=")
+            if not sep:
+                specs.append(token)
+                continue
+            if key not in options:
+                self._error(f"Unknown option: {key}\n{usage}")
+                return None
+            try:
+                options[key] = int(value)
+            except ValueError:
+                self._error(f"{key} は整数で指定してください (例: {key}={options[key]})")
+                return None
+            if options[key] < 1:
+                self._error(f"{key} は 1 以上で指定してください")
+                return None
+
+        if not specs:
+            self._error(usage)
+            return None
+
+        try:
+            targets = expand_targets(specs)
+        except ValueError as e:
+            self._error(str(e))
+            return None
+
+        return self._ping_sweep(targets, options["count"], options["concurrency"], options["timeout"])
+
+    async def _ping_sweep(self, targets: List[str], count: int, concurrency: int, timeout: int) -> None:
+        """ping-sweep のジョブ本体。
+
+        表には応答のあった宛先だけを表示し、応答の無い宛先は数だけを集計に含める。
+        """
+
+        emit(f"PING SWEEP {len(targets)} targets, {count} packets each, concurrency {concurrency}...")
+
+        start = time.perf_counter()
+        results = await sweep(targets, count, concurrency, timeout)
+        elapsed = time.perf_counter() - start
+
+        for line in format_table(r for r in results if r.reachable):
+            emit(line)
+        emit(summarize(results, elapsed))
+
+        # 最後に応答のあった宛先を state に残す (ping と同じ leaf を使う)
+        reachable = [r.destination for r in results if r.reachable]
+        self.state["last-ping-target"] = reachable[-1] if reachable else targets[-1]
+        self.state["last-ping-success"] = "true" if reachable else "false"
+
     def _show_route_state(self, family: Optional[str]) -> None:
-        """Show routing state for `show route [...]`."""
+        """Show routing state for `show route [ipv4|ipv6]`."""
 
-        # Demo 用のダミー経路データ
-        ipv4_routes = [
-            ("0.0.0.0/0", "192.0.2.254", 1),
-            ("192.0.2.0/24", "0.0.0.0", 0),
-        ]
-        ipv6_routes = [
-            ("::/0", "2001:db8::ffff", 1),
-            ("2001:db8::/64", "::", 0),
-        ]
-
-        def print_ipv4() -> None:
-            print("state route ipv4:")
-            for prefix, nexthop, metric in ipv4_routes:
-                print(f"  {prefix:18s} via {nexthop:15s} metric {metric}")
-
-        def print_ipv6() -> None:
-            print("state route ipv6:")
-            for prefix, nexthop, metric in ipv6_routes:
-                print(f"  {prefix:24s} via {nexthop:20s} metric {metric}")
+        def print_routes(version: int) -> None:
+            print(f"state route ipv{version}:")
+            for route in self.rib.routes(version):
+                print(self._format_route(route))
 
         if family is None:
-            print_ipv4()
+            print_routes(4)
             print("")
-            print_ipv6()
+            print_routes(6)
         elif family == "ipv4":
-            print_ipv4()
+            print_routes(4)
         else:  # ipv6
-            print_ipv6()
+            print_routes(6)
+
+    def _show_route_lookup(self, target: str, match: Optional[str]) -> None:
+        """Show routes for `show route <address>` / `show route <prefix> longer|shorter`."""
+
+        if match is None:
+            # アドレス (またはプレフィックスのネットワークアドレス) で最長一致検索
+            address = target.split("/", 1)[0]
+            route = self.rib.lookup(address)
+            print(f"state route {target}:")
+            if route is None:
+                print(f"  no route to {address}")
+            else:
+                print(self._format_route(route))
+            return
+
+        routes = self.rib.longer(target) if match == "longer" else self.rib.shorter(target)
+        print(f"state route {target} {match}:")
+        for route in routes:
+            print(self._format_route(route))
+
+    @staticmethod
+    def _format_route(route: Route) -> str:
+        """経路 1 行分の表示文字列を返す。"""
+
+        if ":" in route.destination:
+            return f"  {route.destination:24s} via {route.next_hop or '':20s} metric {route.metric}"
+        return f"  {route.destination:18s} via {route.next_hop or '':15s} metric {route.metric}"
 
     def _run_bash_shell(self) -> None:
         """/usr/bin/bash を起動し、終了するまで待つ。"""
@@ -375,28 +620,105 @@ class ExampleCli:
             # bash を抜けると CLI のプロンプトに戻る。
             subprocess.run(["/usr/bin/bash"])
         except FileNotFoundError:
-            print("/usr/bin/bash not found.")
+            self._error("/usr/bin/bash not found.")
         except KeyboardInterrupt:
             # bash 実行中の Ctrl-C はここまで伝播しないはずだが、念のため
             print("\nInterrupted while running bash shell.")
 
+    # --- ジョブ制御 ----------------------------------------------------
+
+    def do_job_control(self, command: str, args: Sequence[str]) -> None:
+        """jobs / fg [<job>] / kill [<job>]"""
+
+        if command == "jobs":
+            for job in self.jobs.list():
+                where = "&" if job.background else ""
+                print(f"[{job.id}] {job.status:8s} {job.elapsed:7.1f}s  {job.command} {where}".rstrip())
+            return
+
+        if args:
+            try:
+                job = self.jobs.get(int(args[0].lstrip("%")))
+            except ValueError:
+                self._error(f"Usage: {command} [<job>]")
+                return
+        else:
+            job = self.jobs.latest()
+        if job is None:
+            self._error(f"{command}: no such job")
+            return
+
+        if command == "fg":
+            print(job.command)
+            self._foreground = job
+        else:  # kill
+            assert job.task is not None
+            job.task.cancel()
+
+    def _start_job(self, name: str, coro: Awaitable[None]) -> None:
+        """handler が返したコルーチンをジョブとして起動する。
+
+        行末に "&" が付いていればバックグラウンドで動かし、すぐにプロンプトに戻る。
+        そうでなければ、行の処理後に run_async() が終了を待つ (Ctrl-C で中断)。
+        イベントループの外 (REPL 以外からの呼び出し) では、その場で完了まで実行する。
+        """
+
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            try:
+                asyncio.run(coro)
+            except Exception as e:  # noqa: BLE001
+                self._error(f"Error while executing handler for rpc '{name}': {e}")
+            return
+
+        job = self.jobs.start(name, self._command_line, coro, self._background)
+        if job.background:
+            print(f"[{job.id}] {job.command}")
+        else:
+            self._foreground = job
+
+    async def _wait_foreground(self) -> None:
+        """フォアグラウンドのジョブの終了を待つ。Ctrl-C はそのジョブを止める。"""
+
+        job = self._foreground
+        self._foreground = None
+        if job is None or job.task is None:
+            return
+        job.background = False
+
+        # 入力待ちでない間の Ctrl-C は SIGINT として届くので、ジョブの取り消しに置き換える
+        loop = asyncio.get_running_loop()
+        task = job.task
+        previous = signal.getsignal(signal.SIGINT)
+        signal.signal(signal.SIGINT, lambda *_: loop.call_soon_threadsafe(task.cancel))
+        try:
+            await asyncio.wait({task})
+        finally:
+            signal.signal(signal.SIGINT, previous)
+
     # --- helper --------------------------------------------------------
 
-    @staticmethod
-    def _parse_key_value_args(tokens: Sequence[str]) -> Optional[Dict[str, str]]:
+    def _error(self, message: str) -> None:
+        """エラーメッセージを表示し、この行が失敗したことを記録する。"""
+
+        print(message)
+        self.command_failed = True
+
+    def _parse_key_value_args(self, tokens: Sequence[str]) -> Optional[Dict[str, str]]:
         """Parse ['k1=v1', 'k2=v2', ...] into a dict.
 
-        フォーマットが不正な場合はメッセージを表示して None を返す。
+        フォーマットが不正な場合はエラーを表示して None を返す。
         """
 
         result: Dict[str, str] = {}
         for t in tokens:
             if "=" not in t:
-                print(f"Invalid argument (expected key=value): {t}")
+                self._error(f"Invalid argument (expected key=value): {t}")
                 return None
             k, v = t.split("=", 1)
             if not k:
-                print(f"Invalid argument (empty key): {t}")
+                self._error(f"Invalid argument (empty key): {t}")
                 return None
             result[k] = v
         return result
@@ -410,45 +732,52 @@ class ExampleCli:
         """YANG で指定された Python handler を呼び出す。
 
         handler_symbol は 'module:function' 形式とする。
+        呼び出し可能オブジェクトは HandlerTable で解決済みのものを使う。
 
         payload の型は呼び出し元により異なる:
-        - ping の場合:         Sequence[str] (トークン列)
+        - ping / ping-sweep:   Sequence[str] (トークン列)
         - state leaf handler:  Sequence[str] (leaf 以降のトークン列)
         - それ以外の rpc:      Dict[str, str] (key=value でパース済み)
         """
 
-        try:
-            module_name, func_name = handler_symbol.split(":", 1)
-        except ValueError:
-            print(f"Invalid handler symbol for rpc '{rpc_name}': {handler_symbol}")
+        func = self.handlers.resolve(handler_symbol)
+        if func is None:
+            self._error(f"Failed to load handler for rpc '{rpc_name}': {self.handlers.error(handler_symbol)}")
             return
 
+        # ハンドラには (cli, payload) を渡す契約とする。
+        # コルーチンを返すハンドラ (async def) はジョブとして実行する
         try:
-            module = importlib.import_module(module_name)
-            func = getattr(module, func_name)
+            result = func(self, payload)
         except Exception as e:  # noqa: BLE001
-            print(f"Failed to load handler for rpc '{rpc_name}': {e}")
+            self._error(f"Error while executing handler for rpc '{rpc_name}': {e}")
             return
-
-        # ハンドラには (cli, payload) を渡す契約とする
-        try:
-            func(self, payload)
-        except Exception as e:  # noqa: BLE001
-            print(f"Error while executing handler for rpc '{rpc_name}': {e}")
+        if inspect.isawaitable(result):
+            self._start_job(rpc_name, result)
 
 
 class CliCompleter(Completer):
-    """prompt_toolkit 用のシンプルな補完クラス。"""
+    """prompt_toolkit 用のシンプルな補完クラス。
+
+    候補は CompletionIndex (プレフィックストライ) から引くので、
+    キー入力ごとのコストは候補の総数ではなく、一致した件数に比例する。
+    """
+
+    # 1 回の補完で表示する候補の上限
+    max_candidates = 200
 
     def __init__(self, cli: ExampleCli) -> None:
         self._cli = cli
+        self._index = CompletionIndex(cli.model)
+        self._tokenizer = LineTokenizer()
+        self._path_completer: Optional[PathCompleter] = None
 
     # type: ignore[override]
     def get_completions(self, document, complete_event):
         text = document.text_before_cursor
         # シェル風の分割を行う。末尾が空白なら空トークンを追加しておく。
         try:
-            tokens = shlex.split(text)
+            tokens = self._tokenizer.split(text)
         except ValueError:
             return
 
@@ -456,69 +785,69 @@ class CliCompleter(Completer):
             tokens.append("")
 
         word = document.get_word_before_cursor(WORD=True) or ""
-
-        # トップレベルの候補
-        commands = [
-            "show",
-            "bash",
-            "exit",
-            "quit",
-            "help",
-            "?",
-        ]
-        # rpc 名はそのまま補完する
-        commands.extend(self._cli.model.rpc_names)
+        limit = self.max_candidates
+        model = self._cli.model
 
         # 文脈に応じた候補を決める
+        # (ensure_* でモデルが変わることがあるので、索引はその後で引く)
         candidates: List[str]
         if not tokens or len(tokens) == 1:
-            # 1語目の補完
-            candidates = commands
+            # 1語目の補完: 組み込みコマンド + rpc 名
+            candidates = self._index.commands().complete(word, limit)
         elif tokens[0] == "show":
+            model.ensure_state()
             if len(tokens) == 2:
                 # "show " の直後は state leaf 名をそのまま補完
-                candidates = self._cli.model.state_leaf_names
+                candidates = self._index.state_leaves().complete(word, limit)
             else:
                 # "show <leaf> ..." 形式の場合
-                if len(tokens) >= 3:
-                    leaf_name = tokens[1]
-                    base = self._cli.model.state_leaf_completions.get(
-                        leaf_name,
-                        [],
-                    )
-                    # leaf 名の後に「非空トークン + 末尾の空トークン」があれば、
-                    # すなわち "show route ipv4 " のように完全に入力済みとみなし、
-                    # <CR> のみを候補に出す。それ以外 (例: "show route i") では
-                    # 通常どおり base を使い、word プレフィックスでフィルタする。
-                    tail = tokens[2:]
-                    has_non_empty = any(t for t in tail)
-                    ends_with_empty = bool(tail) and tail[-1] == ""
-                    if has_non_empty and ends_with_empty:
-                        candidates = [c for c in base if c == "<CR>"]
-                    else:
-                        candidates = base
+                base = self._index.leaf_completions(tokens[1])
+                # leaf 名の後に「非空トークン + 末尾の空トークン」があれば、
+                # すなわち "show route ipv4 " のように完全に入力済みとみなし、
+                # <CR> のみを候補に出す。それ以外 (例: "show route i") では
+                # 通常どおり word プレフィックスで絞り込む。
+                tail = tokens[2:]
+                has_non_empty = any(t for t in tail)
+                ends_with_empty = tail[-1] == ""
+                if has_non_empty and ends_with_empty:
+                    candidates = ["<CR>"] if "<CR>" in base else []
                 else:
-                    candidates = []
-        elif tokens[0] in self._cli.model.rpc_names:
+                    candidates = base.complete(word, limit)
+        elif tokens[0] == "schema":
+            # スキーマツリーをたどってパスを補完する ("/" で始まるパス指定は対象外)
+            path_tokens = [t for t in tokens[1:-1] if not t.startswith("depth=")]
+            tree = model.ensure_schema()
+            if tree is None or (path_tokens and path_tokens[0].startswith("/")):
+                candidates = []
+            else:
+                if self._path_completer is None or self._path_completer.tree is not tree:
+                    self._path_completer = PathCompleter(
+                        tree,
+                        self._cli.key_providers,
+                        page_size=limit,
+                    )
+                candidates, total = self._path_completer.complete(path_tokens, word)
+                if total > len(candidates):
+                    candidates = candidates + [f"<{total - len(candidates)} more>"]
+        elif model.has_rpc(tokens[0]):
             # rpc 名の後ろでの補完 (kv スタイル向け)
             rpc_name = tokens[0]
-            arg_style = self._cli.model.rpc_arg_styles.get(rpc_name, "kv")
+            model.ensure_rpc(rpc_name)
+            arg_style = model.rpc_arg_styles.get(rpc_name, "kv")
             if arg_style != "positional":
                 # YANG input から収集した leaf 名を key= 形式で提案する
-                param_names = self._cli.model.rpc_input_params.get(rpc_name, [])
-
                 # すでに指定済みの key は候補から除外する
                 used_keys = set()
                 # 末尾の空トークン (入力中) は除外してチェックする
-                check_tokens = tokens[1:-1] if tokens and tokens[-1] == "" else tokens[1:]
+                check_tokens = tokens[1:-1] if tokens[-1] == "" else tokens[1:]
                 for t in check_tokens:
                     if "=" in t:
                         k, _ = t.split("=", 1)
                         if k:
-                            used_keys.add(k)
+                            used_keys.add(f"{k}=")
 
-                base = [f"{name}=" for name in param_names if name not in used_keys]
-                candidates = base
+                base = self._index.rpc_params(rpc_name).complete(word)
+                candidates = [c for c in base if c not in used_keys][:limit]
             else:
                 # 位置引数スタイルの rpc では特に補完しない
                 candidates = []
@@ -527,13 +856,22 @@ class CliCompleter(Completer):
             candidates = []
 
         for c in candidates:
-            if not word or c.startswith(word):
-                # 特別な sentinel "<CR>" は「そのまま Enter」であることを
-                # 示すために表示だけ行い、実際には何も挿入しない。
-                if c == "<CR>":
-                    yield Completion("", start_position=-len(word), display="<CR>")
-                else:
-                    yield Completion(c, start_position=-len(word))
+            # 特別な sentinel "<CR>" は「そのまま Enter」であることを
+            # 示すために表示だけ行い、実際には何も挿入しない。
+            # "<キー名>" や "<N more>" も同様に表示専用。
+            if c.startswith("<") and c.endswith(">"):
+                yield Completion("", start_position=-len(word), display=c)
+            else:
+                yield Completion(c, start_position=-len(word))
+
+
+def _host_interface_keys() -> List[Tuple[str]]:
+    """このホストのインターフェース名 (/interfaces/interface のキー)。"""
+
+    try:
+        return [(name,) for _, name in socket.if_nameindex()]
+    except OSError:
+        return []
 
 
 # --- YANG から指定される Python handler 用ラッパー ------------------------
@@ -565,10 +903,16 @@ def rpc_set_hostname(cli: ExampleCli, args: Dict[str, str]) -> None:
     cli._rpc_set_hostname(args)
 
 
-def rpc_ping(cli: ExampleCli, tokens: Sequence[str]) -> None:
-    """YANG rpc 'ping' 用 handler."""
+def rpc_ping(cli: ExampleCli, tokens: Sequence[str]) -> Optional[Awaitable[None]]:
+    """YANG rpc 'ping' 用 handler (コルーチンを返すのでジョブとして実行される)。"""
+
+    return cli._rpc_ping(tokens)
 
-    cli._rpc_ping(tokens)
+
+def rpc_ping_sweep(cli: ExampleCli, tokens: Sequence[str]) -> Optional[Awaitable[None]]:
+    """YANG rpc 'ping-sweep' 用 handler (コルーチンを返すのでジョブとして実行される)。"""
+
+    return cli._rpc_ping_sweep(tokens)
 
 
 # --- state leaf 用ハンドラ -----------------------------------------------
@@ -620,20 +964,33 @@ def state_route(cli: ExampleCli, args: Sequence[str]) -> None:
     """state leaf 'route' 用 handler.
 
     "show route [ipv4|ipv6]" を state ベースで実装する。
+    "show route <address>" は最長一致した経路を、
+    "show route <prefix> longer|shorter" はプレフィックスに含まれる/含む経路を表示する。
     """
 
+    usage = "Usage: show route [ipv4|ipv6|<address>|<prefix> longer|<prefix> shorter]"
+
     # args には "show route" 以降のトークンが入っている想定
-    family: Optional[str] = None
     if len(args) == 0:
-        family = None
-    elif len(args) == 1:
-        family = args[0]
-    else:
-        print("Usage: show route [ipv4|ipv6]")
+        cli._show_route_state(None)
+        return
+
+    if len(args) == 1 and args[0] in {"ipv4", "ipv6"}:
+        cli._show_route_state(args[0])
+        return
+
+    if len(args) > 2 or (len(args) == 2 and args[1] not in {"longer", "shorter"}):
+        cli._error(usage)
         return
 
-    if family not in {None, "ipv4", "ipv6"}:
-        print("Usage: show route [ipv4|ipv6]")
+    target = args[0]
+    try:
+        if "/" in target:
+            ipaddress.ip_network(target, strict=False)
+        else:
+            ipaddress.ip_address(target)
+    except ValueError:
+        cli._error(usage)
         return
 
-    cli._show_route_state(family)
+    cli._show_route_lookup(target, args[1] if len(args) == 2 else None)
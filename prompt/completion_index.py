@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+"""補完候補の索引 (プレフィックストライ) と、入力行の逐次トークン分割を提供するモジュール。
+
+補完はキー入力のたびに呼ばれるため、毎回候補リストを作り直して
+``startswith`` で全件を走査すると、候補数 (スキーマのノード数) に比例して遅くなる。
+ここでは YangModel から一度だけ索引を作り、モデルが変わったとき
+(YangModel.generation が進んだとき) にだけ作り直す。
+
+* PrefixTrie: 候補をソートした配列と、その上のトライ。各トライノードは
+  「そのプレフィックスで始まる候補」の配列上の範囲 [lo, hi) を持つ
+* LineTokenizer: 空白で確定したトークンを覚えておき、末尾の入力中の部分だけを
+  shlex で分割する
+* CompletionIndex: コマンド名、state leaf 名、leaf ごとの補完候補、
+  rpc ごとの引数名のトライをまとめて管理する
+* PathCompleter: スキーマツリーをたどって、コンテナ・リスト・リストのキーの値を
+  補完する。結果は (ノード, 入力済みのキー, プレフィックス) ごとにメモ化する
+"""
+
+import logging
+import shlex
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from yang_model import YangModel
+from yang_schema import SchemaNode, SchemaTree
+
+logger = logging.getLogger(__name__)
+
+
+# 組み込みコマンド (rpc 名と合わせて 1 語目の補完候補になる)
+BUILTIN_COMMANDS = ("show", "schema", "jobs", "fg", "kill", "bash", "exit", "quit", "help", "?")
+
+
+class _TrieNode:
+    __slots__ = ("children", "lo", "hi")
+
+    def __init__(self, lo: int) -> None:
+        self.children: Dict[str, _TrieNode] = {}
+        self.lo = lo
+        self.hi = lo
+
+
+class PrefixTrie:
+    """前方一致検索用のトライ。
+
+    候補はソートして 1 本の配列に持ち、トライの各ノードには
+    そのプレフィックスで始まる候補の範囲 [lo, hi) だけを記録する。
+    検索はプレフィックスの文字数ぶんノードをたどり、範囲をスライスするだけで済む。
+
+    候補が数万あるとすべての文字にノードを作るとメモリを使いすぎるため、
+    ノードは先頭 *depth* 文字までに限り、それより長いプレフィックスは
+    ノードの範囲内を二分探索して絞り込む。
+    """
+
+    __slots__ = ("words", "depth", "_root")
+
+    def __init__(self, words: Iterable[str] = (), depth: int = 4) -> None:
+        self.words: List[str] = sorted(set(words))
+        self.depth = depth
+        self._root = _TrieNode(0)
+        self._root.hi = len(self.words)
+
+        for i, word in enumerate(self.words):
+            node = self._root
+            for ch in word[:depth]:
+                child = node.children.get(ch)
+                if child is None:
+                    child = node.children[ch] = _TrieNode(i)
+                # ソート済みなので、同じプレフィックスの候補は連続している
+                child.hi = i + 1
+                node = child
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __contains__(self, word: str) -> bool:
+        lo, hi = self._range(word)
+        return lo < hi and self.words[lo] == word
+
+    def _range(self, prefix: str) -> Tuple[int, int]:
+        node = self._root
+        for ch in prefix[: self.depth]:
+            node = node.children.get(ch)
+            if node is None:
+                return 0, 0
+        lo, hi = node.lo, node.hi
+        if len(prefix) > self.depth:
+            # prefix で始まる候補は [prefix, prefix の最後の文字を 1 つ進めた文字列) に並ぶ
+            upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            lo = bisect_left(self.words, prefix, lo, hi)
+            hi = bisect_left(self.words, upper, lo, hi)
+        return lo, hi
+
+    def complete(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """*prefix* で始まる候補をソート順で返す (*limit* 件まで)。"""
+
+        lo, hi = self._range(prefix)
+        if limit is not None:
+            hi = min(hi, lo + limit)
+        return self.words[lo:hi]
+
+    def count(self, prefix: str) -> int:
+        """*prefix* で始まる候補の数。"""
+
+        lo, hi = self._range(prefix)
+        return hi - lo
+
+
+class LineTokenizer:
+    """入力行を shlex 互換で分割する。前回の結果を使って差分だけ分割する。
+
+    補完中の入力は 1 文字ずつ伸びていくので、クオートの外の空白までを
+    「確定した部分」として覚えておき、次の呼び出しではその後ろだけを分割する。
+    行頭が変わった (カーソルより前を編集した) 場合は最初から分割し直す。
+    """
+
+    def __init__(self) -> None:
+        self._head = ""
+        self._head_tokens: List[str] = []
+
+    def split(self, text: str) -> List[str]:
+        """*text* をトークンに分割する。クオートが閉じていない場合は ValueError。"""
+
+        if not text.startswith(self._head):
+            self._head = ""
+            self._head_tokens = []
+
+        tail = text[len(self._head) :]
+        tail_tokens = shlex.split(tail)
+        tokens = self._head_tokens + tail_tokens
+
+        # 末尾がトークンの区切りなら確定部分を進める。
+        # 区切りかどうかは、後ろに 1 文字足しても既存のトークンが変わらないことで判定する
+        # (エスケープされた空白 "a\ " はトークンの一部なので区切りではない)。
+        if tail and tail[-1].isspace():
+            try:
+                probe = shlex.split(tail + "x")
+            except ValueError:
+                probe = []
+            if probe == tail_tokens + ["x"]:
+                self._head = text
+                self._head_tokens = list(tokens)
+
+        return tokens
+
+
+class CompletionIndex:
+    """YangModel から作る補完候補の索引。
+
+    索引は使われたときに model.generation を確認し、モデルが変わっていれば作り直す。
+    rpc の引数名や leaf ごとの補完候補は、その rpc / leaf を初めて補完するときに作る。
+    """
+
+    def __init__(self, model: YangModel) -> None:
+        self.model = model
+        self._generation = -1
+        self._commands = PrefixTrie()
+        self._state_leaves = PrefixTrie()
+        self._leaf_completions: Dict[str, PrefixTrie] = {}
+        self._rpc_params: Dict[str, PrefixTrie] = {}
+
+    def _refresh(self) -> None:
+        if self._generation == self.model.generation:
+            return
+        self._generation = self.model.generation
+        self._commands = PrefixTrie(list(BUILTIN_COMMANDS) + self.model.rpc_names)
+        self._state_leaves = PrefixTrie(self.model.state_leaf_names)
+        self._leaf_completions.clear()
+        self._rpc_params.clear()
+
+    def commands(self) -> PrefixTrie:
+        """1 語目 (組み込みコマンドと rpc 名) の候補。"""
+
+        self._refresh()
+        return self._commands
+
+    def state_leaves(self) -> PrefixTrie:
+        """show の直後 (state leaf 名) の候補。"""
+
+        self._refresh()
+        return self._state_leaves
+
+    def leaf_completions(self, leaf: str) -> PrefixTrie:
+        """show <leaf> の後ろの候補 (YANG の cli-completion)。"""
+
+        self._refresh()
+        trie = self._leaf_completions.get(leaf)
+        if trie is None:
+            words = self.model.state_leaf_completions.get(leaf, [])
+            trie = self._leaf_completions[leaf] = PrefixTrie(words)
+        return trie
+
+    def rpc_params(self, rpc_name: str) -> PrefixTrie:
+        """kv スタイルの rpc の引数 ("name=" の形) の候補。"""
+
+        self._refresh()
+        trie = self._rpc_params.get(rpc_name)
+        if trie is None:
+            params = self.model.rpc_input_params.get(rpc_name, [])
+            trie = self._rpc_params[rpc_name] = PrefixTrie(f"{name}=" for name in params)
+        return trie
+
+
+# list のキーの値を返す関数 (キーが複数ある場合は 1 エントリを 1 タプルで返す)
+KeyProvider = Callable[[], Iterable[Sequence[str]]]
+
+
+class PathCompleter:
+    """スキーマツリー上の CLI パス ("interfaces interface eth0 config mtu") の補完。
+
+    * 子ノード名の候補は、ノードごとに PrefixTrie を作って引く
+    * list のキーの値は、list のパスに登録された KeyProvider (実データ) から引く
+    * 結果は (ノード, 入力済みのキー, プレフィックス) をキーに LRU でメモ化する。
+      スキーマだけから決まる結果は期限なし、実データを含む結果は *ttl* 秒で捨てる
+    * 1 回に返す候補は *page_size* 件までとし、全体の件数も合わせて返す
+    """
+
+    def __init__(
+        self,
+        tree: SchemaTree,
+        providers: Optional[Dict[str, KeyProvider]] = None,
+        page_size: int = 100,
+        ttl: float = 5.0,
+        memo_size: int = 4096,
+    ) -> None:
+        self.tree = tree
+        self.providers = providers if providers is not None else {}
+        self.page_size = page_size
+        self.ttl = ttl
+        self.memo_size = memo_size
+        self._children: Dict[int, PrefixTrie] = {}
+        # (list のノード番号, 入力済みのキー) → (取得時刻, キーの値のトライ)
+        self._keys: Dict[Tuple[int, Tuple[str, ...]], Tuple[float, PrefixTrie]] = {}
+        # 失敗を報告済みのプロバイダ (キー入力のたびに同じ警告を出さない)
+        self._failed: set = set()
+        # (ノード番号, 入力済みのキー, プレフィックス) → (取得時刻 or None, 候補, 全件数)
+        self._memo: OrderedDict[
+            Tuple[int, Tuple[str, ...], str],
+            Tuple[Optional[float], List[str], int],
+        ] = OrderedDict()
+
+    def _child_trie(self, node: SchemaNode) -> PrefixTrie:
+        trie = self._children.get(node.index)
+        if trie is None:
+            trie = self._children[node.index] = PrefixTrie(node.children)
+        return trie
+
+    def _key_trie(self, node: SchemaNode, keys: Tuple[str, ...], now: float) -> Optional[PrefixTrie]:
+        """list *node* の次のキーの値の候補。プロバイダが無ければ None。
+
+        プレフィックスが伸びるたびにプロバイダを呼ばないよう、*ttl* 秒は使い回す。
+        """
+
+        provider = self.providers.get(node.path)
+        if provider is None:
+            return None
+
+        cached = self._keys.get((node.index, keys))
+        if cached is not None and now - cached[0] < self.ttl:
+            return cached[1]
+
+        n = len(keys)
+        try:
+            rows = [tuple(row) for row in provider()]
+        except Exception as e:  # プロバイダの失敗で補完全体を止めない
+            # 補完はプロンプトの描画中に呼ばれるので、print() はせずに 1 回だけ logging に出す
+            if node.path not in self._failed:
+                self._failed.add(node.path)
+                logger.warning("key provider for %s failed: %s", node.path, e)
+            rows = []
+        else:
+            self._failed.discard(node.path)
+        trie = PrefixTrie(row[n] for row in rows if len(row) > n and row[:n] == keys)
+        self._keys[(node.index, keys)] = (now, trie)
+        return trie
+
+    def complete(self, tokens: Sequence[str], prefix: str) -> Tuple[List[str], int]:
+        """*tokens* の位置で *prefix* に一致する候補 (1 ページ分) と全件数を返す。
+
+        list のキーを入力する位置でプロバイダが無い場合は、"<キー名>" を表示用に返す。
+        """
+
+        found = self.tree.walk(tokens)
+        if found is None:
+            return [], 0
+        node, keys = found
+
+        memo_key = (node.index, keys, prefix)
+        now = time.monotonic()
+        hit = self._memo.get(memo_key)
+        if hit is not None and (hit[0] is None or now - hit[0] < self.ttl):
+            self._memo.move_to_end(memo_key)
+            return hit[1], hit[2]
+
+        page: List[str] = []
+        total = 0
+        fetched: Optional[float] = None
+
+        if node.is_list and len(keys) < len(node.keys):
+            key_trie = self._key_trie(node, keys, now)
+            if key_trie is None:
+                if not prefix:
+                    page.append(f"<{node.keys[len(keys)]}>")
+                    total += 1
+            else:
+                fetched = self._keys[(node.index, keys)][0]
+                total += key_trie.count(prefix)
+                page.extend(key_trie.complete(prefix, self.page_size))
+
+        child_trie = self._child_trie(node)
+        total += child_trie.count(prefix)
+        page.extend(child_trie.complete(prefix, max(self.page_size - len(page), 0)))
+
+        self._memo[memo_key] = (fetched, page, total)
+        if len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+        return page, total
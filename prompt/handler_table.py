@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+"""YANG で指定された handler シンボル ("module:function") を解決するモジュール。
+
+rpc や show のたびに ``importlib.import_module`` と ``getattr`` を呼ばないように、
+シンボルは一度だけ解決して呼び出し可能オブジェクトの表に持っておく。
+解決できなかったシンボルもその理由を覚えておき、同じ失敗を繰り返さない。
+
+ExampleCli は起動時に YangModel.handler_symbols() をまとめて解決し、
+解決できないものを警告として表示する。
+"""
+
+import importlib
+import inspect
+from typing import Any, Callable, Dict, Iterable, Optional
+
+# handler は (cli, payload) を受け取る
+HandlerFunc = Callable[[Any, Any], Any]
+
+
+class HandlerError(Exception):
+    """handler シンボルを解決できない。"""
+
+
+def load_handler(symbol: str) -> HandlerFunc:
+    """*symbol* を import して呼び出し可能オブジェクトを返す。
+
+    (cli, payload) の 2 引数で呼び出せないものは HandlerError にする。
+    """
+
+    module_name, sep, func_name = symbol.partition(":")
+    if not sep or not module_name or not func_name:
+        raise HandlerError(f"invalid handler symbol: {symbol}")
+
+    try:
+        module = importlib.import_module(module_name)
+    except Exception as e:  # noqa: BLE001
+        raise HandlerError(f"cannot import module '{module_name}': {e}") from e
+
+    func = getattr(module, func_name, None)
+    if func is None:
+        raise HandlerError(f"module '{module_name}' has no attribute '{func_name}'")
+    if not callable(func):
+        raise HandlerError(f"'{symbol}' is not callable")
+
+    try:
+        inspect.signature(func).bind(None, None)
+    except TypeError as e:
+        raise HandlerError(f"'{symbol}' must accept (cli, payload): {e}") from e
+    except ValueError:
+        # シグネチャを取得できない組み込み関数などは呼び出し時に任せる
+        pass
+
+    return func
+
+
+class HandlerTable:
+    """handler シンボル → 呼び出し可能オブジェクト の表。"""
+
+    def __init__(self) -> None:
+        self._resolved: Dict[str, HandlerFunc] = {}
+        self._errors: Dict[str, str] = {}
+
+    def resolve(self, symbol: str) -> Optional[HandlerFunc]:
+        """*symbol* の handler を返す。解決できない場合は None (理由は error())。"""
+
+        func = self._resolved.get(symbol)
+        if func is not None or symbol in self._errors:
+            return func
+        try:
+            func = load_handler(symbol)
+        except HandlerError as e:
+            self._errors[symbol] = str(e)
+            return None
+        self._resolved[symbol] = func
+        return func
+
+    def error(self, symbol: str) -> Optional[str]:
+        return self._errors.get(symbol)
+
+    def preload(self, symbols: Iterable[str]) -> Dict[str, str]:
+        """*symbols* をまとめて解決し、解決できなかったもの (シンボル → 理由) を返す。"""
+
+        failed: Dict[str, str] = {}
+        for symbol in symbols:
+            if self.resolve(symbol) is None:
+                failed[symbol] = self._errors[symbol]
+        return failed
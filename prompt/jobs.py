@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+"""CLI のバックグラウンドジョブ (asyncio のタスク) を管理するモジュール。
+
+時間のかかる rpc handler (ping など) はコルーチンとして実装し、
+ExampleCli はそれを asyncio のタスクとしてジョブ表に登録する。
+ジョブには番号が付き、``jobs`` / ``fg`` / ``kill`` コマンドから参照できる。
+
+ジョブの中で ``emit()`` を使って出力すると、バックグラウンドのジョブの場合は
+行頭に ``[番号]`` を付けて、どのジョブの出力かわかるようにする。
+"""
+
+import asyncio
+import contextvars
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Dict, List, Optional
+
+
+@dataclass
+class Job:
+    """ジョブ表の 1 エントリ。"""
+
+    id: int
+    name: str
+    command: str
+    background: bool
+    started: float = field(default_factory=time.monotonic)
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def status(self) -> str:
+        if self.task is None or not self.task.done():
+            return "Running"
+        if self.task.cancelled():
+            return "Killed"
+        if self.task.exception() is not None:
+            return "Failed"
+        return "Done"
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+
+# 実行中のジョブ (ジョブのタスクの中でだけ設定される)
+current_job: contextvars.ContextVar[Optional[Job]] = contextvars.ContextVar(
+    "current_job",
+    default=None,
+)
+
+
+def emit(text: str) -> None:
+    """ジョブの出力を 1 行表示する (バックグラウンドなら "[番号] " を付ける)。"""
+
+    job = current_job.get()
+    if job is not None and job.background:
+        for line in text.splitlines() or [""]:
+            print(f"[{job.id}] {line}")
+    else:
+        print(text)
+
+
+def emit_for(job: Job, text: str) -> None:
+    """ジョブの外から、*job* の出力として表示する。"""
+
+    token = current_job.set(job)
+    try:
+        emit(text)
+    finally:
+        current_job.reset(token)
+
+
+class JobTable:
+    """実行中のジョブの一覧。
+
+    終了したジョブは表から取り除く。バックグラウンドで終了した場合は
+    シェルと同じように "[番号] Done  コマンド" を表示する。
+    """
+
+    def __init__(self) -> None:
+        self._jobs: Dict[int, Job] = {}
+        self._next_id = 1
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def start(self, name: str, command: str, coro: Awaitable[Any], background: bool) -> Job:
+        """*coro* をタスクとして起動し、ジョブとして登録する。"""
+
+        job = Job(self._next_id, name, command, background)
+        self._next_id += 1
+        job.task = asyncio.get_running_loop().create_task(self._run(job, coro))
+        job.task.add_done_callback(lambda _task: self._finished(job))
+        self._jobs[job.id] = job
+        return job
+
+    @staticmethod
+    async def _run(job: Job, coro: Awaitable[Any]) -> Any:
+        current_job.set(job)
+        return await coro
+
+    def _finished(self, job: Job) -> None:
+        self._jobs.pop(job.id, None)
+        task = job.task
+        if task is not None and not task.cancelled() and task.exception() is not None:
+            emit_for(job, f"Error while executing handler for rpc '{job.name}': {task.exception()}")
+        if job.background:
+            print(f"[{job.id}] {job.status:8s} {job.command}")
+
+    def get(self, job_id: int) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        return sorted(self._jobs.values(), key=lambda job: job.id)
+
+    def latest(self) -> Optional[Job]:
+        """最後に起動したジョブ (fg / kill で番号を省略したときの対象)。"""
+
+        return max(self._jobs.values(), key=lambda job: job.id, default=None)
+
+    async def cancel_all(self) -> None:
+        """すべてのジョブを止め、終了を待つ。"""
+
+        tasks = [job.task for job in self._jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -2,16 +2,28 @@ from __future__ import annotations
 
 """YANG モデルの最小表現と読み込み処理を提供するモジュール。"""
 
+import hashlib
+import os
+import pickle
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from yang_schema import SchemaTree, build_schema_tree
 
 try:
     from pyang import context as yang_context
     from pyang import repository as yang_repository
+    from pyang import util as yang_util
+    from pyang import yang_parser
 except ImportError:  # pyang が無い場合は後でエラーメッセージを出す
     yang_context = None  # type: ignore[assignment]
     yang_repository = None  # type: ignore[assignment]
+    yang_util = None  # type: ignore[assignment]
+    yang_parser = None  # type: ignore[assignment]
 
 
 @dataclass
@@ -28,6 +40,13 @@ class YangModel:
     * state_leaf_handlers: state leaf ごとの Python handler シンボル
     * rpc_arg_styles: rpc 引数スタイル ("kv" / "positional" など)
     * rpc_input_params: rpc の input セクションで定義された leaf 名一覧
+    * schema: uses / augment を展開したスキーマツリー (ensure_schema() で取得)
+
+    rpc 名と state leaf 名の存在確認は has_rpc() / has_state_leaf() で O(1) に行う
+    (一覧は表示順を保つためにリストのまま持つ)。
+
+    generation はモデルの内容が変わるたびに増える番号で、補完の索引など
+    モデルから作った派生データを作り直すべきかどうかの判定に使う。
     """
 
     rpc_names: List[str] = field(default_factory=list)
@@ -40,158 +59,797 @@ class YangModel:
     state_leaf_handlers: Dict[str, str] = field(default_factory=dict)
     rpc_arg_styles: Dict[str, str] = field(default_factory=dict)
     rpc_input_params: Dict[str, List[str]] = field(default_factory=dict)
+    schema: Optional[SchemaTree] = field(default=None, repr=False, compare=False)
+    _rpc_set: Set[str] = field(default_factory=set, repr=False, compare=False)
+    _state_leaf_set: Set[str] = field(default_factory=set, repr=False, compare=False)
+    generation: int = field(default=0, repr=False, compare=False)
 
+    def has_rpc(self, name: str) -> bool:
+        return name in self._rpc_set
 
-def load_example_yang(directory: Path) -> YangModel:
-    """Load YANG modules in *directory* using pyang and collect metadata.
+    def has_state_leaf(self, leaf: str) -> bool:
+        return leaf in self._state_leaf_set
 
-    - すべての rpc 名を収集
-    - container state (config false) 以下の leaf 名を、入れ子も含めて収集
+    def add_rpc_name(self, name: str) -> None:
+        if name not in self._rpc_set:
+            self._rpc_set.add(name)
+            self.rpc_names.append(name)
+            self.generation += 1
 
-    pyang がインストールされていない場合は例外を投げる。
-    """
+    def add_state_leaf_name(self, leaf: str) -> None:
+        if leaf not in self._state_leaf_set:
+            self._state_leaf_set.add(leaf)
+            self.state_leaf_names.append(leaf)
+            self.generation += 1
+
+    def handler_symbols(self) -> List[str]:
+        """YANG で指定されている handler シンボル ("module:function") の一覧 (重複なし)。"""
+
+        symbols = list(self.rpc_handlers.values()) + list(self.state_leaf_handlers.values())
+        return list(dict.fromkeys(symbols))
+
+    def ensure_schema(self) -> Optional[SchemaTree]:
+        """スキーマツリーを返す。
+
+        load_example_yang() で読み込んだモデルでは構築済みのものを返す。
+        遅延読み込み版 (LazyYangModel) は初めて呼ばれたときに構築する。
+        """
+
+        return self.schema
+
+    def ensure_rpc(self, name: str) -> None:
+        """rpc *name* の詳細 (description, handler など) を利用可能にする。
+
+        すべて読み込み済みのモデルでは何もしない。
+        遅延読み込み版 (LazyYangModel) がオーバーライドする。
+        """
+
+    def ensure_state(self) -> None:
+        """state leaf の一覧と詳細を利用可能にする。
 
+        すべて読み込み済みのモデルでは何もしない。
+        遅延読み込み版 (LazyYangModel) がオーバーライドする。
+        """
+
+    def merge_rpc(self, other: "YangModel", name: str) -> None:
+        """*other* が持つ rpc *name* の情報を取り込む (先に登録された値を優先)。"""
+
+        if not other.has_rpc(name):
+            return
+        self.add_rpc_name(name)
+        for attr in (
+            "rpc_descriptions",
+            "rpc_handlers",
+            "rpc_usages",
+            "rpc_arg_styles",
+            "rpc_input_params",
+        ):
+            mine = getattr(self, attr)
+            theirs = getattr(other, attr)
+            if name not in mine and name in theirs:
+                mine[name] = theirs[name]
+        self.generation += 1
+
+    def merge_state(self, other: "YangModel") -> None:
+        """*other* が持つ state leaf の情報を取り込む (先に登録された値を優先)。"""
+
+        for leaf in other.state_leaf_names:
+            self.add_state_leaf_name(leaf)
+        for attr in (
+            "state_leaf_descriptions",
+            "state_leaf_completions",
+            "state_leaf_handlers",
+        ):
+            mine = getattr(self, attr)
+            for leaf, value in getattr(other, attr).items():
+                mine.setdefault(leaf, value)
+        self.generation += 1
+
+
+def _require_pyang() -> None:
     if yang_repository is None or yang_context is None:
         raise RuntimeError(
             "pyang is not available. Please install it in your environment.",
         )
 
+
+def _list_yang_files(directory: Path) -> List[Path]:
     # ディレクトリ内の .yang ファイルをすべて対象にする
     yang_files = sorted(p for p in directory.glob("*.yang"))
     if not yang_files:
         raise FileNotFoundError(f"No YANG files found in {directory}")
+    return yang_files
+
+
+# --- 並列解析 ---------------------------------------------------------------
+#
+# pyang の字句解析・構文解析 (YangParser.parse) はファイルごとに独立しており、
+# Context に登録する (add_parsed_module) 前の構文木は pickle できる。
+# そこで解析だけをプロセスプールで並列に行い、構文木を受け取ってから
+# import / include の依存順に Context へ登録する。
+# 構文木の pickle/unpickle は解析の数分の一のコストで済む。
+
+# これより少ないファイル数ではプロセス起動のコストの方が大きい
+_PARALLEL_MIN_FILES = 8
+
+# ワーカープロセスごとの Context (エラーの記録先として使うだけ)
+_worker_ctx = None
+
+
+def _init_parse_worker(directory: str) -> None:
+    global _worker_ctx
+    _worker_ctx = yang_context.Context(yang_repository.FileRepository(directory))
+
+
+def _parse_in_worker(path: str):
+    """ワーカープロセスで 1 ファイルを解析し、構文木 (未登録) を返す。"""
+
+    text = Path(path).read_text(encoding="utf-8")
+    return yang_parser.YangParser().parse(_worker_ctx, Path(path).name, text)
+
+
+def _dependency_order(modules: Dict[Path, object]) -> List[Path]:
+    """import / include される側が先になるように並べる。
+
+    依存関係の無いもの同士はファイル名順のまま。循環がある場合は
+    循環に入ったところでファイル名順に戻す。
+    """
+
+    by_name: Dict[str, Path] = {}
+    for path, mod in modules.items():
+        by_name.setdefault(mod.arg, path)
+
+    order: List[Path] = []
+    visiting: set = set()
+    done: set = set()
+
+    def visit(path: Path) -> None:
+        if path in done or path in visiting:
+            return
+        visiting.add(path)
+        for sub in modules[path].substmts:
+            if sub.keyword in ("import", "include") and sub.arg in by_name:
+                visit(by_name[sub.arg])
+        visiting.discard(path)
+        done.add(path)
+        order.append(path)
+
+    for path in sorted(modules):
+        visit(path)
+    return order
+
+
+def parse_yang_files(
+    ctx,
+    paths: Sequence[Path],
+    workers: Optional[int] = None,
+) -> Dict[Path, object]:
+    """*paths* を pyang で解析して *ctx* に登録し、ファイルごとの構文木を返す。
+
+    解析に失敗したファイルは結果に含まれない。
+    *workers* が 2 以上 (省略時は CPU 数) でファイル数が十分多い場合は
+    プロセスプールで並列に解析する。
+    """
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(paths))
+
+    if workers < 2 or len(paths) < _PARALLEL_MIN_FILES:
+        parsed: Dict[Path, object] = {}
+        for path in paths:
+            mod = ctx.add_module(path.name, path.read_text(encoding="utf-8"))
+            if mod is not None:
+                parsed[path] = mod
+        return parsed
+
+    directory = str(paths[0].parent)
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_parse_worker,
+        initargs=(directory,),
+    ) as pool:
+        trees = list(pool.map(_parse_in_worker, [str(p) for p in paths], chunksize=4))
+
+    modules = {path: mod for path, mod in zip(paths, trees) if mod is not None}
+
+    # add_module() が解析後に行う登録処理と同じことを依存順に行う
+    parsed = {}
+    for path in _dependency_order(modules):
+        mod = modules[path]
+        mod.i_is_primary_module = False
+        if mod.arg not in ctx.revs:
+            ctx.revs[mod.arg] = [(yang_util.get_latest_revision(mod), None)]
+        added = ctx.add_parsed_module(mod)
+        if added is not None:
+            parsed[path] = added
+    return parsed
+
+
+def load_example_yang(directory: Path, workers: Optional[int] = None) -> YangModel:
+    """Load YANG modules in *directory* using pyang and collect metadata.
+
+    - すべての rpc 名を収集
+    - container state (config false) 以下の leaf 名を、入れ子も含めて収集
+
+    *workers* は構文解析に使うプロセス数 (省略時は CPU 数)。
+    pyang がインストールされていない場合は例外を投げる。
+    """
+
+    _require_pyang()
+    yang_files = _list_yang_files(directory)
 
     repo = yang_repository.FileRepository(str(directory))
     ctx = yang_context.Context(repo)
 
+    parsed = parse_yang_files(ctx, yang_files, workers)
     modules = []
     for yf in yang_files:
-        text = yf.read_text(encoding="utf-8")
-        mod = ctx.add_module(yf.name, text)
-        if mod is None:
+        if yf not in parsed:
             raise RuntimeError(f"Failed to parse YANG file: {yf}")
-        modules.append(mod)
+        modules.append(parsed[yf])
 
     # 構文木 (substmts) から必要な情報をたどる。
     model = YangModel()
+    for mod in modules:
+        _walk(mod, False, model)
+    model.schema = build_schema_tree(modules)
+
+    return model
+
+
+def _is_extension(stmt, localname: str) -> bool:
+    """pyang の拡張ステートメント判定.
+
+    keyword が "ex:cli-usage" のような文字列の場合と
+    (prefix, localname) タプルの場合の両方を扱う。
+    """
+
+    key = getattr(stmt, "keyword", None)
+    if isinstance(key, tuple) and len(key) == 2:
+        return key[1] == localname
+    if isinstance(key, str):
+        return key.endswith(":" + localname) or key == localname
+    return False
+
+
+def _first_description_arg(stmt) -> Optional[str]:
+    for sub in getattr(stmt, "substmts", []) or []:
+        if sub.keyword == "description" and isinstance(sub.arg, str):
+            return sub.arg.strip()
+    return None
+
+
+def _first_extension_arg(stmt, localname: str) -> Optional[str]:
+    for sub in getattr(stmt, "substmts", []) or []:
+        if isinstance(sub.arg, str) and _is_extension(sub, localname):
+            return sub.arg.strip()
+    return None
+
+
+def _collect_input_leaf_names(input_stmt) -> List[str]:
+    """Recursively collect leaf names under an rpc's input statement."""
+
+    names: List[str] = []
+
+    def _walk_input(s) -> None:
+        if s.keyword == "leaf":
+            if isinstance(s.arg, str) and s.arg not in names:
+                names.append(s.arg)
+        for child in getattr(s, "substmts", []) or []:
+            _walk_input(child)
+
+    _walk_input(input_stmt)
+    return names
+
+
+def _walk(stmt, in_state: bool, model: YangModel) -> None:
+    """構文木をたどり、rpc と state leaf の情報を *model* に登録する。"""
+
+    # rpc
+    if stmt.keyword == "rpc":
+        name = stmt.arg
+        model.add_rpc_name(name)
+
+        if name not in model.rpc_descriptions:
+            desc = _first_description_arg(stmt)
+            if desc is not None:
+                model.rpc_descriptions[name] = desc
+
+        if name not in model.rpc_handlers:
+            handler = _first_extension_arg(stmt, "python-handler")
+            if handler is not None:
+                model.rpc_handlers[name] = handler
+
+        if name not in model.rpc_usages:
+            usage = _first_extension_arg(stmt, "cli-usage")
+            if usage is not None:
+                model.rpc_usages[name] = usage
+
+        if name not in model.rpc_arg_styles:
+            style = _first_extension_arg(stmt, "rpc-arg-style")
+            if style is not None:
+                model.rpc_arg_styles[name] = style
+
+        # rpc input セクションから引数 leaf 名を収集しておく
+        if name not in model.rpc_input_params:
+            for sub in getattr(stmt, "substmts", []) or []:
+                if sub.keyword == "input":
+                    params = _collect_input_leaf_names(sub)
+                    if params:
+                        model.rpc_input_params[name] = params
+                    break
+
+    # state コンテナ (config false)
+    if stmt.keyword == "container":
+        is_state_here = in_state
+        if stmt.arg == "state":
+            has_config_false = any(
+                sub.keyword == "config" and str(sub.arg) == "false"
+                for sub in stmt.substmts
+            )
+            if has_config_false:
+                is_state_here = True
+        for sub in stmt.substmts:
+            _walk(sub, is_state_here, model)
+        return
+
+    # state コンテナ配下の leaf
+    if in_state and stmt.keyword == "leaf":
+        leaf_name = stmt.arg
+        model.add_state_leaf_name(leaf_name)
+
+        if leaf_name not in model.state_leaf_descriptions:
+            desc = _first_description_arg(stmt)
+            if desc is not None:
+                model.state_leaf_descriptions[leaf_name] = desc
+
+        if leaf_name not in model.state_leaf_completions:
+            comp = _first_extension_arg(stmt, "cli-completion")
+            if comp is not None:
+                # 空白区切りの候補リストとみなす
+                model.state_leaf_completions[leaf_name] = comp.split()
+
+        if leaf_name not in model.state_leaf_handlers:
+            handler = _first_extension_arg(stmt, "state-python-handler")
+            if handler is not None:
+                model.state_leaf_handlers[leaf_name] = handler
+
+    for sub in getattr(stmt, "substmts", []) or []:
+        _walk(sub, in_state, model)
+
+
+# --- 遅延読み込み -----------------------------------------------------------
+#
+# pyang での構文解析はモジュール数に比例して重い (openconfig の 123 ファイルで
+# 1 秒前後)。CLI の起動に必要なのは rpc 名の一覧だけなので、起動時には
+# 正規表現による軽量な事前スキャンで索引 (YangModuleInfo) だけを作り、
+# pyang での解析は利用者が触った rpc / state に関係するファイルに限って、
+# 初めて必要になった時点で行う。
+
+# コメントと文字列リテラル (中の { } ; を構造と誤認しないように除去する)
+_COMMENT_OR_STRING_RE = re.compile(
+    r'//[^\n]*|/\*.*?\*/|"[^"\\]*(?:\\.[^"\\]*)*"|\'[^\']*\'',
+    re.DOTALL,
+)
+
+# 1 ステートメント分の「キーワード 引数」と終端記号 ({ ; })
+_STATEMENT_RE = re.compile(r"([^{};]*)([{};])")
+
+# handler シンボルを指定する拡張 (プレフィックスはモジュールごとに異なるので後方一致で見る)
+_HANDLER_KEYWORDS = (":python-handler", ":state-python-handler")
+
+# config false を持つファイルだけが state leaf を提供しうる
+_CONFIG_FALSE_RE = re.compile(r"config\s+[\"']?false\b")
+
+_TOP_LEVEL_DATA_KEYWORDS = frozenset(
+    {"container", "list", "leaf", "leaf-list", "choice", "anydata", "anyxml"},
+)
+
+
+@dataclass
+class YangModuleInfo:
+    """事前スキャンで得られる 1 ファイル分の索引。
+
+    * path: YANG ファイルのパス
+    * name: module / submodule 名
+    * kind: "module" または "submodule"
+    * belongs_to: submodule の場合、所属する module 名
+    * imports: import しているモジュール名一覧
+    * includes: include している submodule 名一覧
+    * rpcs: 定義している rpc 名一覧
+    * top_nodes: トップレベルのデータノード名一覧
+    * has_state: config false を含むか (state leaf を持ちうるか)
+    * handlers: python-handler / state-python-handler 拡張で指定された handler シンボル
+    """
+
+    path: Path
+    name: str
+    kind: str = "module"
+    belongs_to: Optional[str] = None
+    imports: List[str] = field(default_factory=list)
+    includes: List[str] = field(default_factory=list)
+    rpcs: List[str] = field(default_factory=list)
+    top_nodes: List[str] = field(default_factory=list)
+    has_state: bool = False
+    handlers: List[str] = field(default_factory=list)
+
+
+def _unquote(arg: str) -> str:
+    if len(arg) >= 2 and arg[0] == arg[-1] and arg[0] in "\"'":
+        return arg[1:-1]
+    return arg
+
 
-    def _is_extension(stmt, localname: str) -> bool:
-        """pyang の拡張ステートメント判定.
+def scan_yang_file(path: Path, text: Optional[str] = None) -> YangModuleInfo:
+    """YANG ファイルを構文解析せずに走査し、索引情報を返す。
 
-        keyword が "ex:cli-usage" のような文字列の場合と
-        (prefix, localname) タプルの場合の両方を扱う。
+    コメントと文字列を除去したうえで { } の深さだけを追い、
+    module 直下 (深さ 1) のステートメントのキーワードと引数を拾う。
+    *text* を渡した場合はファイルを読まずにそれを走査する。
+    """
+
+    if text is None:
+        text = path.read_text(encoding="utf-8")
+    info = YangModuleInfo(path=path, name=path.stem.split("@", 1)[0])
+    info.has_state = _CONFIG_FALSE_RE.search(text) is not None
+
+    def _neutralize(m: "re.Match[str]") -> str:
+        token = m.group(0)
+        if token[0] == "/":
+            return " "
+        # 文字列リテラルは引数として残し、構造記号だけを取り除く
+        return token.replace("{", "").replace("}", "").replace(";", "")
+
+    cleaned = _COMMENT_OR_STRING_RE.sub(_neutralize, text)
+
+    depth = 0
+    for m in _STATEMENT_RE.finditer(cleaned):
+        head, term = m.groups()
+        if term == "}":
+            depth -= 1
+            continue
+
+        # handler シンボルは深さに関係なく拾う (起動時に import できるか確認するため)
+        if "python-handler" in head:
+            parts = head.split(None, 1)
+            if len(parts) == 2 and parts[0].endswith(_HANDLER_KEYWORDS):
+                info.handlers.append(_unquote(parts[1].strip()))
+
+        if depth <= 1:
+            parts = head.split(None, 1)
+            if parts:
+                keyword = parts[0]
+                arg = _unquote(parts[1].strip()) if len(parts) > 1 else ""
+                if depth == 0 and keyword in {"module", "submodule"}:
+                    info.kind = keyword
+                    info.name = arg
+                elif depth == 1:
+                    if keyword == "import":
+                        info.imports.append(arg)
+                    elif keyword == "include":
+                        info.includes.append(arg)
+                    elif keyword == "belongs-to":
+                        info.belongs_to = arg
+                    elif keyword == "rpc":
+                        info.rpcs.append(arg)
+                    elif keyword in _TOP_LEVEL_DATA_KEYWORDS:
+                        info.top_nodes.append(arg)
+
+        if term == "{":
+            depth += 1
+
+    return info
+
+
+def build_yang_index(directory: Path) -> List[YangModuleInfo]:
+    """*directory* 内の全 YANG ファイルを事前スキャンし、ファイル名順の索引を返す。"""
+
+    return [scan_yang_file(path) for path in _list_yang_files(directory)]
+
+
+class LazyYangModel(YangModel):
+    """必要になった部分だけを pyang で解析する YangModel.
+
+    起動時には事前スキャンの索引から rpc 名の一覧だけを用意する。
+    rpc の詳細は ensure_rpc() でその rpc を定義するファイルだけを、
+    state leaf は ensure_state() で config false を含むファイルだけを解析する。
+
+    解析結果のマージはファイル名順で行うため、同名の rpc / leaf が
+    複数ファイルにある場合の優先順位は load_example_yang() と同じになる。
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        index: Iterable[YangModuleInfo],
+        cache: Optional["YangCache"] = None,
+        workers: Optional[int] = None,
+    ) -> None:
+        super().__init__()
+        _require_pyang()
+        self.directory = directory
+        self.index = list(index)
+        self.workers = workers
+
+        # pyang の Context はキャッシュに無いファイルを解析するときに作る
+        self._ctx = None
+        self._cache = cache
+
+        # ファイルごとの構文木と解析結果 (解析に失敗したファイルは None)
+        self._statements: Dict[Path, object] = {}
+        self._parsed: Dict[Path, Optional[YangModel]] = {}
+        if cache is not None:
+            self._parsed.update(cache.parsed_models())
+        self._loaded_rpcs: set = set()
+        self._state_loaded = False
+
+        for info in self.index:
+            for name in info.rpcs:
+                self.add_rpc_name(name)
+
+    def handler_symbols(self) -> List[str]:
+        # 未解析のファイルの分は事前スキャンで拾ったシンボルを使う
+        symbols = super().handler_symbols()
+        for info in self.index:
+            symbols.extend(info.handlers)
+        return list(dict.fromkeys(symbols))
+
+    def _load(self, paths: Sequence[Path]) -> None:
+        """*paths* のうち未解析のファイルを pyang で解析する。
+
+        解析結果の構文木を保持し、ファイルごとの YangModel も作っておく。
+        まとめて parse_yang_files() に渡すので、ファイル数が多ければ並列に解析される。
         """
 
-        key = getattr(stmt, "keyword", None)
-        if isinstance(key, tuple) and len(key) == 2:
-            return key[1] == localname
-        if isinstance(key, str):
-            return key.endswith(":" + localname) or key == localname
-        return False
-
-    def _first_description_arg(stmt) -> Optional[str]:
-        for sub in getattr(stmt, "substmts", []) or []:
-            if sub.keyword == "description" and isinstance(sub.arg, str):
-                return sub.arg.strip()
-        return None
-
-    def _first_extension_arg(stmt, localname: str) -> Optional[str]:
-        for sub in getattr(stmt, "substmts", []) or []:
-            if isinstance(sub.arg, str) and _is_extension(sub, localname):
-                return sub.arg.strip()
-        return None
-
-    def _collect_input_leaf_names(input_stmt) -> List[str]:
-        """Recursively collect leaf names under an rpc's input statement."""
-
-        names: List[str] = []
-
-        def _walk_input(s) -> None:
-            if s.keyword == "leaf":
-                if isinstance(s.arg, str) and s.arg not in names:
-                    names.append(s.arg)
-            for child in getattr(s, "substmts", []) or []:
-                _walk_input(child)
-
-        _walk_input(input_stmt)
-        return names
-
-    def walk(stmt, in_state: bool) -> None:
-        # rpc
-        if stmt.keyword == "rpc":
-            name = stmt.arg
-            if name not in model.rpc_names:
-                model.rpc_names.append(name)
-
-            if name not in model.rpc_descriptions:
-                desc = _first_description_arg(stmt)
-                if desc is not None:
-                    model.rpc_descriptions[name] = desc
-
-            if name not in model.rpc_handlers:
-                handler = _first_extension_arg(stmt, "python-handler")
-                if handler is not None:
-                    model.rpc_handlers[name] = handler
-
-            if name not in model.rpc_usages:
-                usage = _first_extension_arg(stmt, "cli-usage")
-                if usage is not None:
-                    model.rpc_usages[name] = usage
-
-            if name not in model.rpc_arg_styles:
-                style = _first_extension_arg(stmt, "rpc-arg-style")
-                if style is not None:
-                    model.rpc_arg_styles[name] = style
-
-            # rpc input セクションから引数 leaf 名を収集しておく
-            if name not in model.rpc_input_params:
-                for sub in getattr(stmt, "substmts", []) or []:
-                    if sub.keyword == "input":
-                        params = _collect_input_leaf_names(sub)
-                        if params:
-                            model.rpc_input_params[name] = params
-                        break
-
-        # state コンテナ (config false)
-        if stmt.keyword == "container":
-            is_state_here = in_state
-            if stmt.arg == "state":
-                has_config_false = any(
-                    sub.keyword == "config" and str(sub.arg) == "false"
-                    for sub in stmt.substmts
-                )
-                if has_config_false:
-                    is_state_here = True
-            for sub in stmt.substmts:
-                walk(sub, is_state_here)
+        pending = [path for path in paths if path not in self._statements]
+        if not pending:
             return
 
-        # state コンテナ配下の leaf
-        if in_state and stmt.keyword == "leaf":
-            leaf_name = stmt.arg
-            if leaf_name not in model.state_leaf_names:
-                model.state_leaf_names.append(leaf_name)
+        if self._ctx is None:
+            repo = yang_repository.FileRepository(str(self.directory))
+            self._ctx = yang_context.Context(repo)
+
+        modules = parse_yang_files(self._ctx, pending, self.workers)
+        for path in pending:
+            mod = modules.get(path)
+            self._statements[path] = mod
+            if mod is None:
+                # 起動後の REPL 中なので例外にはせず、そのファイルを無視する
+                print(f"Failed to parse YANG file: {path}", file=sys.stderr)
+            if path in self._parsed:
+                continue
+            partial: Optional[YangModel] = None
+            if mod is not None:
+                partial = YangModel()
+                _walk(mod, False, partial)
+            self._parsed[path] = partial
+            if self._cache is not None:
+                self._cache.store_parsed(path, partial)
+        if self._cache is not None:
+            self._cache.save()
+
+    def _parse(self, infos: Sequence[YangModuleInfo]) -> List[Optional[YangModel]]:
+        """ファイルごとの YangModel を返す (キャッシュに無いものだけ解析する)。"""
+
+        self._load([info.path for info in infos if info.path not in self._parsed])
+        return [self._parsed[info.path] for info in infos]
+
+    def ensure_schema(self) -> Optional[SchemaTree]:
+        if self.schema is not None:
+            return self.schema
+
+        digest = None
+        if self._cache is not None:
+            digest = self._cache.content_digest()
+            self.schema = self._cache.get_schema(digest)
+            if self.schema is not None:
+                return self.schema
+
+        # import 先や augment 対象を含めて展開するため、全ファイルを解析する
+        paths = [info.path for info in self.index]
+        self._load(paths)
+        modules = [self._statements[p] for p in paths if self._statements[p] is not None]
+        self.schema = build_schema_tree(modules)
+
+        if self._cache is not None:
+            self._cache.store_schema(digest, self.schema)
+            self._cache.save()
+        return self.schema
+
+    def ensure_rpc(self, name: str) -> None:
+        if name in self._loaded_rpcs:
+            return
+        self._loaded_rpcs.add(name)
+        infos = [info for info in self.index if name in info.rpcs]
+        for partial in self._parse(infos):
+            if partial is not None:
+                self.merge_rpc(partial, name)
+
+    def ensure_state(self) -> None:
+        if self._state_loaded:
+            return
+        self._state_loaded = True
+        infos = [info for info in self.index if info.has_state]
+        for partial in self._parse(infos):
+            if partial is not None:
+                self.merge_state(partial)
 
-            if leaf_name not in model.state_leaf_descriptions:
-                desc = _first_description_arg(stmt)
-                if desc is not None:
-                    model.state_leaf_descriptions[leaf_name] = desc
 
-            if leaf_name not in model.state_leaf_completions:
-                comp = _first_extension_arg(stmt, "cli-completion")
-                if comp is not None:
-                    # 空白区切りの候補リストとみなす
-                    model.state_leaf_completions[leaf_name] = comp.split()
+def load_yang_lazily(
+    directory: Path,
+    cache_path: Optional[Path] = None,
+    workers: Optional[int] = None,
+) -> LazyYangModel:
+    """*directory* の YANG を事前スキャンし、遅延読み込みするモデルを返す。
 
-            if leaf_name not in model.state_leaf_handlers:
-                handler = _first_extension_arg(stmt, "state-python-handler")
-                if handler is not None:
-                    model.state_leaf_handlers[leaf_name] = handler
+    *cache_path* を指定した場合は、事前スキャンと解析の結果をそのファイルに
+    キャッシュし、変更されていない YANG ファイルについては再利用する。
+    *workers* は構文解析に使うプロセス数 (省略時は CPU 数)。
 
-        for sub in getattr(stmt, "substmts", []) or []:
-            walk(sub, in_state)
+    pyang がインストールされていない場合は例外を投げる。
+    """
 
-    for mod in modules:
-        walk(mod, False)
+    if cache_path is None:
+        return LazyYangModel(directory, build_yang_index(directory), workers=workers)
 
-    return model
+    cache = YangCache.load(cache_path, directory)
+    index = cache.build_index(_list_yang_files(directory))
+    cache.save()
+    return LazyYangModel(directory, index, cache, workers)
+
+
+# --- キャッシュ -------------------------------------------------------------
+#
+# 事前スキャンの索引 (YangModuleInfo) と、pyang で解析した結果 (ファイルごとの
+# YangModel) を pickle でファイルに保存する。各ファイルは独立して解析している
+# (import 先を解決しない) ため、キャッシュもファイル単位で無効化すればよい。
+#
+# ファイルが変更されたかどうかは、まず mtime とサイズで判定し、それらが
+# 変わっていた場合だけ内容の sha256 を比べる (touch しただけなら再利用する)。
+
+
+@dataclass
+class _CacheEntry:
+    mtime_ns: int
+    size: int
+    sha256: str
+    info: YangModuleInfo
+    parsed: bool = False
+    model: Optional[YangModel] = None
+
+
+class YangCache:
+    """YANG ファイルごとの索引と解析結果のキャッシュ。"""
+
+    # 保存形式を変えたら上げる (古いキャッシュは読み捨てる)
+    VERSION = 3
+
+    def __init__(self, path: Path, directory: Path) -> None:
+        self.path = path
+        self.directory = str(directory.resolve())
+        self.entries: Dict[str, _CacheEntry] = {}
+        # スキーマツリーは全ファイルから作るので、全ファイルの内容のハッシュで管理する
+        self.schema_digest: Optional[str] = None
+        self.schema: Optional[SchemaTree] = None
+        self._dirty = False
+
+    @classmethod
+    def load(cls, path: Path, directory: Path) -> "YangCache":
+        """キャッシュファイルを読み込む。
+
+        ファイルが無い、壊れている、形式が古い、別ディレクトリのもの、
+        のいずれの場合も空のキャッシュを返す。
+        """
+
+        cache = cls(path, directory)
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+        except Exception:  # noqa: BLE001
+            return cache
+
+        if (
+            isinstance(data, dict)
+            and data.get("version") == cls.VERSION
+            and data.get("directory") == cache.directory
+        ):
+            cache.entries = data["entries"]
+            cache.schema_digest = data.get("schema_digest")
+            cache.schema = data.get("schema")
+        return cache
+
+    def build_index(self, paths: Iterable[Path]) -> List[YangModuleInfo]:
+        """*paths* の索引を返す。変更されたファイルだけを走査し直す。
+
+        エントリはファイル名で照合し、索引のパスは *paths* のものにする。
+        """
+
+        entries: Dict[str, _CacheEntry] = {}
+        for path in paths:
+            st = path.stat()
+            entry = self.entries.get(path.name)
+            if entry is None or (entry.mtime_ns, entry.size) != (st.st_mtime_ns, st.st_size):
+                data = path.read_bytes()
+                digest = hashlib.sha256(data).hexdigest()
+                if entry is None or entry.sha256 != digest:
+                    info = scan_yang_file(path, data.decode("utf-8"))
+                    entry = _CacheEntry(st.st_mtime_ns, st.st_size, digest, info)
+                else:
+                    # 内容は同じ (touch されただけ)
+                    entry.mtime_ns = st.st_mtime_ns
+                    entry.size = st.st_size
+                self._dirty = True
+            elif entry.info.path != path:
+                # 別の作業ディレクトリや、別の相対パスの --yang-dir で作ったキャッシュ。
+                # 照合はファイル名で行い、パスは今回走査したものに付け替える
+                entry.info.path = path
+                self._dirty = True
+            entries[path.name] = entry
+
+        if entries.keys() != self.entries.keys():
+            # 削除されたファイルのエントリを捨てる
+            self._dirty = True
+        self.entries = entries
+        return [entry.info for entry in entries.values()]
+
+    def parsed_models(self) -> Dict[Path, Optional[YangModel]]:
+        """解析済みのファイルの結果を返す (解析に失敗したファイルは None)。"""
+
+        return {
+            entry.info.path: entry.model
+            for entry in self.entries.values()
+            if entry.parsed
+        }
+
+    def store_parsed(self, path: Path, model: Optional[YangModel]) -> None:
+        """ファイルの解析結果を記録する。"""
+
+        entry = self.entries.get(path.name)
+        if entry is None:
+            return
+        entry.parsed = True
+        entry.model = model
+        self._dirty = True
+
+    def content_digest(self) -> str:
+        """全ファイルの名前と内容のハッシュから作ったダイジェスト。"""
+
+        h = hashlib.sha256()
+        for name, entry in sorted(self.entries.items()):
+            h.update(f"{name}:{entry.sha256}\n".encode("utf-8"))
+        return h.hexdigest()
+
+    def get_schema(self, digest: str) -> Optional[SchemaTree]:
+        """*digest* の時点のスキーマツリーがあれば返す。"""
+
+        return self.schema if self.schema_digest == digest else None
+
+    def store_schema(self, digest: Optional[str], schema: SchemaTree) -> None:
+        self.schema_digest = digest
+        self.schema = schema
+        self._dirty = True
+
+    def save(self) -> None:
+        """変更があればキャッシュファイルに書き出す。"""
+
+        if not self._dirty:
+            return
+
+        data = {
+            "version": self.VERSION,
+            "directory": self.directory,
+            "entries": self.entries,
+            "schema_digest": self.schema_digest,
+            "schema": self.schema,
+        }
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # 書きかけのファイルを読まないように、置き換えは rename で行う
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"Failed to write YANG cache {self.path}: {e}", file=sys.stderr)
+        self._dirty = False
@@ -0,0 +1,460 @@
+from __future__ import annotations
+
+"""YANG のスキーマツリー (uses / augment を展開したノードの木) を提供するモジュール。
+
+YangModel が持つのは rpc 名や state leaf 名の平坦な一覧だけなので、
+コンテナやリスト、リストのキーといった入れ子の構造はここで表現する。
+
+* SchemaNode: 1 ノード。``__slots__`` で属性を固定し、名前は intern する
+* SchemaTree: ノード全体。次の索引を持つ
+  - パス ("/interfaces/interface/config/name") → ノード の辞書 (O(1))
+  - 子の名前 → ノード の辞書をたどる解決 (O(深さ))
+    (CLI 形式の list のキーの値を含むパスは walk() でたどる)
+  - 行きがけ順の番号で並べたノード配列と、親番号・部分木の終端番号の配列
+    (祖先判定と部分木の列挙が O(1) / スライスで済む)
+
+スキーマは pyang の構文解析結果 (validate 前の Statement) から自前で組み立てる。
+pyang の validate() は OpenConfig 規模で数秒かかり、import 先が揃っていないと
+失敗するため使わない。展開するのは次のものだけで、if-feature, refine,
+deviation などは無視する。
+
+* uses → grouping の中身 (字句スコープ、submodule、prefix 付きの import 先を解決)
+* augment (トップレベル、および uses 配下の相対パス)
+* choice / case は CLI のパスに現れないので、親ノードに畳み込む
+"""
+
+import sys
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# スキーマツリーのノードになるステートメント
+DATA_KEYWORDS = frozenset(
+    {"container", "list", "leaf", "leaf-list", "anydata", "anyxml"},
+)
+OPERATION_KEYWORDS = frozenset({"rpc", "action", "notification", "input", "output"})
+
+# 親ノードに畳み込むステートメント
+TRANSPARENT_KEYWORDS = frozenset({"choice", "case"})
+
+
+class SchemaNode:
+    """スキーマツリーの 1 ノード。
+
+    * index: SchemaTree.nodes 上の番号 (行きがけ順)
+    * name: ノード名 (intern 済み)
+    * keyword: "container" / "list" / "leaf" / "rpc" など
+    * module: ノードが属するモジュール名 (uses で展開した場合は利用側)
+    * parent: 親ノード (ルートは None)
+    * children: 子ノード名 → ノード (定義順)
+    * keys: list のキー leaf 名
+    * type: leaf / leaf-list の型名
+    * config: 設定データなら True (config false の配下や rpc などは False)
+    * mandatory: mandatory true が指定されているか
+    * description: description 文字列
+    * aliases: このノードに畳み込んだ choice / case の名前
+    """
+
+    __slots__ = (
+        "index",
+        "name",
+        "keyword",
+        "module",
+        "parent",
+        "children",
+        "keys",
+        "type",
+        "config",
+        "mandatory",
+        "description",
+        "aliases",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        keyword: str,
+        module: str,
+        parent: Optional["SchemaNode"] = None,
+    ) -> None:
+        self.index = -1
+        self.name = sys.intern(name)
+        self.keyword = keyword
+        self.module = module
+        self.parent = parent
+        self.children: Dict[str, SchemaNode] = {}
+        self.keys: Tuple[str, ...] = ()
+        self.type: Optional[str] = None
+        self.config = True
+        self.mandatory = False
+        self.description: Optional[str] = None
+        self.aliases: Optional[Set[str]] = None
+
+    def __repr__(self) -> str:
+        return f"SchemaNode({self.keyword} {self.path})"
+
+    @property
+    def path(self) -> str:
+        """ルートからのパス ("/a/b/c")。ルート自身は "/"。"""
+
+        names: List[str] = []
+        node: Optional[SchemaNode] = self
+        while node is not None and node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+        return "/" + "/".join(reversed(names))
+
+    @property
+    def is_leaf(self) -> bool:
+        return self.keyword in ("leaf", "leaf-list")
+
+    @property
+    def is_list(self) -> bool:
+        return self.keyword == "list"
+
+    def child(self, name: str) -> Optional["SchemaNode"]:
+        return self.children.get(name)
+
+
+class SchemaTree:
+    """展開済みのスキーマツリーと、その索引。"""
+
+    def __init__(self, root: SchemaNode) -> None:
+        self.root = root
+        # 行きがけ順のノード配列と、親番号 (ルートは -1)・部分木の終端番号 (排他的)
+        self.nodes: List[SchemaNode] = []
+        self.parents = array("i")
+        self.ends = array("i")
+        self._by_path: Dict[str, SchemaNode] = {}
+        self._number()
+
+    def _number(self) -> None:
+        nodes = self.nodes
+        parents = self.parents
+        by_path = self._by_path
+
+        # (ノード, パス) を積むスタック。終端番号は子を処理し終えたときに書き込む
+        stack: List[Tuple[SchemaNode, str, bool]] = [(self.root, "", False)]
+        while stack:
+            node, path, done = stack.pop()
+            if done:
+                self.ends[node.index] = len(nodes)
+                continue
+            node.index = len(nodes)
+            nodes.append(node)
+            parents.append(node.parent.index if node.parent is not None else -1)
+            self.ends.append(0)
+            by_path[path or "/"] = node
+            stack.append((node, path, True))
+            for child in reversed(list(node.children.values())):
+                stack.append((child, f"{path}/{child.name}", False))
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def find(self, path: str) -> Optional[SchemaNode]:
+        """パス ("/a/b/c") に対応するノードを返す (O(1))。"""
+
+        return self._by_path.get(path.rstrip("/") or "/")
+
+    def resolve(self, names: Sequence[str], start: Optional[SchemaNode] = None) -> Optional[SchemaNode]:
+        """ノード名の並びを *start* (省略時はルート) からたどる (O(深さ))。"""
+
+        node = start or self.root
+        for name in names:
+            child = node.children.get(name)
+            if child is None:
+                return None
+            node = child
+        return node
+
+    def walk(self, tokens: Sequence[str]) -> Optional[Tuple[SchemaNode, Tuple[str, ...]]]:
+        """CLI 形式のパス (list 名の後ろにキーの値を続けられる) をたどる。
+
+        "interfaces interface eth0 config" のように、list の後ろの子ノード名ではない
+        トークンはキーの値とみなす (キーの数まで)。
+        戻り値は (最後のノード, そのノードが list の場合に入力済みのキーの値)。
+        たどれない場合は None。
+        """
+
+        node = self.root
+        keys: Tuple[str, ...] = ()
+        for token in tokens:
+            child = node.children.get(token)
+            if child is not None:
+                node = child
+                keys = ()
+            elif node.is_list and len(keys) < len(node.keys):
+                keys += (token,)
+            else:
+                return None
+        return node, keys
+
+    def parent_of(self, node: SchemaNode) -> Optional[SchemaNode]:
+        index = self.parents[node.index]
+        return self.nodes[index] if index >= 0 else None
+
+    def is_ancestor(self, ancestor: SchemaNode, node: SchemaNode) -> bool:
+        """*ancestor* が *node* の祖先 (または同一) か (O(1))。"""
+
+        return ancestor.index <= node.index < self.ends[ancestor.index]
+
+    def descendants(self, node: SchemaNode) -> List[SchemaNode]:
+        """*node* の子孫を行きがけ順で返す (自身は含まない)。"""
+
+        return self.nodes[node.index + 1:self.ends[node.index]]
+
+    def render(self, node: Optional[SchemaNode] = None, depth: Optional[int] = None) -> List[str]:
+        """pyang の tree 形式に似た表示用の行を返す。
+
+        *depth* を指定した場合は、その深さより下を省略する。
+        """
+
+        start = node or self.root
+        lines = [start.path if start is not self.root else "/"]
+
+        def emit(parent: SchemaNode, indent: str, level: int) -> None:
+            children = list(parent.children.values())
+            # 兄弟ノードの間で型の列をそろえる
+            labels = [_label(child) for child in children]
+            width = max((len(name) for name, type_ in labels if type_), default=0)
+            for i, child in enumerate(children):
+                last = i == len(children) - 1
+                name, type_ = labels[i]
+                label = f"{name:{width}}   {type_}" if type_ else name
+                lines.append(f"{indent}+--{_flags(child)} {label}")
+                if child.children:
+                    if depth is not None and level >= depth:
+                        lines.append(f"{indent}{'   ' if last else '|  '}   ...")
+                    else:
+                        emit(child, indent + ("   " if last else "|  "), level + 1)
+
+        emit(start, "   ", 1)
+        return lines
+
+
+def _flags(node: SchemaNode) -> str:
+    if node.keyword in ("rpc", "action"):
+        return "-x"
+    if node.keyword == "notification":
+        return "-n"
+    if node.keyword in ("input", "output"):
+        return "--"
+    return "rw" if node.config else "ro"
+
+
+def _label(node: SchemaNode) -> Tuple[str, str]:
+    """(ノード名の表記, 型) を返す。型を表示しないノードでは型は空文字列。"""
+
+    if node.keyword == "list":
+        return f"{node.name}* [{' '.join(node.keys)}]", ""
+    if node.keyword == "leaf-list":
+        return f"{node.name}*", node.type or ""
+    if node.keyword == "leaf":
+        is_key = node.parent is not None and node.name in node.parent.keys
+        mark = "" if node.mandatory or is_key else "?"
+        return f"{node.name}{mark}", node.type or ""
+    return node.name, ""
+
+
+# --- 構築 -------------------------------------------------------------------
+
+
+def _sub_arg(stmt, keyword: str) -> Optional[str]:
+    for sub in stmt.substmts:
+        if sub.keyword == keyword and isinstance(sub.arg, str):
+            return sub.arg
+    return None
+
+
+def _local_name(qname: str) -> str:
+    return qname.split(":", 1)[1] if ":" in qname else qname
+
+
+class _SchemaBuilder:
+    """pyang の Statement から SchemaTree を組み立てる。"""
+
+    def __init__(self, statements: Iterable) -> None:
+        # module 名 → [module, その submodule...] (ファイル順)
+        self.families: Dict[str, List] = {}
+        submodules = []
+        for stmt in statements:
+            if stmt.keyword == "module":
+                self.families.setdefault(stmt.arg, []).insert(0, stmt)
+            elif stmt.keyword == "submodule":
+                submodules.append(stmt)
+        for stmt in submodules:
+            owner = _sub_arg(stmt, "belongs-to")
+            if owner is not None:
+                self.families.setdefault(owner, []).append(stmt)
+
+        self._prefixes: Dict[int, Dict[str, str]] = {}
+        self._groupings: Dict[str, Dict[str, object]] = {}
+
+    # --- 名前解決 -------------------------------------------------------
+
+    def _module_of(self, top) -> str:
+        if top.keyword == "submodule":
+            return _sub_arg(top, "belongs-to") or top.arg
+        return top.arg
+
+    def _prefix_map(self, top) -> Dict[str, str]:
+        """prefix → module 名 (*top* は module または submodule)。"""
+
+        prefixes = self._prefixes.get(id(top))
+        if prefixes is None:
+            prefixes = {}
+            if top.keyword == "submodule":
+                belongs = top.search_one("belongs-to")
+                own = _sub_arg(belongs, "prefix") if belongs is not None else None
+            else:
+                own = _sub_arg(top, "prefix")
+            if own is not None:
+                prefixes[own] = self._module_of(top)
+            for imp in top.substmts:
+                if imp.keyword == "import":
+                    prefix = _sub_arg(imp, "prefix")
+                    if prefix is not None:
+                        prefixes[prefix] = imp.arg
+            self._prefixes[id(top)] = prefixes
+        return prefixes
+
+    def _top_groupings(self, module: str) -> Dict[str, object]:
+        """module (と submodule) のトップレベルの grouping。"""
+
+        groupings = self._groupings.get(module)
+        if groupings is None:
+            groupings = {}
+            for stmt in self.families.get(module, []):
+                for sub in stmt.substmts:
+                    if sub.keyword == "grouping":
+                        groupings.setdefault(sub.arg, sub)
+            self._groupings[module] = groupings
+        return groupings
+
+    def _find_grouping(self, uses):
+        top = uses.top
+        name = uses.arg
+        if ":" in name:
+            prefix, name = name.split(":", 1)
+            module = self._prefix_map(top).get(prefix)
+            if module is None:
+                return None
+        else:
+            module = self._module_of(top)
+
+        if module == self._module_of(top):
+            # 字句スコープ: uses を囲むステートメントで定義された grouping を優先する
+            parent = uses.parent
+            while parent is not None and parent.keyword not in ("module", "submodule"):
+                for sub in parent.substmts:
+                    if sub.keyword == "grouping" and sub.arg == name:
+                        return sub
+                parent = parent.parent
+
+        return self._top_groupings(module).get(name)
+
+    def _walk_path(self, start: SchemaNode, path: str) -> Optional[SchemaNode]:
+        """augment のパス (絶対または相対) をたどる。prefix は無視する。"""
+
+        node = start
+        for segment in path.split("/"):
+            segment = _local_name(segment.split("[", 1)[0].strip())
+            if not segment:
+                continue
+            child = node.children.get(segment)
+            if child is not None:
+                node = child
+            elif node.aliases is not None and segment in node.aliases:
+                # 畳み込んだ choice / case は読み飛ばす
+                continue
+            else:
+                return None
+        return node
+
+    # --- 展開 -----------------------------------------------------------
+
+    def _add(self, parent: SchemaNode, stmt, module: str) -> SchemaNode:
+        keyword = stmt.keyword
+        # input / output は引数を持たないので、キーワードをノード名にする
+        name = stmt.arg if stmt.arg is not None else keyword
+        node = parent.children.get(name)
+        if node is not None:
+            # 同名ノードは 1 つにまとめる (先に定義されたものを優先)
+            return node
+
+        node = SchemaNode(name, keyword, module, parent)
+        if keyword in OPERATION_KEYWORDS:
+            node.config = False
+        else:
+            node.config = parent.config and _sub_arg(stmt, "config") != "false"
+        if keyword == "list":
+            key = _sub_arg(stmt, "key")
+            node.keys = tuple(sys.intern(k) for k in key.split()) if key else ()
+        elif keyword in ("leaf", "leaf-list"):
+            node.type = _sub_arg(stmt, "type")
+            node.mandatory = _sub_arg(stmt, "mandatory") == "true"
+        node.description = _sub_arg(stmt, "description")
+        parent.children[node.name] = node
+        return node
+
+    def _expand(self, stmts, parent: SchemaNode, module: str, active: Tuple[int, ...]) -> None:
+        for stmt in stmts:
+            keyword = stmt.keyword
+            if not isinstance(keyword, str):
+                # 拡張ステートメント
+                continue
+            if keyword in DATA_KEYWORDS or keyword in OPERATION_KEYWORDS:
+                node = self._add(parent, stmt, module)
+                self._expand(stmt.substmts, node, module, active)
+            elif keyword in TRANSPARENT_KEYWORDS:
+                if parent.aliases is None:
+                    parent.aliases = set()
+                parent.aliases.add(stmt.arg)
+                self._expand(stmt.substmts, parent, module, active)
+            elif keyword == "uses":
+                grouping = self._find_grouping(stmt)
+                # 見つからない grouping と、自分自身を含む grouping は展開しない
+                if grouping is None or id(grouping) in active:
+                    continue
+                inner = active + (id(grouping),)
+                self._expand(grouping.substmts, parent, module, inner)
+                for sub in stmt.substmts:
+                    if sub.keyword == "augment":
+                        target = self._walk_path(parent, sub.arg)
+                        if target is not None:
+                            self._expand(sub.substmts, target, module, inner)
+
+    def build(self) -> SchemaTree:
+        root = SchemaNode("", "root", "")
+        augments = []
+        for module, stmts in self.families.items():
+            for stmt in stmts:
+                self._expand(stmt.substmts, root, module, ())
+                augments.extend(
+                    (sub, module) for sub in stmt.substmts if sub.keyword == "augment"
+                )
+
+        # augment の対象が別の augment で追加されることがあるので、
+        # 解決できるものが無くなるまで繰り返す
+        while augments:
+            pending = []
+            for stmt, module in augments:
+                target = self._walk_path(root, stmt.arg)
+                if target is None:
+                    pending.append((stmt, module))
+                else:
+                    self._expand(stmt.substmts, target, module, ())
+            if len(pending) == len(augments):
+                break
+            augments = pending
+
+        return SchemaTree(root)
+
+
+def build_schema_tree(statements: Iterable) -> SchemaTree:
+    """pyang で構文解析した module / submodule の Statement から SchemaTree を作る。
+
+    *statements* はファイル順に渡す (同名ノードは先に現れたものを優先する)。
+    """
+
+    return _SchemaBuilder(statements).build()